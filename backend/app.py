@@ -1,10 +1,48 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, has_request_context, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import oracledb
+import atexit
 import bcrypt
+import csv
 import datetime
 import os
 import jwt
+import hashlib
+import io
+import json
+import mmap
+import queue
+import socket
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from urllib.parse import urlencode
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: columnar catalog load (_fetch_catalog_rows falls back to row fetch), Parquet export
+    pa = None
+    pc = None
+    pq = None
+try:
+    import orjson
+except ImportError:  # optional: fast JSON provider; Flask's stdlib provider is used without it
+    orjson = None
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process catalog build lock, each worker rebuilds the shared file itself
+    fcntl = None
 
 app = Flask(__name__)
 # Enable CORS for all routes with proper configuration
@@ -12,7 +50,8 @@ CORS(app, resources={
     r"/api/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["ETag", "X-Catalog-Seq", "Retry-After"]
     }
 })
 # Ensure CORS headers on every response (including 500 errors)
@@ -21,6 +60,7 @@ def add_cors_after(response):
     response.headers["Access-Control-Allow-Origin"] = "*"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
     response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response.headers["Access-Control-Expose-Headers"] = "ETag, X-Catalog-Seq, Retry-After"
     return response
 
 
@@ -30,7 +70,55 @@ def handle_500(err):
     return jsonify({"error": "Internal server error", "message": str(err)}), 500
 
 
+# --- JSON serialization ---
+# orjson-backed provider producing the same documents as Flask's default one (sorted keys, RFC 822 dates,
+# Decimal as string). POS_JSON_PROVIDER=stdlib switches back to the default provider.
+JSON_PROVIDER = (os.environ.get('POS_JSON_PROVIDER') or 'orjson').strip().lower()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding; values orjson rejects (e.g. ints over 64 bits) use json."""
+
+    def dumpb(self, obj, **kwargs):
+        """Serialize obj to UTF-8 JSON bytes (kwargs as for dumps; only indent changes the orjson output)."""
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option)
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        return self.dumpb(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return super().loads(s, **kwargs) if kwargs else orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        dump_args = {'indent': 2} if pretty else {'separators': (',', ':')}
+        return self._app.response_class(self.dumpb(obj, **dump_args) + b'\n', mimetype=self.mimetype)
+
+
+if orjson is not None and JSON_PROVIDER == 'orjson':
+    app.json = FastJSONProvider(app)
+
+
+def _json_bytes(obj):
+    """obj serialized with the app's JSON provider, as bytes."""
+    dumpb = getattr(app.json, 'dumpb', None)
+    return dumpb(obj) if dumpb else app.json.dumps(obj).encode('utf-8')
+
+
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'pos-secret-key-change-in-production')
+# Per-user app data dir for local state that must outlive temp cleanup (audit queue)
+POS_DATA_DIR = os.environ.get('POS_DATA_DIR') or os.path.join(
+    os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_DATA_HOME')
+    or os.path.join(os.path.expanduser('~'), '.local', 'share'), 'pos')
 
 # Role from APPLICATIONUSER.ROLECODE: 1=IT (full), 2=Supervisor (Billing+CounterOpen), 3=Cashier (Billing only)
 ROLE_CODE_TO_NAME = {1: 'it', 2: 'supervisor', 3: 'cashier'}
@@ -47,7 +135,8 @@ _demo_users = {
     'cashier': {'password': _hash('cashier'), 'role': 'cashier', 'userid': 'cashier', 'name': 'Cashier', 'alt_password': 'password'},
     '1': {'password': _hash('password'), 'role': 'cashier', 'userid': '1', 'name': 'User 1'},
 }
-# Admin-created users (in-memory; code -> {password, role, userid, name})
+# Admin-created users (code -> {password, role, userid, name}); in memory only, per worker. Never sent over the
+# cache bus, since an entry carries the password hash.
 _added_users = {}
 
 
@@ -90,15 +179,79 @@ def _encode_token(username, role, userid=None):
     return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
 
 
+# Verified-token cache: sha256(token) -> (claims, exp). Skips HMAC verification for repeat requests
+# from the same terminal; entries are dropped at token exp. Revoked digests are kept until their exp
+# (at most REVOKED_TOKENS_MAX; past that the ones expiring soonest are forgotten first).
+TOKEN_CACHE_MAX = 1024
+REVOKED_TOKENS_MAX = 4096
+_token_cache = OrderedDict()
+_revoked_tokens = {}  # digest -> exp (epoch seconds)
+_token_cache_lock = threading.Lock()
+
+
+def _token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _verify_token(token):
+    """Return JWT claims for token, using the verified-token cache. Raises jwt.InvalidTokenError (or subclass)."""
+    digest = _token_digest(token)
+    now = time.time()
+    with _token_cache_lock:
+        if digest in _revoked_tokens:
+            raise jwt.InvalidTokenError("Token revoked")
+        hit = _token_cache.get(digest)
+        if hit is not None:
+            claims, exp = hit
+            if exp > now:
+                _token_cache.move_to_end(digest)
+                return dict(claims)
+            del _token_cache[digest]
+    claims = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    exp = _to_float(claims.get('exp'), 0.0)
+    if exp > now:
+        with _token_cache_lock:
+            _token_cache[digest] = (dict(claims), exp)
+            _token_cache.move_to_end(digest)
+            while len(_token_cache) > TOKEN_CACHE_MAX:
+                _token_cache.popitem(last=False)
+    return claims
+
+
+def _revoke_token(token):
+    """Revocation hook: drop a valid token from the cache and reject it until its exp. False if it is not valid."""
+    token = (token or '').strip()
+    if not token:
+        return False
+    try:
+        claims = _verify_token(token)
+    except jwt.InvalidTokenError:
+        return False  # forged, expired or already revoked: nothing to revoke
+    exp = _to_float(claims.get('exp'), 0.0)
+    _bus_publish('token.revoked', {'digest': _token_digest(token), 'exp': exp})  # every worker drops / rejects it
+    return True
+
+
+def _remember_revoked(digest, exp):
+    """Record a revoked digest; expired entries are pruned and the map is kept to REVOKED_TOKENS_MAX."""
+    now = time.time()
+    with _token_cache_lock:
+        _token_cache.pop(digest, None)
+        for d in [d for d, e in _revoked_tokens.items() if e <= now]:
+            del _revoked_tokens[d]
+        if exp <= now:
+            return
+        _revoked_tokens[digest] = exp
+        if len(_revoked_tokens) > REVOKED_TOKENS_MAX:
+            for d, _ in sorted(_revoked_tokens.items(), key=lambda item: item[1])[:len(_revoked_tokens) - REVOKED_TOKENS_MAX]:
+                del _revoked_tokens[d]
+
+
 def _decode_token(auth_header):
     if not auth_header or not auth_header.startswith('Bearer '):
         return None
     try:
-        return jwt.decode(
-            auth_header[7:].strip(),
-            app.config['SECRET_KEY'],
-            algorithms=['HS256']
-        )
+        return _verify_token(auth_header[7:].strip())
     except Exception:
         return None
 
@@ -232,6 +385,28 @@ def _get_base_location():
                 pass
 
 
+BASE_LOCATION_TTL_SECONDS = 300
+_base_location_cache = {'value': None, 'loaded_at': 0.0}
+
+
+def _get_cached_base_location():
+    """_get_base_location() cached for BASE_LOCATION_TTL_SECONDS, including a miss (no row / Oracle unavailable)."""
+    cached = _base_location_cache
+    if cached['loaded_at'] and time.time() - cached['loaded_at'] < BASE_LOCATION_TTL_SECONDS:
+        return cached['value']
+    value = _get_base_location()
+    _base_location_cache.update(value=value, loaded_at=time.time())
+    return value
+
+
+def _request_location_code(data=None):
+    """Store a catalog request is scoped to: locationCode from the request, else the login (base) location."""
+    code = str((data or {}).get('locationCode') or request.args.get('locationCode') or '').strip()
+    if code:
+        return code
+    return ((_get_cached_base_location() or {}).get('locationCode') or '').strip() or None
+
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json(silent=True) or {}
@@ -262,11 +437,7 @@ def me():
     if not auth.startswith('Bearer '):
         return jsonify({"error": "Missing or invalid authorization"}), 401
     try:
-        payload = jwt.decode(
-            auth[7:],
-            app.config['SECRET_KEY'],
-            algorithms=['HS256']
-        )
+        payload = _verify_token(auth[7:].strip())
         return jsonify({
             "user": {
                 "username": payload.get('sub'),
@@ -280,6 +451,16 @@ def me():
         return jsonify({"error": "Invalid token"}), 401
 
 
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    """Revoke the caller's token so cached verification no longer accepts it."""
+    auth = request.headers.get('Authorization') or ''
+    if not auth.startswith('Bearer '):
+        return jsonify({"ok": True})
+    _revoke_token(auth[7:])
+    return jsonify({"ok": True})
+
+
 def _require_manager():
     """Require IT or manager role for admin APIs (users, etc.)."""
     auth = request.headers.get('Authorization') or ''
@@ -350,261 +531,454 @@ def add_user():
     }), 201
 
 
-@app.route('/api/customers', methods=['GET'])
-def get_customers():
+# --- Single-flight read coalescing ---
+# Identical concurrent GETs (same path + normalized query args) share one computation: the first request runs the
+# view, the rest wait for its response. Successful responses are reused for `fresh` seconds and then served stale
+# for up to `stale` more seconds while a single background request revalidates them.
+SINGLE_FLIGHT_MAX_ENTRIES = 256
+SINGLE_FLIGHT_WAIT_SECONDS = 60
+_flight_results = OrderedDict()  # key -> (stored_at, (body, status, mimetype))
+_flights = {}  # key -> _Flight currently computing
+_flight_lock = threading.Lock()
+
+
+class _Flight:
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def _flight_key():
+    args = sorted((k, v.strip()) for k, v in request.args.items(multi=True) if (v or '').strip())
+    return request.path, tuple(args)
+
+
+def _flight_response(result):
+    body, status, mimetype = result
+    return app.response_class(body, status=status, mimetype=mimetype)
+
+
+def _run_flight(key, flight, view, args, kwargs):
+    """Run the view for a flight, publish the result to waiters and cache it if it was a 200."""
+    result = None
     try:
-        # Establish connection
-        connection = oracledb.connect(
-            user=ORACLE_CONFIG['user'],
-            password=ORACLE_CONFIG['password'],
-            dsn=ORACLE_CONFIG['dsn']
-        )
-        cursor = connection.cursor()
-        
-        # Execute Query
-        query = """
-            SELECT 
-                c.locationcode, 
-                c.customercode, 
-                c.customercode || ' ' || c.customername AS cust_full_name, 
-                g.categoryname,
-                c.flag,
-                c.invoicecode,
-                c.currentcreditamount,
-                c.creditlimit
-            FROM customer c
-            INNER JOIN (SELECT DISTINCT customercode FROM billhdrhistory) b 
-                ON c.customercode = b.customercode
-            INNER JOIN tblcustomercategory g 
-                ON c.customercategory = g.categorycode
-        """
-        cursor.execute(query)
-        
-        # Fetch rows and column names
-        columns = [col[0] for col in cursor.description]
-        rows = cursor.fetchall()
-        
-        # Convert to list of dicts
-        results = []
-        for row in rows:
-            results.append(dict(zip(columns, row)))
-            
-        return jsonify(results)
-        
-    except oracledb.Error as e:
-        print(f"Oracle Connection Error: {e}")
-        # Fallback to mock data for development
-        mock_data = [
-            {
-                "LOCATIONCODE": "001",
-                "CUSTOMERCODE": "C001",
-                "CUST_FULL_NAME": "C001 JOHN DOE",
-                "CATEGORYNAME": "RETAIL",
-                "FLAG": "A",
-                "INVOICECODE": None,
-                "CURRENTCREDITAMOUNT": 0,
-                "CREDITLIMIT": 1000
-            },
-            {
-                "LOCATIONCODE": "001",
-                "CUSTOMERCODE": "C002",
-                "CUST_FULL_NAME": "C002 JANE SMITH",
-                "CATEGORYNAME": "WHOLESALE",
-                "FLAG": "A",
-                "INVOICECODE": None,
-                "CURRENTCREDITAMOUNT": 0,
-                "CREDITLIMIT": 5000
-            }
-        ]
-        return jsonify(mock_data)
+        response = app.make_response(view(*args, **kwargs))
+        result = (response.get_data(), response.status_code, response.mimetype)
+        return result
     finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'connection' in locals():
-            connection.close()
+        with _flight_lock:
+            if result is not None and result[1] == 200:
+                _flight_results[key] = (time.time(), result)
+                _flight_results.move_to_end(key)
+                while len(_flight_results) > SINGLE_FLIGHT_MAX_ENTRIES:
+                    _flight_results.popitem(last=False)
+            _flights.pop(key, None)
+        flight.result = result
+        flight.done.set()
 
 
+def _revalidate_flight(key, flight, view, args, kwargs, environ):
+    def run():
+        try:
+            with app.request_context(environ):
+                _run_flight(key, flight, view, args, kwargs)
+        except Exception as e:
+            print(f"[SingleFlight] revalidate {key[0]} error: {e}")
+    threading.Thread(target=run, name='single-flight', daemon=True).start()
 
 
-# Format for Oracle TO_CHAR on numbers to avoid scientific notation (e.g. long barcodes)
-_ORACLE_NUM_FMT = "FM99999999999999999999999999999999999999"
+def _single_flight(fresh, stale):
+    """Decorator for read-only GET views; ?refresh=1 bypasses it."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.args.get('refresh') in ('1', 'true'):
+                return view(*args, **kwargs)
+            key = _flight_key()
+            now = time.time()
+            with _flight_lock:
+                cached = _flight_results.get(key)
+                age = now - cached[0] if cached else None
+                if cached and age < fresh:
+                    return _flight_response(cached[1])
+                flight = _flights.get(key)
+                owner = flight is None
+                if owner:
+                    flight = _flights[key] = _Flight()
+            if cached and age < fresh + stale:
+                if owner:
+                    _revalidate_flight(key, flight, view, args, kwargs, dict(request.environ))
+                return _flight_response(cached[1])
+            if owner:
+                return _flight_response(_run_flight(key, flight, view, args, kwargs))
+            if flight.done.wait(SINGLE_FLIGHT_WAIT_SECONDS) and flight.result is not None:
+                return _flight_response(flight.result)
+            # leader failed or is stuck: compute this request on its own
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
 
 
-def _get_alternate_uom_table_info(cur):
+def _invalidate_single_flight(path=None):
+    """Drop cached responses for path (or all); in-flight computations still complete for their waiters."""
+    with _flight_lock:
+        for key in [k for k in _flight_results if path is None or k[0] == path]:
+            del _flight_results[key]
+
+
+def _invalidates_flights(path):
+    """Decorator for write views: clear path's single-flight cache in every worker once the write has succeeded."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code < 400:
+                _bus_publish('flights.invalidate', {'path': path})
+            return response
+        return wrapper
+    return decorator
+
+
+# --- Admission control ---
+# Caps how many requests work at once so a burst of heavy reads (every terminal reloading the catalog) cannot
+# starve checkout. Each route has a priority and optionally its own concurrency limit (ADMISSION_ROUTES; routes not
+# listed are normal priority). The last ADMISSION_CRITICAL_RESERVED slots are only used by critical routes, and a
+# freed slot goes to waiting requests in priority order (a waiter held back only by its own route limit does not
+# hold back lower classes). A request that finds its class's queue full, or does not get a slot within the class's
+# wait, is answered 429 with Retry-After. The slot is held until the response body has been sent.
+ADMISSION_ENABLED = (os.environ.get('POS_ADMISSION') or '1').strip().lower() not in ('0', 'false', 'no')
+ADMISSION_MAX_ACTIVE = int(os.environ.get('POS_ADMISSION_MAX_ACTIVE') or 24)
+ADMISSION_CRITICAL_RESERVED = int(os.environ.get('POS_ADMISSION_CRITICAL_RESERVED') or 8)
+ADMISSION_CRITICAL, ADMISSION_NORMAL, ADMISSION_LOW = 0, 1, 2
+# priority -> (name, max queued, max wait seconds, Retry-After seconds)
+ADMISSION_CLASSES = {
+    ADMISSION_CRITICAL: ('critical', 64, 15.0, 1),
+    ADMISSION_NORMAL: ('normal', 32, 5.0, 2),
+    ADMISSION_LOW: ('low', 16, 1.0, 5),
+}
+# endpoint -> (priority, concurrency limit or None)
+ADMISSION_ROUTES = {
+    'billdtl_insert': (ADMISSION_CRITICAL, None),
+    'create_next_billno': (ADMISSION_CRITICAL, None),
+    'mark_bill_paid': (ADMISSION_CRITICAL, None),
+    'check_billno': (ADMISSION_CRITICAL, None),
+    'lookup_product': (ADMISSION_CRITICAL, None),
+    'lookup_products_batch': (ADMISSION_NORMAL, 8),
+    'get_products': (ADMISSION_LOW, 4),
+    'search_products': (ADMISSION_LOW, 8),
+    'get_top_products': (ADMISSION_LOW, 4),
+    'get_catalog_blob': (ADMISSION_LOW, 4),
+    'bootstrap': (ADMISSION_LOW, 4),
+    'product_changes': (ADMISSION_LOW, 8),
+    'get_customers': (ADMISSION_LOW, 4),
+    'search_customers': (ADMISSION_LOW, 8),
+    'counter_summary': (ADMISSION_LOW, 2),
+    'export_bills': (ADMISSION_LOW, None),  # capped by its own pool
+    'import_catalog_changes': (ADMISSION_LOW, 1),
+    'tempbill_purge_now': (ADMISSION_LOW, 1),
+}
+ADMISSION_EXEMPT = frozenset(('health_check', 'admission_status'))
+ADMISSION_UNMATCHED = '<unmatched>'  # one route key for every URL no view matches (404 / 405)
+_admission_cond = threading.Condition()
+_admission_active = 0
+_admission_route_active = {}  # endpoint -> requests holding a slot
+_admission_waiting = [0, 0, 0]  # per priority
+_admission_route_waiting = {}  # endpoint -> requests queued for a slot
+_admission_stats = {}  # endpoint -> counters
+
+
+def _admission_route(endpoint):
+    return ADMISSION_ROUTES.get(endpoint, (ADMISSION_NORMAL, None))
+
+
+def _admission_route_full(endpoint, limit):
+    return limit is not None and _admission_route_active.get(endpoint, 0) >= limit
+
+
+def _admission_free(endpoint, priority, limit):
     """
-    Discover ITEMALTERNATEUOMMAP table and columns from Oracle (USER or ALL_TAB_COLUMNS).
-    Returns (qualified_table, itemcode_col, alternate_cols) or (None, None, []).
-    alternate_cols = list of column names to match barcode/code against.
+    Whether a request of this priority / route may take a slot now (caller holds _admission_cond). Higher-priority
+    waiters only hold it back while they wait for global capacity, not for their own route limit.
+    """
+    if _admission_route_full(endpoint, limit):
+        return False
+    capacity = ADMISSION_MAX_ACTIVE if priority == ADMISSION_CRITICAL else ADMISSION_MAX_ACTIVE - ADMISSION_CRITICAL_RESERVED
+    if _admission_active >= capacity:
+        return False
+    if not any(_admission_waiting[p] for p in range(priority)):
+        return True
+    for name, waiting in _admission_route_waiting.items():
+        waiter_priority, waiter_limit = _admission_route(name)
+        if waiting and waiter_priority < priority and not _admission_route_full(name, waiter_limit):
+            return False
+    return True
+
+
+def _admission_acquire(endpoint):
+    """Take a slot for endpoint; True when admitted, False when its queue is full or the wait timed out."""
+    global _admission_active
+    priority, limit = _admission_route(endpoint)
+    _, max_queued, max_wait, _ = ADMISSION_CLASSES[priority]
+    started = time.monotonic()
+    with _admission_cond:
+        stats = _admission_stats.setdefault(endpoint, {'admitted': 0, 'queued': 0, 'rejected': 0, 'maxWaitMs': 0})
+        if not _admission_free(endpoint, priority, limit):
+            if _admission_waiting[priority] >= max_queued:
+                stats['rejected'] += 1
+                return False
+            stats['queued'] += 1
+            _admission_waiting[priority] += 1
+            _admission_route_waiting[endpoint] = _admission_route_waiting.get(endpoint, 0) + 1
+            try:
+                while not _admission_free(endpoint, priority, limit):
+                    remaining = started + max_wait - time.monotonic()
+                    if remaining <= 0:
+                        stats['rejected'] += 1
+                        return False
+                    _admission_cond.wait(remaining)
+            finally:
+                _admission_waiting[priority] -= 1
+                _admission_route_waiting[endpoint] -= 1
+                _admission_cond.notify_all()  # lower priorities may proceed once this class stops waiting
+        _admission_active += 1
+        _admission_route_active[endpoint] = _admission_route_active.get(endpoint, 0) + 1
+        stats['admitted'] += 1
+        stats['maxWaitMs'] = max(stats['maxWaitMs'], round((time.monotonic() - started) * 1000))
+    return True
+
+
+def _admission_release(endpoint):
+    global _admission_active
+    with _admission_cond:
+        _admission_active -= 1
+        _admission_route_active[endpoint] -= 1
+        _admission_cond.notify_all()
+
+
+@app.before_request
+def _admit_request():
+    if not ADMISSION_ENABLED or request.method == 'OPTIONS' or request.endpoint in ADMISSION_EXEMPT:
+        return None
+    endpoint = request.endpoint or ADMISSION_UNMATCHED
+    if _admission_acquire(endpoint):
+        g.admission_endpoint = endpoint
+        return None
+    retry_after = ADMISSION_CLASSES[_admission_route(endpoint)[0]][3]
+    resp = jsonify({"ok": False, "error": "Server busy, retry shortly", "retryAfter": retry_after})
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp
+
+
+@app.after_request
+def _release_admission_on_close(response):
+    """Hold the slot until the server closes the response, so a streamed body (CSV export) still counts."""
+    endpoint = g.pop('admission_endpoint', None)
+    if endpoint is not None:
+        response.call_on_close(lambda: _admission_release(endpoint))
+    return response
+
+
+@app.teardown_request
+def _release_admission(exc=None):
+    """Release a slot that no response took over (the request failed before after_request ran)."""
+    endpoint = g.pop('admission_endpoint', None)
+    if endpoint is not None:
+        _admission_release(endpoint)
+
+
+@app.route('/api/admin/admission', methods=['GET'])
+def admission_status():
+    """Slots in use, queue lengths per priority and per-route admission counters. Manager/IT only."""
+    _, err = _require_manager()
+    if err:
+        return err
+    with _admission_cond:
+        routes = {name: dict(stats, active=_admission_route_active.get(name, 0),
+                             priority=ADMISSION_CLASSES[_admission_route(name)[0]][0],
+                             limit=_admission_route(name)[1])
+                  for name, stats in _admission_stats.items()}
+        waiting = {ADMISSION_CLASSES[p][0]: n for p, n in enumerate(_admission_waiting)}
+        active = _admission_active
+    return jsonify({"ok": True, "enabled": ADMISSION_ENABLED, "maxActive": ADMISSION_MAX_ACTIVE,
+                    "criticalReserved": ADMISSION_CRITICAL_RESERVED, "active": active, "waiting": waiting,
+                    "routes": routes})
+
+
+# --- Background job scheduler ---
+# Periodic work (cache refreshes, maintenance) runs here instead of on the request path. Each worker runs one
+# scheduler thread that submits due jobs to a small pool; a job never overlaps itself within a worker. Singleton
+# jobs also take a cross-worker lock (flock on a side file, or a lease row in POSJOBLOCK where flock is not
+# available) and share a last-run stamp through it, so N workers still run them once per interval / cron slot.
+SCHEDULER_ENABLED = (os.environ.get('POS_SCHEDULER') or '1').strip().lower() not in ('0', 'false', 'no')
+JOB_LOCK_MODE = (os.environ.get('POS_JOB_LOCK') or ('file' if fcntl is not None else 'db')).strip().lower()
+JOB_LOCK_TABLE_NAME = 'POSJOBLOCK'
+JOB_LEASE_SECONDS = 3600  # DB lease of a worker that died mid-run expires after this
+JOB_WORKERS = 4
+_JOB_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+_jobs = {}  # name -> _Job
+_jobs_lock = threading.Lock()
+_job_wake = threading.Event()
+_job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+_scheduler_thread = None
+_job_lock_table_ready = False
+
+
+class CronSchedule:
+    """5-field cron expression (minute hour day-of-month month day-of-week, Sunday=0) in local time."""
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, lo, hi) for field, (lo, hi) in zip(fields, self._RANGES))
+        # standard cron: when both day fields are restricted, either one matching is enough
+        self._any_day = fields[2] != '*' and fields[4] != '*'
+
+    @staticmethod
+    def _parse(field, lo, hi):
+        values = set()
+        for part in field.split(','):
+            rng, _, step = part.partition('/')
+            if rng == '*':
+                start, end = lo, hi
+            elif '-' in rng:
+                start, end = (int(x) for x in rng.split('-', 1))
+            else:
+                start = end = int(rng)
+                if step:
+                    end = hi
+            if not (lo <= start <= end <= hi + (1 if hi == 6 else 0)):
+                raise ValueError(f"cron field out of range: {field!r}")
+            values.update(v % 7 if hi == 6 else v for v in range(start, end + 1, int(step or 1)))
+        return values
+
+    def _day_matches(self, dt):
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.weekdays
+        return (dom or dow) if self._any_day else (dom and dow)
+
+    def next_after(self, ts):
+        """Epoch seconds of the first matching minute after ts."""
+        dt = datetime.datetime.fromtimestamp(ts).replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = dt + datetime.timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + datetime.timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(dt):
+                dt = (dt + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + datetime.timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += datetime.timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"cron expression never matches: {self.expr!r}")
+
+
+class _Job:
+    __slots__ = ('name', 'fn', 'every', 'cron', 'singleton', 'next_run', 'running', 'stats')
+
+    def __init__(self, name, fn, every, cron, singleton, first_run):
+        self.name = name
+        self.fn = fn
+        self.every = every
+        self.cron = cron
+        self.singleton = singleton
+        self.next_run = first_run
+        self.running = False
+        self.stats = {'runs': 0, 'failures': 0, 'skipped': 0, 'lastOutcome': None, 'lastStartedAt': None,
+                      'lastDurationMs': None, 'maxDurationMs': None, 'totalDurationMs': 0, 'lastError': None}
+
+    def following(self, now):
+        return self.cron.next_after(now) if self.cron else now + self.every
+
+
+def _schedule_job(name, fn, every=None, cron=None, singleton=True, initial_delay=None):
     """
+    Register fn to run every `every` seconds (first run after initial_delay, default one interval) or on a
+    cron expression. singleton=True: once across all workers; False: in every worker (per-process caches).
+    """
+    if (every is None) == (cron is None):
+        raise ValueError("a job needs exactly one of every / cron")
+    cron = CronSchedule(cron) if cron else None
+    now = time.time()
+    first_run = cron.next_after(now) if cron else now + (every if initial_delay is None else initial_delay)
+    with _jobs_lock:
+        _jobs[name] = _Job(name, fn, every, cron, singleton, first_run)
+    _job_wake.set()
+
+
+def _ensure_job_lock_table(cur):
+    global _job_lock_table_ready
+    if _job_lock_table_ready:
+        return
     try:
-        owner = None
-        cur.execute("""
-            SELECT OWNER FROM ALL_TABLES
-            WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP' AND ROWNUM = 1
+        cur.execute(f"""
+            CREATE TABLE {JOB_LOCK_TABLE_NAME} (
+                JOBNAME VARCHAR2(50) PRIMARY KEY,
+                OWNER VARCHAR2(100),
+                LEASEUNTIL DATE,
+                LASTRUNAT NUMBER DEFAULT 0
+            )
         """)
-        row = cur.fetchone()
-        if row and row[0]:
-            owner = str(row[0]).strip()
-        if not owner:
-            cur.execute("""
-                SELECT 1 FROM USER_TABLES
-                WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP' AND ROWNUM = 1
-            """)
-            if not cur.fetchone():
-                return None, None, []
-        qualified = f'"{owner}".ITEMALTERNATEUOMMAP' if owner else 'ITEMALTERNATEUOMMAP'
-        if owner:
-            cur.execute("""
-                SELECT COLUMN_NAME FROM ALL_TAB_COLUMNS
-                WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP' AND OWNER = :owner
-                ORDER BY COLUMN_ID
-            """, owner=owner)
-        else:
-            cur.execute("""
-                SELECT COLUMN_NAME FROM USER_TAB_COLUMNS
-                WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP'
-                ORDER BY COLUMN_ID
-            """)
-        columns = [str(r[0]).strip().upper() for r in cur.fetchall() if r and r[0]]
-        if not columns:
-            return None, None, []
-        itemcode_col = next((c for c in columns if c in ('ITEMCODE', 'ITEM_CODE')), columns[0])
-        # Your table: ALTERNATEUOMCODE (VARCHAR), MANUFACTURERID (VARCHAR) for barcode/code lookup
-        alt_names = ('ALTERNATEUOMCODE', 'MANUFACTURERID', 'ALTERNATECODE', 'ALTERNATEITEMCODE', 'BARCODE', 'ALTERNATEUOM', 'UOM')
-        alternate_cols = [c for c in columns if c in alt_names or (c != itemcode_col and ('ALT' in c or 'CODE' in c or 'BAR' in c or 'MANUFACTURER' in c))]
-        if not alternate_cols:
-            alternate_cols = [c for c in columns if c != itemcode_col][:5]
-        return qualified, itemcode_col, alternate_cols
-    except oracledb.Error:
-        return None, None, []
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' not in err_str and '00955' not in err_str and '01031' not in err_str:
+            print(f"[Jobs] {JOB_LOCK_TABLE_NAME} create failed: {e}")
+            raise
+    _job_lock_table_ready = True
 
 
-@app.route('/api/products/lookup', methods=['GET'])
-def lookup_product():
-    """Look up a single product by code for cart add: check BOTH ITEMMASTER and ITEMALTERNATEUOMMAP."""
-    code = (request.args.get('code') or '').strip()
-    if not code:
-        return jsonify({"error": "code is required"}), 400
+def _db_job_lock(name, acquire, ran_at=None):
+    """Take (acquire=True) or give back a POSJOBLOCK lease. Returns the shared last-run epoch, or None if not taken."""
     conn = _get_connection()
     if not conn:
-        return jsonify({"found": False, "code": code, "error": "Product not found"}), 200
-    cursor = None
+        return None
+    cur = None
     try:
-        cursor = conn.cursor()
-        row = None
-        itemcode_from_alt = None
-        # 1) ITEMMASTER: match by manufacturerid (barcode) or itemcode
+        cur = conn.cursor()
+        _ensure_job_lock_table(cur)
+        if not acquire:
+            cur.execute(f"""
+                UPDATE {JOB_LOCK_TABLE_NAME} SET LEASEUNTIL = SYSDATE, LASTRUNAT = NVL(:ran, LASTRUNAT)
+                WHERE JOBNAME = :name AND OWNER = :owner
+            """, name=name, owner=_JOB_OWNER, ran=ran_at)
+            conn.commit()
+            return None
+        cur.execute(f"""
+            MERGE INTO {JOB_LOCK_TABLE_NAME} l
+            USING (SELECT :name AS JOBNAME FROM dual) s ON (l.JOBNAME = s.JOBNAME)
+            WHEN MATCHED THEN UPDATE SET l.OWNER = :owner, l.LEASEUNTIL = SYSDATE + :lease / 86400
+                WHERE l.LEASEUNTIL < SYSDATE OR l.OWNER = :owner
+            WHEN NOT MATCHED THEN INSERT (JOBNAME, OWNER, LEASEUNTIL, LASTRUNAT)
+                VALUES (:name, :owner, SYSDATE + :lease / 86400, 0)
+        """, name=name, owner=_JOB_OWNER, lease=JOB_LEASE_SECONDS)
+        if cur.rowcount != 1:
+            conn.rollback()
+            return None
+        cur.execute(f"SELECT LASTRUNAT FROM {JOB_LOCK_TABLE_NAME} WHERE JOBNAME = :name", name=name)
+        row = cur.fetchone()
+        conn.commit()
+        return _to_float(row[0] if row else 0, 0.0)
+    except oracledb.Error as e:
+        if '00001' not in str(e):  # lost the race to insert the lease row
+            print(f"[Jobs] {name} lease error: {e}")
         try:
-            cursor.execute(f"""
-                SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
-                FROM itemmaster
-                WHERE ((manufacturerid IS NOT NULL AND (TRIM(TO_CHAR(manufacturerid, '{_ORACLE_NUM_FMT}')) = TRIM(:code)
-                   OR UPPER(TRIM(TO_CHAR(manufacturerid))) = UPPER(:code)))
-                   OR (itemcode IS NOT NULL AND UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code)))
-                AND ROWNUM = 1
-            """, code=code)
-            row = cursor.fetchone()
-        except oracledb.Error:
+            conn.rollback()
+        except Exception:
+            pass
+        return None
+    finally:
+        if cur:
             try:
-                cursor.execute(f"""
-                    SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
-                    FROM itemmaster
-                    WHERE ((manufacturerid IS NOT NULL AND TRIM(TO_CHAR(manufacturerid, '{_ORACLE_NUM_FMT}')) = TRIM(:code))
-                       OR (itemcode IS NOT NULL AND UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code)))
-                    AND ROWNUM = 1
-                """, code=code)
-                row = cursor.fetchone()
-            except oracledb.Error:
-                try:
-                    cursor.execute(f"""
-                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
-                        FROM itemmaster
-                        WHERE (TRIM(TO_CHAR(NVL(manufacturerid, 0), '{_ORACLE_NUM_FMT}')) = TRIM(:code)
-                           OR UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code))
-                        AND ROWNUM = 1
-                    """, code=code)
-                    row = cursor.fetchone()
-                except oracledb.Error:
-                    try:
-                        cursor.execute("""
-                            SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
-                            FROM itemmaster
-                            WHERE (TRIM(manufacturerid) = TRIM(:code) OR TRIM(itemcode) = TRIM(:code))
-                            AND ROWNUM = 1
-                        """, code=code)
-                        row = cursor.fetchone()
-                    except oracledb.Error:
-                        try:
-                            cursor.execute("""
-                                SELECT locationcode, itemcode, itemname, categorycode, retailprice, baseuom
-                                FROM itemmaster
-                                WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
-                            """, code=code)
-                            row = cursor.fetchone()
-                        except oracledb.Error:
-                            pass
-        # 2) ITEMALTERNATEUOMMAP: MANUFACTURERID found here -> use this table's RETAILPRICE, ALTERNATEUOMCODE; name/category from itemmaster
-        alt_retailprice = None
-        alt_alternateuomcode = None
-        if not row:
-            itemcode_from_alt, locationcode_from_alt, alt_retailprice, alt_alternateuomcode = _resolve_itemcode_location_from_alternate(cursor, code)
-            if itemcode_from_alt:
-                try:
-                    if locationcode_from_alt:
-                        cursor.execute("""
-                            SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
-                            FROM itemmaster
-                            WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:ic) AND (UPPER(TRIM(TO_CHAR(locationcode))) = UPPER(:lc) OR TRIM(locationcode) = TRIM(:lc))
-                            AND ROWNUM = 1
-                        """, ic=itemcode_from_alt, lc=locationcode_from_alt)
-                    else:
-                        cursor.execute("""
-                            SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
-                            FROM itemmaster
-                            WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
-                        """, code=itemcode_from_alt)
-                    row = cursor.fetchone()
-                except oracledb.Error:
-                    try:
-                        if locationcode_from_alt:
-                            cursor.execute(f"""
-                                SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
-                                FROM itemmaster
-                                WHERE TRIM(TO_CHAR(itemcode)) = TRIM(:ic) AND TRIM(TO_CHAR(NVL(locationcode, 0), '{_ORACLE_NUM_FMT}')) = TRIM(:lc) AND ROWNUM = 1
-                            """, ic=itemcode_from_alt, lc=locationcode_from_alt)
-                        else:
-                            cursor.execute("""
-                                SELECT locationcode, itemcode, itemname, categorycode, retailprice, baseuom
-                                FROM itemmaster
-                                WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
-                            """, code=itemcode_from_alt)
-                        row = cursor.fetchone()
-                    except oracledb.Error:
-                        pass
-        if not row:
-            return jsonify({"found": False, "code": code, "error": "Product not found"}), 200
-        columns = [col[0] for col in cursor.description]
-        result = dict(zip(columns, row))
-        if itemcode_from_alt and alt_retailprice is not None:
-            result['RETAILPRICE'] = alt_retailprice
-            result['retailprice'] = alt_retailprice
-        if itemcode_from_alt and alt_alternateuomcode:
-            result['BASEUOM'] = alt_alternateuomcode
-            result['baseuom'] = alt_alternateuomcode
-        if result.get('manufactureid') is None and result.get('MANUFACTUREID') is None:
-            result['manufactureid'] = str(result.get('ITEMCODE') or result.get('itemcode') or '')
-        if itemcode_from_alt and code:
-            result['manufactureid'] = str(code).strip()
-            result['MANUFACTURERID'] = str(code).strip()
-        result["found"] = True
-        return jsonify(result)
-    except oracledb.Error as e:
-        print(f"Oracle lookup error: {e}")
-        return jsonify({"found": False, "code": code, "error": "Product not found"}), 200
-    finally:
-        if cursor:
-            try:
-                cursor.close()
+                cur.close()
             except Exception:
                 pass
         try:
@@ -613,239 +987,605 @@ def lookup_product():
             pass
 
 
-@app.route('/api/products', methods=['GET'])
-def get_products():
-    """Fetch products from ITEMMASTER and ITEMALTERNATEUOMMAP; show if either table has the product."""
-    conn = _get_connection()
-    if not conn:
-        return jsonify(_get_products_mock_data()), 200
-    cursor = None
+def _acquire_job_lock(job):
+    """Cross-worker lock for a singleton job: (handle, shared last-run epoch), or None while another worker holds it."""
+    if JOB_LOCK_MODE == 'db':
+        last_run = _db_job_lock(job.name, True)
+        return None if last_run is None else ('db', last_run)
+    lock_file = os.fdopen(os.open(os.path.join(tempfile.gettempdir(), f"pos-job-{job.name}.lock"),
+                                  os.O_RDWR | os.O_CREAT), 'r+b')
     try:
-        cursor = conn.cursor()
-        # 1) All from ITEMMASTER (same columns + BASEUOM for item list UOM)
-        query = """
-            SELECT
-                p.locationcode,
-                p.itemcode,
-                p.itemname,
-                p.categorycode,
-                p.retailprice,
-                p.manufacturerid,
-                p.baseuom
-            FROM itemmaster p
-        """
-        cursor.execute(query)
-        columns = [col[0] for col in cursor.description]
-        rows = cursor.fetchall()
-        results = []
-        seen_itemcodes = set()
-        for row in rows:
-            rec = dict(zip(columns, row))
-            ic = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
-            if ic:
-                seen_itemcodes.add(ic.upper())
-            results.append(rec)
-        # 2) ITEMALTERNATEUOMMAP: fetch alternate rows then get RETAILPRICE (and name, etc.) from itemmaster in Python
-        qualified_alt, itemcode_col_alt, alternate_cols_alt = _get_alternate_uom_table_info(cursor)
-        alt_table = qualified_alt if qualified_alt else "ITEMALTERNATEUOMMAP"
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file, _to_float(lock_file.read().decode('ascii', 'ignore').strip(), 0.0)
+    except OSError:
+        lock_file.close()
+        return None
+
+
+def _release_job_lock(job, handle, ran_at):
+    if handle == 'db':
+        _db_job_lock(job.name, False, ran_at)
+        return
+    try:
+        if ran_at is not None:
+            handle.seek(0)
+            handle.truncate()
+            handle.write(f"{ran_at:.3f}".encode('ascii'))
+            handle.flush()
+    finally:
+        handle.close()
+
+
+def _stale_after(seconds):
+    """Age at which a request refreshes a cache itself: one interval, or two while the scheduler keeps it warm."""
+    return seconds * 2 if _scheduler_thread is not None else seconds
+
+
+def _ran_elsewhere(job, last_run, due):
+    """True when another worker already ran this interval / cron slot of a singleton job."""
+    if job.cron:
+        return due is not None and last_run >= due
+    return time.time() - last_run < job.every * 0.9
+
+
+def _run_job(job, due=None, manual=False):
+    """Run a job once; returns 'ok', 'failed', 'skipped' (ran elsewhere), 'locked' or 'busy' (already running here)."""
+    with _jobs_lock:
+        if job.running:
+            return 'busy'
+        job.running = True
+    lock = None
+    ran_at = None
+    try:
+        if job.singleton:
+            lock = _acquire_job_lock(job)
+            if lock is None:
+                job.stats['skipped'] += 1
+                return 'locked'
+            if not manual and _ran_elsewhere(job, lock[1], due):
+                job.stats['skipped'] += 1
+                if not job.cron:
+                    with _jobs_lock:
+                        job.next_run = lock[1] + job.every
+                return 'skipped'
+        stats = job.stats
+        ran_at = time.time()
+        stats['lastStartedAt'] = datetime.datetime.fromtimestamp(ran_at).isoformat(timespec='seconds')
         try:
-            cursor.execute(f"""
-                SELECT {itemcode_col_alt} AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid, RETAILPRICE AS retailprice, ALTERNATEUOMCODE AS alternateuomcode
-                FROM {alt_table}
-                WHERE {itemcode_col_alt} IS NOT NULL
-            """)
-            alt_rows = cursor.fetchall()
-        except oracledb.Error:
+            job.fn()
+            outcome = 'ok'
+            stats['lastError'] = None
+        except Exception as e:
+            outcome = 'failed'
+            stats['failures'] += 1
+            stats['lastError'] = str(e)
+            print(f"[Jobs] {job.name} failed: {e}")
+        duration = round((time.time() - ran_at) * 1000)
+        stats['runs'] += 1
+        stats['lastOutcome'] = outcome
+        stats['lastDurationMs'] = duration
+        stats['maxDurationMs'] = max(stats['maxDurationMs'] or 0, duration)
+        stats['totalDurationMs'] += duration
+        return outcome
+    finally:
+        if lock is not None:
+            _release_job_lock(job, lock[0], ran_at)
+        with _jobs_lock:
+            job.running = False
+
+
+def _scheduler_loop():
+    while True:
+        now = time.time()
+        with _jobs_lock:
+            due = [(job, job.next_run) for job in _jobs.values() if job.next_run <= now and not job.running]
+            for job, _ in due:
+                job.next_run = job.following(now)
+        for job, due_at in due:
+            _job_executor.submit(_run_job, job, due_at)
+        with _jobs_lock:
+            wait = min((job.next_run for job in _jobs.values()), default=now + 60) - time.time()
+        _job_wake.wait(min(max(wait, 0.5), 60))
+        _job_wake.clear()
+
+
+@app.before_request
+def _start_scheduler():
+    """Start this worker's scheduler with its first request (not at import, so tools importing app stay passive)."""
+    global _scheduler_thread
+    if _scheduler_thread is None and SCHEDULER_ENABLED:
+        with _jobs_lock:
+            if _scheduler_thread is None:
+                _scheduler_thread = threading.Thread(target=_scheduler_loop, name='scheduler', daemon=True)
+                _scheduler_thread.start()
+
+
+def _job_info(job):
+    stats = dict(job.stats)
+    total = stats.pop('totalDurationMs')
+    stats['avgDurationMs'] = round(total / stats['runs']) if stats['runs'] else None
+    return {
+        "name": job.name,
+        "schedule": f"cron {job.cron.expr}" if job.cron else f"every {job.every:g}s",
+        "singleton": job.singleton,
+        "running": job.running,
+        "nextRunAt": datetime.datetime.fromtimestamp(job.next_run).isoformat(timespec='seconds'),
+        **stats,
+    }
+
+
+@app.route('/api/admin/jobs', methods=['GET'])
+def list_jobs():
+    """Scheduled jobs with schedule, next run and timing metrics. Manager/IT only."""
+    _, err = _require_manager()
+    if err:
+        return err
+    with _jobs_lock:
+        jobs = sorted(_jobs.values(), key=lambda j: j.name)
+    return jsonify({"ok": True, "schedulerRunning": _scheduler_thread is not None, "lockMode": JOB_LOCK_MODE,
+                    "jobs": [_job_info(job) for job in jobs]})
+
+
+@app.route('/api/admin/jobs/<name>/run', methods=['POST'])
+def trigger_job(name):
+    """Run a job now: in the background (202), or inline with ?wait=1 (returns its outcome). Manager/IT only."""
+    _, err = _require_manager()
+    if err:
+        return err
+    job = _jobs.get(name)
+    if job is None:
+        return jsonify({"ok": False, "error": "Unknown job"}), 404
+    if request.args.get('wait') in ('1', 'true'):
+        outcome = _run_job(job, manual=True)
+        return jsonify({"ok": outcome == 'ok', "outcome": outcome, "job": _job_info(job)})
+    _job_executor.submit(_run_job, job, None, True)
+    return jsonify({"ok": True, "queued": True}), 202
+
+
+# --- Cache invalidation bus ---
+# Per-worker caches (counter registry / state, hold-list responses, warm lookups, revoked tokens)
+# tell the other workers on this host about writes through typed messages instead of waiting for TTLs.
+# Transports: 'unix' (a datagram socket per worker in a shared directory; publish sends to every socket there),
+# 'oracle' (POSCACHEBUS change table polled by every worker; for hosts without AF_UNIX datagrams) or 'local'.
+# Messages carry a version (publish time in ns). Cache entries record the version they were loaded at, and a
+# message only replaces entries older than itself, so a late or replayed message never undoes a newer load.
+# A gap in a peer's message sequence drops every cache that listens on the bus. Publishing applies the message in
+# this worker at once; a sender thread delivers it to the others, so a slow transport never delays the request.
+BUS_TRANSPORT = (os.environ.get('POS_CACHE_BUS') or (
+    'unix' if os.name == 'posix' and hasattr(socket, 'AF_UNIX') else 'oracle')).strip().lower()
+BUS_SOCKET_DIR = os.environ.get('POS_CACHE_BUS_DIR') or os.path.join(tempfile.gettempdir(), 'pos-cache-bus')
+BUS_TABLE_NAME = 'POSCACHEBUS'
+BUS_SEQUENCE_NAME = 'POSCACHEBUS_SEQ'
+BUS_POLL_SECONDS = 1.0
+BUS_POLL_WINDOW_SECONDS = 30  # re-read this much of the table each poll (catches late-committing inserts)
+BUS_RETAIN_MINUTES = 60
+BUS_LONG_TTL_SECONDS = int(os.environ.get('POS_CACHE_BUS_TTL') or 3600)
+BUS_MAX_MESSAGE_BYTES = 3900
+BUS_SEND_QUEUE_MAX = 1000  # unsent messages beyond this are dropped (peers see the sequence gap and resync)
+_BUS_ORIGIN = f"{_JOB_OWNER}:{os.urandom(4).hex()}"
+_bus_handlers = {}  # type -> [fn(data, version)]
+_bus_lock = threading.Lock()
+_bus_seq = 0
+_bus_peer_seqs = {}  # origin -> last seq received
+_bus_stats = {'published': 0, 'sent': 0, 'dropped': 0, 'received': 0, 'gaps': 0, 'errors': 0}
+_bus = None
+_bus_started = False
+_bus_outbox = queue.Queue(maxsize=BUS_SEND_QUEUE_MAX)
+
+
+def _bus_version():
+    """Version stamp for a cache entry: take it before reading the source, so a concurrent change wins."""
+    return time.time_ns()
+
+
+def _bus_ttl(seconds):
+    """TTL for a cache the bus keeps current: long when peers deliver invalidations, as configured otherwise."""
+    return max(seconds, BUS_LONG_TTL_SECONDS) if _bus is not None else seconds
+
+
+def _on_bus(message_type):
+    """Decorator: handle a message type in every worker (including the publisher) with fn(data, version)."""
+    def decorator(fn):
+        _bus_handlers.setdefault(message_type, []).append(fn)
+        return fn
+    return decorator
+
+
+def _bus_dispatch(message_type, data, version):
+    for fn in _bus_handlers.get(message_type, ()):
+        try:
+            fn(data, version)
+        except Exception as e:
+            _bus_stats['errors'] += 1
+            print(f"[CacheBus] {message_type} handler error: {e}")
+
+
+def _bus_publish(message_type, data=None):
+    """Apply a message in this worker, then queue it for the others."""
+    global _bus_seq
+    version = _bus_version()
+    _bus_dispatch(message_type, data, version)
+    with _bus_lock:
+        _bus_seq += 1
+        payload = json.dumps({'t': message_type, 'd': data, 'v': version, 'o': _BUS_ORIGIN, 's': _bus_seq},
+                             separators=(',', ':')).encode('utf-8')
+        _bus_stats['published'] += 1
+        if _bus is None:
+            return
+        if len(payload) > BUS_MAX_MESSAGE_BYTES:
+            print(f"[CacheBus] {message_type} message too large ({len(payload)} bytes); not sent")
+            return
+        try:
+            _bus_outbox.put_nowait((message_type, payload))  # under the lock: queued in sequence order
+        except queue.Full:
+            _bus_stats['dropped'] += 1
+
+
+def _bus_sender_loop():
+    while True:
+        message_type, payload = _bus_outbox.get()
+        try:
+            sent, dropped = _bus.send(payload)
+        except Exception as e:
+            print(f"[CacheBus] send {message_type} failed: {e}")
+            sent, dropped = 0, 1
+        _bus_stats['sent'] += sent
+        _bus_stats['dropped'] += dropped
+
+
+def _bus_receive(payload):
+    try:
+        message = json.loads(payload)
+        origin, seq = message['o'], message['s']
+    except (ValueError, KeyError, TypeError):
+        _bus_stats['errors'] += 1
+        return
+    if origin == _BUS_ORIGIN:
+        return
+    _bus_stats['received'] += 1
+    with _bus_lock:
+        last = _bus_peer_seqs.get(origin)
+        _bus_peer_seqs[origin] = seq if last is None else max(last, seq)
+    if last is not None and seq > last + 1:
+        _bus_stats['gaps'] += 1
+        print(f"[CacheBus] missed {seq - last - 1} message(s) from {origin}; dropping bus-backed caches")
+        _bus_dispatch('resync', None, _bus_version())
+    _bus_dispatch(message.get('t'), message.get('d'), _to_int(message.get('v'), 0))
+
+
+class UnixSocketBus:
+    """One datagram socket per worker in a shared directory; a send goes to every other socket found there."""
+
+    name = 'unix'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{_BUS_ORIGIN[-8:]}.sock")
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sender.setblocking(False)
+
+    def start(self, deliver):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.path)
+
+        def loop():
+            while True:
+                try:
+                    deliver(receiver.recv(65536))
+                except OSError as e:
+                    print(f"[CacheBus] receive error: {e}")
+                    time.sleep(1)
+
+        threading.Thread(target=loop, name='cache-bus', daemon=True).start()
+
+    def peers(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [os.path.join(self.directory, n) for n in names if n.endswith('.sock')
+                and os.path.join(self.directory, n) != self.path]
+
+    def send(self, payload):
+        sent = dropped = 0
+        for path in self.peers():
             try:
-                cursor.execute("""
-                    SELECT ITEMCODE AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid, RETAILPRICE AS retailprice, ALTERNATEUOMCODE AS alternateuomcode
-                    FROM ITEMALTERNATEUOMMAP
-                    WHERE ITEMCODE IS NOT NULL
-                """)
-                alt_rows = cursor.fetchall()
-            except oracledb.Error:
+                self.sender.sendto(payload, path)
+                sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
                 try:
-                    cursor.execute("""
-                        SELECT ITEMCODE AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid, RETAILPRICE AS retailprice
-                        FROM ITEMALTERNATEUOMMAP
-                        WHERE ITEMCODE IS NOT NULL
-                    """)
-                    alt_rows = [(r[0], r[1] if len(r) > 1 else None, r[2] if len(r) > 2 else r[1] if len(r) == 2 else None, r[3] if len(r) > 3 else None, None) for r in cursor.fetchall()]
-                except oracledb.Error:
-                    try:
-                        cursor.execute("""
-                            SELECT ITEMCODE AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid
-                            FROM ITEMALTERNATEUOMMAP
-                            WHERE ITEMCODE IS NOT NULL
-                        """)
-                        alt_rows = [(r[0], r[1] if len(r) > 1 else None, r[2] if len(r) > 2 else r[1] if len(r) == 2 else None, None, None) for r in cursor.fetchall()]
-                    except oracledb.Error:
+                    os.remove(path)  # worker is gone
+                except OSError:
+                    pass
+            except OSError:
+                dropped += 1  # receiver's queue is full; it sees the sequence gap on its next message
+        return sent, dropped
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class OracleTableBus:
+    """Messages are rows in POSCACHEBUS; every worker polls the recent rows and delivers the ones it has not seen."""
+
+    name = 'oracle'
+
+    def __init__(self):
+        self.table_ready = False
+
+    def _ensure_table(self, cur):
+        if self.table_ready:
+            return
+        for ddl in (f"""
+            CREATE TABLE {BUS_TABLE_NAME} (
+                SEQ NUMBER PRIMARY KEY,
+                CREATEDAT DATE DEFAULT SYSDATE NOT NULL,
+                MSG VARCHAR2(4000) NOT NULL
+            )
+        """, f"CREATE INDEX IX_{BUS_TABLE_NAME}_CREATED ON {BUS_TABLE_NAME} (CREATEDAT)",
+                f"CREATE SEQUENCE {BUS_SEQUENCE_NAME} CACHE 100"):
+            try:
+                cur.execute(ddl)
+            except oracledb.Error as e:
+                err_str = str(e).upper()
+                if not any(c in err_str for c in ('00955', '01408')):
+                    print(f"[CacheBus] {BUS_TABLE_NAME} create failed: {e}")
+                    return
+        self.table_ready = True
+
+    def _recent(self, cur):
+        cur.execute(f"""
+            SELECT SEQ, MSG FROM {BUS_TABLE_NAME}
+            WHERE CREATEDAT >= SYSDATE - :window / 86400
+            ORDER BY SEQ
+        """, {"window": BUS_POLL_WINDOW_SECONDS})
+        return cur.fetchall()
+
+    def start(self, deliver):
+        def loop():
+            conn = cur = None
+            seen = None
+            while True:
+                try:
+                    if conn is None:
+                        conn = _get_connection()
+                        if conn is None:
+                            time.sleep(BUS_POLL_SECONDS * 5)
+                            continue
+                        cur = conn.cursor()
+                        self._ensure_table(cur)
+                    rows = self._recent(cur)
+                    if seen is None:
+                        seen = {seq for seq, _ in rows}  # start from now, not from the table's history
+                    for seq, msg in rows:
+                        if seq not in seen:
+                            deliver(msg)
+                    seen = {seq for seq, _ in rows}
+                except oracledb.Error as e:
+                    print(f"[CacheBus] poll error: {e}")
+                    for obj in (cur, conn):
                         try:
-                            cursor.execute("""
-                                SELECT ITEMCODE AS itemcode, MANUFACTURERID AS manufacturerid
-                                FROM ITEMALTERNATEUOMMAP
-                                WHERE ITEMCODE IS NOT NULL
-                            """)
-                            alt_rows = [(r[0], None, r[1], None, None) for r in cursor.fetchall()] if cursor.description and len(cursor.description) >= 2 else []
-                        except oracledb.Error:
-                            alt_rows = []
-        if alt_rows:
-            alt_itemcodes = list({str(r[0]).strip() for r in alt_rows if r and r[0]})
-            itemmaster_by_ic_lc = {}
-            itemmaster_by_ic = {}
-            for ic in alt_itemcodes:
-                if not ic:
-                    continue
+                            if obj is not None:
+                                obj.close()
+                        except Exception:
+                            pass
+                    conn = cur = None
+                time.sleep(BUS_POLL_SECONDS)
+
+        threading.Thread(target=loop, name='cache-bus', daemon=True).start()
+
+    def send(self, payload):
+        conn = _get_connection()
+        if not conn:
+            return 0, 1
+        cur = None
+        try:
+            cur = conn.cursor()
+            self._ensure_table(cur)
+            cur.execute(f"INSERT INTO {BUS_TABLE_NAME} (SEQ, MSG) VALUES ({BUS_SEQUENCE_NAME}.NEXTVAL, :msg)",
+                        {"msg": payload.decode('utf-8')})
+            conn.commit()
+            return 1, 0
+        except oracledb.Error as e:
+            print(f"[CacheBus] insert error: {e}")
+            return 0, 1
+        finally:
+            if cur:
                 try:
-                    cursor.execute("""
-                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid, baseuom
-                        FROM itemmaster
-                        WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:ic)
-                    """, ic=ic)
-                    im_cols = [c[0] for c in cursor.description]
-                    for im_row in cursor.fetchall():
-                        im_rec = dict(zip(im_cols, im_row))
-                        ic_val = str(im_rec.get('ITEMCODE') or im_rec.get('itemcode') or '').strip()
-                        lc_val = im_rec.get('LOCATIONCODE') or im_rec.get('locationcode')
-                        if ic_val:
-                            itemmaster_by_ic[ic_val.upper()] = im_rec
-                            if lc_val is not None:
-                                itemmaster_by_ic_lc[(ic_val.upper(), str(lc_val).strip().upper())] = im_rec
-                except oracledb.Error:
+                    cur.close()
+                except Exception:
                     pass
-            added_from_alt = set()
-            for row in alt_rows:
-                if not row:
-                    continue
-                ic = str(row[0]).strip() if row[0] is not None else ''
-                lc_alt = row[1] if len(row) > 1 else None
-                alt_manufacturerid = row[2] if len(row) > 2 else (row[1] if len(row) == 2 else None)
-                alt_retailprice = row[3] if len(row) > 3 else None
-                alt_alternateuomcode = row[4] if len(row) > 4 else None
-                if alt_alternateuomcode is not None:
-                    alt_alternateuomcode = str(alt_alternateuomcode).strip() or None
-                if not ic:
-                    continue
-                if ic.upper() in added_from_alt:
-                    continue
-                im_rec = None
-                if lc_alt is not None and str(lc_alt).strip():
-                    im_rec = itemmaster_by_ic_lc.get((ic.upper(), str(lc_alt).strip().upper()))
-                if im_rec is None:
-                    im_rec = itemmaster_by_ic.get(ic.upper())
-                if im_rec is None:
-                    continue
-                rec = {
-                    'LOCATIONCODE': im_rec.get('LOCATIONCODE') or im_rec.get('locationcode'),
-                    'ITEMCODE': im_rec.get('ITEMCODE') or im_rec.get('itemcode'),
-                    'ITEMNAME': im_rec.get('ITEMNAME') or im_rec.get('itemname'),
-                    'CATEGORYCODE': im_rec.get('CATEGORYCODE') or im_rec.get('categorycode'),
-                    'RETAILPRICE': alt_retailprice if alt_retailprice is not None else (im_rec.get('RETAILPRICE') or im_rec.get('retailprice')),
-                    'MANUFACTURERID': alt_manufacturerid or im_rec.get('MANUFACTURERID') or im_rec.get('manufacturerid'),
-                    'BASEUOM': alt_alternateuomcode if alt_alternateuomcode else (im_rec.get('BASEUOM') or im_rec.get('baseuom')),
-                }
-                if rec.get('ITEMCODE') or rec.get('itemcode'):
-                    seen_itemcodes.add(ic.upper())
-                    added_from_alt.add(ic.upper())
-                    results.append(rec)
-        # 3) Add products by ITEMCODE from alternate table that are not already in list (itemmaster may not have them)
-        qualified_alt, itemcode_col_alt, alternate_cols_alt = _get_alternate_uom_table_info(cursor)
-        alt_itemcodes = []
-        if qualified_alt and itemcode_col_alt:
             try:
-                cursor.execute(f"""
-                    SELECT DISTINCT {itemcode_col_alt} FROM {qualified_alt}
-                    WHERE {itemcode_col_alt} IS NOT NULL
-                """)
-                alt_itemcodes = [str(row[0]).strip() for row in cursor.fetchall() if row and row[0]]
-            except oracledb.Error:
+                conn.close()
+            except Exception:
                 pass
-        if not alt_itemcodes:
+
+    def peers(self):
+        return []
+
+    def prune(self):
+        conn = _get_connection()
+        if not conn:
+            return
+        cur = None
+        try:
+            cur = conn.cursor()
+            cur.execute(f"DELETE FROM {BUS_TABLE_NAME} WHERE CREATEDAT < SYSDATE - :mins / 1440",
+                        {"mins": BUS_RETAIN_MINUTES})
+            conn.commit()
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
             try:
-                cursor.execute("""
-                    SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
-                    WHERE ITEMCODE IS NOT NULL
-                """)
-                alt_itemcodes = [str(row[0]).strip() for row in cursor.fetchall() if row and row[0]]
-            except oracledb.Error:
-                pass
-        for ic in alt_itemcodes:
-            if not ic or ic.upper() in seen_itemcodes:
-                continue
-            try:
-                cursor.execute("""
-                    SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid, baseuom
-                    FROM itemmaster
-                    WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
-                """, code=ic)
-                row = cursor.fetchone()
-                if row:
-                    results.append(dict(zip(columns, row)))
-                    seen_itemcodes.add(ic.upper())
-            except oracledb.Error:
-                pass
-        # 4) Attach alternate codes per ITEMCODE (use discovered table/columns)
-        alt_map = {}
-        if qualified_alt and itemcode_col_alt and alternate_cols_alt:
-            alt_col = alternate_cols_alt[0]
-            try:
-                cursor.execute(f"""
-                    SELECT {itemcode_col_alt}, {alt_col} FROM {qualified_alt}
-                    WHERE {itemcode_col_alt} IS NOT NULL AND {alt_col} IS NOT NULL
-                """)
-                for row in cursor.fetchall():
-                    ic = str(row[0]).strip() if row[0] else None
-                    alt = str(row[1]).strip() if row[1] else None
-                    if ic and alt:
-                        alt_map.setdefault(ic, []).append(alt)
-            except oracledb.Error:
+                conn.close()
+            except Exception:
                 pass
-        if not alt_map:
-            # Your table: ALTERNATEUOMCODE, MANUFACTURERID (VARCHAR)
-            try:
-                cursor.execute("""
-                    SELECT ITEMCODE, ALTERNATEUOMCODE FROM ITEMALTERNATEUOMMAP
-                    WHERE ITEMCODE IS NOT NULL AND ALTERNATEUOMCODE IS NOT NULL
-                """)
-                for row in cursor.fetchall():
-                    ic = str(row[0]).strip() if row[0] else None
-                    alt = str(row[1]).strip() if row[1] else None
-                    if ic and alt:
-                        alt_map.setdefault(ic, []).append(alt)
-                cursor.execute("""
-                    SELECT ITEMCODE, MANUFACTURERID FROM ITEMALTERNATEUOMMAP
-                    WHERE ITEMCODE IS NOT NULL AND MANUFACTURERID IS NOT NULL
-                """)
-                for row in cursor.fetchall():
-                    ic = str(row[0]).strip() if row[0] else None
-                    alt = str(row[1]).strip() if row[1] else None
-                    if ic and alt:
-                        lst = alt_map.setdefault(ic, [])
-                        if alt not in lst:
-                            lst.append(alt)
-            except oracledb.Error:
-                try:
-                    cursor.execute("""
-                        SELECT ITEMCODE, ALTERNATECODE FROM ITEMALTERNATEUOMMAP
-                        WHERE ITEMCODE IS NOT NULL AND ALTERNATECODE IS NOT NULL
-                    """)
-                    for row in cursor.fetchall():
-                        ic, alt = (str(row[0]).strip() if row[0] else None), (str(row[1]).strip() if row[1] else None)
-                        if ic and alt:
-                            alt_map.setdefault(ic, []).append(alt)
-                except oracledb.Error:
-                    pass
-        for rec in results:
-            itemcode = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
-            rec['ALTERNATECODES'] = alt_map.get(itemcode, [])
-        return jsonify(results)
+
+
+def _start_cache_bus():
+    """Join the bus; called when the worker imports the app, so revocations sent before its first request arrive."""
+    global _bus, _bus_started
+    if _bus_started:
+        return
+    with _bus_lock:
+        if _bus_started:
+            return
+        _bus_started = True
+        try:
+            if BUS_TRANSPORT == 'unix':
+                bus = UnixSocketBus(BUS_SOCKET_DIR)
+                atexit.register(bus.close)
+            elif BUS_TRANSPORT == 'oracle':
+                bus = OracleTableBus()
+                _schedule_job('cache-bus-prune', bus.prune, every=600, initial_delay=120)
+            else:
+                return
+            bus.start(_bus_receive)
+            _bus = bus
+            threading.Thread(target=_bus_sender_loop, name='cache-bus-send', daemon=True).start()
+        except OSError as e:
+            print(f"[CacheBus] {BUS_TRANSPORT} transport unavailable ({e}); caches fall back to their TTLs")
+
+
+@app.route('/api/admin/cache-bus', methods=['GET'])
+def cache_bus_status():
+    """Bus transport, peers and message counters for this worker. Manager/IT only."""
+    _, err = _require_manager()
+    if err:
+        return err
+    with _bus_lock:
+        peers = len(_bus_peer_seqs)
+    return jsonify({"ok": True, "transport": _bus.name if _bus is not None else 'local', "origin": _BUS_ORIGIN,
+                    "peersSeen": peers, "peerSockets": len(_bus.peers()) if _bus is not None else 0,
+                    "types": sorted(_bus_handlers), **_bus_stats})
+
+
+@_on_bus('flights.invalidate')
+def _on_flights_invalidate(data, version):
+    _invalidate_single_flight(data.get('path') if data else None)
+
+
+@_on_bus('token.revoked')
+def _on_token_revoked(data, version):
+    _remember_revoked(data['digest'], _to_float(data.get('exp'), 0.0))
+
+
+@_on_bus('resync')
+def _on_bus_resync(data, version):
+    _invalidate_single_flight()
+
+
+# --- Customer directory cache ---
+# Built once from CUSTOMER (customers with sales history), then refreshed incrementally from BILLHDR rows
+# newer than the last seen BILLNO. Terminals search/page it instead of pulling the whole table.
+CUSTOMER_DIRECTORY_REFRESH_SECONDS = 60
+CUSTOMER_SEARCH_DEFAULT_LIMIT = 20
+CUSTOMER_SEARCH_MAX_LIMIT = 200
+_CUSTOMER_SELECT = """
+    SELECT
+        c.locationcode,
+        c.customercode,
+        c.customercode || ' ' || c.customername AS cust_full_name,
+        g.categoryname,
+        c.flag,
+        c.invoicecode,
+        c.currentcreditamount,
+        c.creditlimit
+    FROM customer c
+    INNER JOIN tblcustomercategory g
+        ON c.customercategory = g.categorycode
+"""
+# by_code: (LOCATIONCODE, CUSTOMERCODE) -> row dict, one per pair as the original join returned; rows: sorted by code; keys: (code_lower, name_lower) parallel to rows
+_customer_directory = {'by_code': {}, 'rows': [], 'keys': [], 'last_billno': 0, 'loaded_at': 0.0, 'ready': False}
+_customer_directory_lock = threading.Lock()
+
+
+def _get_customers_mock_data():
+    """Fallback mock data when Oracle unavailable."""
+    return [
+        {
+            "LOCATIONCODE": "001",
+            "CUSTOMERCODE": "C001",
+            "CUST_FULL_NAME": "C001 JOHN DOE",
+            "CATEGORYNAME": "RETAIL",
+            "FLAG": "A",
+            "INVOICECODE": None,
+            "CURRENTCREDITAMOUNT": 0,
+            "CREDITLIMIT": 1000
+        },
+        {
+            "LOCATIONCODE": "001",
+            "CUSTOMERCODE": "C002",
+            "CUST_FULL_NAME": "C002 JANE SMITH",
+            "CATEGORYNAME": "WHOLESALE",
+            "FLAG": "A",
+            "INVOICECODE": None,
+            "CURRENTCREDITAMOUNT": 0,
+            "CREDITLIMIT": 5000
+        }
+    ]
+
+
+def _customer_directory_state(by_code, last_billno):
+    """Build an immutable directory snapshot (sorted rows + lowercase search keys) from by_code."""
+    rows = [by_code[k] for k in sorted(by_code, key=lambda k: (k[1], k[0]))]
+    keys = [
+        (str(r.get('CUSTOMERCODE') or '').strip().lower(), str(r.get('CUST_FULL_NAME') or '').strip().lower())
+        for r in rows
+    ]
+    return {'by_code': by_code, 'rows': rows, 'keys': keys, 'last_billno': last_billno,
+            'loaded_at': time.time(), 'ready': True}
+
+
+def _fetch_customer_rows(cur, where_sql, params=None):
+    cur.execute(_CUSTOMER_SELECT + where_sql, params or {})
+    columns = [col[0] for col in cur.description]
+    by_code = {}
+    for row in cur.fetchall():
+        rec = dict(zip(columns, row))
+        code = str(rec.get('CUSTOMERCODE') or '').strip()
+        if code:
+            by_code[(str(rec.get('LOCATIONCODE') or '').strip(), code)] = rec
+    return by_code
+
+
+def _last_billhdr_billno(cur):
+    try:
+        cur.execute(f"SELECT NVL(MAX(BILLNO), 0) FROM {BILLHDR_TABLE_NAME}")
+        row = cur.fetchone()
+        return _to_int(row[0], 0) if row else 0
+    except oracledb.Error:
+        return 0
+
+
+def _load_customer_directory():
+    """Full build: customers that appear in BILLHDRHISTORY (semi-join, no DISTINCT over history)."""
+    conn = _get_connection(read_only=True)
+    if not conn:
+        return None
+    cur = None
+    try:
+        cur = conn.cursor()
+        last_billno = _last_billhdr_billno(cur)
+        by_code = _fetch_customer_rows(cur, """
+            WHERE EXISTS (SELECT 1 FROM billhdrhistory b WHERE b.customercode = c.customercode)
+        """)
+        return _customer_directory_state(by_code, last_billno)
     except oracledb.Error as e:
-        print(f"Oracle get_products error: {e}")
-        return jsonify(_get_products_mock_data()), 200
+        print(f"[Customers] directory load error: {e}")
+        return None
     finally:
-        if cursor:
+        if cur:
             try:
-                cursor.close()
+                cur.close()
             except Exception:
                 pass
         try:
@@ -854,110 +1594,39 @@ def get_products():
             pass
 
 
-@app.route('/api/products/search', methods=['GET'])
-def search_products():
-    """Search products: check both ITEMMASTER and ITEMALTERNATEUOMMAP; return if either table has a match."""
-    q = (request.args.get('q') or request.args.get('code') or request.args.get('search') or '').strip()
-    if not q:
-        return jsonify([])
-    conn = _get_connection()
+def _refresh_customer_directory(state):
+    """Incremental refresh: (re)load customers billed in BILLHDR since state['last_billno']."""
+    conn = _get_connection(read_only=True)
     if not conn:
-        return jsonify([])
-    cursor = None
+        return state
+    cur = None
     try:
-        cursor = conn.cursor()
-        seen = set()
-        results = []
-        search_pct = '%' + q.replace('%', '\\%').replace('_', '\\_') + '%'
-        # 1) ITEMMASTER: match itemcode, itemname, or manufacturerid
-        try:
-            cursor.execute("""
-                SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid
-                FROM itemmaster
-                WHERE UPPER(TRIM(TO_CHAR(itemcode))) LIKE UPPER(:q)
-                   OR UPPER(TRIM(itemname)) LIKE UPPER(:q)
-                   OR UPPER(TRIM(TO_CHAR(manufacturerid))) LIKE UPPER(:q)
-            """, q=search_pct)
-            cols = [c[0] for c in cursor.description]
-            for row in cursor.fetchall():
-                rec = dict(zip(cols, row))
-                ic = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
-                if ic and ic.upper() not in seen:
-                    seen.add(ic.upper())
-                    rec['ALTERNATECODES'] = []
-                    results.append(rec)
-        except oracledb.Error:
-            try:
-                cursor.execute("""
-                    SELECT locationcode, itemcode, itemname, categorycode, retailprice
-                    FROM itemmaster
-                    WHERE UPPER(TRIM(TO_CHAR(itemcode))) LIKE UPPER(:q)
-                       OR UPPER(TRIM(itemname)) LIKE UPPER(:q)
-                """, q=search_pct)
-                cols = [c[0] for c in cursor.description]
-                for row in cursor.fetchall():
-                    rec = dict(zip(cols, row))
-                    rec['manufacturerid'] = rec.get('ITEMCODE') or rec.get('itemcode')
-                    ic = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
-                    if ic and ic.upper() not in seen:
-                        seen.add(ic.upper())
-                        rec['ALTERNATECODES'] = []
-                        results.append(rec)
-            except oracledb.Error:
-                pass
-        # 2) ITEMALTERNATEUOMMAP: match ALTERNATEUOMCODE / MANUFACTURERID (your columns), then get from ITEMMASTER
-        def add_from_alt_itemcodes(alt_itemcodes):
-            for row in (alt_itemcodes or []):
-                if not row or not row[0]:
-                    continue
-                ic = str(row[0]).strip()
-                if ic.upper() in seen:
-                    continue
-                seen.add(ic.upper())
-                try:
-                    cursor.execute("""
-                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid
-                        FROM itemmaster
-                        WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
-                    """, code=ic)
-                    r = cursor.fetchone()
-                    if r:
-                        cols = [c[0] for c in cursor.description]
-                        rec = dict(zip(cols, r))
-                        rec['ALTERNATECODES'] = []
-                        results.append(rec)
-                except oracledb.Error:
-                    pass
+        cur = conn.cursor()
+        last_billno = _last_billhdr_billno(cur)
+        if last_billno <= state['last_billno']:
+            return dict(state, loaded_at=time.time())
         try:
-            cursor.execute("""
-                SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
-                WHERE UPPER(TRIM(ALTERNATEUOMCODE)) LIKE UPPER(:q) OR UPPER(TRIM(MANUFACTURERID)) LIKE UPPER(:q)
-            """, q=search_pct)
-            add_from_alt_itemcodes(cursor.fetchall())
-        except oracledb.Error:
-            try:
-                cursor.execute("""
-                    SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
-                    WHERE UPPER(TRIM(TO_CHAR(ALTERNATECODE))) LIKE UPPER(:q)
-                """, q=search_pct)
-                add_from_alt_itemcodes(cursor.fetchall())
-            except oracledb.Error:
-                try:
-                    cursor.execute("""
-                        SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
-                        WHERE UPPER(TRIM(TO_CHAR(ALTERNATEITEMCODE))) LIKE UPPER(:q)
-                    """, q=search_pct)
-                    add_from_alt_itemcodes(cursor.fetchall())
-                except oracledb.Error:
-                    pass
-        return jsonify(results)
+            changed = _fetch_customer_rows(cur, f"""
+                WHERE c.customercode IN (
+                    SELECT customercode FROM {BILLHDR_TABLE_NAME}
+                    WHERE BILLNO > :last AND customercode IS NOT NULL
+                )
+            """, {"last": state['last_billno']})
+        except oracledb.Error as e:
+            # BILLHDR without CUSTOMERCODE: nothing to merge, just advance the watermark
+            if 'ORA-00904' not in str(e).upper() and '00904' not in str(e).upper():
+                raise
+            changed = {}
+        by_code = dict(state['by_code'])
+        by_code.update(changed)
+        return _customer_directory_state(by_code, last_billno)
     except oracledb.Error as e:
-        print(f"Product search error: {e}")
-        return jsonify([])
+        print(f"[Customers] directory refresh error: {e}")
+        return state
     finally:
-        if cursor:
+        if cur:
             try:
-                cursor.close()
+                cur.close()
             except Exception:
                 pass
         try:
@@ -966,360 +1635,2528 @@ def search_products():
             pass
 
 
-def _get_products_mock_data():
-    """Fallback mock data when Oracle unavailable."""
-    return [
-        {"LOCATIONCODE": "020", "ITEMCODE": "1001", "ITEMNAME": "COCA COLA 500ML", "CATEGORYCODE": "BEVERAGES", "RETAILPRICE": "100", "MANUFACTUREID": "8901234567890", "ALTERNATECODES": []},
-        {"LOCATIONCODE": "020", "ITEMCODE": "1002", "ITEMNAME": "PEPSI 500ML", "CATEGORYCODE": "BEVERAGES", "RETAILPRICE": "100", "MANUFACTUREID": "8901234567891", "ALTERNATECODES": []},
-        {"LOCATIONCODE": "020", "ITEMCODE": "2001", "ITEMNAME": "ALMARAI MILK 1L", "CATEGORYCODE": "DAIRY", "RETAILPRICE": "100", "MANUFACTUREID": "8901234567892", "ALTERNATECODES": []},
-    ]
+def _get_customer_directory(force=False):
+    """Return the current directory snapshot, building or refreshing it as needed; None if Oracle is unavailable."""
+    global _customer_directory
+    state = _customer_directory
+    if state['ready'] and not force and time.time() - state['loaded_at'] < _stale_after(CUSTOMER_DIRECTORY_REFRESH_SECONDS):
+        return state
+    with _customer_directory_lock:
+        state = _customer_directory
+        if state['ready'] and not force and time.time() - state['loaded_at'] < _stale_after(CUSTOMER_DIRECTORY_REFRESH_SECONDS):
+            return state
+        new_state = _refresh_customer_directory(state) if state['ready'] and not force else _load_customer_directory()
+        if new_state is None:
+            return state if state['ready'] else None
+        _customer_directory = new_state
+        return new_state
 
 
-# --- Hold / cart bills (Oracle) or in-memory fallback ---
-# Change this constant when you rename the DB table (one place for all hold/cart SQL).
-HOLD_TABLE_NAME = 'TEMPBILLHDR'
-HOLD_DTL_TABLE_NAME = 'TEMPBILLDTL'
-BILLNO_TABLE_NAME = 'BILLNOTABLE'
-BILLDTL_TABLE_NAME = 'BILLDTL'
-BILLHDR_TABLE_NAME = 'BILLHDR'
-# BILLNOTABLE columns: BILLNO NUMBER, FLAG CHAR(1) DEFAULT 'n' (n/y), BILLDATE (required), COUNTERCODE (optional).
-# BILLDTL (paid bill detail): LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE. Insert on Pay.
-# BILLHDR (bill header on Pay): LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE (C/R from INVOICECODE 1=C 2=R), COUNTERCODE, RESETNO=1, SESSIONCODE=0.
-# HOLD table (TEMPBILLHDR): BILLNO, LOCATIONCODE, FLAG. At HOLD time FLAG=0 (held); draft FLAG=1.
-# HOLD detail (TEMPBILLDTL): BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, FLAG. At hold FLAG=0.
-FLAG_HELD = 0   # TEMPBILLHDR/TEMPBILLDTL: when bill is held
-FLAG_DRAFT = 1  # TEMPBILLHDR: when bill is draft/current cart
-_held_bills_fallback = {}  # key: (location_code, bill_no) -> { "counterCode", "heldDate", "customerCode", "items": [...] }
+def _refresh_customer_directory_job():
+    """Scheduled refresh (every worker keeps its own directory), so requests find it current."""
+    global _customer_directory
+    with _customer_directory_lock:
+        state = _customer_directory
+        new_state = _refresh_customer_directory(state) if state['ready'] else _load_customer_directory()
+        if new_state is None:
+            raise RuntimeError('Database unavailable')
+        _customer_directory = new_state
 
 
-def _get_connection():
-    try:
-        return oracledb.connect(
-            user=ORACLE_CONFIG['user'],
-            password=ORACLE_CONFIG['password'],
-            dsn=ORACLE_CONFIG['dsn']
-        )
-    except oracledb.Error as e:
-        print(f"[Hold] Oracle connection failed: {e}")
+_schedule_job('customer-directory', _refresh_customer_directory_job, every=CUSTOMER_DIRECTORY_REFRESH_SECONDS,
+              singleton=False, initial_delay=0)
+
+
+def _paging_args(default_limit, max_limit):
+    limit = _to_int(request.args.get('limit'), default_limit)
+    offset = _to_int(request.args.get('offset'), 0)
+    return max(1, min(limit, max_limit)), max(0, offset)
+
+
+@app.route('/api/customers', methods=['GET'])
+def get_customers():
+    """Customer directory. Without limit/offset returns the full list (pre-serialized blob); with them returns one page."""
+    state = _get_customer_directory(force=request.args.get('refresh') in ('1', 'true'))
+    if request.args.get('limit') is None and request.args.get('offset') is None:
+        return _catalog_blob_response('customers')
+    rows = state['rows'] if state else _get_customers_mock_data()
+    limit, offset = _paging_args(CUSTOMER_SEARCH_MAX_LIMIT, CUSTOMER_SEARCH_MAX_LIMIT)
+    return jsonify({
+        "ok": True,
+        "total": len(rows),
+        "offset": offset,
+        "limit": limit,
+        "customers": rows[offset:offset + limit],
+    })
+
+
+@app.route('/api/customers/search', methods=['GET'])
+def search_customers():
+    """Search the customer directory by code/name: code-prefix matches first, then substring matches."""
+    q = (request.args.get('q') or request.args.get('search') or '').strip().lower()
+    limit, _ = _paging_args(CUSTOMER_SEARCH_DEFAULT_LIMIT, CUSTOMER_SEARCH_MAX_LIMIT)
+    if not q:
+        return jsonify([])
+    state = _get_customer_directory()
+    if state:
+        rows, keys = state['rows'], state['keys']
+    else:
+        rows = _get_customers_mock_data()
+        keys = [(str(r['CUSTOMERCODE']).lower(), str(r['CUST_FULL_NAME']).lower()) for r in rows]
+    prefix, substring = [], []
+    for rec, (code, name) in zip(rows, keys):
+        if code.startswith(q):
+            prefix.append(rec)
+            if len(prefix) >= limit:
+                break
+        elif len(substring) < limit and (q in code or q in name):
+            substring.append(rec)
+    return jsonify((prefix + substring)[:limit])
+
+
+# Format for Oracle TO_CHAR on numbers to avoid scientific notation (e.g. long barcodes)
+_ORACLE_NUM_FMT = "FM99999999999999999999999999999999999999"
+
+
+def _get_alternate_uom_table_info(cur):
+    """
+    Discover ITEMALTERNATEUOMMAP table and columns from Oracle (USER or ALL_TAB_COLUMNS).
+    Returns (qualified_table, itemcode_col, alternate_cols) or (None, None, []).
+    alternate_cols = list of column names to match barcode/code against.
+    """
+    try:
+        owner = None
+        cur.execute("""
+            SELECT OWNER FROM ALL_TABLES
+            WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP' AND ROWNUM = 1
+        """)
+        row = cur.fetchone()
+        if row and row[0]:
+            owner = str(row[0]).strip()
+        if not owner:
+            cur.execute("""
+                SELECT 1 FROM USER_TABLES
+                WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP' AND ROWNUM = 1
+            """)
+            if not cur.fetchone():
+                return None, None, []
+        qualified = f'"{owner}".ITEMALTERNATEUOMMAP' if owner else 'ITEMALTERNATEUOMMAP'
+        if owner:
+            cur.execute("""
+                SELECT COLUMN_NAME FROM ALL_TAB_COLUMNS
+                WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP' AND OWNER = :owner
+                ORDER BY COLUMN_ID
+            """, owner=owner)
+        else:
+            cur.execute("""
+                SELECT COLUMN_NAME FROM USER_TAB_COLUMNS
+                WHERE UPPER(TABLE_NAME) = 'ITEMALTERNATEUOMMAP'
+                ORDER BY COLUMN_ID
+            """)
+        columns = [str(r[0]).strip().upper() for r in cur.fetchall() if r and r[0]]
+        if not columns:
+            return None, None, []
+        itemcode_col = next((c for c in columns if c in ('ITEMCODE', 'ITEM_CODE')), columns[0])
+        # Your table: ALTERNATEUOMCODE (VARCHAR), MANUFACTURERID (VARCHAR) for barcode/code lookup
+        alt_names = ('ALTERNATEUOMCODE', 'MANUFACTURERID', 'ALTERNATECODE', 'ALTERNATEITEMCODE', 'BARCODE', 'ALTERNATEUOM', 'UOM')
+        alternate_cols = [c for c in columns if c in alt_names or (c != itemcode_col and ('ALT' in c or 'CODE' in c or 'BAR' in c or 'MANUFACTURER' in c))]
+        if not alternate_cols:
+            alternate_cols = [c for c in columns if c != itemcode_col][:5]
+        return qualified, itemcode_col, alternate_cols
+    except oracledb.Error:
+        return None, None, []
+
+
+# --- Barcode normalization ---
+# Scanned codes are turned into the keys the catalog / code map actually hold, without extra queries:
+# - EAN/UPC (GTIN-8/12/13/14) with a valid check digit also tries its leading-zero-stripped form (how NUMBER
+#   columns store it) and its 8/12/13/14-digit zero-padded forms, so UPC-A vs EAN-13 and dropped zeros all match.
+# - Variable-measure labels (GS1 prefix 2x: scale/price labels) are split into item key + embedded weight or
+#   price using per-store prefix rules; the product is found by the item key and the measure becomes QUANTITY.
+BARCODE_GTIN_LENGTHS = (8, 12, 13, 14)
+BARCODE_MIN_GTIN_DIGITS = 7
+
+
+def _measure_rule(prefix, kind, decimals):
+    """EAN-13 'PP IIIII VVVVV C' layout: 2-digit prefix, 5-digit item, 5-digit value, check digit."""
+    return {'prefix': prefix, 'kind': kind, 'length': 13, 'item': (2, 5), 'value': (7, 5), 'decimals': decimals,
+            'key': 'item'}
+
+
+# location code -> variable-measure rules; '*' applies to stores without their own list. kind: weight (kg),
+# price (label amount) or count; key: 'item' (item digits) or 'zeroed' (label with value zeroed, check recomputed).
+# POS_BARCODE_RULES (JSON, same shape) replaces entries per location.
+BARCODE_PREFIX_RULES = {
+    '*': [
+        _measure_rule('20', 'price', 2),
+        _measure_rule('21', 'weight', 3),
+        _measure_rule('22', 'weight', 3),
+        _measure_rule('23', 'price', 2),
+        _measure_rule('24', 'price', 2),
+    ],
+}
+try:
+    BARCODE_PREFIX_RULES.update(json.loads(os.environ.get('POS_BARCODE_RULES') or '{}'))
+except ValueError as e:
+    print(f"[Barcode] POS_BARCODE_RULES ignored: {e}")
+
+
+def _gtin_check_digit(body):
+    """GS1 mod-10 check digit for the digits before it."""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(body)))
+    return str((10 - total % 10) % 10)
+
+
+def _gtin_valid(code):
+    return code.isdigit() and len(code) in BARCODE_GTIN_LENGTHS and _gtin_check_digit(code[:-1]) == code[-1]
+
+
+def _barcode_variants(code):
+    """code plus its equivalent GTIN spellings (zero-stripped, 8/12/13/14-digit) when it is a valid GTIN."""
+    variants = [code]
+    if code.isdigit() and BARCODE_MIN_GTIN_DIGITS <= len(code) <= 14 and _gtin_valid(code.zfill(14)):
+        core = code.lstrip('0')
+        for form in [core] + [core.zfill(n) for n in BARCODE_GTIN_LENGTHS if len(core) <= n]:
+            if form not in variants:
+                variants.append(form)
+    return variants
+
+
+def _barcode_rules(location_code):
+    location_code = (location_code or '').strip()
+    return BARCODE_PREFIX_RULES.get(location_code) or BARCODE_PREFIX_RULES.get('*') or []
+
+
+def _parse_variable_measure(code, location_code=None):
+    """Split a variable-measure label into {'kind', 'value', 'keys'} with the first matching store rule; None otherwise."""
+    if not code.isdigit():
         return None
+    for rule in _barcode_rules(location_code):
+        if len(code) != rule.get('length', 13) or not code.startswith(rule['prefix']):
+            continue
+        if not _gtin_valid(code):
+            return None
+        item_at, item_len = rule['item']
+        value_at, value_len = rule['value']
+        value = int(code[value_at:value_at + value_len]) / (10 ** rule.get('decimals', 0))
+        item = code[item_at:item_at + item_len]
+        if rule.get('key') == 'zeroed':
+            body = code[:value_at] + '0' * value_len + code[value_at + value_len:-1]
+            keys = [body + _gtin_check_digit(body)]
+        else:
+            keys = [item, item.lstrip('0') or item, code[:item_at + item_len]]
+        return {'kind': rule['kind'], 'value': value, 'barcode': code, 'keys': list(dict.fromkeys(keys))}
+    return None
 
 
-def _ensure_tempbillhdr(cur):
-    """Create hold table if it does not exist. Ignore ORA-00955 (exists) and ORA-01031 (no create priv)."""
-    create_sql = f"""
-        CREATE TABLE {HOLD_TABLE_NAME} (
-            BILLNO NUMBER NOT NULL,
-            LOCATIONCODE NUMBER NOT NULL,
-            FLAG NUMBER DEFAULT 1
-        )
+def _barcode_lookup_keys(code, location_code=None):
+    """
+    (variable measure or None, ordered lookup keys) for a scanned code. The code and its GTIN variants come first,
+    so an item stocked under the full label still wins; a variable-measure label's item keys follow, and only those
+    are kept in measure['keys'].
+    """
+    keys = _barcode_variants(code)
+    measure = _parse_variable_measure(code, location_code)
+    if measure:
+        item_keys = []
+        for key in measure['keys']:
+            item_keys.extend(k for k in _barcode_variants(key) if k not in keys and k not in item_keys)
+        measure['keys'] = item_keys
+        keys = keys + item_keys
+    return measure, keys
+
+
+def _hit_measure(measure, key):
+    """The label's measure when the hit came from one of its item keys; None for a hit on the code itself."""
+    return measure if measure and key in measure['keys'] else None
+
+
+def _direct_lookup_keys(keys, measure=None):
+    """
+    Keys worth the per-code Oracle queries: for the scanned code and then the label's item keys, the first key and,
+    for a GTIN, its zero-stripped NUMBER form.
+    """
+    item_keys = measure['keys'] if measure else []
+    direct = []
+    for group in ([k for k in keys if k not in item_keys], item_keys):
+        if group:
+            core = group[0].lstrip('0')
+            direct += [group[0]] + ([core] if core != group[0] and core in group else [])
+    return direct
+
+
+def _first_hit(keys, lookup):
+    """(key, hit) for the first key lookup(key) resolves; (None, None) when none does."""
+    for key in keys:
+        hit = lookup(key)
+        if hit:
+            return key, hit
+    return None, None
+
+
+def _catalog_lookup(catalog, keys, location_code=None):
+    return _first_hit(keys, lambda key: catalog.lookup(key, location_code))
+
+
+def _apply_variable_measure(result, measure):
+    """Turn the label's embedded weight/price into QUANTITY (and AMOUNT for price labels) on a lookup result."""
+    price = _to_float(result.get('RETAILPRICE'), 0.0)
+    value = measure['value']
+    if measure['kind'] == 'price':
+        result['AMOUNT'] = value
+        if price > 0:
+            quantity = round(value / price, 3)
+        else:
+            quantity = 1
+            result['RETAILPRICE'] = value
+            if 'retailprice' in result:
+                result['retailprice'] = value
+    else:
+        quantity = value
+    result['QUANTITY'] = quantity
+    result['VARIABLEMEASURE'] = {'kind': measure['kind'], 'value': value, 'barcode': measure['barcode']}
+
+
+# --- Normalized code map (POSITEMCODEMAP) ---
+# One row per UPPER(TRIM(code)) and store across ITEMMASTER itemcode / manufacturerid and ITEMALTERNATEUOMMAP
+# manufacturerid / alternateuomcode / itemcode, with a unique index on (NORMCODE, STORECODE) and the ROWID of the
+# ITEMMASTER row it resolves to. STORECODE is that row's UPPER(TRIM(LOCATIONCODE)); LOCATIONCODE keeps the source
+# row's own location. A DB-path lookup is then one unique-index probe plus a ROWID fetch instead of the
+# UPPER(TRIM(TO_CHAR())) ladder; the fetched row must still carry the mapped item and store, so a ROWID gone stale
+# since the last sync (row re-inserted, table moved) is a miss that falls back to the direct queries.
+# Winner per code and store follows lookup_product: ITEMMASTER before ITEMALTERNATEUOMMAP (manufacturerid, UOM code,
+# itemcode).
+CODE_MAP_TABLE_NAME = 'POSITEMCODEMAP'
+CODE_MAP_OLD_INDEX_NAME = 'POSITEMCODEMAP_CODE_UX'  # NORMCODE alone, before the map was per store
+CODE_MAP_INDEX_NAME = 'POSITEMCODEMAP_STORE_UX'
+CODE_MAP_CODE_MAX = 100
+ORACLE_IN_LIST_MAX = 1000
+_code_map_table_ready = False
+
+_CODE_MAP_SOURCE_SQL = f"""
+    WITH alt AS (
+        SELECT a.ITEMCODE, a.LOCATIONCODE, a.MANUFACTURERID, a.ALTERNATEUOMCODE, a.RETAILPRICE, im.ROWID AS itemrowid,
+               NVL(UPPER(TRIM(TO_CHAR(im.locationcode))), ' ') AS storecode,
+               ROW_NUMBER() OVER (PARTITION BY a.ROWID, NVL(UPPER(TRIM(TO_CHAR(im.locationcode))), ' ')
+                                  ORDER BY im.ROWID) AS arn
+        FROM ITEMALTERNATEUOMMAP a
+        JOIN itemmaster im
+          ON UPPER(TRIM(TO_CHAR(im.itemcode))) = UPPER(TRIM(TO_CHAR(a.ITEMCODE)))
+         AND (TRIM(TO_CHAR(a.LOCATIONCODE)) IS NULL
+              OR UPPER(TRIM(TO_CHAR(im.locationcode))) = UPPER(TRIM(TO_CHAR(a.LOCATIONCODE))))
+    ),
+    codes AS (
+        SELECT UPPER(TRIM(TO_CHAR(itemcode))) AS normcode, ROWID AS itemrowid, TRIM(TO_CHAR(itemcode)) AS itemcode,
+               TRIM(TO_CHAR(locationcode)) AS locationcode, 'M' AS source, CAST(NULL AS NUMBER) AS retailprice,
+               CAST(NULL AS VARCHAR2(50)) AS uomcode, NVL(UPPER(TRIM(TO_CHAR(locationcode))), ' ') AS storecode,
+               1 AS prio
+        FROM itemmaster
+        UNION ALL
+        SELECT UPPER(TRIM(TO_CHAR(manufacturerid))), ROWID, TRIM(TO_CHAR(itemcode)), TRIM(TO_CHAR(locationcode)), 'M', NULL, NULL,
+               NVL(UPPER(TRIM(TO_CHAR(locationcode))), ' '), 1
+        FROM itemmaster
+        UNION ALL
+        SELECT UPPER(TRIM(MANUFACTURERID)), itemrowid, TRIM(TO_CHAR(ITEMCODE)), TRIM(TO_CHAR(LOCATIONCODE)), 'A',
+               RETAILPRICE, TRIM(ALTERNATEUOMCODE), storecode, 2
+        FROM alt WHERE arn = 1
+        UNION ALL
+        SELECT UPPER(TRIM(ALTERNATEUOMCODE)), itemrowid, TRIM(TO_CHAR(ITEMCODE)), TRIM(TO_CHAR(LOCATIONCODE)), 'A',
+               RETAILPRICE, TRIM(ALTERNATEUOMCODE), storecode, 3
+        FROM alt WHERE arn = 1
+        UNION ALL
+        SELECT UPPER(TRIM(TO_CHAR(ITEMCODE))), itemrowid, TRIM(TO_CHAR(ITEMCODE)), TRIM(TO_CHAR(LOCATIONCODE)), 'A',
+               RETAILPRICE, TRIM(ALTERNATEUOMCODE), storecode, 4
+        FROM alt WHERE arn = 1
+    )
+    SELECT normcode, storecode, itemrowid, itemcode, locationcode, source, retailprice, uomcode FROM (
+        SELECT codes.*, ROW_NUMBER() OVER (PARTITION BY normcode, storecode ORDER BY prio, itemrowid) AS rn
+        FROM codes
+        WHERE normcode IS NOT NULL AND LENGTH(normcode) <= {CODE_MAP_CODE_MAX}
+    ) WHERE rn = 1
+"""
+
+
+def _ensure_code_map_table(cur):
+    """
+    Create POSITEMCODEMAP and its unique (NORMCODE, STORECODE) index if not exists; a map from before STORECODE gets
+    the column and loses its NORMCODE-only index. Runs once per process.
     """
+    global _code_map_table_ready
+    if _code_map_table_ready:
+        return
     try:
-        cur.execute(create_sql)
+        cur.execute(f"""
+            CREATE TABLE {CODE_MAP_TABLE_NAME} (
+                NORMCODE VARCHAR2({CODE_MAP_CODE_MAX}) NOT NULL,
+                STORECODE VARCHAR2(50),
+                ITEMROWID ROWID NOT NULL,
+                ITEMCODE VARCHAR2(100),
+                LOCATIONCODE VARCHAR2(50),
+                SOURCE VARCHAR2(1) NOT NULL,
+                RETAILPRICE NUMBER,
+                UOMCODE VARCHAR2(50)
+            )
+        """)
     except oracledb.Error as e:
         err_str = str(e).upper()
-        if 'ORA-00955' in err_str or '00955' in err_str:
-            pass
-        elif 'ORA-01031' in err_str or '01031' in err_str:
-            pass
-        else:
-            print(f"[Hold] {HOLD_TABLE_NAME} create failed: {e}")
-            raise
+        if 'ORA-00955' not in err_str and '00955' not in err_str:
+            print(f"[CodeMap] create failed: {e}")
+            return
+        try:
+            cur.execute(f"ALTER TABLE {CODE_MAP_TABLE_NAME} ADD (STORECODE VARCHAR2(50))")
+            # Rows from before the store split are rebuilt by the next refresh.
+            cur.execute(f"DELETE FROM {CODE_MAP_TABLE_NAME} WHERE STORECODE IS NULL")
+            cur.connection.commit()
+        except oracledb.Error as e:
+            if '01430' not in str(e).upper():  # ORA-01430 column already exists
+                print(f"[CodeMap] add STORECODE failed: {e}")
+                return
+        try:
+            cur.execute(f"DROP INDEX {CODE_MAP_OLD_INDEX_NAME}")
+        except oracledb.Error as e:
+            if '01418' not in str(e).upper():  # ORA-01418 index does not exist
+                print(f"[CodeMap] drop {CODE_MAP_OLD_INDEX_NAME} failed: {e}")
+                return
+    try:
+        cur.execute(f"CREATE UNIQUE INDEX {CODE_MAP_INDEX_NAME} ON {CODE_MAP_TABLE_NAME} (NORMCODE, STORECODE)")
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if not any(c in err_str for c in ('00955', '01408', '01031')):
+            print(f"[CodeMap] index create failed: {e}")
+    _code_map_table_ready = True
 
 
-def _ensure_tempbilldtl(cur):
-    """Create TEMPBILLDTL if it does not exist. BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, FLAG (default 1; when hold set 0)."""
-    create_sql = f"""
-        CREATE TABLE {HOLD_DTL_TABLE_NAME} (
-            BILLNO NUMBER NOT NULL,
-            SLNO NUMBER NOT NULL,
-            ITEMCODE VARCHAR2(50),
-            QUANTITY NUMBER DEFAULT 1,
-            RATE NUMBER DEFAULT 0,
-            MANUFACTURERID VARCHAR2(50),
-            FLAG NUMBER DEFAULT 1
-        )
+def _sync_code_map():
     """
+    Bring POSITEMCODEMAP in line with ITEMMASTER / ITEMALTERNATEUOMMAP: MERGE writes only new or changed codes,
+    then codes no longer present are deleted. Returns True on success.
+    """
+    conn = _get_connection()
+    if not conn:
+        return False
+    cur = None
     try:
-        cur.execute(create_sql)
+        cur = conn.cursor()
+        _ensure_code_map_table(cur)
+        cur.execute(f"""
+            MERGE INTO {CODE_MAP_TABLE_NAME} t
+            USING ({_CODE_MAP_SOURCE_SQL}) s
+            ON (t.NORMCODE = s.normcode AND t.STORECODE = s.storecode)
+            WHEN MATCHED THEN UPDATE SET
+                t.ITEMROWID = s.itemrowid, t.ITEMCODE = s.itemcode, t.LOCATIONCODE = s.locationcode,
+                t.SOURCE = s.source, t.RETAILPRICE = s.retailprice, t.UOMCODE = s.uomcode
+                WHERE t.ITEMROWID <> s.itemrowid OR t.SOURCE <> s.source
+                   OR DECODE(t.ITEMCODE, s.itemcode, 0, 1) = 1 OR DECODE(t.LOCATIONCODE, s.locationcode, 0, 1) = 1
+                   OR DECODE(t.RETAILPRICE, s.retailprice, 0, 1) = 1 OR DECODE(t.UOMCODE, s.uomcode, 0, 1) = 1
+            WHEN NOT MATCHED THEN INSERT (NORMCODE, STORECODE, ITEMROWID, ITEMCODE, LOCATIONCODE, SOURCE, RETAILPRICE,
+                                          UOMCODE)
+                VALUES (s.normcode, s.storecode, s.itemrowid, s.itemcode, s.locationcode, s.source, s.retailprice,
+                        s.uomcode)
+        """)
+        merged = cur.rowcount
+        cur.execute(f"""
+            DELETE FROM {CODE_MAP_TABLE_NAME} t
+            WHERE NOT EXISTS (SELECT 1 FROM ({_CODE_MAP_SOURCE_SQL}) s
+                              WHERE s.normcode = t.NORMCODE AND s.storecode = t.STORECODE)
+        """)
+        deleted = cur.rowcount
+        conn.commit()
+        print(f"[CodeMap] synced: {merged} upserted, {deleted} removed")
+        return True
     except oracledb.Error as e:
-        err_str = str(e).upper()
-        if 'ORA-00955' in err_str or '00955' in err_str:
+        print(f"[CodeMap] sync error: {e}")
+        try:
+            conn.rollback()
+        except Exception:
             pass
-        elif 'ORA-01031' in err_str or '01031' in err_str:
+        return False
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
             pass
-        else:
-            print(f"[Hold] {HOLD_DTL_TABLE_NAME} create failed: {e}")
-            raise
 
 
-def _to_int(val, default=0):
-    """Coerce to int for Oracle NUMBER; avoid ORA-01722."""
-    if val is None:
-        return default
-    try:
-        return int(float(val))
-    except (TypeError, ValueError):
-        return default
+def _code_map_key(code):
+    key = (code or '').strip().upper()
+    return key if 0 < len(key) <= CODE_MAP_CODE_MAX else None
 
 
-def _to_float(val, default=0.0):
-    """Coerce to float for Oracle NUMBER; avoid ORA-01722."""
-    if val is None:
-        return default
+_CODE_MAP_LOOKUP_SQL = f"""
+    SELECT im.locationcode, im.itemcode, im.itemname, im.categorycode, im.retailprice,
+           im.manufacturerid AS manufactureid, im.baseuom,
+           c.NORMCODE, c.SOURCE, c.ITEMCODE AS MAP_ITEMCODE, c.LOCATIONCODE AS MAP_LOCATIONCODE,
+           c.RETAILPRICE AS MAP_RETAILPRICE, c.UOMCODE AS MAP_UOMCODE
+    FROM {CODE_MAP_TABLE_NAME} c
+    JOIN itemmaster im ON im.ROWID = c.ITEMROWID
+     AND UPPER(TRIM(TO_CHAR(im.itemcode))) = UPPER(c.ITEMCODE)
+     AND NVL(UPPER(TRIM(TO_CHAR(im.locationcode))), ' ') = c.STORECODE
+"""
+
+
+def _code_map_hit(columns, row):
+    """Split a _CODE_MAP_LOOKUP_SQL row into (normcode, (record, itemcode_from_alt, alt_price, alt_uom))."""
+    rec = dict(zip(columns, row))
+    mapped = {k: rec.pop(k) for k in ('NORMCODE', 'SOURCE', 'MAP_ITEMCODE', 'MAP_LOCATIONCODE', 'MAP_RETAILPRICE', 'MAP_UOMCODE')}
+    if mapped['SOURCE'] == 'A':
+        return mapped['NORMCODE'], (rec, mapped['MAP_ITEMCODE'], mapped['MAP_RETAILPRICE'], mapped['MAP_UOMCODE'])
+    return mapped['NORMCODE'], (rec, None, None, None)
+
+
+def _lookup_code_map(cur, codes, location_code=None):
+    """
+    Probe POSITEMCODEMAP for codes at a store (any store, lowest STORECODE first, without one); returns
+    {normalized code: (record, alt itemcode, price, uom), ...}.
+    """
+    keys = sorted({k for k in map(_code_map_key, codes) if k})
+    store = _location_key(location_code)
+    found = {}
+    for at in range(0, len(keys), ORACLE_IN_LIST_MAX):
+        binds, params = _in_binds(keys[at:at + ORACLE_IN_LIST_MAX], 'k')
+        where = f"c.NORMCODE IN ({binds})"
+        if store:
+            where += " AND c.STORECODE = :store"
+            params['store'] = store
+        try:
+            cur.execute(f"{_CODE_MAP_LOOKUP_SQL} WHERE {where} ORDER BY c.NORMCODE, c.STORECODE", params)
+        except oracledb.Error as e:
+            err_str = str(e).upper()
+            if '00942' not in err_str:  # table not created yet: callers fall back to the direct queries
+                print(f"[CodeMap] lookup error: {e}")
+            return found
+        columns = [col[0] for col in cur.description]
+        for row in cur.fetchall():
+            key, hit = _code_map_hit(columns, row)
+            found.setdefault(key, hit)
+    return found
+
+
+def _resolve_alternate_from_code_map(cur, code):
+    """(ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE) for an ITEMALTERNATEUOMMAP code via POSITEMCODEMAP, else None."""
+    key = _code_map_key(code)
+    if not key:
+        return None
     try:
-        return float(val)
-    except (TypeError, ValueError):
-        return default
+        cur.execute(f"""
+            SELECT ITEMCODE, LOCATIONCODE, RETAILPRICE, UOMCODE FROM {CODE_MAP_TABLE_NAME}
+            WHERE NORMCODE = :code AND SOURCE = 'A' AND ROWNUM = 1
+        """, code=key)
+        row = cur.fetchone()
+    except oracledb.Error:
+        return None
+    if not row or not row[0]:
+        return None
+    return str(row[0]).strip(), row[1] or None, row[2], row[3] or None
 
 
-def _resolve_itemcode_location_from_alternate(cur, code):
+def _lookup_result(result, itemcode_from_alt, alt_retailprice, alt_alternateuomcode, code):
+    """Apply ITEMALTERNATEUOMMAP price/UOM overrides and barcode fields to an ITEMMASTER row for /api/products/lookup."""
+    if itemcode_from_alt and alt_retailprice is not None:
+        result['RETAILPRICE'] = alt_retailprice
+        result['retailprice'] = alt_retailprice
+    if itemcode_from_alt and alt_alternateuomcode:
+        result['BASEUOM'] = alt_alternateuomcode
+        result['baseuom'] = alt_alternateuomcode
+    if result.get('manufactureid') is None and result.get('MANUFACTUREID') is None:
+        result['manufactureid'] = str(result.get('ITEMCODE') or result.get('itemcode') or '')
+    if itemcode_from_alt and code:
+        result['manufactureid'] = str(code).strip()
+        result['MANUFACTURERID'] = str(code).strip()
+    result["found"] = True
+    return result
+
+
+def _lookup_product_db(cursor, code):
     """
-    Resolve barcode/code to (ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE) from ITEMALTERNATEUOMMAP.
-    Returns (itemcode_str, locationcode_or_none, retailprice_or_none, alternateuomcode_or_none).
+    lookup_product's direct Oracle queries for one code: ITEMMASTER by manufacturerid/itemcode, then
+    ITEMALTERNATEUOMMAP. Returns (record, itemcode_from_alt, alt_price, alt_uom) or None.
     """
-    if not code or not str(code).strip():
-        return None, None, None, None
-    code_str = str(code).strip()
-    # 1) ITEMALTERNATEUOMMAP: get ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE
+    row = None
+    itemcode_from_alt = None
+    # 1) ITEMMASTER: match by manufacturerid (barcode) or itemcode
     try:
-        cur.execute("""
-            SELECT ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE FROM ITEMALTERNATEUOMMAP
-            WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
-               OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
-               OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
+        cursor.execute(f"""
+            SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+            FROM itemmaster
+            WHERE ((manufacturerid IS NOT NULL AND (TRIM(TO_CHAR(manufacturerid, '{_ORACLE_NUM_FMT}')) = TRIM(:code)
+               OR UPPER(TRIM(TO_CHAR(manufacturerid))) = UPPER(:code)))
+               OR (itemcode IS NOT NULL AND UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code)))
             AND ROWNUM = 1
-        """, code=code_str)
-        row = cur.fetchone()
-        if row and row[0]:
-            loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
-            price = row[2] if len(row) > 2 and row[2] is not None else None
-            alt_uom = row[3] if len(row) > 3 and row[3] is not None else None
-            if alt_uom is not None:
-                alt_uom = str(alt_uom).strip() or None
-            return str(row[0]).strip(), (loc if loc else None), price, alt_uom
+        """, code=code)
+        row = cursor.fetchone()
     except oracledb.Error:
         try:
-            cur.execute("""
-                SELECT ITEMCODE, LOCATIONCODE, RETAILPRICE FROM ITEMALTERNATEUOMMAP
-                WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
-                   OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
-                   OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
+            cursor.execute(f"""
+                SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+                FROM itemmaster
+                WHERE ((manufacturerid IS NOT NULL AND TRIM(TO_CHAR(manufacturerid, '{_ORACLE_NUM_FMT}')) = TRIM(:code))
+                   OR (itemcode IS NOT NULL AND UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code)))
                 AND ROWNUM = 1
-            """, code=code_str)
-            row = cur.fetchone()
-            if row and row[0]:
-                loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
-                price = row[2] if len(row) > 2 and row[2] is not None else None
-                return str(row[0]).strip(), (loc if loc else None), price, None
+            """, code=code)
+            row = cursor.fetchone()
         except oracledb.Error:
             try:
-                cur.execute("""
-                    SELECT ITEMCODE, LOCATIONCODE FROM ITEMALTERNATEUOMMAP
-                    WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
-                       OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
-                       OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
-                    AND ROWNUM = 1
-                """, code=code_str)
-                row = cur.fetchone()
-                if row and row[0]:
-                    loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
-                    return str(row[0]).strip(), (loc if loc else None), None, None
+                cursor.execute(f"""
+                    SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+                    FROM itemmaster
+                    WHERE (TRIM(TO_CHAR(NVL(manufacturerid, 0), '{_ORACLE_NUM_FMT}')) = TRIM(:code)
+                       OR UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code))
+                    AND ROWNUM = 1
+                """, code=code)
+                row = cursor.fetchone()
             except oracledb.Error:
                 try:
-                    cur.execute("""
-                        SELECT ITEMCODE FROM ITEMALTERNATEUOMMAP
-                        WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
-                           OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
-                           OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
+                    cursor.execute("""
+                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+                        FROM itemmaster
+                        WHERE (TRIM(manufacturerid) = TRIM(:code) OR TRIM(itemcode) = TRIM(:code))
                         AND ROWNUM = 1
-                    """, code=code_str)
-                    row = cur.fetchone()
-                    if row and row[0]:
-                        return str(row[0]).strip(), None, None, None
-                except oracledb.Error as e:
-                    print(f"[ITEMALTERNATEUOMMAP] lookup fallback error: {e}")
-    # 2) Discovered table/columns
-    qualified, itemcode_col, alternate_cols = _get_alternate_uom_table_info(cur)
-    if qualified and itemcode_col and alternate_cols:
-        for col in alternate_cols:
+                    """, code=code)
+                    row = cursor.fetchone()
+                except oracledb.Error:
+                    try:
+                        cursor.execute("""
+                            SELECT locationcode, itemcode, itemname, categorycode, retailprice, baseuom
+                            FROM itemmaster
+                            WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
+                        """, code=code)
+                        row = cursor.fetchone()
+                    except oracledb.Error:
+                        pass
+    # 2) ITEMALTERNATEUOMMAP: MANUFACTURERID found here -> use this table's RETAILPRICE, ALTERNATEUOMCODE; name/category from itemmaster
+    alt_retailprice = None
+    alt_alternateuomcode = None
+    if not row:
+        itemcode_from_alt, locationcode_from_alt, alt_retailprice, alt_alternateuomcode = _resolve_itemcode_location_from_alternate(cursor, code)
+        if itemcode_from_alt:
             try:
-                cur.execute(f"""
-                    SELECT {itemcode_col}, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE FROM {qualified}
-                    WHERE {col} IS NOT NULL AND TRIM(TO_CHAR(NVL({col}, 0), '{_ORACLE_NUM_FMT}')) = TRIM(:code)
-                    AND ROWNUM = 1
-                """, code=code_str)
-                row = cur.fetchone()
-                if row and row[0]:
-                    loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
-                    price = row[2] if len(row) > 2 and row[2] is not None else None
-                    alt_uom = row[3] if len(row) > 3 and row[3] is not None else None
-                    if alt_uom is not None:
-                        alt_uom = str(alt_uom).strip() or None
-                    return str(row[0]).strip(), (loc if loc else None), price, alt_uom
+                if locationcode_from_alt:
+                    cursor.execute("""
+                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+                        FROM itemmaster
+                        WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:ic) AND (UPPER(TRIM(TO_CHAR(locationcode))) = UPPER(:lc) OR TRIM(locationcode) = TRIM(:lc))
+                        AND ROWNUM = 1
+                    """, ic=itemcode_from_alt, lc=locationcode_from_alt)
+                else:
+                    cursor.execute("""
+                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+                        FROM itemmaster
+                        WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
+                    """, code=itemcode_from_alt)
+                row = cursor.fetchone()
             except oracledb.Error:
                 try:
-                    cur.execute(f"""
-                        SELECT {itemcode_col}, LOCATIONCODE, RETAILPRICE FROM {qualified}
-                        WHERE TRIM({col}) = TRIM(:code) AND ROWNUM = 1
-                    """, code=code_str)
-                    row = cur.fetchone()
-                    if row and row[0]:
-                        loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
-                        price = row[2] if len(row) > 2 and row[2] is not None else None
-                        return str(row[0]).strip(), (loc if loc else None), price, None
+                    if locationcode_from_alt:
+                        cursor.execute(f"""
+                            SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+                            FROM itemmaster
+                            WHERE TRIM(TO_CHAR(itemcode)) = TRIM(:ic) AND TRIM(TO_CHAR(NVL(locationcode, 0), '{_ORACLE_NUM_FMT}')) = TRIM(:lc) AND ROWNUM = 1
+                        """, ic=itemcode_from_alt, lc=locationcode_from_alt)
+                    else:
+                        cursor.execute("""
+                            SELECT locationcode, itemcode, itemname, categorycode, retailprice, baseuom
+                            FROM itemmaster
+                            WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
+                        """, code=itemcode_from_alt)
+                    row = cursor.fetchone()
                 except oracledb.Error:
-                    try:
-                        cur.execute(f"""
-                            SELECT {itemcode_col}, LOCATIONCODE FROM {qualified}
-                            WHERE TRIM({col}) = TRIM(:code) AND ROWNUM = 1
-                        """, code=code_str)
-                        row = cur.fetchone()
-                        if row and row[0]:
-                            loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
-                            return str(row[0]).strip(), (loc if loc else None), None, None
-                    except oracledb.Error:
-                        try:
-                            cur.execute(f"""
-                                SELECT {itemcode_col} FROM {qualified}
-                                WHERE TRIM({col}) = TRIM(:code) AND ROWNUM = 1
-                            """, code=code_str)
-                            row = cur.fetchone()
-                            if row and row[0]:
-                                return str(row[0]).strip(), None, None, None
-                        except oracledb.Error:
-                            pass
-    return None, None, None, None
-
-
-def _resolve_itemcode_from_alternate(cur, code):
-    """Resolve barcode/code to ITEMCODE from ITEMALTERNATEUOMMAP. Returns itemcode or None."""
-    ic, _, _, _ = _resolve_itemcode_location_from_alternate(cur, code)
-    return ic
+                    pass
+    if not row:
+        return None
+    columns = [col[0] for col in cursor.description]
+    return dict(zip(columns, row)), itemcode_from_alt, alt_retailprice, alt_alternateuomcode
 
 
-def _get_item_names_from_master(cur, itemcodes):
-    """Look up ITEMNAME from itemmaster by ITEMCODE; also resolve via ITEMALTERNATEUOMMAP. Returns dict itemcode_str -> itemname."""
-    codes = [str(c).strip() for c in (itemcodes or []) if c is not None and str(c).strip()]
-    if not codes:
-        return {}
-    names = {}
-    for code in set(codes):
+@app.route('/api/products/lookup', methods=['GET'])
+def lookup_product():
+    """Look up a single product by code for cart add: check BOTH ITEMMASTER and ITEMALTERNATEUOMMAP."""
+    code = (request.args.get('code') or '').strip()
+    if not code:
+        return jsonify({"error": "code is required"}), 400
+    location_code = _request_location_code()
+    measure, keys = _barcode_lookup_keys(code, location_code)
+    # Shared catalog first; a miss (or no catalog yet) still goes to Oracle so new items are found immediately
+    catalog = _get_catalog()
+    # Until the catalog is loaded, the warmed best sellers answer most scans without a query
+    key, hit = _catalog_lookup(catalog, keys, location_code) if catalog else _hot_lookup(keys, location_code)
+    if not hit:
+        conn = _get_connection(read_only=True)
+        if not conn:
+            return jsonify({"found": False, "code": code, "error": "Product not found"}), 200
+        cursor = None
         try:
-            cur.execute("""
-                SELECT itemname FROM itemmaster
-                WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
-            """, code=code)
-            row = cur.fetchone()
-            if row and row[0]:
-                names[code] = str(row[0]).strip()
-        except oracledb.Error:
-            try:
-                cur.execute("SELECT itemname FROM itemmaster WHERE TRIM(itemcode) = :code AND ROWNUM = 1", code=code)
-                row = cur.fetchone()
-                if row and row[0]:
-                    names[code] = str(row[0]).strip()
-            except oracledb.Error:
-                pass
-        if code not in names:
-            itemcode = _resolve_itemcode_from_alternate(cur, code)
-            if itemcode:
+            cursor = conn.cursor()
+            # POSITEMCODEMAP: one unique-index probe for all key variants; codes not in the map use the direct queries
+            mapped = _lookup_code_map(cursor, keys, location_code)
+            key, hit = _first_hit(keys, lambda k: mapped.get(_code_map_key(k)))
+            if not hit:
+                key, hit = _first_hit(_direct_lookup_keys(keys, measure), lambda k: _lookup_product_db(cursor, k))
+        except oracledb.Error as e:
+            print(f"Oracle lookup error: {e}")
+        finally:
+            if cursor:
                 try:
-                    cur.execute("SELECT itemname FROM itemmaster WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1", code=itemcode)
-                    row = cur.fetchone()
-                    if row and row[0]:
-                        names[code] = str(row[0]).strip()
-                except oracledb.Error:
+                    cursor.close()
+                except Exception:
                     pass
-    return names
+            try:
+                conn.close()
+            except Exception:
+                pass
+    if not hit:
+        return jsonify({"found": False, "code": code, "error": "Product not found"}), 200
+    result = _lookup_result(dict(hit[0]), *hit[1:], code=code)
+    measure = _hit_measure(measure, key)
+    if measure:
+        _apply_variable_measure(result, measure)
+    return jsonify(result)
 
 
-def _location_to_num(location_code, default=1):
-    """Convert location code to NUMBER for hold table (LOCATIONCODE is NUMBER)."""
-    s = str(location_code or '').strip()
-    if not s:
-        return default
-    if s.isdigit():
-        return _to_int(s, default)
-    digits = ''.join(c for c in s if c.isdigit())
-    return _to_int(digits, default) if digits else default
+LOOKUP_BATCH_MAX = 500
+_LOOKUP_SELECT = """
+    SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid AS manufactureid, baseuom
+    FROM itemmaster
+"""
 
 
-def _ensure_billnotable(cur):
-    """Create BILLNOTABLE if not exists. Columns: BILLNO NUMBER, FLAG CHAR(1) DEFAULT 'n', BILLDATE DATE, COUNTERCODE VARCHAR2(50)."""
-    create_sql = f"""
-        CREATE TABLE {BILLNO_TABLE_NAME} (
-            BILLNO NUMBER NOT NULL,
-            FLAG CHAR(1) DEFAULT 'n',
-            BILLDATE DATE DEFAULT SYSDATE NOT NULL,
-            COUNTERCODE VARCHAR2(50)
-        )
-    """
+def _in_binds(values, prefix):
+    """(':p0, :p1, ...', {p0: v0, ...}) for an IN list."""
+    params = {f"{prefix}{i}": v for i, v in enumerate(values)}
+    return ', '.join(':' + k for k in params), params
+
+
+def _batch_master_rows(cur, codes):
+    """ITEMMASTER rows matching any code by itemcode or manufacturerid: UPPER(TRIM(code)) -> first row dict."""
+    binds, params = _in_binds([c.upper() for c in codes], 'c')
     try:
-        cur.execute(create_sql)
-    except oracledb.Error as e:
-        err_str = str(e).upper()
-        if 'ORA-00955' in err_str or '00955' in err_str:
-            pass
-        elif 'ORA-01031' in err_str or '01031' in err_str:
-            pass
-        else:
-            print(f"[BillNo] {BILLNO_TABLE_NAME} create failed: {e}")
-            raise
+        cur.execute(f"""{_LOOKUP_SELECT}
+            WHERE UPPER(TRIM(TO_CHAR(itemcode))) IN ({binds})
+               OR (manufacturerid IS NOT NULL AND UPPER(TRIM(TO_CHAR(manufacturerid))) IN ({binds}))
+        """, params)
+    except oracledb.Error:
+        cur.execute(f"{_LOOKUP_SELECT} WHERE UPPER(TRIM(TO_CHAR(itemcode))) IN ({binds})", params)
+    columns = [col[0] for col in cur.description]
+    found = {}
+    for row in cur.fetchall():
+        rec = dict(zip(columns, row))
+        for key in (rec.get('ITEMCODE'), rec.get('MANUFACTUREID')):
+            found.setdefault(_code_str(key).upper(), rec)
+    return found
 
 
-def _ensure_billdtl(cur):
-    """Create BILLDTL if not exists. Columns: LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE."""
-    create_sql = f"""
-        CREATE TABLE {BILLDTL_TABLE_NAME} (
-            LOCATIONCODE VARCHAR2(50),
-            BILLNO NUMBER NOT NULL,
-            SLNO NUMBER NOT NULL,
-            ITEMCODE VARCHAR2(50),
-            QUANTITY NUMBER,
-            RATE NUMBER
-        )
-    """
+def _batch_alternate_rows(cur, codes):
+    """ITEMALTERNATEUOMMAP matches: TRIM(code) -> (itemcode, locationcode, retailprice, alternateuomcode)."""
+    binds, params = _in_binds(codes, 'a')
     try:
-        cur.execute(create_sql)
+        cur.execute(f"""
+            SELECT ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE, MANUFACTURERID FROM ITEMALTERNATEUOMMAP
+            WHERE TRIM(MANUFACTURERID) IN ({binds}) OR TRIM(ALTERNATEUOMCODE) IN ({binds})
+               OR TRIM(TO_CHAR(ITEMCODE)) IN ({binds})
+        """, params)
     except oracledb.Error as e:
-        err_str = str(e).upper()
-        if 'ORA-00955' in err_str or '00955' in err_str:
-            pass
-        elif 'ORA-01031' in err_str or '01031' in err_str:
-            pass
-        else:
-            print(f"[BILLDTL] create failed: {e}")
-            raise
+        print(f"[ITEMALTERNATEUOMMAP] batch lookup error: {e}")
+        return {}
+    wanted = set(codes)
+    found = {}
+    for ic, lc, price, uom, mfr in cur.fetchall():
+        if not ic:
+            continue
+        uom = (str(uom).strip() or None) if uom is not None else None
+        hit = (str(ic).strip(), _code_str(lc) or None, price, uom)
+        for key in (_code_str(mfr), uom, _code_str(ic)):
+            if key in wanted:
+                found.setdefault(key, hit)
+    return found
 
 
-def _ensure_billhdr(cur):
-    """Create BILLHDR if not exists. Columns: LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE, COUNTERCODE, RESETNO, SESSIONCODE."""
-    create_sql = f"""
-        CREATE TABLE {BILLHDR_TABLE_NAME} (
-            LOCATIONCODE VARCHAR2(50),
-            BILLNO NUMBER NOT NULL,
-            BILLDATE DATE DEFAULT SYSDATE NOT NULL,
-            BILLTYPE CHAR(1) DEFAULT 'C',
-            COUNTERCODE VARCHAR2(50),
-            RESETNO NUMBER DEFAULT 1,
-            SESSIONCODE NUMBER DEFAULT 0
-        )
+def _batch_hits(codes, location_code=None):
     """
-    try:
-        cur.execute(create_sql)
-    except oracledb.Error as e:
-        err_str = str(e).upper()
-        if 'ORA-00955' in err_str or '00955' in err_str:
-            pass
-        elif 'ORA-01031' in err_str or '01031' in err_str:
-            pass
+    Resolve many codes with lookup_product's rules: catalog first, then one POSITEMCODEMAP probe, then for codes
+    not in the map one ITEMMASTER query, one ITEMALTERNATEUOMMAP query and one ITEMMASTER query for the
+    alternate item codes. Returns ({code: (measure, keys)}, {code: hit}); measure is None unless the hit came from
+    the label's item keys.
+    """
+    parsed = {code: _barcode_lookup_keys(code, location_code) for code in dict.fromkeys(codes)}
+    found = {}
+    matched = {}
+    catalog = _get_catalog()
+    pending = []
+    for code, (_, keys) in parsed.items():
+        key, hit = _catalog_lookup(catalog, keys, location_code) if catalog else (None, None)
+        if hit:
+            found[code], matched[code] = hit, key
         else:
-            print(f"[BILLHDR] create failed: {e}")
-            raise
+            pending.append(code)
+    conn = _get_connection(read_only=True) if pending else None
+    if conn:
+        cur = None
+        try:
+            cur = conn.cursor()
+            mapped = _lookup_code_map(cur, [k for code in pending for k in parsed[code][1]], location_code)
+            unmapped = {}
+            for code in pending:
+                key, hit = _first_hit(parsed[code][1], lambda k: mapped.get(_code_map_key(k)))
+                if hit:
+                    found[code], matched[code] = hit, key
+                else:
+                    unmapped[code] = _direct_lookup_keys(parsed[code][1], parsed[code][0])
+            primary = list(dict.fromkeys(k for keys in unmapped.values() for k in keys))
+            master = _batch_master_rows(cur, primary) if primary else {}
+            missing = [key for key in primary if key.upper() not in master]
+            alternates = _batch_alternate_rows(cur, missing) if missing else {}
+            items = {}
+            if alternates:
+                itemcodes = sorted({hit[0] for hit in alternates.values()})
+                binds, params = _in_binds([ic.upper() for ic in itemcodes], 'i')
+                cur.execute(f"{_LOOKUP_SELECT} WHERE UPPER(TRIM(TO_CHAR(itemcode))) IN ({binds})", params)
+                columns = [col[0] for col in cur.description]
+                for row in cur.fetchall():
+                    rec = dict(zip(columns, row))
+                    ic = _code_str(rec.get('ITEMCODE')).upper()
+                    items.setdefault((ic, None), rec)
+                    items.setdefault((ic, _code_str(rec.get('LOCATIONCODE')).upper()), rec)
+            for code, keys in unmapped.items():
+                for key in keys:
+                    rec = master.get(key.upper())
+                    if rec:
+                        found[code], matched[code] = (rec, None, None, None), key
+                        break
+                for key in keys:
+                    if code in found or key not in alternates:
+                        continue
+                    ic, lc, price, uom = alternates[key]
+                    rec = items.get((ic.upper(), lc.upper() if lc else None))
+                    if rec:
+                        found[code], matched[code] = (rec, ic, price, uom), key
+        except oracledb.Error as e:
+            print(f"Oracle batch lookup error: {e}")
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+    parsed = {code: (_hit_measure(measure, matched.get(code)), keys) for code, (measure, keys) in parsed.items()}
+    return parsed, found
 
 
-def _billtype_from_invoicecode(invoice_code):
-    """BILLTYPE: 1 or '1' -> 'C', 2 or '2' -> 'R', else 'C' (C/R bill type from customer INVOICECODE)."""
+def _batch_lookup(codes, location_code=None):
+    """lookup_product results for many codes, in input order."""
+    parsed, found = _batch_hits(codes, location_code)
+    results = []
+    for code in codes:
+        hit = found.get(code)
+        if not hit:
+            results.append({"found": False, "code": code, "error": "Product not found"})
+            continue
+        result = _lookup_result(dict(hit[0]), *hit[1:], code=code)
+        measure = parsed[code][0]
+        if measure:
+            _apply_variable_measure(result, measure)
+        results.append(result)
+    return results
+
+
+@app.route('/api/products/lookup/batch', methods=['GET', 'POST'])
+def lookup_products_batch():
+    """Look up many codes at once (JSON {"codes": [...]} or ?codes=a,b); results follow input order."""
+    data = request.get_json(silent=True) or {}
+    codes = data.get('codes')
+    if codes is None:
+        codes = (request.args.get('codes') or '').split(',')
+    if not isinstance(codes, list):
+        return jsonify({"ok": False, "error": "codes must be a list"}), 400
+    codes = [str(c).strip() for c in codes if c is not None and str(c).strip()]
+    if not codes:
+        return jsonify({"ok": False, "error": "codes is required"}), 400
+    if len(codes) > LOOKUP_BATCH_MAX:
+        return jsonify({"ok": False, "error": f"At most {LOOKUP_BATCH_MAX} codes per request"}), 400
+    results = _batch_lookup(codes, _request_location_code(data))
+    return jsonify({"ok": True, "found": sum(1 for r in results if r.get("found")), "results": results})
+
+
+# Columnar catalog load: ITEMMASTER / ITEMALTERNATEUOMMAP fetched as Arrow tables (python-oracledb fetch_df_all),
+# keys normalized and the alternate-price/UOM merge done with vectorized compute instead of per-row dicts.
+PRODUCT_COLUMNS = ['LOCATIONCODE', 'ITEMCODE', 'ITEMNAME', 'CATEGORYCODE', 'RETAILPRICE', 'MANUFACTURERID', 'BASEUOM']
+
+
+def _arrow_plain(arr):
+    """Decimal columns -> int64 (scale 0) or float64 so values match what the row fetch path returns."""
+    if pa.types.is_decimal(arr.type):
+        return pc.cast(arr, pa.int64() if arr.type.scale == 0 else pa.float64())
+    return arr
+
+
+def _arrow_code_key(arr, upper=True):
+    """Vectorized str(v).strip().upper() for a code column (NUMBER or VARCHAR2); nulls stay null."""
+    arr = _arrow_plain(arr)
+    if pa.types.is_floating(arr.type):
+        arr = pc.cast(arr, pa.int64(), safe=False)
+    if not pa.types.is_string(arr.type) and not pa.types.is_large_string(arr.type):
+        arr = pc.cast(arr, pa.string())
+    arr = pc.utf8_trim_whitespace(arr)
+    return pc.utf8_upper(arr) if upper else arr
+
+
+def _arrow_blank_to_null(arr):
+    """Treat '' (after strip) like None, as the row path's `value or fallback` does."""
+    if pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type):
+        arr = pc.utf8_trim_whitespace(arr)
+        return pc.if_else(pc.equal(arr, ''), pa.scalar(None, arr.type), arr)
+    return arr
+
+
+def _arrow_last_index(keys):
+    """(unique non-null keys, index of the last row holding each key) - dict-assignment semantics."""
+    t = pa.table({'k': keys, 'i': pa.array(range(len(keys)), pa.int64())}).filter(pc.is_valid(keys))
+    t = t.filter(pc.not_equal(t['k'], ''))
+    g = t.group_by('k', use_threads=False).aggregate([('i', 'max')])
+    return g['k'], g['i_max']
+
+
+def _arrow_first_index(keys):
+    """Sorted indices of the first row holding each non-null, non-empty key."""
+    t = pa.table({'k': keys, 'i': pa.array(range(len(keys)), pa.int64())}).filter(pc.is_valid(keys))
+    t = t.filter(pc.not_equal(t['k'], ''))
+    first = t.group_by('k', use_threads=False).aggregate([('i', 'min')])['i_min']
+    return pc.take(first, pc.sort_indices(first))
+
+
+def _arrow_lookup(keys, value_set, values):
+    """values[position of key in value_set] per row; null where the key is missing."""
+    return pc.take(values, pc.index_in(keys, value_set=value_set))
+
+
+def _arrow_coalesce_typed(primary, fallback):
+    """
+    coalesce(primary, fallback) when the column types can be unified (same type, or both numeric -> float64).
+    Returns None for mixed NUMBER/VARCHAR2 columns; the caller resolves those per row to keep the row path's types.
+    """
+    if pa.types.is_null(primary.type):
+        primary = pc.cast(primary, fallback.type)
+    if primary.type == fallback.type:
+        return pc.coalesce(primary, fallback)
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(f(primary.type) for f in numeric) and any(f(fallback.type) for f in numeric):
+        return pc.coalesce(pc.cast(primary, pa.float64()), pc.cast(fallback, pa.float64()))
+    return None
+
+
+def _alternate_code_lists(alt, alt_cols):
+    """Stripped ITEMCODE -> alternate codes, like the row path: first column as-is, later columns only if not already listed."""
+    ic = _arrow_code_key(alt['ITEMCODE'], upper=False)
+    alt_map = {}
+    for n, col in enumerate(alt_cols):
+        t = pa.table({'ic': ic, 'code': _arrow_blank_to_null(_arrow_code_key(alt[col], upper=False))})
+        t = t.filter(pc.and_(pc.is_valid(t['ic']), pc.is_valid(t['code'])))
+        t = t.filter(pc.not_equal(t['ic'], ''))
+        g = t.group_by('ic', use_threads=False).aggregate([('code', 'list')])
+        for key, codes in zip(g['ic'].to_pylist(), g['code_list'].to_pylist()):
+            if n == 0:
+                alt_map[key] = codes
+            else:
+                lst = alt_map.setdefault(key, [])
+                lst.extend(c for c in dict.fromkeys(codes) if c not in lst)
+    return alt_map
+
+
+def _load_products_columnar(conn, cursor):
+    """Columnar version of the ITEMMASTER + ITEMALTERNATEUOMMAP catalog merge. Same result tuple as the row path."""
+    im = pa.table(conn.fetch_df_all("""
+        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid, baseuom
+        FROM itemmaster
+    """))
+    im = pa.table({c: _arrow_plain(im[c]) for c in PRODUCT_COLUMNS})
+    qualified_alt, itemcode_col_alt, alternate_cols_alt = _get_alternate_uom_table_info(cursor)
+    alt_table = qualified_alt or 'ITEMALTERNATEUOMMAP'
+    ic_col = itemcode_col_alt or 'ITEMCODE'
+    alt_col = alternate_cols_alt[0] if qualified_alt and alternate_cols_alt else None
+    alt = pa.table(conn.fetch_df_all(f"""
+        SELECT {ic_col} AS ITEMCODE, LOCATIONCODE, MANUFACTURERID, RETAILPRICE, ALTERNATEUOMCODE
+               {f', {alt_col} AS ALTCODE' if alt_col else ''}
+        FROM {alt_table}
+        WHERE {ic_col} IS NOT NULL
+    """))
+
+    # ITEMMASTER lookups: by ITEMCODE and by (ITEMCODE, LOCATIONCODE), last row wins
+    im_ic = _arrow_code_key(im['ITEMCODE'])
+    im_ic_lc = pc.binary_join_element_wise(im_ic, _arrow_code_key(im['LOCATIONCODE']), '\x1f')
+    ic_keys, ic_idx = _arrow_last_index(im_ic)
+    lc_keys, lc_idx = _arrow_last_index(im_ic_lc)
+
+    # ALTERNATECODES per stripped ITEMCODE, attached as a list column
+    code_cols = ['ALTCODE'] if alt_col else ['ALTERNATEUOMCODE', 'MANUFACTURERID']
+    alt_lists = _alternate_code_lists(alt, code_cols) if alt.num_rows else {}
+    list_keys = pa.array(list(alt_lists), pa.string())
+    list_values = pa.array(list(alt_lists.values()), pa.list_(pa.string()))
+    no_codes = pa.scalar([], pa.list_(pa.string()))
+
+    def with_alt_codes(table):
+        codes = _arrow_lookup(_arrow_code_key(table['ITEMCODE'], upper=False), list_keys, list_values)
+        return table.append_column('ALTERNATECODES', pc.if_else(pc.is_valid(codes), codes, no_codes))
+
+    results = with_alt_codes(im).to_pylist()
+    if alt.num_rows:
+        # First alternate row per ITEMCODE, in table order
+        alt_ic = _arrow_code_key(alt['ITEMCODE'])
+        first_idx = _arrow_first_index(alt_ic)
+        sel = alt.take(first_idx)
+        sel_ic = pc.take(alt_ic, first_idx)
+        sel_lc = _arrow_blank_to_null(_arrow_code_key(sel['LOCATIONCODE']))
+        im_idx = pc.coalesce(
+            _arrow_lookup(pc.binary_join_element_wise(sel_ic, sel_lc, '\x1f'), lc_keys, lc_idx),
+            _arrow_lookup(sel_ic, ic_keys, ic_idx),
+        )
+        found = pc.is_valid(im_idx)
+        sel = sel.filter(found)
+        base = im.take(im_idx.filter(found))
+        # Alternate RETAILPRICE / MANUFACTURERID / ALTERNATEUOMCODE override the ITEMMASTER values when present
+        overrides = {
+            'RETAILPRICE': _arrow_plain(sel['RETAILPRICE']),
+            'MANUFACTURERID': _arrow_blank_to_null(_arrow_plain(sel['MANUFACTURERID'])),
+            'BASEUOM': _arrow_blank_to_null(_arrow_code_key(sel['ALTERNATEUOMCODE'], upper=False)),
+        }
+        columns = {c: base[c] for c in PRODUCT_COLUMNS}
+        per_row = {}
+        for col, alt_vals in overrides.items():
+            merged_col = _arrow_coalesce_typed(alt_vals, base[col])
+            if merged_col is None:
+                per_row[col] = alt_vals
+            else:
+                columns[col] = merged_col
+        merged = with_alt_codes(pa.table(columns)).to_pylist()
+        for col, alt_vals in per_row.items():
+            for rec, value in zip(merged, alt_vals.to_pylist()):
+                if value is not None:
+                    rec[col] = value
+        results.extend(merged)
+    alt_rows = list(zip(*(alt[c].to_pylist() for c in ('ITEMCODE', 'LOCATIONCODE', 'MANUFACTURERID', 'RETAILPRICE', 'ALTERNATEUOMCODE'))))
+    return results, alt_rows, im.num_rows
+
+
+def _fetch_catalog_rows():
+    """
+    Fetch products from ITEMMASTER and ITEMALTERNATEUOMMAP; show if either table has the product.
+    Returns (products, alternate_rows, master_count): the first master_count products are ITEMMASTER rows,
+    alternate_rows are ITEMALTERNATEUOMMAP (itemcode, locationcode, manufacturerid, retailprice, alternateuomcode)
+    tuples. None if Oracle unavailable.
+    """
+    conn = _get_connection(read_only=True)
+    if not conn:
+        return None
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        if pa is not None and hasattr(conn, 'fetch_df_all'):
+            try:
+                return _load_products_columnar(conn, cursor)
+            except (oracledb.Error, pa.ArrowException) as e:
+                print(f"[Products] columnar load failed, using row fetch: {e}")
+        # 1) All from ITEMMASTER (same columns + BASEUOM for item list UOM)
+        query = """
+            SELECT
+                p.locationcode,
+                p.itemcode,
+                p.itemname,
+                p.categorycode,
+                p.retailprice,
+                p.manufacturerid,
+                p.baseuom
+            FROM itemmaster p
+        """
+        cursor.execute(query)
+        columns = [col[0] for col in cursor.description]
+        rows = cursor.fetchall()
+        results = []
+        seen_itemcodes = set()
+        for row in rows:
+            rec = dict(zip(columns, row))
+            ic = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
+            if ic:
+                seen_itemcodes.add(ic.upper())
+            results.append(rec)
+        master_count = len(results)
+        # 2) ITEMALTERNATEUOMMAP: fetch alternate rows then get RETAILPRICE (and name, etc.) from itemmaster in Python
+        qualified_alt, itemcode_col_alt, alternate_cols_alt = _get_alternate_uom_table_info(cursor)
+        alt_table = qualified_alt if qualified_alt else "ITEMALTERNATEUOMMAP"
+        try:
+            cursor.execute(f"""
+                SELECT {itemcode_col_alt} AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid, RETAILPRICE AS retailprice, ALTERNATEUOMCODE AS alternateuomcode
+                FROM {alt_table}
+                WHERE {itemcode_col_alt} IS NOT NULL
+            """)
+            alt_rows = cursor.fetchall()
+        except oracledb.Error:
+            try:
+                cursor.execute("""
+                    SELECT ITEMCODE AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid, RETAILPRICE AS retailprice, ALTERNATEUOMCODE AS alternateuomcode
+                    FROM ITEMALTERNATEUOMMAP
+                    WHERE ITEMCODE IS NOT NULL
+                """)
+                alt_rows = cursor.fetchall()
+            except oracledb.Error:
+                try:
+                    cursor.execute("""
+                        SELECT ITEMCODE AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid, RETAILPRICE AS retailprice
+                        FROM ITEMALTERNATEUOMMAP
+                        WHERE ITEMCODE IS NOT NULL
+                    """)
+                    alt_rows = [(r[0], r[1] if len(r) > 1 else None, r[2] if len(r) > 2 else r[1] if len(r) == 2 else None, r[3] if len(r) > 3 else None, None) for r in cursor.fetchall()]
+                except oracledb.Error:
+                    try:
+                        cursor.execute("""
+                            SELECT ITEMCODE AS itemcode, LOCATIONCODE AS locationcode, MANUFACTURERID AS manufacturerid
+                            FROM ITEMALTERNATEUOMMAP
+                            WHERE ITEMCODE IS NOT NULL
+                        """)
+                        alt_rows = [(r[0], r[1] if len(r) > 1 else None, r[2] if len(r) > 2 else r[1] if len(r) == 2 else None, None, None) for r in cursor.fetchall()]
+                    except oracledb.Error:
+                        try:
+                            cursor.execute("""
+                                SELECT ITEMCODE AS itemcode, MANUFACTURERID AS manufacturerid
+                                FROM ITEMALTERNATEUOMMAP
+                                WHERE ITEMCODE IS NOT NULL
+                            """)
+                            alt_rows = [(r[0], None, r[1], None, None) for r in cursor.fetchall()] if cursor.description and len(cursor.description) >= 2 else []
+                        except oracledb.Error:
+                            alt_rows = []
+        if alt_rows:
+            alt_itemcodes = list({str(r[0]).strip() for r in alt_rows if r and r[0]})
+            itemmaster_by_ic_lc = {}
+            itemmaster_by_ic = {}
+            for ic in alt_itemcodes:
+                if not ic:
+                    continue
+                try:
+                    cursor.execute("""
+                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid, baseuom
+                        FROM itemmaster
+                        WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:ic)
+                    """, ic=ic)
+                    im_cols = [c[0] for c in cursor.description]
+                    for im_row in cursor.fetchall():
+                        im_rec = dict(zip(im_cols, im_row))
+                        ic_val = str(im_rec.get('ITEMCODE') or im_rec.get('itemcode') or '').strip()
+                        lc_val = im_rec.get('LOCATIONCODE') or im_rec.get('locationcode')
+                        if ic_val:
+                            itemmaster_by_ic[ic_val.upper()] = im_rec
+                            if lc_val is not None:
+                                itemmaster_by_ic_lc[(ic_val.upper(), str(lc_val).strip().upper())] = im_rec
+                except oracledb.Error:
+                    pass
+            added_from_alt = set()
+            for row in alt_rows:
+                if not row:
+                    continue
+                ic = str(row[0]).strip() if row[0] is not None else ''
+                lc_alt = row[1] if len(row) > 1 else None
+                alt_manufacturerid = row[2] if len(row) > 2 else (row[1] if len(row) == 2 else None)
+                alt_retailprice = row[3] if len(row) > 3 else None
+                alt_alternateuomcode = row[4] if len(row) > 4 else None
+                if alt_alternateuomcode is not None:
+                    alt_alternateuomcode = str(alt_alternateuomcode).strip() or None
+                if not ic:
+                    continue
+                if ic.upper() in added_from_alt:
+                    continue
+                im_rec = None
+                if lc_alt is not None and str(lc_alt).strip():
+                    im_rec = itemmaster_by_ic_lc.get((ic.upper(), str(lc_alt).strip().upper()))
+                if im_rec is None:
+                    im_rec = itemmaster_by_ic.get(ic.upper())
+                if im_rec is None:
+                    continue
+                rec = {
+                    'LOCATIONCODE': im_rec.get('LOCATIONCODE') or im_rec.get('locationcode'),
+                    'ITEMCODE': im_rec.get('ITEMCODE') or im_rec.get('itemcode'),
+                    'ITEMNAME': im_rec.get('ITEMNAME') or im_rec.get('itemname'),
+                    'CATEGORYCODE': im_rec.get('CATEGORYCODE') or im_rec.get('categorycode'),
+                    'RETAILPRICE': alt_retailprice if alt_retailprice is not None else (im_rec.get('RETAILPRICE') or im_rec.get('retailprice')),
+                    'MANUFACTURERID': alt_manufacturerid or im_rec.get('MANUFACTURERID') or im_rec.get('manufacturerid'),
+                    'BASEUOM': alt_alternateuomcode if alt_alternateuomcode else (im_rec.get('BASEUOM') or im_rec.get('baseuom')),
+                }
+                if rec.get('ITEMCODE') or rec.get('itemcode'):
+                    seen_itemcodes.add(ic.upper())
+                    added_from_alt.add(ic.upper())
+                    results.append(rec)
+        # 3) Add products by ITEMCODE from alternate table that are not already in list (itemmaster may not have them)
+        qualified_alt, itemcode_col_alt, alternate_cols_alt = _get_alternate_uom_table_info(cursor)
+        alt_itemcodes = []
+        if qualified_alt and itemcode_col_alt:
+            try:
+                cursor.execute(f"""
+                    SELECT DISTINCT {itemcode_col_alt} FROM {qualified_alt}
+                    WHERE {itemcode_col_alt} IS NOT NULL
+                """)
+                alt_itemcodes = [str(row[0]).strip() for row in cursor.fetchall() if row and row[0]]
+            except oracledb.Error:
+                pass
+        if not alt_itemcodes:
+            try:
+                cursor.execute("""
+                    SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
+                    WHERE ITEMCODE IS NOT NULL
+                """)
+                alt_itemcodes = [str(row[0]).strip() for row in cursor.fetchall() if row and row[0]]
+            except oracledb.Error:
+                pass
+        for ic in alt_itemcodes:
+            if not ic or ic.upper() in seen_itemcodes:
+                continue
+            try:
+                cursor.execute("""
+                    SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid, baseuom
+                    FROM itemmaster
+                    WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
+                """, code=ic)
+                row = cursor.fetchone()
+                if row:
+                    results.append(dict(zip(columns, row)))
+                    seen_itemcodes.add(ic.upper())
+            except oracledb.Error:
+                pass
+        # 4) Attach alternate codes per ITEMCODE (use discovered table/columns)
+        alt_map = {}
+        if qualified_alt and itemcode_col_alt and alternate_cols_alt:
+            alt_col = alternate_cols_alt[0]
+            try:
+                cursor.execute(f"""
+                    SELECT {itemcode_col_alt}, {alt_col} FROM {qualified_alt}
+                    WHERE {itemcode_col_alt} IS NOT NULL AND {alt_col} IS NOT NULL
+                """)
+                for row in cursor.fetchall():
+                    ic = str(row[0]).strip() if row[0] else None
+                    alt = str(row[1]).strip() if row[1] else None
+                    if ic and alt:
+                        alt_map.setdefault(ic, []).append(alt)
+            except oracledb.Error:
+                pass
+        if not alt_map:
+            # Your table: ALTERNATEUOMCODE, MANUFACTURERID (VARCHAR)
+            try:
+                cursor.execute("""
+                    SELECT ITEMCODE, ALTERNATEUOMCODE FROM ITEMALTERNATEUOMMAP
+                    WHERE ITEMCODE IS NOT NULL AND ALTERNATEUOMCODE IS NOT NULL
+                """)
+                for row in cursor.fetchall():
+                    ic = str(row[0]).strip() if row[0] else None
+                    alt = str(row[1]).strip() if row[1] else None
+                    if ic and alt:
+                        alt_map.setdefault(ic, []).append(alt)
+                cursor.execute("""
+                    SELECT ITEMCODE, MANUFACTURERID FROM ITEMALTERNATEUOMMAP
+                    WHERE ITEMCODE IS NOT NULL AND MANUFACTURERID IS NOT NULL
+                """)
+                for row in cursor.fetchall():
+                    ic = str(row[0]).strip() if row[0] else None
+                    alt = str(row[1]).strip() if row[1] else None
+                    if ic and alt:
+                        lst = alt_map.setdefault(ic, [])
+                        if alt not in lst:
+                            lst.append(alt)
+            except oracledb.Error:
+                try:
+                    cursor.execute("""
+                        SELECT ITEMCODE, ALTERNATECODE FROM ITEMALTERNATEUOMMAP
+                        WHERE ITEMCODE IS NOT NULL AND ALTERNATECODE IS NOT NULL
+                    """)
+                    for row in cursor.fetchall():
+                        ic, alt = (str(row[0]).strip() if row[0] else None), (str(row[1]).strip() if row[1] else None)
+                        if ic and alt:
+                            alt_map.setdefault(ic, []).append(alt)
+                except oracledb.Error:
+                    pass
+        for rec in results:
+            itemcode = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
+            rec['ALTERNATECODES'] = alt_map.get(itemcode, [])
+        return results, alt_rows, master_count
+    except oracledb.Error as e:
+        print(f"Oracle get_products error: {e}")
+        return None
+    finally:
+        if cursor:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _load_products(location_code=None):
+    """
+    Product list for /api/products, rebuilt from the resident catalog: one store's partition when location_code
+    is given and the catalog has rows for it, otherwise every row. Mock data when Oracle unavailable.
+    """
+    catalog = _get_catalog(wait=True)
+    if not catalog:
+        return _get_products_mock_data()
+    rows = catalog.rows(location_code) if location_code else None
+    return rows if rows is not None else catalog.rows()
+
+
+@app.route('/api/products', methods=['GET'])
+def get_products():
+    """
+    Fetch products from ITEMMASTER and ITEMALTERNATEUOMMAP for the terminal's store (locationCode / login location).
+    Served from the pre-serialized products blob (ETag / 304).
+    """
+    return _catalog_blob_response('products')
+
+
+@app.route('/api/products/search', methods=['GET'])
+def search_products():
+    """Search products: check both ITEMMASTER and ITEMALTERNATEUOMMAP; return if either table has a match."""
+    q = (request.args.get('q') or request.args.get('code') or request.args.get('search') or '').strip()
+    if not q:
+        return jsonify([])
+    # Shared catalog first; no match there (e.g. item added since the last refresh) still searches Oracle
+    catalog = _get_catalog()
+    matches = catalog.search(q, _request_location_code()) if catalog and _SEARCH_SEP not in q else None
+    if matches:
+        return jsonify(matches)
+    conn = _get_connection(read_only=True)
+    if not conn:
+        return jsonify([])
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        seen = set()
+        results = []
+        search_pct = '%' + q.replace('%', '\\%').replace('_', '\\_') + '%'
+        # 1) ITEMMASTER: match itemcode, itemname, or manufacturerid
+        try:
+            cursor.execute("""
+                SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid
+                FROM itemmaster
+                WHERE UPPER(TRIM(TO_CHAR(itemcode))) LIKE UPPER(:q)
+                   OR UPPER(TRIM(itemname)) LIKE UPPER(:q)
+                   OR UPPER(TRIM(TO_CHAR(manufacturerid))) LIKE UPPER(:q)
+            """, q=search_pct)
+            cols = [c[0] for c in cursor.description]
+            for row in cursor.fetchall():
+                rec = dict(zip(cols, row))
+                ic = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
+                if ic and ic.upper() not in seen:
+                    seen.add(ic.upper())
+                    rec['ALTERNATECODES'] = []
+                    results.append(rec)
+        except oracledb.Error:
+            try:
+                cursor.execute("""
+                    SELECT locationcode, itemcode, itemname, categorycode, retailprice
+                    FROM itemmaster
+                    WHERE UPPER(TRIM(TO_CHAR(itemcode))) LIKE UPPER(:q)
+                       OR UPPER(TRIM(itemname)) LIKE UPPER(:q)
+                """, q=search_pct)
+                cols = [c[0] for c in cursor.description]
+                for row in cursor.fetchall():
+                    rec = dict(zip(cols, row))
+                    rec['manufacturerid'] = rec.get('ITEMCODE') or rec.get('itemcode')
+                    ic = str(rec.get('ITEMCODE') or rec.get('itemcode') or '').strip()
+                    if ic and ic.upper() not in seen:
+                        seen.add(ic.upper())
+                        rec['ALTERNATECODES'] = []
+                        results.append(rec)
+            except oracledb.Error:
+                pass
+        # 2) ITEMALTERNATEUOMMAP: match ALTERNATEUOMCODE / MANUFACTURERID (your columns), then get from ITEMMASTER
+        def add_from_alt_itemcodes(alt_itemcodes):
+            for row in (alt_itemcodes or []):
+                if not row or not row[0]:
+                    continue
+                ic = str(row[0]).strip()
+                if ic.upper() in seen:
+                    continue
+                seen.add(ic.upper())
+                try:
+                    cursor.execute("""
+                        SELECT locationcode, itemcode, itemname, categorycode, retailprice, manufacturerid
+                        FROM itemmaster
+                        WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
+                    """, code=ic)
+                    r = cursor.fetchone()
+                    if r:
+                        cols = [c[0] for c in cursor.description]
+                        rec = dict(zip(cols, r))
+                        rec['ALTERNATECODES'] = []
+                        results.append(rec)
+                except oracledb.Error:
+                    pass
+        try:
+            cursor.execute("""
+                SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
+                WHERE UPPER(TRIM(ALTERNATEUOMCODE)) LIKE UPPER(:q) OR UPPER(TRIM(MANUFACTURERID)) LIKE UPPER(:q)
+            """, q=search_pct)
+            add_from_alt_itemcodes(cursor.fetchall())
+        except oracledb.Error:
+            try:
+                cursor.execute("""
+                    SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
+                    WHERE UPPER(TRIM(TO_CHAR(ALTERNATECODE))) LIKE UPPER(:q)
+                """, q=search_pct)
+                add_from_alt_itemcodes(cursor.fetchall())
+            except oracledb.Error:
+                try:
+                    cursor.execute("""
+                        SELECT DISTINCT ITEMCODE FROM ITEMALTERNATEUOMMAP
+                        WHERE UPPER(TRIM(TO_CHAR(ALTERNATEITEMCODE))) LIKE UPPER(:q)
+                    """, q=search_pct)
+                    add_from_alt_itemcodes(cursor.fetchall())
+                except oracledb.Error:
+                    pass
+        return jsonify(results)
+    except oracledb.Error as e:
+        print(f"Product search error: {e}")
+        return jsonify([])
+    finally:
+        if cursor:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _get_products_mock_data():
+    """Fallback mock data when Oracle unavailable."""
+    return [
+        {"LOCATIONCODE": "020", "ITEMCODE": "1001", "ITEMNAME": "COCA COLA 500ML", "CATEGORYCODE": "BEVERAGES", "RETAILPRICE": "100", "MANUFACTUREID": "8901234567890", "ALTERNATECODES": []},
+        {"LOCATIONCODE": "020", "ITEMCODE": "1002", "ITEMNAME": "PEPSI 500ML", "CATEGORYCODE": "BEVERAGES", "RETAILPRICE": "100", "MANUFACTUREID": "8901234567891", "ALTERNATECODES": []},
+        {"LOCATIONCODE": "020", "ITEMCODE": "2001", "ITEMNAME": "ALMARAI MILK 1L", "CATEGORYCODE": "DAIRY", "RETAILPRICE": "100", "MANUFACTUREID": "8901234567892", "ALTERNATECODES": []},
+    ]
+
+
+# --- Resident product catalog (compact, array-backed, shared via mmap) ---
+# Every ITEMMASTER / ITEMALTERNATEUOMMAP product. Strings live in UTF-8 pools (one bytes blob + offsets),
+# low-cardinality columns (location, category, UOM) are interned to small ints, prices are a float array, and
+# code lookups binary-search sorted key tables - no per-item dicts or lists. One worker builds the catalog into
+# CATALOG_MMAP_PATH (immutable, replaced atomically on refresh); every worker maps that file read-only, so all
+# processes share the same pages and Oracle is queried once per refresh instead of once per worker.
+CATALOG_REFRESH_SECONDS = 600
+CATALOG_STAT_SECONDS = 2
+CATALOG_MMAP_PATH = os.environ.get('POS_CATALOG_PATH') or os.path.join(tempfile.gettempdir(), 'pos-catalog.bin')
+_CATALOG_MAGIC = b'POSCAT03'
+_NO_PRICE = float('nan')
+
+
+class StringPool:
+    """
+    Immutable list of strings stored as one UTF-8 blob plus an offsets array. '' stands in for None.
+    _data is bytes, or the catalog mmap with the blob starting at _base.
+    """
+    __slots__ = ('_data', '_base', '_offsets')
+
+    def __init__(self, values):
+        data = bytearray()
+        offsets = array('I', [0])
+        for v in values:
+            data += (v or '').encode('utf-8')
+            offsets.append(len(data))
+        self._data = bytes(data)
+        self._base = 0
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def raw(self, i):
+        return self._data[self._base + self._offsets[i]:self._base + self._offsets[i + 1]]
+
+    def get(self, i):
+        return self.raw(i).decode('utf-8') or None
+
+    def find_rows(self, needle):
+        """Indices of entries containing needle (bytes), in order; one scan of the blob, one hit per entry."""
+        base = self._base
+        end = base + self._offsets[len(self._offsets) - 1]
+        pos = self._data.find(needle, base, end)
+        while pos >= 0:
+            i = bisect_right(self._offsets, pos - base) - 1
+            yield i
+            pos = self._data.find(needle, base + self._offsets[i + 1], end)
+
+    @property
+    def nbytes(self):
+        return self._offsets[len(self._offsets) - 1] + self._offsets.itemsize * len(self._offsets)
+
+
+class InternTable:
+    """Small-cardinality string column: per-row array of indices into a shared value list (index 0 = None)."""
+    __slots__ = ('values', '_ids')
+
+    def __init__(self, column):
+        index = {None: 0}
+        self.values = [None]
+        ids = array('I')
+        for v in column:
+            i = index.get(v)
+            if i is None:
+                i = index[v] = len(self.values)
+                self.values.append(v)
+            ids.append(i)
+        self._ids = ids
+
+    def id(self, row):
+        return self._ids[row]
+
+    def get(self, row):
+        return self.values[self._ids[row]]
+
+    @property
+    def nbytes(self):
+        return self._ids.itemsize * len(self._ids)
+
+
+class KeyIndex:
+    """Sorted code -> row table. Keys are compared as UTF-8 bytes (same order as str); first row wins on duplicates."""
+    __slots__ = ('_keys', '_rows')
+
+    def __init__(self, pairs):
+        first = {}
+        for key, row in pairs:
+            if key and key not in first:
+                first[key] = row
+        ordered = sorted(first.items(), key=lambda kv: kv[0].encode('utf-8'))
+        self._keys = StringPool(k for k, _ in ordered)
+        self._rows = array('I', (r for _, r in ordered))
+
+    def find(self, key):
+        """Row for key, or None."""
+        target = key.encode('utf-8')
+        lo, hi = 0, len(self._rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._keys.raw(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._rows) and self._keys.raw(lo) == target:
+            return self._rows[lo]
+        return None
+
+    @property
+    def nbytes(self):
+        return self._keys.nbytes + self._rows.itemsize * len(self._rows)
+
+
+_SEARCH_SEP = '\x1f'
+_LOCATION_SEP = '\x1f'
+
+
+def _location_key(location_code):
+    return _code_str(location_code).upper()
+
+
+def _scoped_key(key, location_key):
+    """Code key qualified by store ('' when either part is empty, so KeyIndex skips it)."""
+    return f"{key}{_LOCATION_SEP}{location_key}" if key and location_key else ''
+
+
+def _code_str(value):
+    """Code value as stored text: ints stay digit strings, None -> ''."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class CompactCatalog:
+    """
+    Array-backed product catalog. rows() rebuilds the /api/products payload; lookup(code) resolves a barcode or
+    item code with lookup_product's ITEMMASTER-then-ITEMALTERNATEUOMMAP rules. Both take an optional store
+    (LOCATIONCODE): rows are then limited to that store's partition and lookups prefer that store's row.
+    """
+    __slots__ = ('size', 'master_count', 'loaded_at', 'change_seq', '_itemcode', '_itemcode_int', '_name', '_mfr', '_mfr_int',
+                 '_location', '_category', '_uom', '_price', '_alt_group', '_alt_codes', '_alt_code_off',
+                 '_master_keys', '_alt_keys', '_alt_item', '_alt_price', '_alt_uom', '_alt_location', '_search_master',
+                 '_search_alt', '_alt_search_item', '_loc_rows', '_loc_offsets')
+
+    def __init__(self, products, alternate_rows, master_count):
+        self.size = len(products)
+        self.master_count = master_count
+        self.loaded_at = time.time()
+        self.change_seq = 0  # highest POSCATALOGCHANGE CHANGESEQ committed before the rows were read
+        col = lambda name: [p.get(name) for p in products]
+        itemcodes = col('ITEMCODE')
+        mfrs = col('MANUFACTURERID')
+        # NUMBER vs VARCHAR2 code values differ per row (alternate-only rows carry text codes): 1 byte flag each
+        self._itemcode_int = array('b', (isinstance(v, int) for v in itemcodes))
+        self._mfr_int = array('b', (isinstance(v, int) for v in mfrs))
+        self._itemcode = StringPool(_code_str(v) for v in itemcodes)
+        self._name = StringPool(col('ITEMNAME'))
+        self._mfr = StringPool(_code_str(v) for v in mfrs)
+        self._location = InternTable(col('LOCATIONCODE'))
+        # Per-store partitions: row indices grouped by interned location id (CSR layout, rows ascending per store)
+        loc_ids = [self._location.id(i) for i in range(self.size)]
+        counts = [0] * len(self._location.values)
+        for lid in loc_ids:
+            counts[lid] += 1
+        self._loc_offsets = array('I', [0])
+        for n in counts:
+            self._loc_offsets.append(self._loc_offsets[-1] + n)
+        fill = list(self._loc_offsets[:-1])
+        loc_rows = array('I', [0]) * self.size
+        for i, lid in enumerate(loc_ids):
+            loc_rows[fill[lid]] = i
+            fill[lid] += 1
+        self._loc_rows = loc_rows
+        locs = [_location_key(v) for v in col('LOCATIONCODE')]
+        self._category = InternTable(col('CATEGORYCODE'))
+        self._uom = InternTable(col('BASEUOM'))
+        self._price = array('d', (_NO_PRICE if v is None else _to_float(v, _NO_PRICE) for v in col('RETAILPRICE')))
+
+        # ALTERNATECODES are per ITEMCODE: one code group per distinct itemcode, rows point at their group
+        groups = {}
+        group_ids = array('i')
+        codes = []
+        offsets = array('I', [0])
+        for p in products:
+            key = _code_str(p.get('ITEMCODE'))
+            g = groups.get(key)
+            if g is None:
+                alt = p.get('ALTERNATECODES') or []
+                if alt:
+                    g = groups[key] = len(offsets) - 1
+                    codes.extend(alt)
+                    offsets.append(len(codes))
+                else:
+                    g = -1
+            group_ids.append(g)
+        self._alt_group = group_ids
+        self._alt_codes = StringPool(codes)
+        self._alt_code_off = offsets
+
+        # ITEMMASTER keys: UPPER(TRIM(itemcode)) and UPPER(TRIM(manufacturerid)), master rows only; each also
+        # qualified by the row's store so a store-scoped lookup finds that store's row
+        self._master_keys = KeyIndex(
+            (key, i)
+            for i in range(master_count)
+            for v in (itemcodes[i], mfrs[i])
+            for key in (_code_str(v).upper(), _scoped_key(_code_str(v).upper(), locs[i]))
+        )
+        # ITEMALTERNATEUOMMAP keys: TRIM(manufacturerid / alternateuomcode / itemcode) -> alternate entry
+        by_ic_lc = {}
+        by_ic = {}
+        for i in range(master_count):
+            ic = _code_str(itemcodes[i]).upper()
+            by_ic.setdefault(ic, i)
+            by_ic_lc.setdefault((ic, _code_str(products[i].get('LOCATIONCODE')).upper()), i)
+        alt_item = array('i')
+        alt_price = array('d')
+        alt_uom = []
+        alt_locs = []
+        alt_pairs = []
+        # search_products text: UPPER(itemcode / itemname / manufacturerid) per master row, and
+        # UPPER(alternateuomcode / manufacturerid) per alternate row pointing at the first master row of its itemcode
+        self._search_master = StringPool(
+            _SEARCH_SEP.join((_code_str(itemcodes[i]), products[i].get('ITEMNAME') or '', _code_str(mfrs[i]), '')).upper()
+            for i in range(master_count)
+        )
+        search_alt = []
+        alt_search_item = array('i')
+        for ic, lc, mfr, price, uom in alternate_rows:
+            ic_key = _code_str(ic).upper()
+            lc_key = _code_str(lc).upper()
+            if ic_key in by_ic:
+                search_alt.append(_SEARCH_SEP.join((_code_str(uom), _code_str(mfr), '')).upper())
+                alt_search_item.append(by_ic[ic_key])
+            item = by_ic_lc.get((ic_key, lc_key)) if lc_key else by_ic.get(ic_key)
+            if item is None:
+                continue
+            entry = len(alt_item)
+            alt_item.append(item)
+            alt_price.append(_NO_PRICE if price is None else _to_float(price, _NO_PRICE))
+            alt_uom.append((str(uom).strip() or None) if uom is not None else None)
+            alt_locs.append(lc_key or None)
+            for code in (mfr, uom, ic):
+                alt_pairs.append((_code_str(code), entry))
+                alt_pairs.append((_scoped_key(_code_str(code), lc_key), entry))
+        self._alt_keys = KeyIndex(alt_pairs)
+        self._alt_item = alt_item
+        self._alt_price = alt_price
+        self._alt_uom = InternTable(alt_uom)
+        self._alt_location = InternTable(alt_locs)
+        self._search_alt = StringPool(search_alt)
+        self._alt_search_item = alt_search_item
+
+    @staticmethod
+    def _code_value(pool, int_flags, i):
+        v = pool.get(i)
+        return int(v) if int_flags[i] and v is not None else v
+
+    def alternate_codes(self, i):
+        g = self._alt_group[i]
+        if g < 0:
+            return []
+        return [self._alt_codes.get(j) for j in range(self._alt_code_off[g], self._alt_code_off[g + 1])]
+
+    def record(self, i):
+        """Product i as an /api/products row."""
+        price = self._price[i]
+        return {
+            'LOCATIONCODE': self._location.get(i),
+            'ITEMCODE': self._code_value(self._itemcode, self._itemcode_int, i),
+            'ITEMNAME': self._name.get(i),
+            'CATEGORYCODE': self._category.get(i),
+            'RETAILPRICE': None if price != price else price,
+            'MANUFACTURERID': self._code_value(self._mfr, self._mfr_int, i),
+            'BASEUOM': self._uom.get(i),
+            'ALTERNATECODES': self.alternate_codes(i),
+        }
+
+    def find_item(self, item_code, location_code=None):
+        """ITEMMASTER row of item_code (at that store when given, else any store), or None."""
+        key = _code_str(item_code).upper()
+        if not key:
+            return None
+        loc = _location_key(location_code)
+        i = self._master_keys.find(_scoped_key(key, loc) if loc else key)
+        if i is None or self._itemcode.get(i).upper() != key:  # key matched another item's MANUFACTURERID
+            return None
+        return i
+
+    def _location_id(self, location_code):
+        """Interned id of a store, or None if the catalog has no rows for it."""
+        key = _location_key(location_code)
+        for lid, value in enumerate(self._location.values):
+            if lid and _location_key(value) == key:
+                return lid
+        return None
+
+    def _partition(self, lid):
+        return self._loc_rows[self._loc_offsets[lid]:self._loc_offsets[lid + 1]]
+
+    def rows(self, location_code=None):
+        """All rows, or one store's rows plus rows without LOCATIONCODE. None if the store has no rows."""
+        if not location_code:
+            return [self.record(i) for i in range(self.size)]
+        lid = self._location_id(location_code)
+        if lid is None:
+            return None
+        return [self.record(i) for i in sorted(list(self._partition(lid)) + list(self._partition(0)))]
+
+    def _at_location(self, i, location_key):
+        """Same item's row at the given store when row i belongs to another store and the store stocks it."""
+        if not location_key or _location_key(self._location.get(i)) in ('', location_key):
+            return i
+        itemcode = self._itemcode.get(i)
+        j = self._master_keys.find(_scoped_key(itemcode.upper(), location_key)) if itemcode else None
+        return i if j is None else j
+
+    def lookup(self, code, location_code=None):
+        """
+        Resolve code like lookup_product: returns (record, itemcode_from_alt, alt_price, alt_uom) with record in
+        lookup_product's column layout, or None when the code is not in the catalog. With a store, that store's
+        ITEMMASTER / ITEMALTERNATEUOMMAP rows win over other stores', and alternate price / UOM come only from an
+        alternate row at that store (or one without LOCATIONCODE).
+        """
+        code = (code or '').strip()
+        if not code:
+            return None
+        loc = _location_key(location_code)
+        i = self._master_keys.find(_scoped_key(code.upper(), loc)) if loc else None
+        if i is None:
+            i = self._master_keys.find(code.upper())
+        alt = None
+        if i is None:
+            entry = self._alt_keys.find(_scoped_key(code, loc)) if loc else None
+            if entry is None:
+                entry = self._alt_keys.find(code)
+            if entry is None:
+                return None
+            i = self._alt_item[entry]
+            alt_loc = self._alt_location.get(entry)
+            if loc and alt_loc and alt_loc != loc:
+                # another store's alternate row: the item still resolves, but its price and UOM are that store's
+                alt = (None, None)
+            else:
+                price = self._alt_price[entry]
+                alt = (None if price != price else price, self._alt_uom.get(entry))
+        rec = self.record(self._at_location(i, loc))
+        result = {
+            'LOCATIONCODE': rec['LOCATIONCODE'],
+            'ITEMCODE': rec['ITEMCODE'],
+            'ITEMNAME': rec['ITEMNAME'],
+            'CATEGORYCODE': rec['CATEGORYCODE'],
+            'RETAILPRICE': rec['RETAILPRICE'],
+            'MANUFACTUREID': rec['MANUFACTURERID'],
+            'BASEUOM': rec['BASEUOM'],
+        }
+        if alt is None:
+            return result, None, None, None
+        return result, _code_str(rec['ITEMCODE']), alt[0], alt[1]
+
+    def search(self, q, location_code=None):
+        """search_products over the catalog: ITEMMASTER text matches first, then items matched via ITEMALTERNATEUOMMAP."""
+        needle = q.upper().encode('utf-8')
+        loc = _location_key(location_code)
+        seen = set()
+        results = []
+
+        def add(i):
+            i = self._at_location(i, loc)
+            key = self._itemcode.get(i)
+            if key and key.upper() not in seen:
+                seen.add(key.upper())
+                rec = self.record(i)
+                del rec['BASEUOM']
+                rec['ALTERNATECODES'] = []
+                results.append(rec)
+        for i in self._search_master.find_rows(needle):
+            add(i)
+        for entry in self._search_alt.find_rows(needle):
+            add(self._alt_search_item[entry])
+        return results
+
+    @property
+    def nbytes(self):
+        """Approximate resident size of the arrays and pools (excludes the small interned value lists)."""
+        parts = (self._itemcode, self._name, self._mfr, self._location, self._category, self._uom,
+                 self._alt_codes, self._master_keys, self._alt_keys, self._alt_uom, self._alt_location, self._search_master,
+                 self._search_alt)
+        arrays = (self._price, self._itemcode_int, self._mfr_int, self._alt_group, self._alt_code_off, self._alt_item,
+                  self._alt_price, self._alt_search_item, self._loc_rows, self._loc_offsets)
+        return sum(p.nbytes for p in parts) + sum(a.itemsize * len(a) for a in arrays)
+
+
+# Catalog file: MAGIC, header offset/length (two little-endian u64), 8-byte aligned sections (array data and string
+# blobs), then a JSON header describing how to rebuild the objects over the mapped sections.
+_CATALOG_TYPES = {cls.__name__: cls for cls in (StringPool, InternTable, KeyIndex, CompactCatalog)}
+
+
+def _pack_catalog(obj, sections, name):
+    """JSON description of obj; arrays and bytes blobs are appended to sections as (name, buffer)."""
+    if isinstance(obj, array):
+        sections.append((name, obj))
+        return {'a': name, 't': obj.typecode}
+    if isinstance(obj, bytes):
+        sections.append((name, obj))
+        return {'b': name}
+    if type(obj).__name__ in _CATALOG_TYPES:
+        return {'o': type(obj).__name__,
+                'f': {slot: _pack_catalog(getattr(obj, slot), sections, f"{name}.{slot}")
+                      for slot in obj.__slots__ if slot != '_base'}}
+    return {'v': obj}
+
+
+def _unpack_catalog(desc, mm, view, layout):
+    if 'a' in desc:
+        offset, size = layout[desc['a']]
+        return view[offset:offset + size].cast(desc['t'])
+    if 'o' in desc:
+        cls = _CATALOG_TYPES[desc['o']]
+        obj = cls.__new__(cls)
+        for slot, field in desc['f'].items():
+            if 'b' in field:
+                # string blob: read straight from the mmap (slicing an mmap returns bytes, not a copy of the file)
+                obj._base = layout[field['b']][0]
+                setattr(obj, slot, mm)
+            else:
+                setattr(obj, slot, _unpack_catalog(field, mm, view, layout))
+        return obj
+    return desc['v']
+
+
+def _write_catalog_file(catalog, path):
+    """Write catalog to a temp file next to path, then atomically replace path (readers keep their old mapping)."""
+    sections = []
+    root = _pack_catalog(catalog, sections, 'catalog')
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_CATALOG_MAGIC + struct.pack('<QQ', 0, 0))
+            layout = {}
+            for name, buf in sections:
+                f.write(b'\0' * (-f.tell() % 8))
+                data = buf.tobytes() if isinstance(buf, array) else buf
+                layout[name] = (f.tell(), len(data))
+                f.write(data)
+            header = json.dumps({'root': root, 'layout': layout}).encode('utf-8')
+            header_at = f.tell()
+            f.write(header)
+            f.seek(len(_CATALOG_MAGIC))
+            f.write(struct.pack('<QQ', header_at, len(header)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _map_catalog_file(path):
+    """Map a catalog file read-only; returns (catalog, file id) or (None, None) if missing or not a catalog file."""
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None, None
+    if mm[:len(_CATALOG_MAGIC)] != _CATALOG_MAGIC:
+        mm.close()
+        return None, None
+    try:
+        header_at, header_len = struct.unpack_from('<QQ', mm, len(_CATALOG_MAGIC))
+        header = json.loads(mm[header_at:header_at + header_len].decode('utf-8'))
+        catalog = _unpack_catalog(header['root'], mm, memoryview(mm), header['layout'])
+    except (struct.error, ValueError, KeyError, TypeError, IndexError) as e:
+        print(f"[Catalog] cannot map {path}: {e}")
+        try:
+            mm.close()
+        except BufferError:
+            pass  # views made before the error still point into it; the map goes with them
+        return None, None
+    return catalog, (st.st_ino, st.st_mtime_ns)
+
+
+_catalog = None
+_catalog_file_id = None
+_catalog_checked_at = 0.0
+_catalog_lock = threading.Lock()
+_catalog_refresh_lock = threading.Lock()  # held by the one background refresh
+_catalog_rerun_after = 0.0
+_catalog_rerun_primary = False
+
+
+def _use_catalog(catalog, file_id):
+    global _catalog, _catalog_file_id, _catalog_checked_at
+    _catalog = catalog
+    _catalog_file_id = file_id
+    _catalog_checked_at = time.time()
+    _invalidate_single_flight('/api/products/top')
+    return catalog
+
+
+def _build_catalog(newer_than):
+    """
+    Make sure CATALOG_MMAP_PATH holds a catalog loaded after newer_than and no older than the latest committed
+    change seq, and map it. Only one worker rebuilds at a time (flock on a side file); workers that waited for it
+    map the fresh file instead of querying Oracle again. Falls back to an in-process catalog if the shared file
+    cannot be written. None if Oracle unavailable.
+    """
+    lock_file = None
+    try:
+        if fcntl is not None:
+            try:
+                lock_file = open(CATALOG_MMAP_PATH + '.lock', 'a+b')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except OSError as e:
+                print(f"[Catalog] build lock unavailable: {e}")
+        started = time.time()
+        change_seq = _latest_catalog_change_seq()
+        catalog, file_id = _map_catalog_file(CATALOG_MMAP_PATH)
+        if catalog is not None and catalog.loaded_at > newer_than and catalog.change_seq >= change_seq:
+            return _use_catalog(catalog, file_id)
+        fetched = _fetch_catalog_rows()
+        if not fetched:
+            return None
+        _sync_code_map()
+        products, alternate_rows, master_count = fetched
+        built = CompactCatalog(products, alternate_rows, master_count)
+        built.loaded_at = started  # rows read after this, so a build started before a change is not "newer"
+        built.change_seq = change_seq
+        try:
+            _write_catalog_file(built, CATALOG_MMAP_PATH)
+            catalog, file_id = _map_catalog_file(CATALOG_MMAP_PATH)
+        except OSError as e:
+            print(f"[Catalog] shared file write error ({CATALOG_MMAP_PATH}): {e}")
+            catalog = None
+            _catalog_refresh_per_worker()
+        if catalog is None:
+            catalog, file_id = built, None
+        print(f"[Catalog] loaded {catalog.size} products, ~{catalog.nbytes // 1024} KiB")
+        return _use_catalog(catalog, file_id)
+    finally:
+        if lock_file is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except OSError:
+                pass
+            lock_file.close()
+
+
+def _refresh_catalog_async(newer_than=None, primary=False):
+    """Rebuild in the background. primary=True (after a change): read the primary, not a possibly lagging replica."""
+    global _catalog_rerun_after, _catalog_rerun_primary
+    if newer_than is None:
+        newer_than = time.time() - CATALOG_REFRESH_SECONDS
+    if not _catalog_refresh_lock.acquire(blocking=False):
+        # the running refresh may have read the rows before this request's change: build again after it
+        _catalog_rerun_after = max(_catalog_rerun_after, newer_than)
+        _catalog_rerun_primary = _catalog_rerun_primary or primary
+        return
+
+    def run():
+        global _catalog_rerun_after, _catalog_rerun_primary
+        target, on_primary = newer_than, primary
+        try:
+            while target:
+                _read_primary.active = on_primary
+                try:
+                    with _catalog_lock:
+                        _build_catalog(target)
+                finally:
+                    _read_primary.active = False
+                target, _catalog_rerun_after = _catalog_rerun_after, 0.0
+                on_primary, _catalog_rerun_primary = _catalog_rerun_primary, False
+        except Exception as e:
+            print(f"[Catalog] refresh error: {e}")
+        finally:
+            _catalog_refresh_lock.release()
+        if _catalog_rerun_after:
+            # asked for after the loop's last check, while the lock was still held
+            target, _catalog_rerun_after = _catalog_rerun_after, 0.0
+            on_primary, _catalog_rerun_primary = _catalog_rerun_primary, False
+            _refresh_catalog_async(target, on_primary)
+    threading.Thread(target=run, name='catalog-refresh', daemon=True).start()
+
+
+def _check_catalog_file():
+    """Remap when another worker has swapped in a new catalog file (checked at most every CATALOG_STAT_SECONDS)."""
+    global _catalog_checked_at
+    now = time.time()
+    if now - _catalog_checked_at < CATALOG_STAT_SECONDS:
+        return
+    _catalog_checked_at = now
+    try:
+        st = os.stat(CATALOG_MMAP_PATH)
+    except OSError:
+        return
+    if (st.st_ino, st.st_mtime_ns) != _catalog_file_id:
+        catalog, file_id = _map_catalog_file(CATALOG_MMAP_PATH)
+        if catalog is None:
+            return
+        if _catalog is None:
+            # first access in this worker: adopt the shared file only if it is current (not left over from a restart)
+            if now - catalog.loaded_at < CATALOG_REFRESH_SECONDS:
+                _use_catalog(catalog, file_id)
+        elif catalog.loaded_at >= _catalog.loaded_at:
+            _use_catalog(catalog, file_id)
+
+
+def _get_catalog(wait=False):
+    """
+    Current resident catalog. wait=True loads it inline when there is none yet (returns None if Oracle is
+    unavailable); wait=False never blocks and starts a background load instead. Stale catalogs are served
+    while a background refresh runs.
+    """
+    _check_catalog_file()
+    catalog = _catalog
+    if catalog is not None:
+        if time.time() - catalog.loaded_at >= _stale_after(CATALOG_REFRESH_SECONDS):
+            _refresh_catalog_async()
+        return catalog
+    if not wait:
+        _refresh_catalog_async()
+        return None
+    with _catalog_lock:
+        return _catalog or _build_catalog(time.time() - CATALOG_REFRESH_SECONDS)
+
+
+def _invalidate_catalog():
+    """
+    Rebuild the shared catalog from the primary in the background (a replica may not have the change yet); the
+    current one is served until the new file is swapped in.
+    """
+    _refresh_catalog_async(newer_than=time.time(), primary=True)
+
+
+def _refresh_catalog_job():
+    """
+    Scheduled rebuild, also warming the catalog at startup. One worker runs it and the others remap the new file;
+    without the shared file (no fcntl, or the file cannot be written) every worker runs it for its own catalog.
+    """
+    with _catalog_lock:
+        if _build_catalog(time.time() - CATALOG_REFRESH_SECONDS / 2) is None:
+            raise RuntimeError('Database unavailable')
+
+
+def _catalog_refresh_per_worker():
+    """
+    Switch catalog-refresh to every worker: this one's builds are not shared. The others follow once the shared
+    last-run stamp goes stale and their own write fails.
+    """
+    with _jobs_lock:
+        job = _jobs.get('catalog-refresh')
+        if job is None or not job.singleton:
+            return
+        job.singleton = False
+    print("[Catalog] shared file unavailable, catalog-refresh now runs in every worker")
+
+
+_schedule_job('catalog-refresh', _refresh_catalog_job, every=CATALOG_REFRESH_SECONDS, singleton=fcntl is not None,
+              initial_delay=0)
+
+
+# --- Read replica routing ---
+# Optional read-only replica (e.g. an Active Data Guard standby, POS_REPLICA_DSN) for catalog, customer and
+# reporting reads, so shift-start pulls do not compete with checkout commits on the primary. Call sites whose
+# statements are plain SELECTs ask for _get_connection(read_only=True); they get a pooled replica connection when
+# the current route is in REPLICA_READ_ROUTES (background jobs and catalog builds qualify, except a catalog rebuild
+# triggered by a change, which reads the primary) and the replica is up. A failed replica connect falls back to the primary and the replica is retried after REPLICA_RETRY_SECONDS.
+REPLICA_DSN = (os.environ.get('POS_REPLICA_DSN') or '').strip() or None
+REPLICA_POOL_MAX = int(os.environ.get('POS_REPLICA_POOL_MAX') or 8)
+REPLICA_WAIT_MS = 2000  # all replica connections busy for this long: use the primary for this read
+REPLICA_RETRY_SECONDS = 30
+# Routes that read the primary's latest writes (checkout, bill numbers, holds, counter state, the change feed
+# paired with the catalog's change seq) are left out and always use the primary.
+REPLICA_READ_ROUTES = frozenset(
+    name.strip() for name in (os.environ.get('POS_REPLICA_ROUTES') or ','.join((
+        'get_products', 'search_products', 'lookup_product', 'lookup_products_batch', 'get_top_products',
+        'get_catalog_blob', 'bootstrap', 'get_customers', 'search_customers', 'list_counters', 'counter_summary',
+    ))).split(',') if name.strip()
+)
+_replica_pool = None
+_replica_down_until = 0.0
+_replica_lock = threading.Lock()
+_replica_connections = weakref.WeakSet()
+_replica_stats = {'replica': 0, 'fallback': 0, 'busy': 0}
+_read_primary = threading.local()  # .active: this thread's reads must see the primary's latest commits
+
+
+def _replica_allowed():
+    """Whether read-only statements of the current route (or background work) may run on the replica."""
+    if getattr(_read_primary, 'active', False):
+        return False
+    return not has_request_context() or request.endpoint in REPLICA_READ_ROUTES
+
+
+def _get_replica_connection():
+    """Pooled replica connection, or None when the replica is down, being retried later, or saturated."""
+    global _replica_pool, _replica_down_until
+    if time.time() < _replica_down_until:
+        return None
+    with _replica_lock:
+        if _replica_pool is None:
+            try:
+                _replica_pool = oracledb.create_pool(
+                    user=ORACLE_CONFIG['user'],
+                    password=ORACLE_CONFIG['password'],
+                    dsn=REPLICA_DSN,
+                    min=0,
+                    max=REPLICA_POOL_MAX,
+                    increment=1,
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=REPLICA_WAIT_MS,
+                )
+            except oracledb.Error as e:
+                print(f"[Replica] pool create failed: {e}")
+                _replica_down_until = time.time() + REPLICA_RETRY_SECONDS
+                return None
+    try:
+        conn = _replica_pool.acquire()
+    except oracledb.Error as e:
+        if 'DPY-4005' in str(e):
+            _replica_stats['busy'] += 1
+            return None
+        print(f"[Replica] connection failed, reading from the primary for {REPLICA_RETRY_SECONDS}s: {e}")
+        _replica_down_until = time.time() + REPLICA_RETRY_SECONDS
+        return None
+    _replica_connections.add(conn)
+    return conn
+
+
+def _on_replica(conn):
+    """True for a replica connection (read-only: skip table-creation checks, never write)."""
+    return conn in _replica_connections
+
+
+@app.route('/api/admin/replica', methods=['GET'])
+def replica_status():
+    """Replica routing: configured DSN, routes using it, down-until and connection counters. Manager/IT only."""
+    _, err = _require_manager()
+    if err:
+        return err
+    down = _replica_down_until > time.time()
+    return jsonify({"ok": True, "configured": REPLICA_DSN is not None, "dsn": REPLICA_DSN,
+                    "routes": sorted(REPLICA_READ_ROUTES), "pool": {"max": REPLICA_POOL_MAX,
+                    "open": _replica_pool.opened if _replica_pool is not None else 0},
+                    "downUntil": datetime.datetime.fromtimestamp(_replica_down_until).isoformat(timespec='seconds')
+                    if down else None, **_replica_stats})
+
+
+# --- Hold / cart bills (Oracle) or in-memory fallback ---
+# Change this constant when you rename the DB table (one place for all hold/cart SQL).
+HOLD_TABLE_NAME = 'TEMPBILLHDR'
+HOLD_DTL_TABLE_NAME = 'TEMPBILLDTL'
+BILLNO_TABLE_NAME = 'BILLNOTABLE'
+BILLDTL_TABLE_NAME = 'BILLDTL'
+BILLHDR_TABLE_NAME = 'BILLHDR'
+# BILLNOTABLE columns: BILLNO NUMBER, FLAG CHAR(1) DEFAULT 'n' (n/y), BILLDATE (required), COUNTERCODE (optional).
+# BILLDTL (paid bill detail): LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE. Insert on Pay.
+# BILLHDR (bill header on Pay): LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE (C/R from INVOICECODE 1=C 2=R), COUNTERCODE, RESETNO=1, SESSIONCODE=0.
+# HOLD table (TEMPBILLHDR): BILLNO, LOCATIONCODE, FLAG. At HOLD time FLAG=0 (held); draft FLAG=1.
+# HOLD detail (TEMPBILLDTL): BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, FLAG. At hold FLAG=0.
+FLAG_HELD = 0   # TEMPBILLHDR/TEMPBILLDTL: when bill is held
+FLAG_DRAFT = 1  # TEMPBILLHDR: when bill is draft/current cart
+_held_bills_fallback = {}  # key: (location_code, bill_no) -> { "counterCode", "heldDate", "customerCode", "items": [...] }
+
+
+def _get_connection(read_only=False):
+    """Primary connection; with read_only=True a replica connection where the routing policy allows it."""
+    if read_only and REPLICA_DSN and _replica_allowed():
+        conn = _get_replica_connection()
+        if conn is not None:
+            _replica_stats['replica'] += 1
+            return conn
+        _replica_stats['fallback'] += 1
+    try:
+        return oracledb.connect(
+            user=ORACLE_CONFIG['user'],
+            password=ORACLE_CONFIG['password'],
+            dsn=ORACLE_CONFIG['dsn']
+        )
+    except oracledb.Error as e:
+        print(f"[Hold] Oracle connection failed: {e}")
+        return None
+
+
+def _ensure_tempbillhdr(cur):
+    """Create hold table if it does not exist. Ignore ORA-00955 (exists) and ORA-01031 (no create priv)."""
+    create_sql = f"""
+        CREATE TABLE {HOLD_TABLE_NAME} (
+            BILLNO NUMBER NOT NULL,
+            LOCATIONCODE NUMBER NOT NULL,
+            FLAG NUMBER DEFAULT 1
+        )
+    """
+    try:
+        cur.execute(create_sql)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' in err_str or '00955' in err_str:
+            pass
+        elif 'ORA-01031' in err_str or '01031' in err_str:
+            pass
+        else:
+            print(f"[Hold] {HOLD_TABLE_NAME} create failed: {e}")
+            raise
+
+
+def _ensure_tempbilldtl(cur):
+    """Create TEMPBILLDTL if it does not exist. BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, FLAG (default 1; when hold set 0)."""
+    create_sql = f"""
+        CREATE TABLE {HOLD_DTL_TABLE_NAME} (
+            BILLNO NUMBER NOT NULL,
+            SLNO NUMBER NOT NULL,
+            ITEMCODE VARCHAR2(50),
+            QUANTITY NUMBER DEFAULT 1,
+            RATE NUMBER DEFAULT 0,
+            MANUFACTURERID VARCHAR2(50),
+            FLAG NUMBER DEFAULT 1
+        )
+    """
+    try:
+        cur.execute(create_sql)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' in err_str or '00955' in err_str:
+            pass
+        elif 'ORA-01031' in err_str or '01031' in err_str:
+            pass
+        else:
+            print(f"[Hold] {HOLD_DTL_TABLE_NAME} create failed: {e}")
+            raise
+
+
+def _to_int(val, default=0):
+    """Coerce to int for Oracle NUMBER; avoid ORA-01722."""
+    if val is None:
+        return default
+    try:
+        return int(float(val))
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(val, default=0.0):
+    """Coerce to float for Oracle NUMBER; avoid ORA-01722."""
+    if val is None:
+        return default
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_quantity(val, default=1):
+    """Line quantity for TEMPBILLDTL: whole counts stay ints, weighed quantities (1.234 kg) keep their fraction."""
+    qty = _to_float(val, default)
+    return int(qty) if qty.is_integer() else qty
+
+
+def _hold_hdr_rows(qty):
+    """TEMPBILLHDR rows for a cart line: one per unit for a whole count, one for a weighed quantity."""
+    return int(qty) if isinstance(qty, int) and qty > 1 else 1
+
+
+def _resolve_itemcode_location_from_alternate(cur, code):
+    """
+    Resolve barcode/code to (ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE) from ITEMALTERNATEUOMMAP.
+    Returns (itemcode_str, locationcode_or_none, retailprice_or_none, alternateuomcode_or_none).
+    """
+    if not code or not str(code).strip():
+        return None, None, None, None
+    code_str = str(code).strip()
+    mapped = _resolve_alternate_from_code_map(cur, code_str)
+    if mapped:
+        return mapped
+    # 1) ITEMALTERNATEUOMMAP: get ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE
+    try:
+        cur.execute("""
+            SELECT ITEMCODE, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE FROM ITEMALTERNATEUOMMAP
+            WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
+               OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
+               OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
+            AND ROWNUM = 1
+        """, code=code_str)
+        row = cur.fetchone()
+        if row and row[0]:
+            loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
+            price = row[2] if len(row) > 2 and row[2] is not None else None
+            alt_uom = row[3] if len(row) > 3 and row[3] is not None else None
+            if alt_uom is not None:
+                alt_uom = str(alt_uom).strip() or None
+            return str(row[0]).strip(), (loc if loc else None), price, alt_uom
+    except oracledb.Error:
+        try:
+            cur.execute("""
+                SELECT ITEMCODE, LOCATIONCODE, RETAILPRICE FROM ITEMALTERNATEUOMMAP
+                WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
+                   OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
+                   OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
+                AND ROWNUM = 1
+            """, code=code_str)
+            row = cur.fetchone()
+            if row and row[0]:
+                loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
+                price = row[2] if len(row) > 2 and row[2] is not None else None
+                return str(row[0]).strip(), (loc if loc else None), price, None
+        except oracledb.Error:
+            try:
+                cur.execute("""
+                    SELECT ITEMCODE, LOCATIONCODE FROM ITEMALTERNATEUOMMAP
+                    WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
+                       OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
+                       OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
+                    AND ROWNUM = 1
+                """, code=code_str)
+                row = cur.fetchone()
+                if row and row[0]:
+                    loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
+                    return str(row[0]).strip(), (loc if loc else None), None, None
+            except oracledb.Error:
+                try:
+                    cur.execute("""
+                        SELECT ITEMCODE FROM ITEMALTERNATEUOMMAP
+                        WHERE ((MANUFACTURERID IS NOT NULL AND TRIM(MANUFACTURERID) = TRIM(:code))
+                           OR (ALTERNATEUOMCODE IS NOT NULL AND TRIM(ALTERNATEUOMCODE) = TRIM(:code))
+                           OR (ITEMCODE IS NOT NULL AND TRIM(TO_CHAR(ITEMCODE)) = TRIM(:code)))
+                        AND ROWNUM = 1
+                    """, code=code_str)
+                    row = cur.fetchone()
+                    if row and row[0]:
+                        return str(row[0]).strip(), None, None, None
+                except oracledb.Error as e:
+                    print(f"[ITEMALTERNATEUOMMAP] lookup fallback error: {e}")
+    # 2) Discovered table/columns
+    qualified, itemcode_col, alternate_cols = _get_alternate_uom_table_info(cur)
+    if qualified and itemcode_col and alternate_cols:
+        for col in alternate_cols:
+            try:
+                cur.execute(f"""
+                    SELECT {itemcode_col}, LOCATIONCODE, RETAILPRICE, ALTERNATEUOMCODE FROM {qualified}
+                    WHERE {col} IS NOT NULL AND TRIM(TO_CHAR(NVL({col}, 0), '{_ORACLE_NUM_FMT}')) = TRIM(:code)
+                    AND ROWNUM = 1
+                """, code=code_str)
+                row = cur.fetchone()
+                if row and row[0]:
+                    loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
+                    price = row[2] if len(row) > 2 and row[2] is not None else None
+                    alt_uom = row[3] if len(row) > 3 and row[3] is not None else None
+                    if alt_uom is not None:
+                        alt_uom = str(alt_uom).strip() or None
+                    return str(row[0]).strip(), (loc if loc else None), price, alt_uom
+            except oracledb.Error:
+                try:
+                    cur.execute(f"""
+                        SELECT {itemcode_col}, LOCATIONCODE, RETAILPRICE FROM {qualified}
+                        WHERE TRIM({col}) = TRIM(:code) AND ROWNUM = 1
+                    """, code=code_str)
+                    row = cur.fetchone()
+                    if row and row[0]:
+                        loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
+                        price = row[2] if len(row) > 2 and row[2] is not None else None
+                        return str(row[0]).strip(), (loc if loc else None), price, None
+                except oracledb.Error:
+                    try:
+                        cur.execute(f"""
+                            SELECT {itemcode_col}, LOCATIONCODE FROM {qualified}
+                            WHERE TRIM({col}) = TRIM(:code) AND ROWNUM = 1
+                        """, code=code_str)
+                        row = cur.fetchone()
+                        if row and row[0]:
+                            loc = str(row[1]).strip() if len(row) > 1 and row[1] is not None else None
+                            return str(row[0]).strip(), (loc if loc else None), None, None
+                    except oracledb.Error:
+                        try:
+                            cur.execute(f"""
+                                SELECT {itemcode_col} FROM {qualified}
+                                WHERE TRIM({col}) = TRIM(:code) AND ROWNUM = 1
+                            """, code=code_str)
+                            row = cur.fetchone()
+                            if row and row[0]:
+                                return str(row[0]).strip(), None, None, None
+                        except oracledb.Error:
+                            pass
+    return None, None, None, None
+
+
+def _resolve_itemcode_from_alternate(cur, code):
+    """Resolve barcode/code to ITEMCODE from ITEMALTERNATEUOMMAP. Returns itemcode or None."""
+    ic, _, _, _ = _resolve_itemcode_location_from_alternate(cur, code)
+    return ic
+
+
+def _get_item_names_from_master(cur, itemcodes):
+    """Look up ITEMNAME from itemmaster by ITEMCODE; also resolve via ITEMALTERNATEUOMMAP. Returns dict itemcode_str -> itemname."""
+    codes = [str(c).strip() for c in (itemcodes or []) if c is not None and str(c).strip()]
+    if not codes:
+        return {}
+    names = {}
+    for code in set(codes):
+        try:
+            cur.execute("""
+                SELECT itemname FROM itemmaster
+                WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1
+            """, code=code)
+            row = cur.fetchone()
+            if row and row[0]:
+                names[code] = str(row[0]).strip()
+        except oracledb.Error:
+            try:
+                cur.execute("SELECT itemname FROM itemmaster WHERE TRIM(itemcode) = :code AND ROWNUM = 1", code=code)
+                row = cur.fetchone()
+                if row and row[0]:
+                    names[code] = str(row[0]).strip()
+            except oracledb.Error:
+                pass
+        if code not in names:
+            itemcode = _resolve_itemcode_from_alternate(cur, code)
+            if itemcode:
+                try:
+                    cur.execute("SELECT itemname FROM itemmaster WHERE UPPER(TRIM(TO_CHAR(itemcode))) = UPPER(:code) AND ROWNUM = 1", code=itemcode)
+                    row = cur.fetchone()
+                    if row and row[0]:
+                        names[code] = str(row[0]).strip()
+                except oracledb.Error:
+                    pass
+    return names
+
+
+def _location_to_num(location_code, default=1):
+    """Convert location code to NUMBER for hold table (LOCATIONCODE is NUMBER)."""
+    s = str(location_code or '').strip()
+    if not s:
+        return default
+    if s.isdigit():
+        return _to_int(s, default)
+    digits = ''.join(c for c in s if c.isdigit())
+    return _to_int(digits, default) if digits else default
+
+
+def _ensure_billnotable(cur):
+    """Create BILLNOTABLE if not exists. Columns: BILLNO NUMBER, FLAG CHAR(1) DEFAULT 'n', BILLDATE DATE, COUNTERCODE VARCHAR2(50)."""
+    create_sql = f"""
+        CREATE TABLE {BILLNO_TABLE_NAME} (
+            BILLNO NUMBER NOT NULL,
+            FLAG CHAR(1) DEFAULT 'n',
+            BILLDATE DATE DEFAULT SYSDATE NOT NULL,
+            COUNTERCODE VARCHAR2(50)
+        )
+    """
+    try:
+        cur.execute(create_sql)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' in err_str or '00955' in err_str:
+            pass
+        elif 'ORA-01031' in err_str or '01031' in err_str:
+            pass
+        else:
+            print(f"[BillNo] {BILLNO_TABLE_NAME} create failed: {e}")
+            raise
+
+
+def _ensure_billdtl(cur):
+    """Create BILLDTL if not exists. Columns: LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE."""
+    create_sql = f"""
+        CREATE TABLE {BILLDTL_TABLE_NAME} (
+            LOCATIONCODE VARCHAR2(50),
+            BILLNO NUMBER NOT NULL,
+            SLNO NUMBER NOT NULL,
+            ITEMCODE VARCHAR2(50),
+            QUANTITY NUMBER,
+            RATE NUMBER
+        )
+    """
+    try:
+        cur.execute(create_sql)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' in err_str or '00955' in err_str:
+            pass
+        elif 'ORA-01031' in err_str or '01031' in err_str:
+            pass
+        else:
+            print(f"[BILLDTL] create failed: {e}")
+            raise
+
+
+def _ensure_billhdr(cur):
+    """Create BILLHDR if not exists. Columns: LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE, COUNTERCODE, RESETNO, SESSIONCODE."""
+    create_sql = f"""
+        CREATE TABLE {BILLHDR_TABLE_NAME} (
+            LOCATIONCODE VARCHAR2(50),
+            BILLNO NUMBER NOT NULL,
+            BILLDATE DATE DEFAULT SYSDATE NOT NULL,
+            BILLTYPE CHAR(1) DEFAULT 'C',
+            COUNTERCODE VARCHAR2(50),
+            RESETNO NUMBER DEFAULT 1,
+            SESSIONCODE NUMBER DEFAULT 0
+        )
+    """
+    try:
+        cur.execute(create_sql)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' in err_str or '00955' in err_str:
+            pass
+        elif 'ORA-01031' in err_str or '01031' in err_str:
+            pass
+        else:
+            print(f"[BILLHDR] create failed: {e}")
+            raise
+
+
+def _billtype_from_invoicecode(invoice_code):
+    """BILLTYPE: 1 or '1' -> 'C', 2 or '2' -> 'R', else 'C' (C/R bill type from customer INVOICECODE)."""
     if invoice_code is None:
         return 'C'
     v = str(invoice_code).strip()
@@ -1328,108 +4165,1675 @@ def _billtype_from_invoicecode(invoice_code):
     return 'C'
 
 
-def _billno_flag_char(value):
-    """Normalize FLAG for BILLNOTABLE to 'n' or 'y' (CHAR(1)). Default 'n'."""
-    if value is None:
-        return 'N'
-    s = str(value).strip().lower()
-    return 'Y' if s == 'Y' else 'N'
+def _billno_flag_char(value):
+    """Normalize FLAG for BILLNOTABLE to 'n' or 'y' (CHAR(1)). Default 'n'."""
+    if value is None:
+        return 'N'
+    s = str(value).strip().lower()
+    return 'Y' if s == 'Y' else 'N'
+
+
+def _allocate_billno(counter_code):
+    """
+    Create next bill no: fetch MAX(BILLNO), new_billno = last + 1.
+    Insert new_billno into BILLNOTABLE (FLAG='N', BILLDATE=SYSDATE, COUNTERCODE). Returns None if Oracle unavailable.
+    """
+    conn = _get_connection()
+    if not conn:
+        return None
+    cur = None
+    try:
+        cur = conn.cursor()
+        _ensure_billnotable(cur)
+        cur.execute(f"SELECT NVL(MAX(BILLNO), 0) AS LAST_BILLNO FROM {BILLNO_TABLE_NAME}")
+        row = cur.fetchone()
+        last_billno = _to_int(row[0], 0) if row else 0
+        new_billno = int(last_billno + 1)
+        counter_code_val = (counter_code if isinstance(counter_code, str) else str(counter_code or '').strip()) or None
+        try:
+            cur.execute(
+                f"INSERT INTO {BILLNO_TABLE_NAME} (BILLNO, FLAG, BILLDATE, COUNTERCODE) VALUES (:billno, 'N', SYSDATE, :countercode)",
+                {"billno": new_billno, "countercode": counter_code_val}
+            )
+        except oracledb.Error as col_err:
+            err_str = str(col_err).upper()
+            if 'ORA-00913' in err_str or 'ORA-00904' in err_str or '00913' in err_str or '00904' in err_str:
+                cur.execute(
+                    f"INSERT INTO {BILLNO_TABLE_NAME} (BILLNO, FLAG, BILLDATE) VALUES (:billno, 'N', SYSDATE)",
+                    {"billno": new_billno}
+                )
+            elif 'ORA-01722' in err_str or '01722' in err_str:
+                cur.execute(
+                    f"INSERT INTO {BILLNO_TABLE_NAME} (BILLNO, FLAG, BILLDATE) VALUES (:billno, 'N', SYSDATE)",
+                    {"billno": new_billno}
+                )
+            else:
+                raise
+        conn.commit()
+        return new_billno
+    except oracledb.Error:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@app.route('/api/billno/next', methods=['GET', 'POST'])
+def create_next_billno():
+    """
+    Create next bill no: fetch MAX(BILLNO), new_billno = last + 1.
+    Insert new_billno into BILLNOTABLE (FLAG='N', BILLDATE=SYSDATE, COUNTERCODE from request).
+    """
+    data = request.get_json(silent=True) or {}
+    _cnt = data.get('counterCode') or data.get('counter_code') or request.args.get('counterCode') or request.args.get('counter_code')
+    counter_code = str(_cnt).strip() if _cnt is not None else ''
+    counter_code = counter_code or None
+    try:
+        new_billno = _allocate_billno(counter_code)
+    except oracledb.Error as e:
+        print(f"[BillNo] {BILLNO_TABLE_NAME} error: {e}")
+        return jsonify({"ok": False, "error": str(e), "billNo": None}), 500
+    if new_billno is None:
+        return jsonify({"error": "Database unavailable", "billNo": None}), 503
+    return jsonify({"ok": True, "billNo": new_billno})
+
+
+@app.route('/api/billno/paid', methods=['POST'])
+def mark_bill_paid():
+    """Set FLAG='Y' for the given billNo in BILLNOTABLE (call when bill is paid)."""
+    data = request.get_json(silent=True) or {}
+    bill_no = data.get('billNo') or data.get('billno')
+    if bill_no is None:
+        return jsonify({"ok": False, "error": "billNo required"}), 400
+    try:
+        bill_no = int(bill_no)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "billNo must be a number"}), 400
+    conn = _get_connection()
+    if not conn:
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    cur = None
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            f"UPDATE {BILLNO_TABLE_NAME} SET FLAG = 'Y' WHERE BILLNO = :billno",
+            {"billno": bill_no}
+        )
+        conn.commit()
+        return jsonify({"ok": True})
+    except oracledb.Error as e:
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        print(f"[BillNo] paid update error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@app.route('/api/billdtl/insert', methods=['POST'])
+def billdtl_insert():
+    """On Pay: insert BILLHDR (header) then BILLDTL (one row per cart line) and add the bill to the sales rollups. BILLTYPE from INVOICECODE: 1=C, 2=R."""
+    data = request.get_json(silent=True) or {}
+    _loc = data.get('locationCode') or data.get('location_code')
+    location_code = str(_loc).strip() if _loc is not None else ''
+    location_code = location_code or None
+    bill_no = data.get('billNo') or data.get('billno')
+    items = data.get('items') or data.get('lines') or []
+    _cnt = data.get('counterCode') or data.get('counter_code')
+    counter_code = str(_cnt).strip() if _cnt is not None else None
+    counter_code = counter_code or None
+    invoice_code = data.get('invoiceCode') or data.get('invoice_code') or data.get('INVOICECODE')
+    bill_type = _billtype_from_invoicecode(invoice_code)
+    business_date = _parse_iso_date(data.get('businessDate') or '')
+    cashier = _username_from_request() or (data.get('username') or '').strip() or None
+    if bill_no is None:
+        return jsonify({"ok": False, "error": "billNo required"}), 400
+    try:
+        bill_no = int(bill_no)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "billNo must be a number"}), 400
+    if not isinstance(items, list):
+        return jsonify({"ok": False, "error": "items must be an array"}), 400
+    conn = _get_connection()
+    if not conn:
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    cur = None
+    inserted = 0
+    total_qty = 0.0
+    total_amount = 0.0
+    try:
+        cur = conn.cursor()
+        _ensure_billhdr(cur)
+        _ensure_billdtl(cur)
+        # DDL commits implicitly: create the rollup / counter tables before the bill's first DML. Once both exist
+        # (or after a failed attempt, for SALES_ROLLUP_ENSURE_RETRY_SECONDS) a Pay runs no DDL.
+        global _pay_tables_attempted_at
+        if not (_counter_operations_table_ready and _sales_rollup_ready) and \
+                time.time() - _pay_tables_attempted_at >= SALES_ROLLUP_ENSURE_RETRY_SECONDS:
+            _pay_tables_attempted_at = time.time()
+            try:
+                _ensure_counter_operations_table(cur)
+                _ensure_sales_rollup_tables(cur)
+            except oracledb.Error as e:
+                print(f"[SalesRollup] unavailable: {e}")
+        if business_date is None:
+            cached, business_date = _cached_counter_business_date(counter_code)
+            if not cached:
+                business_date = _counter_business_date(cur, counter_code)
+            business_date = business_date or datetime.date.today()
+        # Insert BILLHDR: LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE, COUNTERCODE, RESETNO=1, SESSIONCODE=0
+        try:
+            cur.execute(
+                f"""
+                INSERT INTO {BILLHDR_TABLE_NAME} (LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE, COUNTERCODE, RESETNO, SESSIONCODE)
+                VALUES (:loc, :billno, SYSDATE, :billtype, :countercode, 1, 0)
+                """,
+                {"loc": location_code, "billno": bill_no, "billtype": bill_type, "countercode": counter_code}
+            )
+        except oracledb.Error as hdr_err:
+            err_str = str(hdr_err).upper()
+            if 'ORA-00001' not in err_str and '00001' not in err_str:
+                raise
+            try:
+                cur.execute(
+                    f"""
+                    UPDATE {BILLHDR_TABLE_NAME} SET LOCATIONCODE = :loc, BILLDATE = SYSDATE, BILLTYPE = :billtype, COUNTERCODE = :countercode, RESETNO = 1, SESSIONCODE = 0
+                    WHERE BILLNO = :billno
+                    """,
+                    {"loc": location_code, "billno": bill_no, "billtype": bill_type, "countercode": counter_code}
+                )
+            except oracledb.Error:
+                pass
+        # Remove any existing rows for this bill so insert is idempotent (avoids ORA-00001 on double Pay / re-submit)
+        try:
+            cur.execute(f"DELETE FROM {BILLDTL_TABLE_NAME} WHERE BILLNO = :billno", {"billno": bill_no})
+        except oracledb.Error:
+            pass
+        for slno, it in enumerate(items, start=1):
+            if not it or not isinstance(it, dict):
+                continue
+            _ic = it.get('itemCode') or it.get('ITEMCODE') or it.get('itemcode') or it.get('id')
+            item_code = str(_ic).strip() if _ic is not None else ''
+            if not item_code:
+                continue
+            qty = it.get('quantity') or it.get('QUANTITY') or 0
+            rate = it.get('rate') or it.get('RATE') or it.get('price') or 0
+            try:
+                qty = float(qty) if qty is not None else 0
+            except (TypeError, ValueError):
+                qty = 0
+            try:
+                rate = float(rate) if rate is not None else 0
+            except (TypeError, ValueError):
+                rate = 0
+            cur.execute(
+                f"""
+                INSERT INTO {BILLDTL_TABLE_NAME} (LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, RESETNO)
+                VALUES (:loc, :billno, :slno, :itemcode, :qty, :rate, 1)
+                """,
+                {"loc": location_code, "billno": bill_no, "slno": slno, "itemcode": item_code, "qty": qty, "rate": rate}
+            )
+            inserted += 1
+            total_qty += qty
+            total_amount += qty * rate
+        if inserted:
+            _apply_sales_rollup(cur, bill_no, business_date, location_code, counter_code, cashier, bill_type,
+                                inserted, total_qty, round(total_amount, 2))
+        conn.commit()
+        if items and inserted == 0:
+            return jsonify({"ok": False, "error": "No valid rows inserted (check itemCode/quantity/rate)"}), 400
+        _record_hot_sale(location_code, counter_code, bill_no, items)
+        _audit_bill_event('pay', location_code, bill_no, counter_code, _audit_lines(items))
+        return jsonify({"ok": True, "inserted": inserted})
+    except oracledb.Error as e:
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        print(f"[BILLDTL] insert error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@app.route('/api/billno/check', methods=['GET'])
+def check_billno():
+    """Check last and next bill no from BILLNOTABLE (read-only, no insert)."""
+    conn = _get_connection()
+    if not conn:
+        return jsonify({"error": "Database unavailable", "lastBillNo": None, "nextBillNo": None}), 503
+    cur = None
+    try:
+        cur = conn.cursor()
+        _ensure_billnotable(cur)
+        cur.execute(f"SELECT NVL(MAX(BILLNO), 0) AS LAST_BILLNO FROM {BILLNO_TABLE_NAME}")
+        row = cur.fetchone()
+        last_billno = _to_int(row[0], 0) if row else 0
+        next_billno = last_billno + 1
+        return jsonify({
+            "ok": True,
+            "lastBillNo": last_billno,
+            "nextBillNo": next_billno,
+        })
+    except oracledb.Error as e:
+        print(f"[BillNo] check error: {e}")
+        return jsonify({"ok": False, "error": str(e), "lastBillNo": None, "nextBillNo": None}), 500
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# --- Counter table: SYSTEMIP, SYSTEMNAME, COUNTERCODE, COUNTERNAME ---
+COUNTER_TABLE_NAME = 'COUNTER'
+# Terminal/counter registry: COUNTER is read once (then every COUNTER_REGISTRY_TTL_SECONDS, or the bus TTL when
+# the cache bus is up, to pick up rows written outside the app) and kept keyed by (systemIp, systemName);
+# save_counter publishes the new row and every worker adds it in place.
+COUNTER_REGISTRY_TTL_SECONDS = 300
+_counter_registry = {'rows': [], 'by_system': {}, 'by_ip': {}, 'max_code_num': 0, 'loaded_at': 0.0, 'version': 0,
+                     'ready': False}
+_counter_registry_lock = threading.Lock()
+_counter_table_ready = False
+
+
+def _ensure_counter_table(cur):
+    """Create COUNTER table if not exists. Columns: SYSTEMIP, SYSTEMNAME, COUNTERCODE, COUNTERNAME. Runs once per process."""
+    global _counter_table_ready
+    if _counter_table_ready:
+        return
+    create_sql = f"""
+        CREATE TABLE {COUNTER_TABLE_NAME} (
+            SYSTEMIP VARCHAR2(45),
+            SYSTEMNAME VARCHAR2(255),
+            COUNTERCODE VARCHAR2(50),
+            COUNTERNAME VARCHAR2(255)
+        )
+    """
+    try:
+        cur.execute(create_sql)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' in err_str or '00955' in err_str:
+            pass
+        else:
+            print(f"[Counter] {COUNTER_TABLE_NAME} create failed: {e}")
+            return
+    _counter_table_ready = True
+
+
+def _counter_code_num(counter_code):
+    """Numeric part of a COUNTERCODE ('CNT03' -> 3); 0 if it has no digits."""
+    digits = ''.join(c for c in str(counter_code or '') if c.isdigit())
+    return _to_int(digits, 0) if digits else 0
+
+
+def _counter_registry_state(rows):
+    by_system = {}
+    by_ip = {}
+    for r in rows:
+        by_system.setdefault((r['systemIp'], r['systemName']), []).append(r)
+        by_ip.setdefault(r['systemIp'], []).append(r)
+    return {
+        'rows': rows,
+        'by_system': by_system,
+        'by_ip': by_ip,
+        'max_code_num': max((_counter_code_num(r['counterCode']) for r in rows), default=0),
+        'loaded_at': time.time(),
+        'version': 0,
+        'ready': True,
+    }
+
+
+def _load_counter_registry():
+    """Read all COUNTER rows in one pass; None if Oracle is unavailable."""
+    conn = _get_connection(read_only=True)
+    if not conn:
+        return None
+    cur = None
+    version = _bus_version()
+    try:
+        cur = conn.cursor()
+        if not _on_replica(conn):
+            _ensure_counter_table(cur)
+        try:
+            cur.execute(f"SELECT SYSTEMIP, SYSTEMNAME, COUNTERCODE, COUNTERNAME FROM {COUNTER_TABLE_NAME}")
+            fetched = cur.fetchall()
+        except oracledb.Error as e:
+            if 'ORA-00904' not in str(e).upper() and '00904' not in str(e).upper():
+                raise
+            cur.execute(f"SELECT SYSTEMIP, NULL, COUNTERCODE, COUNTERNAME FROM {COUNTER_TABLE_NAME}")
+            fetched = cur.fetchall()
+        rows = [
+            {
+                "systemIp": str(sys_ip or "").strip(),
+                "systemName": str(sys_name or "").strip(),
+                "counterCode": str(cnt_code or "").strip(),
+                "counterName": str(cnt_name or "").strip(),
+            }
+            for sys_ip, sys_name, cnt_code, cnt_name in fetched
+        ]
+        return dict(_counter_registry_state(rows), version=version)
+    except oracledb.Error as e:
+        print(f"[Counter] registry load error: {e}")
+        return None
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _get_counter_registry(force=False):
+    """Return the registry snapshot, loading it when missing or stale; None if Oracle is unavailable."""
+    global _counter_registry
+    state = _counter_registry
+    if state['ready'] and not force and time.time() - state['loaded_at'] < _bus_ttl(COUNTER_REGISTRY_TTL_SECONDS):
+        return state
+    with _counter_registry_lock:
+        state = _counter_registry
+        if state['ready'] and not force and time.time() - state['loaded_at'] < _bus_ttl(COUNTER_REGISTRY_TTL_SECONDS):
+            return state
+        new_state = _load_counter_registry()
+        if new_state is None:
+            return state if state['ready'] else None
+        _counter_registry = new_state
+        return new_state
+
+
+@_on_bus('counter.saved')
+def _register_counter(row, version):
+    """Add a saved COUNTER row to the registry without reloading the table (unless the load already saw it)."""
+    global _counter_registry
+    with _counter_registry_lock:
+        state = _counter_registry
+        if not state['ready'] or state['version'] >= version:
+            return
+        _counter_registry = dict(_counter_registry_state(state['rows'] + [row]), loaded_at=state['loaded_at'],
+                                 version=state['version'])
+
+
+@_on_bus('resync')
+def _invalidate_counter_registry(data=None, version=None):
+    global _counter_registry
+    with _counter_registry_lock:
+        _counter_registry = dict(_counter_registry, ready=False)
+
+
+def _counters_for_system(registry, system_ip, system_name):
+    """Registry rows for (systemIp, systemName), all rows for systemIp, or every row when systemIp is empty."""
+    if system_ip and system_name:
+        rows = registry['by_system'].get((system_ip, system_name), [])
+    elif system_ip:
+        rows = registry['by_ip'].get(system_ip, [])
+    else:
+        rows = registry['rows']
+    return [
+        {"systemName": r['systemName'], "counterCode": r['counterCode'], "counterName": r['counterName']}
+        for r in rows
+    ]
+
+
+@app.route('/api/counters', methods=['GET'])
+def list_counters():
+    """Fetch SYSTEMNAME, COUNTERCODE, COUNTERNAME. If systemIp (and optional systemName) given, only active system's row(s); one row for current terminal."""
+    system_ip = (request.args.get('systemIp') or request.args.get('system_ip') or '').strip()
+    system_name = (request.args.get('systemName') or request.args.get('system_name') or '').strip()
+    registry = _get_counter_registry()
+    if registry is None:
+        return jsonify({"ok": False, "counters": [], "error": "Database unavailable"}), 503
+    return jsonify({"ok": True, "counters": _counters_for_system(registry, system_ip, system_name)})
+
+
+@app.route('/api/counters/next-code', methods=['GET'])
+def next_counter_code():
+    """Return next counter code: highest numeric COUNTERCODE in the registry + 1."""
+    registry = _get_counter_registry()
+    if registry is None:
+        return jsonify({"ok": False, "nextCounterCode": "1", "error": "Database unavailable"}), 503
+    return jsonify({"ok": True, "nextCounterCode": str(registry['max_code_num'] + 1)})
+
+
+@app.route('/api/counter', methods=['POST'])
+def save_counter():
+    """Insert into COUNTER: systemName, systemIp, counterCode, counterName, locationCode (from Counter Setup Save)."""
+    data = request.get_json(silent=True) or {}
+    system_ip = (data.get('systemIp') or data.get('systemIP') or '').strip()
+    system_name = (data.get('systemName') or '').strip()
+    counter_code = (data.get('counterCode') or '').strip() or '1'
+    counter_name = (data.get('counterName') or '').strip() or 'Counter 1'
+    location_code = (data.get('locationCode') or data.get('location_code') or '').strip() or None
+    if location_code is None:
+        location_code = '1'
+    conn = _get_connection()
+    if not conn:
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    cur = None
+    try:
+        cur = conn.cursor()
+        _ensure_counter_table(cur)
+        cur.execute(
+            f"""
+            INSERT INTO {COUNTER_TABLE_NAME} (SYSTEMIP, SYSTEMNAME, COUNTERCODE, COUNTERNAME, LOCATIONCODE)
+            VALUES (:sysip, :sysname, :cntcode, :cntname, :loccode)
+            """,
+            {"sysip": system_ip or None, "sysname": system_name or None, "cntcode": counter_code, "cntname": counter_name, "loccode": location_code}
+        )
+        conn.commit()
+        _bus_publish('counter.saved', {
+            "systemIp": system_ip,
+            "systemName": system_name,
+            "counterCode": counter_code,
+            "counterName": counter_name,
+        })
+        return jsonify({"ok": True})
+    except oracledb.Error as e:
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        print(f"[Counter] insert error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# --- COUNTEROPERATIONS: DATEOFOPEN, OPENEDDATE, OPENFLAG (O/C), OPENEDBY, CLOSEDBY, CLOSEDDATE ---
+COUNTEROPERATIONS_TABLE_NAME = 'COUNTEROPERATIONS'
+# Function-based on NVL(TRIM(COUNTERCODE), ' ') so padded and NULL codes match the way the original NVL/TRIM
+# predicate did while the lookup stays an index range scan
+COUNTEROPERATIONS_INDEX_NAME = 'IX_COUNTEROPERATIONS_DATE_TCNT'
+# Counter-state registry: (date 'YYYY-MM-DD', counterCode) -> (OPENFLAG or None, loaded_at, version).
+# Status checks are memory reads; open/close publish the new flag on the cache bus so every worker updates its
+# entry (without a bus, other workers' changes show up after the TTL).
+COUNTER_STATE_TTL_SECONDS = 300
+COUNTER_SESSION_LOOKBACK_DAYS = 3  # how far back a still-open session's DATEOFOPEN is looked for at Pay
+_counter_state = {}
+_counter_state_lock = threading.Lock()
+_counter_operations_table_ready = False
+
+
+def _ensure_counter_operations_table(cur):
+    """Create COUNTEROPERATIONS table and its (DATEOFOPEN, COUNTERCODE) index if not exists. Runs once per process."""
+    global _counter_operations_table_ready
+    if _counter_operations_table_ready:
+        return
+    create_sql = f"""
+        CREATE TABLE {COUNTEROPERATIONS_TABLE_NAME} (
+            DATEOFOPEN DATE,
+            OPENEDDATE DATE,
+            OPENFLAG VARCHAR2(1),
+            OPENEDBY VARCHAR2(100),
+            CLOSEDBY VARCHAR2(100),
+            CLOSEDDATE DATE,
+            COUNTERCODE VARCHAR2(50)
+        )
+    """
+    try:
+        cur.execute(create_sql)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' in err_str or '00955' in err_str:
+            pass
+        else:
+            print(f"[CounterOperations] create failed: {e}")
+            return
+    try:
+        cur.execute(f"""
+            CREATE INDEX {COUNTEROPERATIONS_INDEX_NAME}
+            ON {COUNTEROPERATIONS_TABLE_NAME} (DATEOFOPEN, NVL(TRIM(COUNTERCODE), ' '))
+        """)
+    except oracledb.Error as e:
+        # ORA-00955 name exists, ORA-01408 columns already indexed, ORA-01031 no privilege
+        err_str = str(e).upper()
+        if not any(c in err_str for c in ('00955', '01408', '01031')):
+            print(f"[CounterOperations] index create failed: {e}")
+    _counter_operations_table_ready = True
+
+
+def _parse_iso_date(date_str):
+    """Parse 'YYYY-MM-DD' (as sent by the terminal) to a date; None if invalid."""
+    try:
+        return datetime.datetime.strptime((date_str or '').strip()[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def _counter_ops_where(day, counter_code):
+    """
+    Sargable WHERE for one (date, counter): DATEOFOPEN day range and NVL(TRIM(COUNTERCODE), ' ') equality, matching
+    padded and NULL codes as before and served by the function-based index.
+    """
+    params = {"d_from": day, "d_to": day + datetime.timedelta(days=1),
+              "cntcode": (counter_code or '').strip() or ' '}
+    return "DATEOFOPEN >= :d_from AND DATEOFOPEN < :d_to AND NVL(TRIM(COUNTERCODE), ' ') = :cntcode", params
+
+
+def _fetch_counter_open_flag(cur, day, counter_code):
+    where_sql, params = _counter_ops_where(day, counter_code)
+    cur.execute(f"""
+        SELECT OPENFLAG FROM {COUNTEROPERATIONS_TABLE_NAME}
+        WHERE {where_sql}
+        AND ROWNUM = 1
+    """, params)
+    row = cur.fetchone()
+    if not row:
+        return None
+    return (row[0] or '').strip().upper() or None
+
+
+def _counter_business_date(cur, counter_code):
+    """
+    DATEOFOPEN of the counter's open session (the latest within COUNTER_SESSION_LOOKBACK_DAYS), so a sale after
+    midnight lands on the day the Z report on close totals. None if no session is open or the table is unavailable.
+    """
+    today = datetime.date.today()
+    where_sql, params = _counter_ops_where(today, counter_code)
+    params["d_from"] = today - datetime.timedelta(days=COUNTER_SESSION_LOOKBACK_DAYS)
+    try:
+        cur.execute(f"""
+            SELECT MAX(DATEOFOPEN) FROM {COUNTEROPERATIONS_TABLE_NAME}
+            WHERE {where_sql}
+            AND OPENFLAG = 'O'
+        """, params)
+        row = cur.fetchone()
+    except oracledb.Error as e:
+        print(f"[CounterOperations] session date lookup error: {e}")
+        return None
+    if not row or row[0] is None:
+        return None
+    return row[0].date() if isinstance(row[0], datetime.datetime) else row[0]
+
+
+def _cached_counter_business_date(counter_code):
+    """
+    _counter_business_date from the counter state cache: (True, date or None) when every day of the lookback
+    window has a fresh entry or a later day is open, else (False, None).
+    """
+    today = datetime.date.today()
+    for back in range(COUNTER_SESSION_LOOKBACK_DAYS + 1):
+        day = today - datetime.timedelta(days=back)
+        cached, open_flag = _get_cached_counter_state(day, counter_code or '')
+        if not cached:
+            return False, None
+        if open_flag == 'O':
+            return True, day
+    return True, None
+
+
+def _get_cached_counter_state(day, counter_code):
+    """Return (True, OPENFLAG) if the registry has a fresh entry, else (False, None)."""
+    with _counter_state_lock:
+        hit = _counter_state.get((day.isoformat(), counter_code))
+    if hit is not None and time.time() - hit[1] < _bus_ttl(COUNTER_STATE_TTL_SECONDS):
+        return True, hit[0]
+    return False, None
+
+
+def _set_counter_state(day, counter_code, open_flag, version):
+    """Store a flag read or written at version; an entry with a newer version is kept."""
+    key = (day.isoformat(), counter_code)
+    with _counter_state_lock:
+        hit = _counter_state.get(key)
+        if hit is None or hit[2] <= version:
+            _counter_state[key] = (open_flag, time.time(), version)
+
+
+def _publish_counter_state(day, counter_code, open_flag):
+    _bus_publish('counter.state', {'date': day.isoformat(), 'counterCode': counter_code, 'openFlag': open_flag})
+
+
+@_on_bus('counter.state')
+def _on_counter_state(data, version):
+    _set_counter_state(_parse_iso_date(data['date']), data['counterCode'], data['openFlag'], version)
+
+
+@_on_bus('resync')
+def _on_counter_state_resync(data, version):
+    _invalidate_counter_state()
+
+
+def _invalidate_counter_state(day=None, counter_code=None):
+    """Drop one registry entry, or everything when called without arguments."""
+    with _counter_state_lock:
+        if day is None:
+            _counter_state.clear()
+        else:
+            _counter_state.pop((day.isoformat(), counter_code), None)
+
+
+def _get_counter_open_flag(day, counter_code):
+    """Return (True, OPENFLAG or None) from the registry or Oracle; (False, None) if Oracle unavailable. Raises oracledb.Error."""
+    cached, open_flag = _get_cached_counter_state(day, counter_code)
+    if cached:
+        return True, open_flag
+    conn = _get_connection()
+    if not conn:
+        return False, None
+    cur = None
+    version = _bus_version()
+    try:
+        cur = conn.cursor()
+        _ensure_counter_operations_table(cur)
+        open_flag = _fetch_counter_open_flag(cur, day, counter_code)
+        _set_counter_state(day, counter_code, open_flag, version)
+        return True, open_flag
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@app.route('/api/counter-operations/status', methods=['GET'])
+def counter_operations_status():
+    """For given date, counterCode: return open=True if OPENFLAG='O', closed=True if OPENFLAG='C' (already closed, cannot open again)."""
+    date_str = (request.args.get('date') or request.args.get('dateOfOpen') or '').strip()
+    counter_code = (request.args.get('counterCode') or request.args.get('counter_code') or '').strip()
+    if not date_str:
+        return jsonify({"ok": False, "open": False, "closed": False, "error": "date required"}), 400
+    day = _parse_iso_date(date_str)
+    if day is None:
+        return jsonify({"ok": False, "open": False, "closed": False, "error": "date must be YYYY-MM-DD"}), 400
+    try:
+        found, open_flag = _get_counter_open_flag(day, counter_code)
+    except oracledb.Error as e:
+        print(f"[CounterOperations] status error: {e}")
+        return jsonify({"ok": False, "open": False, "closed": False, "error": str(e)}), 500
+    if not found:
+        return jsonify({"ok": False, "open": False, "closed": False, "error": "Database unavailable"}), 503
+    is_open = open_flag == 'O'
+    is_closed = open_flag == 'C'
+    return jsonify({"ok": True, "open": is_open, "closed": is_closed})
+
+
+def _username_from_request():
+    """Get username from Authorization Bearer token (JWT sub)."""
+    auth = request.headers.get('Authorization') or ''
+    payload = _decode_token(auth)
+    if not payload:
+        return None
+    return (payload.get('sub') or payload.get('username') or '').strip() or None
+
+
+@app.route('/api/counter-operations/open', methods=['POST'])
+def counter_operations_open():
+    """Insert COUNTEROPERATIONS: DATEOFOPEN=selected date, OPENEDDATE=today, OPENFLAG='O', OPENEDBY=username, LOCATIONCODE from login."""
+    data = request.get_json(silent=True) or {}
+    date_str = (data.get('date') or data.get('dateOfOpen') or '').strip()
+    counter_code = (data.get('counterCode') or data.get('counter_code') or '').strip() or '1'
+    location_code = (data.get('locationCode') or data.get('location_code') or '').strip()
+    if not location_code:
+        base_loc = _get_base_location()
+        location_code = (base_loc or {}).get('locationCode') or (base_loc or {}).get('location_code') or '1'
+    location_code = location_code or '1'
+    username = _username_from_request() or (data.get('username') or '').strip()
+    if not date_str:
+        return jsonify({"ok": False, "error": "date required"}), 400
+    day = _parse_iso_date(date_str)
+    if day is None:
+        return jsonify({"ok": False, "error": "date must be YYYY-MM-DD"}), 400
+    conn = _get_connection()
+    if not conn:
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    cur = None
+    try:
+        cur = conn.cursor()
+        _ensure_counter_operations_table(cur)
+        version = _bus_version()
+        open_flag = _fetch_counter_open_flag(cur, day, counter_code)
+        if open_flag:
+            _set_counter_state(day, counter_code, open_flag, version)
+            if open_flag == 'C':
+                return jsonify({"ok": False, "error": "Counter already closed for this date; cannot open again."}), 400
+            if open_flag == 'O':
+                return jsonify({"ok": False, "error": "Counter already open for this date."}), 400
+        cur.execute(
+            f"""
+            INSERT INTO {COUNTEROPERATIONS_TABLE_NAME}
+            (DATEOFOPEN, OPENEDDATE, OPENFLAG, OPENEDBY, COUNTERCODE, LOCATIONCODE, CASHIERCODE)
+            VALUES (:d, :oday, 'O', :openedby, :cntcode, :loccode, 0)
+            """,
+            {"d": day, "oday": datetime.date.today(), "openedby": username or None, "cntcode": counter_code or None, "loccode": location_code}
+        )
+        conn.commit()
+        _publish_counter_state(day, counter_code, 'O')
+        return jsonify({"ok": True})
+    except oracledb.Error as e:
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        _invalidate_counter_state(day, counter_code)
+        print(f"[CounterOperations] open error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@app.route('/api/counter-operations/close', methods=['POST'])
+def counter_operations_close():
+    """
+    Update COUNTEROPERATIONS: set OPENFLAG='C', CLOSEDBY=username, CLOSEDDATE=sysdate for matching DATEOFOPEN and
+    OPENFLAG='O'. Returns the counter's Z totals for that date from the sales rollups.
+    """
+    data = request.get_json(silent=True) or {}
+    date_str = (data.get('date') or data.get('dateOfOpen') or '').strip()
+    counter_code = (data.get('counterCode') or data.get('counter_code') or '').strip() or '1'
+    location_code = (data.get('locationCode') or data.get('location_code') or '').strip() or None
+    username = _username_from_request() or (data.get('username') or '').strip()
+    if not date_str:
+        return jsonify({"ok": False, "error": "date required"}), 400
+    day = _parse_iso_date(date_str)
+    if day is None:
+        return jsonify({"ok": False, "error": "date must be YYYY-MM-DD"}), 400
+    conn = _get_connection()
+    if not conn:
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    cur = None
+    try:
+        cur = conn.cursor()
+        _ensure_counter_operations_table(cur)
+        where_sql, params = _counter_ops_where(day, counter_code)
+        params["closedby"] = username or None
+        cur.execute(
+            f"""
+            UPDATE {COUNTEROPERATIONS_TABLE_NAME}
+            SET OPENFLAG = 'C', CLOSEDBY = :closedby, CLOSEDDATE = SYSDATE
+            WHERE {where_sql} AND OPENFLAG = 'O'
+            """,
+            params
+        )
+        updated = cur.rowcount
+        conn.commit()
+        if updated:
+            _publish_counter_state(day, counter_code, 'C')
+        else:
+            _invalidate_counter_state(day, counter_code)
+        try:
+            z_report = _z_report(cur, day, counter_code, location_code)
+        except oracledb.Error as e:
+            print(f"[CounterOperations] Z totals error: {e}")
+            z_report = None
+        return jsonify({"ok": True, "updated": updated, "z": z_report})
+    except oracledb.Error as e:
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        _invalidate_counter_state(day, counter_code)
+        print(f"[CounterOperations] close error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@app.route('/api/hold', methods=['POST'])
+@_invalidates_flights('/api/hold')
+def hold_bill():
+    """On hold: set FLAG=0 for current bill's cart rows (held). Draft cart uses FLAG=1; held uses FLAG=0."""
+    try:
+        data = request.get_json(silent=True) or {}
+        bill_no = data.get('billNo')
+        location_code = (data.get('locationCode') or '').strip() or 'LOC001'
+        counter_code = (data.get('counterCode') or '').strip() or '20'
+        customer_code = (data.get('customerCode') or '').strip() or None
+        items = data.get('items') or []
+        if bill_no is None:
+            return jsonify({"error": "billNo is required"}), 400
+        if not items:
+            return jsonify({"error": "items (cart) is required"}), 400
+        bill_no = _to_int(bill_no, 1)
+        loc_num = _location_to_num(location_code, 1)
+        conn = _get_connection()
+        if conn:
+            cur = None
+            try:
+                cur = conn.cursor()
+                _ensure_tempbillhdr(cur)
+                _ensure_tempbilldtl(cur)
+                # At HOLD time: set FLAG = 0 (held) for this bill in TEMPBILLHDR
+                cur.execute(f"""
+                    UPDATE {HOLD_TABLE_NAME} SET FLAG = :flag
+                    WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = {FLAG_DRAFT} OR FLAG IS NULL)
+                """, billno=bill_no, loc=loc_num, flag=FLAG_HELD)
+                updated = cur.rowcount
+                if updated == 0:
+                    params = []
+                    for i, it in enumerate(items):
+                        qty = _to_quantity(it.get('quantity') or it.get('qty'), 1)
+                        for _ in range(_hold_hdr_rows(qty)):
+                            params.append({
+                                'billno': bill_no,
+                                'loc': loc_num,
+                                'flag': FLAG_HELD,
+                            })
+                    cur.executemany(f"""
+                        INSERT INTO {HOLD_TABLE_NAME} (BILLNO, LOCATIONCODE, FLAG)
+                        VALUES (:billno, :loc, :flag)
+                    """, params)
+                # At hold: insert product data into TEMPBILLDTL (no FLAG=0; use table default)
+                cur.execute(f"DELETE FROM {HOLD_DTL_TABLE_NAME} WHERE BILLNO = :billno", billno=bill_no)
+                dtl_params = []
+                for slno, it in enumerate(items, start=1):
+                    if not isinstance(it, dict):
+                        continue
+                    itemcode = str(it.get('id') or it.get('itemcode') or it.get('ITEMCODE') or '').strip()
+                    qty = _to_quantity(it.get('quantity') or it.get('qty') or it.get('QUANTITY'), 1)
+                    rate = _to_float(it.get('price') or it.get('PRICE') or it.get('rate'), 0.0)
+                    manufacturer_id = str(it.get('manufactureId') or it.get('MANUFACTURERID') or it.get('manufacturerId') or '').strip()
+                    dtl_params.append({
+                        'billno': bill_no,
+                        'slno': slno,
+                        'itemcode': itemcode or None,
+                        'quantity': qty,
+                        'rate': rate,
+                        'manufacturerid': manufacturer_id or None,
+                    })
+                if dtl_params:
+                    cur.executemany(f"""
+                        INSERT INTO {HOLD_DTL_TABLE_NAME} (BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID)
+                        VALUES (:billno, :slno, :itemcode, :quantity, :rate, :manufacturerid)
+                    """, dtl_params)
+                discount_amount = _to_float(data.get('discountAmount') or data.get('discount_amount') or data.get('DISCOUNTAMOUNT'), 0.0)
+                conn.commit()
+                # TBLCANCELEDHDR / TBLCANCELEDDTL rows are written by the audit writer, outside this transaction
+                audit_lines = [{k: p[k] for k in ('slno', 'itemcode', 'quantity', 'rate', 'manufacturerid')} for p in dtl_params]
+                _audit_bill_event('hold', location_code, bill_no, counter_code, audit_lines, discount_amount)
+                return jsonify({"ok": True, "billNo": bill_no, "locationCode": location_code, "savedToDb": True})
+            except oracledb.Error as e:
+                if conn:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                print(f"[Hold] {HOLD_TABLE_NAME} insert failed (will use in-memory): {e}")
+            finally:
+                if cur:
+                    try:
+                        cur.close()
+                    except Exception:
+                        pass
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        # In-memory fallback (used when Oracle is down or INSERT failed)
+        hold_items = []
+        for it in items:
+            if not isinstance(it, dict):
+                continue
+            try:
+                hold_items.append({
+                    "id": it.get("id") or it.get("itemcode") or it.get("ITEMCODE"),
+                    "name": it.get("name") or it.get("itemname") or it.get("ITEMNAME") or "",
+                    "price": float(it.get("price", it.get("PRICE", 0)) or 0),
+                    "quantity": _to_quantity(it.get("quantity", it.get("qty", it.get("QUANTITY", 1))) or 1),
+                })
+            except (TypeError, ValueError):
+                hold_items.append({"id": it.get("id"), "name": "", "price": 0.0, "quantity": 1})
+        key = (location_code, bill_no)
+        _held_bills_fallback[key] = {
+            "counterCode": counter_code,
+            "heldDate": datetime.datetime.now().isoformat(),
+            "customerCode": customer_code,
+            "items": hold_items,
+        }
+        return jsonify({"ok": True, "billNo": bill_no, "locationCode": location_code, "savedToDb": False})
+    except Exception as e:
+        print(f"[Hold] unexpected error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
+def _cart_sync_execute(cur, conn, bill_no, location_code, items):
+    """Execute cart sync: TEMPBILLHDR and TEMPBILLDTL with FLAG=1 (draft) when items added to cart."""
+    loc_num = _location_to_num(location_code, 1)
+    bill_no = _to_int(bill_no, 1)
+    err_str = None
+    try:
+        cur.execute(f"""
+            DELETE FROM {HOLD_TABLE_NAME}
+            WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
+        """, billno=bill_no, loc=loc_num, flag=FLAG_DRAFT)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00904' not in err_str and '00904' not in err_str:
+            raise
+        conn.rollback()
+        cur.execute(f"DELETE FROM {HOLD_TABLE_NAME} WHERE BILLNO = :billno AND LOCATIONCODE = :loc",
+                    billno=bill_no, loc=loc_num)
+    if items:
+        params_with_flag = []
+        for i, it in enumerate(items):
+            qty = _to_quantity(it.get('quantity') or it.get('qty'), 1)
+            for _ in range(_hold_hdr_rows(qty)):
+                params_with_flag.append({
+                    'billno': bill_no,
+                    'loc': loc_num,
+                    'flag': FLAG_DRAFT,
+                })
+        try:
+            cur.executemany(f"""
+                INSERT INTO {HOLD_TABLE_NAME} (BILLNO, LOCATIONCODE, FLAG)
+                VALUES (:billno, :loc, :flag)
+            """, params_with_flag)
+        except oracledb.Error as e:
+            err_str = str(e).upper()
+            if 'ORA-00904' not in err_str and '00913' not in err_str:
+                raise
+            conn.rollback()
+            cur.execute(f"DELETE FROM {HOLD_TABLE_NAME} WHERE BILLNO = :billno AND LOCATIONCODE = :loc",
+                        billno=bill_no, loc=loc_num)
+            params_no_flag = [{'billno': p['billno'], 'loc': p['loc']} for p in params_with_flag]
+            cur.executemany(f"""
+                INSERT INTO {HOLD_TABLE_NAME} (BILLNO, LOCATIONCODE)
+                VALUES (:billno, :loc)
+            """, params_no_flag)
+    # TEMPBILLDTL: insert product data with FLAG=1 (draft) when cart items added – same as TEMPBILLHDR
+    _ensure_tempbilldtl(cur)
+    cur.execute(f"DELETE FROM {HOLD_DTL_TABLE_NAME} WHERE BILLNO = :billno", billno=bill_no)
+    dtl_params = []
+    for slno, it in enumerate(items or [], start=1):
+        if not isinstance(it, dict):
+            continue
+        itemcode = str(it.get('id') or it.get('itemcode') or it.get('ITEMCODE') or '').strip()
+        qty = _to_quantity(it.get('quantity') or it.get('qty') or it.get('QUANTITY'), 1)
+        rate = _to_float(it.get('price') or it.get('PRICE') or it.get('rate'), 0.0)
+        manufacturer_id = str(it.get('manufactureId') or it.get('MANUFACTURERID') or it.get('manufacturerId') or '').strip()
+        dtl_params.append({
+            'billno': bill_no,
+            'slno': slno,
+            'itemcode': itemcode or None,
+            'quantity': qty,
+            'rate': rate,
+            'manufacturerid': manufacturer_id or None,
+            'flag': FLAG_DRAFT,
+        })
+    if dtl_params:
+        try:
+            cur.executemany(f"""
+                INSERT INTO {HOLD_DTL_TABLE_NAME} (BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, FLAG)
+                VALUES (:billno, :slno, :itemcode, :quantity, :rate, :manufacturerid, :flag)
+            """, dtl_params)
+        except oracledb.Error as e:
+            if 'ORA-00904' not in str(e).upper() and '00904' not in str(e).upper():
+                raise
+            dtl_no_flag = [{k: v for k, v in p.items() if k != 'flag'} for p in dtl_params]
+            cur.executemany(f"""
+                INSERT INTO {HOLD_DTL_TABLE_NAME} (BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID)
+                VALUES (:billno, :slno, :itemcode, :quantity, :rate, :manufacturerid)
+            """, dtl_no_flag)
+
+
+def _load_cart_items(bill_no):
+    """Cart items from TEMPBILLDTL for BILLNO, with names from ITEMMASTER. Empty list if Oracle unavailable."""
+    conn = _get_connection()
+    if not conn:
+        return []
+    cur = None
+    items = []
+    try:
+        cur = conn.cursor()
+        _ensure_tempbilldtl(cur)
+        cur.execute(f"""
+            SELECT SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID
+            FROM {HOLD_DTL_TABLE_NAME}
+            WHERE BILLNO = :billno
+            ORDER BY SLNO
+        """, billno=bill_no)
+        dtl_rows = cur.fetchall()
+        cols = [c[0].upper() if c else '' for c in cur.description] if cur.description else []
+        for row in dtl_rows:
+            def _col(name, default=None):
+                try:
+                    i = cols.index(name)
+                    return row[i] if i >= 0 and i < len(row) else default
+                except (ValueError, IndexError):
+                    return default
+            itemcode = _col('ITEMCODE')
+            qty = _to_quantity(_col('QUANTITY'), 1)
+            rate = _to_float(_col('RATE'), 0.0)
+            manufacturer_id = _col('MANUFACTURERID')
+            code_str = str(itemcode).strip() if itemcode else ""
+            items.append({
+                "id": code_str or 0,
+                "name": "",
+                "price": rate,
+                "quantity": qty,
+                "manufactureId": str(manufacturer_id).strip() if manufacturer_id else "",
+                "ITEMCODE": code_str,
+                "MANUFACTURERID": str(manufacturer_id).strip() if manufacturer_id else "",
+            })
+        itemcodes = [str(it.get("ITEMCODE") or it.get("id") or "").strip() for it in items if it.get("ITEMCODE") or it.get("id")]
+        if itemcodes:
+            names_map = _get_item_names_from_master(cur, itemcodes)
+            for it in items:
+                code = str(it.get("ITEMCODE") or it.get("id") or "").strip()
+                it["name"] = names_map.get(code, "") or ""
+    except oracledb.Error as e:
+        print(f"[Cart by-bill] {HOLD_DTL_TABLE_NAME} error: {e}")
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return items
+
+
+@app.route('/api/cart/by-bill', methods=['GET'])
+def cart_by_bill():
+    """Fetch cart items from TEMPBILLDTL by BILLNO (for restore on tab reopen)."""
+    bill_no = request.args.get('billNo') or request.args.get('billno')
+    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
+    if not bill_no:
+        return jsonify({"ok": False, "error": "billNo required", "items": []}), 400
+    try:
+        bill_no = int(bill_no)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "billNo must be a number", "items": []}), 400
+    return jsonify({"ok": True, "items": _load_cart_items(bill_no)})
+
+
+@app.route('/api/cart/sync', methods=['GET', 'POST'])
+@_invalidates_flights('/api/hold')
+def cart_sync():
+    """
+    Sync current cart to hold table with FLAG=1 (draft). POST only; GET returns hint.
+    cancel=true (with canceledItems, counterCode) records a cancel audit event for the cleared cart.
+    """
+    if request.method == 'GET':
+        return jsonify({"ok": True, "message": "Use POST with body: billNo, locationCode, items"}), 200
+    data = request.get_json(silent=True) or {}
+    bill_no = data.get('billNo')
+    location_code = (data.get('locationCode') or '').strip() or 'LOC001'
+    items = data.get('items') or []
+    canceled_items = (data.get('canceledItems') or []) if data.get('cancel') else []
+    if bill_no is None:
+        return jsonify({"error": "billNo is required"}), 400
+    bill_no = _to_int(bill_no, 1)
+    conn = _get_connection()
+    if not conn:
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    cur = None
+    try:
+        cur = conn.cursor()
+        _ensure_tempbillhdr(cur)
+        _ensure_tempbilldtl(cur)
+        _cart_sync_execute(cur, conn, bill_no, location_code, items)
+        conn.commit()
+        if canceled_items and isinstance(canceled_items, list):
+            counter_code = str(data.get('counterCode') or '').strip() or None
+            _audit_bill_event('cancel', location_code, bill_no, counter_code, _audit_lines(canceled_items))
+        return jsonify({"ok": True})
+    except oracledb.Error as e:
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        print(f"[Cart sync] {HOLD_TABLE_NAME} error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+@app.route('/api/hold', methods=['GET'])
+@_single_flight(fresh=1, stale=2)
+def list_held_bills():
+    """List held bills from TEMPBILLHDR (FLAG=0). Return BILLNO, HELDDATE, items per bill."""
+    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
+    loc_num = _location_to_num(location_code, 1)
+    conn = _get_connection()
+    result = []
+    if conn:
+        cur = None
+        try:
+            cur = conn.cursor()
+            _ensure_tempbillhdr(cur)
+            # Held bills: distinct BILLNO for this location with FLAG=0 (held)
+            cur.execute(f"""
+                SELECT DISTINCT BILLNO, LOCATIONCODE
+                FROM {HOLD_TABLE_NAME}
+                WHERE LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
+                ORDER BY BILLNO DESC
+            """, loc=loc_num, flag=FLAG_HELD)
+            rows = cur.fetchall()
+            cols = [c[0] for c in cur.description]
+            result = [dict(zip(cols, row)) for row in rows]
+            for r in result:
+                r["HELDDATE"] = None
+                r["items"] = []
+            # Try to get HELDDATE if column exists (MAX per bill)
+            try:
+                cur.execute(f"""
+                    SELECT BILLNO, MAX(HELDDATE) AS HELDDATE
+                    FROM {HOLD_TABLE_NAME}
+                    WHERE LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
+                    GROUP BY BILLNO
+                """, loc=loc_num, flag=FLAG_HELD)
+                for row in cur.fetchall():
+                    billno, hd = row[0], row[1] if len(row) > 1 else None
+                    for r in result:
+                        if r.get("BILLNO") == billno and hd is not None:
+                            r["HELDDATE"] = hd.isoformat() if hasattr(hd, 'isoformat') else str(hd)
+                            break
+            except oracledb.Error:
+                pass
+            # Fetch product details from TEMPBILLDTL per bill; look up product name from ITEMMASTER
+            for r in result:
+                billno = r.get("BILLNO")
+                r["items"] = []
+                try:
+                    cur.execute(f"""
+                        SELECT SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID
+                        FROM {HOLD_DTL_TABLE_NAME}
+                        WHERE BILLNO = :billno
+                        ORDER BY SLNO
+                    """, billno=billno)
+                    dtl_rows = cur.fetchall()
+                    cols = [c[0].upper() if c else '' for c in cur.description] if cur.description else []
+                    for row in dtl_rows:
+                        def _col(name, default=None):
+                            try:
+                                i = cols.index(name)
+                                return row[i] if i >= 0 and i < len(row) else default
+                            except (ValueError, IndexError):
+                                return default
+                        itemcode = _col('ITEMCODE')
+                        qty = _to_quantity(_col('QUANTITY'), 1)
+                        rate = _to_float(_col('RATE'), 0.0)
+                        manufacturer_id = _col('MANUFACTURERID')
+                        code_str = str(itemcode).strip() if itemcode else ""
+                        r["items"].append({
+                            "id": code_str or 0,
+                            "name": "",
+                            "price": rate,
+                            "quantity": qty,
+                            "manufactureId": str(manufacturer_id).strip() if manufacturer_id else "",
+                            "ITEMCODE": code_str,
+                        })
+                    # Look up product names from ITEMMASTER by ITEMCODE
+                    itemcodes = [str(it.get("ITEMCODE") or it.get("id") or "").strip() for it in r["items"] if it.get("ITEMCODE") or it.get("id")]
+                    names_map = _get_item_names_from_master(cur, itemcodes)
+                    for it in r["items"]:
+                        code = str(it.get("ITEMCODE") or it.get("id") or "").strip()
+                        it["name"] = names_map.get(code, "") or ""
+                except oracledb.Error:
+                    pass
+                if not r["items"]:
+                    cur.execute(f"""
+                        SELECT BILLNO FROM {HOLD_TABLE_NAME}
+                        WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
+                    """, billno=billno, loc=loc_num, flag=FLAG_HELD)
+                    hold_rows = cur.fetchall()
+                    r["items"] = [{"id": 0, "name": "Item", "price": 0.0, "quantity": 1} for _ in hold_rows]
+            result.sort(key=lambda x: (x.get("HELDDATE") or "", x.get("BILLNO") or 0), reverse=True)
+            return jsonify(result)
+        except oracledb.Error as e:
+            print(f"{HOLD_TABLE_NAME} list error: {e}")
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+    for (loc, bill_no), v in _held_bills_fallback.items():
+        if loc == location_code and not v.get("retrieved"):
+            result.append({
+                "BILLNO": bill_no,
+                "LOCATIONCODE": loc,
+                "HELDDATE": v.get("heldDate"),
+                "items": v.get("items", []),
+            })
+    result.sort(key=lambda x: -(x.get("BILLNO") or 0))
+    return jsonify(result)
+
+
+def _item_names(cur, itemcodes):
+    """ITEMNAME per item code: resident catalog first, Oracle (_get_item_names_from_master) for the rest."""
+    names = {}
+    catalog = _get_catalog()
+    for code in {str(c).strip() for c in itemcodes if c is not None and str(c).strip()}:
+        hit = catalog.lookup(code) if catalog else None
+        if hit and hit[0].get('ITEMNAME'):
+            names[code] = str(hit[0]['ITEMNAME']).strip()
+    missing = [c for c in itemcodes if str(c).strip() not in names]
+    if missing:
+        names.update(_get_item_names_from_master(cur, missing))
+    return names
+
+
+def _held_bill_items(cur, bill_no, hdr_count):
+    """Cart items for a held bill from TEMPBILLDTL, with product names (placeholder lines if it has none)."""
+    items = []
+    try:
+        cur.execute(f"""
+            SELECT SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID
+            FROM {HOLD_DTL_TABLE_NAME}
+            WHERE BILLNO = :billno
+            ORDER BY SLNO
+        """, billno=bill_no)
+        dtl_rows = cur.fetchall()
+        cols = [c[0].upper() if c else '' for c in cur.description] if cur.description else []
+        for row in dtl_rows:
+            def col(name, default=None):
+                try:
+                    i = cols.index(name)
+                    return row[i] if i >= 0 and i < len(row) else default
+                except (ValueError, IndexError):
+                    return default
+            itemcode = col('ITEMCODE')
+            qty = _to_quantity(col('QUANTITY'), 1)
+            rate = _to_float(col('RATE'), 0.0)
+            manufacturer_id = col('MANUFACTURERID')
+            code_str = str(itemcode).strip() if itemcode else ""
+            items.append({
+                "id": code_str or 0,
+                "name": "",
+                "price": rate,
+                "quantity": qty,
+                "manufactureId": str(manufacturer_id).strip() if manufacturer_id else "",
+                "ITEMCODE": code_str,
+                "MANUFACTURERID": str(manufacturer_id).strip() if manufacturer_id else "",
+            })
+        # Look up product names from ITEMMASTER by ITEMCODE and set name on each item
+        itemcodes = [str(it.get("ITEMCODE") or it.get("id") or "").strip() for it in items if it.get("ITEMCODE") or it.get("id")]
+        names_map = _item_names(cur, itemcodes)
+        for it in items:
+            code = str(it.get("ITEMCODE") or it.get("id") or "").strip()
+            it["name"] = names_map.get(code, "") or ""
+    except oracledb.Error:
+        pass
+    if not items:
+        items = [
+            {"id": 0, "name": "Item", "price": 0.0, "quantity": 1}
+            for _ in range(hdr_count)
+        ]
+    return items
+
+
+@app.route('/api/hold/<int:bill_no>', methods=['GET'])
+def get_held_bill(bill_no):
+    """Get held bill details: fetch product details from TEMPBILLDTL, return billNo and items for cart retrieve."""
+    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
+    loc_num = _location_to_num(location_code, 1)
+    conn = _get_connection()
+    if conn:
+        cur = None
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT BILLNO
+                FROM {HOLD_TABLE_NAME}
+                WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
+            """, billno=bill_no, loc=loc_num, flag=FLAG_HELD)
+            hdr_rows = cur.fetchall()
+            if not hdr_rows:
+                return jsonify({"error": "Held bill not found in database"}), 404
+            items = _held_bill_items(cur, bill_no, len(hdr_rows))
+            return jsonify({"billNo": bill_no, "locationCode": location_code, "items": items})
+        except oracledb.Error as e:
+            print(f"{HOLD_TABLE_NAME} get error: {e}")
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+    # In-memory fallback only when DB unavailable
+    key = (location_code, bill_no)
+    if key not in _held_bills_fallback:
+        return jsonify({"error": "Held bill not found"}), 404
+    v = _held_bills_fallback[key]
+    return jsonify({
+        "billNo": bill_no,
+        "locationCode": location_code,
+        "items": v.get("items", []),
+    })
+
+
+@app.route('/api/hold/<int:bill_no>', methods=['DELETE'])
+@_invalidates_flights('/api/hold')
+def delete_held_bill(bill_no):
+    """On retrieve: only change FLAG (held=0 -> draft=1), do not delete from DB."""
+    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
+    loc_num = _location_to_num(location_code, 1)
+    conn = _get_connection()
+    if conn:
+        cur = None
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                UPDATE {HOLD_TABLE_NAME} SET FLAG = :flag
+                WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag_held OR FLAG IS NULL)
+            """, billno=bill_no, loc=loc_num, flag=FLAG_DRAFT, flag_held=FLAG_HELD)
+            conn.commit()
+            return jsonify({"ok": True})
+        except oracledb.Error as e:
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            print(f"{HOLD_TABLE_NAME} update flag error: {e}")
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+    # In-memory fallback: mark as retrieved so it no longer appears in held list
+    key = (location_code, bill_no)
+    if key in _held_bills_fallback:
+        _held_bills_fallback[key]["retrieved"] = True
+    return jsonify({"ok": True})
+
+
+_held_retrieve_lock = threading.Lock()  # in-memory fallback only; Oracle rows are locked with FOR UPDATE
 
 
-@app.route('/api/billno/next', methods=['GET', 'POST'])
-def create_next_billno():
+@app.route('/api/hold/<int:bill_no>/retrieve', methods=['POST'])
+@_invalidates_flights('/api/hold')
+def retrieve_held_bill(bill_no):
     """
-    Create next bill no: fetch MAX(BILLNO), new_billno = last + 1.
-    Insert new_billno into BILLNOTABLE (FLAG='N', BILLDATE=SYSDATE, COUNTERCODE from request).
+    Retrieve a held bill in one call and one transaction: lock its TEMPBILLHDR rows (FOR UPDATE SKIP LOCKED),
+    flip FLAG held -> draft and return the cart like GET /api/hold/<bill_no>. 409 while another terminal is
+    retrieving the same bill, 404 when it is not held.
     """
     data = request.get_json(silent=True) or {}
-    _cnt = data.get('counterCode') or data.get('counter_code') or request.args.get('counterCode') or request.args.get('counter_code')
-    counter_code = str(_cnt).strip() if _cnt is not None else ''
-    counter_code = counter_code or None
+    location_code = (data.get('locationCode') or request.args.get('locationCode') or '').strip() or 'LOC001'
+    loc_num = _location_to_num(location_code, 1)
     conn = _get_connection()
-    if not conn:
-        return jsonify({"error": "Database unavailable", "billNo": None}), 503
-    cur = None
-    try:
-        cur = conn.cursor()
-        _ensure_billnotable(cur)
-        cur.execute(f"SELECT NVL(MAX(BILLNO), 0) AS LAST_BILLNO FROM {BILLNO_TABLE_NAME}")
-        row = cur.fetchone()
-        last_billno = _to_int(row[0], 0) if row else 0
-        new_billno = int(last_billno + 1)
-        counter_code_val = (counter_code if isinstance(counter_code, str) else str(counter_code or '').strip()) or None
+    if conn:
+        cur = None
         try:
-            cur.execute(
-                f"INSERT INTO {BILLNO_TABLE_NAME} (BILLNO, FLAG, BILLDATE, COUNTERCODE) VALUES (:billno, 'N', SYSDATE, :countercode)",
-                {"billno": new_billno, "countercode": counter_code_val}
-            )
-        except oracledb.Error as col_err:
-            err_str = str(col_err).upper()
-            if 'ORA-00913' in err_str or 'ORA-00904' in err_str or '00913' in err_str or '00904' in err_str:
-                cur.execute(
-                    f"INSERT INTO {BILLNO_TABLE_NAME} (BILLNO, FLAG, BILLDATE) VALUES (:billno, 'N', SYSDATE)",
-                    {"billno": new_billno}
-                )
-            elif 'ORA-01722' in err_str or '01722' in err_str:
-                cur.execute(
-                    f"INSERT INTO {BILLNO_TABLE_NAME} (BILLNO, FLAG, BILLDATE) VALUES (:billno, 'N', SYSDATE)",
-                    {"billno": new_billno}
-                )
-            else:
-                raise
-        conn.commit()
-        return jsonify({"ok": True, "billNo": new_billno})
-    except oracledb.Error as e:
-        if conn:
+            cur = conn.cursor()
+            held_where = "BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)"
+            cur.execute(f"SELECT ROWID FROM {HOLD_TABLE_NAME} WHERE {held_where} FOR UPDATE SKIP LOCKED",
+                        billno=bill_no, loc=loc_num, flag=FLAG_HELD)
+            rowids = [r[0] for r in cur.fetchall()]
+            if not rowids:
+                cur.execute(f"SELECT COUNT(*) FROM {HOLD_TABLE_NAME} WHERE {held_where}",
+                            billno=bill_no, loc=loc_num, flag=FLAG_HELD)
+                row = cur.fetchone()
+                if row and _to_int(row[0]) > 0:
+                    return jsonify({"error": "Held bill is being retrieved at another terminal"}), 409
+                return jsonify({"error": "Held bill not found in database"}), 404
+            cur.executemany(f"UPDATE {HOLD_TABLE_NAME} SET FLAG = :flag WHERE ROWID = :rid",
+                            [{"flag": FLAG_DRAFT, "rid": rid} for rid in rowids])
+            items = _held_bill_items(cur, bill_no, len(rowids))
+            conn.commit()
+            return jsonify({"ok": True, "billNo": bill_no, "locationCode": location_code, "items": items})
+        except oracledb.Error as e:
             try:
                 conn.rollback()
             except Exception:
                 pass
-        print(f"[BillNo] {BILLNO_TABLE_NAME} error: {e}")
-        return jsonify({"ok": False, "error": str(e), "billNo": None}), 500
-    finally:
-        if cur:
+            print(f"{HOLD_TABLE_NAME} retrieve error: {e}")
+            return jsonify({"ok": False, "error": str(e)}), 500
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
             try:
-                cur.close()
+                conn.close()
             except Exception:
                 pass
+    # In-memory fallback only when DB unavailable
+    key = (location_code, bill_no)
+    with _held_retrieve_lock:
+        v = _held_bills_fallback.get(key)
+        if not v or v.get("retrieved"):
+            return jsonify({"error": "Held bill not found"}), 404
+        v["retrieved"] = True
+    return jsonify({"ok": True, "billNo": bill_no, "locationCode": location_code, "items": v.get("items", [])})
+
+
+# --- Temp bill maintenance (archive + purge TEMPBILLHDR / TEMPBILLDTL) ---
+# Temp rows are kept while a bill is open. Once BILLNOTABLE marks it paid (FLAG='Y'), or its BILLDATE is older than
+# the held / draft retention, the bill's rows are copied to the _ARC tables (header rows collapsed to one row per
+# location and flag with a UNITS count) and deleted, in batches of TEMPBILL_PURGE_BATCH bills per transaction.
+TEMPBILL_PAID_RETENTION_DAYS = _to_int(os.environ.get('POS_TEMPBILL_PAID_DAYS'), 1)
+TEMPBILL_HELD_RETENTION_DAYS = _to_int(os.environ.get('POS_TEMPBILL_HELD_DAYS'), 7)
+TEMPBILL_DRAFT_RETENTION_DAYS = _to_int(os.environ.get('POS_TEMPBILL_DRAFT_DAYS'), 2)
+TEMPBILL_ARCHIVE = (os.environ.get('POS_TEMPBILL_ARCHIVE') or '1').strip().lower() not in ('0', 'false', 'no')
+TEMPBILL_PURGE_BATCH = 500
+TEMPBILL_PURGE_MAX_BATCHES = 20  # per run; the next run continues
+TEMPBILL_PURGE_INTERVAL_SECONDS = 3600
+HOLD_ARCHIVE_TABLE_NAME = 'TEMPBILLHDR_ARC'
+HOLD_DTL_ARCHIVE_TABLE_NAME = 'TEMPBILLDTL_ARC'
+_tempbill_archive_ready = False
+_tempbill_purge_lock = threading.Lock()
+_tempbill_purge_stats = {'runs': 0, 'lastRunAt': None, 'lastDurationMs': None, 'lastError': None,
+                         'last': None, 'totals': {}, 'tempRows': None}
+
+_TEMPBILL_PURGE_CANDIDATES_SQL = f"""
+    SELECT BILLNO, REASON FROM (
+        SELECT t.BILLNO,
+               CASE WHEN UPPER(b.FLAG) = 'Y' THEN 'PAID' WHEN t.HELD = 1 THEN 'HELD' ELSE 'DRAFT' END AS REASON
+        FROM (
+            SELECT BILLNO, MAX(HELD) AS HELD FROM (
+                SELECT BILLNO, CASE WHEN FLAG = {FLAG_DRAFT} THEN 0 ELSE 1 END AS HELD FROM {HOLD_TABLE_NAME}
+                UNION ALL
+                SELECT BILLNO, 0 FROM {HOLD_DTL_TABLE_NAME}
+            ) GROUP BY BILLNO
+        ) t
+        JOIN {BILLNO_TABLE_NAME} b ON b.BILLNO = t.BILLNO
+        WHERE b.BILLDATE < SYSDATE - CASE WHEN UPPER(b.FLAG) = 'Y' THEN :paid_days
+                                          WHEN t.HELD = 1 THEN :held_days ELSE :draft_days END
+        ORDER BY t.BILLNO
+    ) WHERE ROWNUM <= :batch
+"""
+
+
+def _ensure_tempbill_archive(cur):
+    """Create TEMPBILLHDR_ARC / TEMPBILLDTL_ARC if they do not exist (once per process)."""
+    global _tempbill_archive_ready
+    if _tempbill_archive_ready:
+        return
+    for table, columns in (
+        (HOLD_ARCHIVE_TABLE_NAME, "BILLNO NUMBER NOT NULL, LOCATIONCODE NUMBER, FLAG NUMBER, UNITS NUMBER"),
+        (HOLD_DTL_ARCHIVE_TABLE_NAME, """BILLNO NUMBER NOT NULL, SLNO NUMBER, ITEMCODE VARCHAR2(50), QUANTITY NUMBER,
+            RATE NUMBER, MANUFACTURERID VARCHAR2(50)"""),
+    ):
         try:
-            conn.close()
-        except Exception:
-            pass
+            cur.execute(f"""
+                CREATE TABLE {table} (
+                    {columns},
+                    PURGEREASON VARCHAR2(10),
+                    ARCHIVEDDATE DATE DEFAULT SYSDATE NOT NULL
+                )
+            """)
+        except oracledb.Error as e:
+            err_str = str(e).upper()
+            if 'ORA-00955' not in err_str and '00955' not in err_str and '01031' not in err_str:
+                print(f"[TempBills] {table} create failed: {e}")
+                raise
+    _tempbill_archive_ready = True
 
 
-@app.route('/api/billno/paid', methods=['POST'])
-def mark_bill_paid():
-    """Set FLAG='Y' for the given billNo in BILLNOTABLE (call when bill is paid)."""
-    data = request.get_json(silent=True) or {}
-    bill_no = data.get('billNo') or data.get('billno')
-    if bill_no is None:
-        return jsonify({"ok": False, "error": "billNo required"}), 400
-    try:
-        bill_no = int(bill_no)
-    except (TypeError, ValueError):
-        return jsonify({"ok": False, "error": "billNo must be a number"}), 400
+def _purge_tempbill_batch(cur, bills):
+    """Archive (optional) and delete the temp rows of bills {billno: reason}; returns (hdr rows, dtl rows) deleted."""
+    if TEMPBILL_ARCHIVE:
+        by_reason = {}
+        for bill_no, reason in bills.items():
+            by_reason.setdefault(reason, []).append(bill_no)
+        for reason, bill_nos in by_reason.items():
+            binds, params = _in_binds(bill_nos, 'b')
+            params['reason'] = reason
+            cur.execute(f"""
+                INSERT INTO {HOLD_ARCHIVE_TABLE_NAME} (BILLNO, LOCATIONCODE, FLAG, UNITS, PURGEREASON)
+                SELECT BILLNO, LOCATIONCODE, FLAG, COUNT(*), :reason FROM {HOLD_TABLE_NAME}
+                WHERE BILLNO IN ({binds}) GROUP BY BILLNO, LOCATIONCODE, FLAG
+            """, params)
+            cur.execute(f"""
+                INSERT INTO {HOLD_DTL_ARCHIVE_TABLE_NAME} (BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, PURGEREASON)
+                SELECT BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, :reason FROM {HOLD_DTL_TABLE_NAME}
+                WHERE BILLNO IN ({binds})
+            """, params)
+    binds, params = _in_binds(list(bills), 'b')
+    cur.execute(f"DELETE FROM {HOLD_DTL_TABLE_NAME} WHERE BILLNO IN ({binds})", params)
+    dtl_rows = cur.rowcount
+    cur.execute(f"DELETE FROM {HOLD_TABLE_NAME} WHERE BILLNO IN ({binds})", params)
+    return cur.rowcount, dtl_rows
+
+
+def _tempbill_row_counts(cur):
+    cur.execute(f"SELECT COUNT(*), COUNT(DISTINCT BILLNO) FROM {HOLD_TABLE_NAME}")
+    hdr_rows, open_bills = cur.fetchone() or (0, 0)
+    cur.execute(f"SELECT COUNT(*) FROM {HOLD_DTL_TABLE_NAME}")
+    dtl_rows = (cur.fetchone() or (0,))[0]
+    return {'hdrRows': _to_int(hdr_rows), 'dtlRows': _to_int(dtl_rows), 'openBills': _to_int(open_bills)}
+
+
+def _purge_temp_bills():
+    """
+    One maintenance run: up to TEMPBILL_PURGE_MAX_BATCHES batches, each committed on its own. Returns this run's
+    counts (bills per reason, rows deleted, whether candidates remain); None if Oracle is unavailable.
+    """
     conn = _get_connection()
     if not conn:
-        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+        return None
     cur = None
+    result = {'PAID': 0, 'HELD': 0, 'DRAFT': 0, 'hdrRows': 0, 'dtlRows': 0, 'batches': 0, 'more': False}
     try:
         cur = conn.cursor()
-        cur.execute(
-            f"UPDATE {BILLNO_TABLE_NAME} SET FLAG = 'Y' WHERE BILLNO = :billno",
-            {"billno": bill_no}
-        )
-        conn.commit()
-        return jsonify({"ok": True})
-    except oracledb.Error as e:
-        if conn:
+        _ensure_tempbillhdr(cur)
+        _ensure_tempbilldtl(cur)
+        _ensure_billnotable(cur)
+        if TEMPBILL_ARCHIVE:
+            _ensure_tempbill_archive(cur)
+        candidates_sql = _TEMPBILL_PURGE_CANDIDATES_SQL
+        while result['batches'] < TEMPBILL_PURGE_MAX_BATCHES:
+            params = {'paid_days': TEMPBILL_PAID_RETENTION_DAYS, 'held_days': TEMPBILL_HELD_RETENTION_DAYS,
+                      'draft_days': TEMPBILL_DRAFT_RETENTION_DAYS, 'batch': TEMPBILL_PURGE_BATCH}
             try:
-                conn.rollback()
-            except Exception:
-                pass
-        print(f"[BillNo] paid update error: {e}")
-        return jsonify({"ok": False, "error": str(e)}), 500
+                cur.execute(candidates_sql, params)
+            except oracledb.Error as e:
+                if '00904' not in str(e) or candidates_sql != _TEMPBILL_PURGE_CANDIDATES_SQL:
+                    raise
+                # TEMPBILLHDR without FLAG: every open bill counts as a draft
+                candidates_sql = candidates_sql.replace(f"CASE WHEN FLAG = {FLAG_DRAFT} THEN 0 ELSE 1 END", "0")
+                cur.execute(candidates_sql, params)
+            bills = {_to_int(bill_no): reason for bill_no, reason in cur.fetchall()}
+            if not bills:
+                break
+            hdr_rows, dtl_rows = _purge_tempbill_batch(cur, bills)
+            conn.commit()
+            for reason in bills.values():
+                result[reason] += 1
+            result['hdrRows'] += hdr_rows
+            result['dtlRows'] += dtl_rows
+            result['batches'] += 1
+            result['more'] = len(bills) >= TEMPBILL_PURGE_BATCH
+        result['tempRows'] = _tempbill_row_counts(cur)
+        return result
+    except oracledb.Error:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
     finally:
         if cur:
             try:
@@ -1442,102 +5846,342 @@ def mark_bill_paid():
             pass
 
 
-@app.route('/api/billdtl/insert', methods=['POST'])
-def billdtl_insert():
-    """On Pay: insert BILLHDR (header) then BILLDTL (one row per cart line). BILLTYPE from INVOICECODE: 1=C, 2=R."""
-    data = request.get_json(silent=True) or {}
-    _loc = data.get('locationCode') or data.get('location_code')
-    location_code = str(_loc).strip() if _loc is not None else ''
-    location_code = location_code or None
-    bill_no = data.get('billNo') or data.get('billno')
-    items = data.get('items') or data.get('lines') or []
-    _cnt = data.get('counterCode') or data.get('counter_code')
-    counter_code = str(_cnt).strip() if _cnt is not None else None
-    counter_code = counter_code or None
-    invoice_code = data.get('invoiceCode') or data.get('invoice_code') or data.get('INVOICECODE')
-    bill_type = _billtype_from_invoicecode(invoice_code)
-    if bill_no is None:
-        return jsonify({"ok": False, "error": "billNo required"}), 400
+def _run_tempbill_purge():
+    """Run _purge_temp_bills (one run at a time per worker) and record its metrics."""
+    with _tempbill_purge_lock:
+        started = time.time()
+        stats = _tempbill_purge_stats
+        try:
+            result = _purge_temp_bills()
+            stats['lastError'] = None if result is not None else 'Database unavailable'
+        except oracledb.Error as e:
+            print(f"[TempBills] purge error: {e}")
+            result = None
+            stats['lastError'] = str(e)
+        stats['runs'] += 1
+        stats['lastRunAt'] = datetime.datetime.now().isoformat(timespec='seconds')
+        stats['lastDurationMs'] = round((time.time() - started) * 1000)
+        if result is not None:
+            stats['tempRows'] = result.pop('tempRows')
+            stats['last'] = result
+            for key in ('PAID', 'HELD', 'DRAFT', 'hdrRows', 'dtlRows', 'batches'):
+                stats['totals'][key] = stats['totals'].get(key, 0) + result[key]
+            purged = result['PAID'] + result['HELD'] + result['DRAFT']
+            if purged:
+                print(f"[TempBills] purged {purged} bills ({result['hdrRows']} hdr / {result['dtlRows']} dtl rows)")
+        return result
+
+
+def _tempbill_purge_settings():
+    return {
+        "paidRetentionDays": TEMPBILL_PAID_RETENTION_DAYS,
+        "heldRetentionDays": TEMPBILL_HELD_RETENTION_DAYS,
+        "draftRetentionDays": TEMPBILL_DRAFT_RETENTION_DAYS,
+        "archive": TEMPBILL_ARCHIVE,
+        "batchSize": TEMPBILL_PURGE_BATCH,
+        "maxBatchesPerRun": TEMPBILL_PURGE_MAX_BATCHES,
+        "intervalSeconds": TEMPBILL_PURGE_INTERVAL_SECONDS,
+    }
+
+
+@app.route('/api/maintenance/temp-bills', methods=['GET'])
+def tempbill_purge_status():
+    """Temp bill purge settings and metrics (last run, totals since start, current temp-table size). Manager/IT only."""
+    _, err = _require_manager()
+    if err:
+        return err
+    return jsonify({"ok": True, "settings": _tempbill_purge_settings(), **_tempbill_purge_stats})
+
+
+@app.route('/api/maintenance/temp-bills/purge', methods=['POST'])
+def tempbill_purge_now():
+    """Run one temp bill purge now. Manager/IT only."""
+    _, err = _require_manager()
+    if err:
+        return err
+    result = _run_tempbill_purge()
+    if result is None:
+        return jsonify({"ok": False, "error": _tempbill_purge_stats['lastError']}), 503
+    return jsonify({"ok": True, "result": result, "tempRows": _tempbill_purge_stats['tempRows']})
+
+
+def _tempbill_purge_job():
+    if _run_tempbill_purge() is None:
+        raise RuntimeError(_tempbill_purge_stats['lastError'] or 'Database unavailable')
+
+
+_schedule_job('tempbill-purge', _tempbill_purge_job, every=TEMPBILL_PURGE_INTERVAL_SECONDS, initial_delay=60)
+
+
+# --- Audit events (durable local queue, batched background writer) ---
+# Hold, cancel and pay events are appended to a local SQLite queue inside the request and written to Oracle by a
+# background thread, so audit table contention never delays the cashier. Each batch is written with array DML in
+# one transaction: POSAUDITEVENT (one row per event, EVENTID primary key so a re-sent batch is skipped) and, for
+# hold/cancel, TBLCANCELEDHDR / TBLCANCELEDDTL. Failed events stay queued and are retried with backoff; after
+# AUDIT_MAX_ATTEMPTS failed writes an event moves to the queue's audit_dead_letter table for manual replay. The queue
+# lives in the per-user app data dir (POS_DATA_DIR), not temp, so OS temp cleanup cannot drop unsent events.
+AUDIT_QUEUE_PATH = os.environ.get('POS_AUDIT_QUEUE_PATH') or os.path.join(POS_DATA_DIR, 'audit-queue.db')
+AUDIT_EVENT_TABLE_NAME = 'POSAUDITEVENT'
+AUDIT_BATCH_MAX = 200
+AUDIT_FLUSH_SECONDS = 1.0
+AUDIT_CLAIM_SECONDS = 120  # a batch claimed by a worker that died is retried after this
+AUDIT_RETRY_MAX_SECONDS = 60
+AUDIT_MAX_ATTEMPTS = 10  # failed writes (Oracle reached) before an event is dead-lettered; outages do not count
+AUDIT_CANCELED_KINDS = ('hold', 'cancel')
+_audit_queue_ready = False
+_audit_event_table_ready = False
+_audit_writer = None
+_audit_pending_checked = False
+_audit_wake = threading.Event()
+_audit_lock = threading.Lock()
+
+
+def _audit_queue_db():
+    """Connection to the local queue (one per call; SQLite serializes writers across threads and workers)."""
+    global _audit_queue_ready
+    if not _audit_queue_ready:
+        os.makedirs(os.path.dirname(os.path.abspath(AUDIT_QUEUE_PATH)), exist_ok=True)
+    db = sqlite3.connect(AUDIT_QUEUE_PATH, timeout=30, isolation_level=None)
+    if not _audit_queue_ready:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS audit_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_at REAL
+            )
+        """)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS audit_dead_letter (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+        _audit_queue_ready = True
+    return db
+
+
+def _audit_bill_event(kind, location_code, bill_no, counter_code, lines, discount=0.0):
+    """
+    Queue a hold / cancel / pay event for a bill. lines: dicts with slno, itemcode, quantity, rate,
+    manufacturerid. Date and time are taken now, not when the writer gets to the event.
+    """
+    now = datetime.datetime.now()
+    payload = {
+        'eventid': os.urandom(16).hex(),
+        'loc': location_code,
+        'billno': bill_no,
+        'countercode': counter_code or None,
+        'billdate': now.strftime('%Y-%m-%d'),
+        'billtime': now.strftime('%H:%M:%S'),
+        'discount': discount,
+        'netamount': sum(line['quantity'] * line['rate'] for line in lines),
+        'username': _username_from_request(),
+        'lines': lines,
+    }
     try:
-        bill_no = int(bill_no)
-    except (TypeError, ValueError):
-        return jsonify({"ok": False, "error": "billNo must be a number"}), 400
-    if not isinstance(items, list):
-        return jsonify({"ok": False, "error": "items must be an array"}), 400
+        db = _audit_queue_db()
+        try:
+            db.execute("INSERT INTO audit_events (kind, payload) VALUES (?, ?)", (kind, json.dumps(payload)))
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[Audit] queue write failed ({AUDIT_QUEUE_PATH}), event lost: {kind} {json.dumps(payload)}: {e}")
+        return
+    _start_audit_writer()
+    _audit_wake.set()
+
+
+def _audit_lines(items):
+    """Audit lines (slno, itemcode, quantity, rate, manufacturerid) from cart or bill items."""
+    lines = []
+    for slno, it in enumerate(items, start=1):
+        if not isinstance(it, dict):
+            continue
+        itemcode = str(it.get('itemCode') or it.get('ITEMCODE') or it.get('itemcode') or it.get('id') or '').strip()
+        manufacturer_id = str(it.get('manufactureId') or it.get('MANUFACTURERID') or it.get('manufacturerId') or '').strip()
+        lines.append({
+            'slno': slno,
+            'itemcode': itemcode or None,
+            'quantity': _to_float(it.get('quantity') or it.get('qty') or it.get('QUANTITY'), 0.0),
+            'rate': _to_float(it.get('rate') or it.get('RATE') or it.get('price') or it.get('PRICE'), 0.0),
+            'manufacturerid': manufacturer_id or None,
+        })
+    return lines
+
+
+def _ensure_audit_event_table(cur):
+    global _audit_event_table_ready
+    if _audit_event_table_ready:
+        return
+    try:
+        cur.execute(f"""
+            CREATE TABLE {AUDIT_EVENT_TABLE_NAME} (
+                EVENTID VARCHAR2(32) PRIMARY KEY,
+                EVENTTYPE VARCHAR2(10) NOT NULL,
+                LOCATIONCODE VARCHAR2(50),
+                BILLNO NUMBER,
+                COUNTERCODE VARCHAR2(50),
+                EVENTDATE DATE DEFAULT SYSDATE NOT NULL,
+                LINECOUNT NUMBER,
+                AMOUNT NUMBER,
+                USERNAME VARCHAR2(100)
+            )
+        """)
+    except oracledb.Error as e:
+        err_str = str(e).upper()
+        if 'ORA-00955' not in err_str and '00955' not in err_str and '01031' not in err_str:
+            print(f"[Audit] {AUDIT_EVENT_TABLE_NAME} create failed: {e}")
+            raise
+    _audit_event_table_ready = True
+
+
+def _write_audit_batch(cur, events):
+    """
+    Insert a claimed batch [(kind, payload), ...] with array DML; events already in POSAUDITEVENT are skipped.
+    Returns the indices of events whose POSAUDITEVENT row could not be written: their TBLCANCELED rows are not
+    inserted either (the EVENTID row is what makes a retry skip them), so they are retried as a whole.
+    """
+    _ensure_audit_event_table(cur)
+    event_rows = [{
+        'eventid': p['eventid'], 'kind': kind.upper(), 'loc': p['loc'], 'billno': p['billno'],
+        'countercode': p['countercode'], 'eventdate': f"{p['billdate']} {p['billtime']}",
+        'linecount': len(p['lines']), 'amount': p['netamount'], 'username': p['username'],
+    } for kind, p in events]
+    duplicates = set()
+    failed = set()
+    try:
+        cur.executemany(f"""
+            INSERT INTO {AUDIT_EVENT_TABLE_NAME}
+                (EVENTID, EVENTTYPE, LOCATIONCODE, BILLNO, COUNTERCODE, EVENTDATE, LINECOUNT, AMOUNT, USERNAME)
+            VALUES (:eventid, :kind, :loc, :billno, :countercode, TO_DATE(:eventdate, 'YYYY-MM-DD HH24:MI:SS'),
+                    :linecount, :amount, :username)
+        """, event_rows, batcherrors=True)
+        for err in cur.getbatcherrors():
+            if '00001' in err.message:
+                duplicates.add(err.offset)
+            else:
+                failed.add(err.offset)
+                print(f"[Audit] {AUDIT_EVENT_TABLE_NAME} row failed, will retry: {err.message}")
+    except oracledb.Error as e:
+        if '00942' not in str(e):
+            raise
+        # no event rows, so nothing would stop a retry from inserting the canceled rows twice
+        print(f"[Audit] {AUDIT_EVENT_TABLE_NAME} unavailable, will retry: {e}")
+        return set(range(len(events)))
+    canceled = [p for i, (kind, p) in enumerate(events)
+                if kind in AUDIT_CANCELED_KINDS and i not in duplicates and i not in failed]
+    hdr_rows = [{k: p[k] for k in ('loc', 'billno', 'billdate', 'billtime', 'countercode', 'discount', 'netamount')}
+                for p in canceled]
+    dtl_rows = [dict(line, loc=p['loc'], billno=p['billno']) for p in canceled for line in p['lines']]
+    for table, sql, rows in (
+        ('TBLCANCELEDHDR', """
+            INSERT INTO TBLCANCELEDHDR (LOCATIONCODE, BILLNO, BILLDATE, BILLTIME, COUNTERCODE, DISCOUNTAMOUNT, NETBILLAMOUNT)
+            VALUES (:loc, :billno, TO_DATE(:billdate, 'YYYY-MM-DD'), :billtime, :countercode, :discount, :netamount)
+        """, hdr_rows),
+        ('TBLCANCELEDDTL', """
+            INSERT INTO TBLCANCELEDDTL (LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID)
+            VALUES (:loc, :billno, :slno, :itemcode, :quantity, :rate, :manufacturerid)
+        """, dtl_rows),
+    ):
+        if not rows:
+            continue
+        try:
+            cur.executemany(sql, rows, batcherrors=True)
+            for err in cur.getbatcherrors():
+                print(f"[Audit] {table} row skipped: {err.message}")
+        except oracledb.Error as e:
+            err_str = str(e).upper()
+            if '00942' not in err_str and '00904' not in err_str:
+                raise
+            # missing table / column: not retryable, same as the old inline insert which only logged it
+            print(f"[Audit] {table} insert failed: {e}")
+    return failed
+
+
+def _claim_audit_batch():
+    """Claim up to AUDIT_BATCH_MAX unclaimed (or abandoned) events: [(id, kind, payload), ...]."""
+    db = _audit_queue_db()
+    try:
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        rows = db.execute("""
+            SELECT id, kind, payload FROM audit_events
+            WHERE claimed_at IS NULL OR claimed_at < ?
+            ORDER BY id LIMIT ?
+        """, (now - AUDIT_CLAIM_SECONDS, AUDIT_BATCH_MAX)).fetchall()
+        db.executemany("UPDATE audit_events SET claimed_at = ? WHERE id = ?", [(now, r[0]) for r in rows])
+        db.execute("COMMIT")
+        return [(r[0], r[1], json.loads(r[2])) for r in rows]
+    except sqlite3.Error:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
+    finally:
+        db.close()
+
+
+def _finish_audit_batch(written, retry=(), attempted=True):
+    """
+    Drop written events from the queue and release the rest for a retry. attempted: Oracle was reached, so the
+    retries count towards AUDIT_MAX_ATTEMPTS; events that reach it move to audit_dead_letter.
+    """
+    db = _audit_queue_db()
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany("DELETE FROM audit_events WHERE id = ?", [(i,) for i in written])
+        db.executemany(f"UPDATE audit_events SET claimed_at = NULL, attempts = attempts + {1 if attempted else 0} "
+                       "WHERE id = ?", [(i,) for i in retry])
+        dead = []
+        if attempted and retry:
+            binds = ', '.join('?' * len(retry))
+            dead = db.execute(f"SELECT id, kind, attempts FROM audit_events WHERE id IN ({binds}) AND attempts >= ?",
+                              (*retry, AUDIT_MAX_ATTEMPTS)).fetchall()
+        if dead:
+            db.executemany("""
+                INSERT INTO audit_dead_letter (id, kind, payload, attempts, failed_at)
+                SELECT id, kind, payload, attempts, ? FROM audit_events WHERE id = ?
+            """, [(time.time(), r[0]) for r in dead])
+            db.executemany("DELETE FROM audit_events WHERE id = ?", [(r[0],) for r in dead])
+        db.execute("COMMIT")
+        for event_id, kind, attempts in dead:
+            print(f"[Audit] {kind} event {event_id} dead-lettered after {attempts} attempts ({AUDIT_QUEUE_PATH})")
+    except sqlite3.Error:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
+    finally:
+        db.close()
+
+
+def _flush_audit_events():
+    """Write one claimed batch to Oracle. Returns the number written, or None if any event failed (kept queued)."""
+    batch = _claim_audit_batch()
+    if not batch:
+        return 0
+    ids = [b[0] for b in batch]
     conn = _get_connection()
     if not conn:
-        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+        _finish_audit_batch([], ids, attempted=False)
+        return None
     cur = None
-    inserted = 0
     try:
         cur = conn.cursor()
-        _ensure_billhdr(cur)
-        _ensure_billdtl(cur)
-        # Insert BILLHDR: LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE, COUNTERCODE, RESETNO=1, SESSIONCODE=0
-        try:
-            cur.execute(
-                f"""
-                INSERT INTO {BILLHDR_TABLE_NAME} (LOCATIONCODE, BILLNO, BILLDATE, BILLTYPE, COUNTERCODE, RESETNO, SESSIONCODE)
-                VALUES (:loc, :billno, SYSDATE, :billtype, :countercode, 1, 0)
-                """,
-                {"loc": location_code, "billno": bill_no, "billtype": bill_type, "countercode": counter_code}
-            )
-        except oracledb.Error as hdr_err:
-            err_str = str(hdr_err).upper()
-            if 'ORA-00001' not in err_str and '00001' not in err_str:
-                raise
-            try:
-                cur.execute(
-                    f"""
-                    UPDATE {BILLHDR_TABLE_NAME} SET LOCATIONCODE = :loc, BILLDATE = SYSDATE, BILLTYPE = :billtype, COUNTERCODE = :countercode, RESETNO = 1, SESSIONCODE = 0
-                    WHERE BILLNO = :billno
-                    """,
-                    {"loc": location_code, "billno": bill_no, "billtype": bill_type, "countercode": counter_code}
-                )
-            except oracledb.Error:
-                pass
-        # Remove any existing rows for this bill so insert is idempotent (avoids ORA-00001 on double Pay / re-submit)
-        try:
-            cur.execute(f"DELETE FROM {BILLDTL_TABLE_NAME} WHERE BILLNO = :billno", {"billno": bill_no})
-        except oracledb.Error:
-            pass
-        for slno, it in enumerate(items, start=1):
-            if not it or not isinstance(it, dict):
-                continue
-            _ic = it.get('itemCode') or it.get('ITEMCODE') or it.get('itemcode') or it.get('id')
-            item_code = str(_ic).strip() if _ic is not None else ''
-            if not item_code:
-                continue
-            qty = it.get('quantity') or it.get('QUANTITY') or 0
-            rate = it.get('rate') or it.get('RATE') or it.get('price') or 0
-            try:
-                qty = float(qty) if qty is not None else 0
-            except (TypeError, ValueError):
-                qty = 0
-            try:
-                rate = float(rate) if rate is not None else 0
-            except (TypeError, ValueError):
-                rate = 0
-            cur.execute(
-                f"""
-                INSERT INTO {BILLDTL_TABLE_NAME} (LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, RESETNO)
-                VALUES (:loc, :billno, :slno, :itemcode, :qty, :rate, 1)
-                """,
-                {"loc": location_code, "billno": bill_no, "slno": slno, "itemcode": item_code, "qty": qty, "rate": rate}
-            )
-            inserted += 1
+        failed = _write_audit_batch(cur, [(kind, payload) for _, kind, payload in batch])
         conn.commit()
-        if items and inserted == 0:
-            return jsonify({"ok": False, "error": "No valid rows inserted (check itemCode/quantity/rate)"}), 400
-        return jsonify({"ok": True, "inserted": inserted})
     except oracledb.Error as e:
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        print(f"[BILLDTL] insert error: {e}")
-        return jsonify({"ok": False, "error": str(e)}), 500
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        print(f"[Audit] batch of {len(ids)} failed, will retry: {e}")
+        _finish_audit_batch([], ids)
+        return None
     finally:
         if cur:
             try:
@@ -1548,30 +6192,136 @@ def billdtl_insert():
             conn.close()
         except Exception:
             pass
+    _finish_audit_batch([i for n, i in enumerate(ids) if n not in failed], [ids[n] for n in sorted(failed)])
+    if failed:
+        return None
+    return len(ids)
 
 
-@app.route('/api/billno/check', methods=['GET'])
-def check_billno():
-    """Check last and next bill no from BILLNOTABLE (read-only, no insert)."""
-    conn = _get_connection()
+def _audit_writer_loop():
+    failures = 0
+    while True:
+        try:
+            written = _flush_audit_events()
+        except Exception as e:
+            print(f"[Audit] writer error: {e}")
+            written = None
+        if written is None:
+            failures += 1
+            time.sleep(min(AUDIT_RETRY_MAX_SECONDS, 2 ** failures))
+            continue
+        failures = 0
+        if written < AUDIT_BATCH_MAX:
+            _audit_wake.wait(AUDIT_FLUSH_SECONDS)
+            _audit_wake.clear()
+
+
+def _start_audit_writer():
+    """Start this worker's writer thread once (it also drains events left queued by an earlier run)."""
+    global _audit_writer
+    if _audit_writer is not None:
+        return
+    with _audit_lock:
+        if _audit_writer is None:
+            _audit_writer = threading.Thread(target=_audit_writer_loop, name='audit-writer', daemon=True)
+            _audit_writer.start()
+
+
+@app.before_request
+def _start_audit_writer_if_pending():
+    """With this worker's first request, start the writer if an earlier run (crash, restart) left events queued."""
+    global _audit_pending_checked
+    if _audit_pending_checked:
+        return
+    _audit_pending_checked = True
+    if _audit_writer is not None or not os.path.exists(AUDIT_QUEUE_PATH):
+        return
+    try:
+        db = _audit_queue_db()
+        try:
+            pending = db.execute("SELECT 1 FROM audit_events LIMIT 1").fetchone()
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        print(f"[Audit] queue check failed ({AUDIT_QUEUE_PATH}): {e}")
+        return
+    if pending:
+        print(f"[Audit] draining events queued by an earlier run ({AUDIT_QUEUE_PATH})")
+        _start_audit_writer()
+
+
+# --- Hot items (top sellers per location / counter from BILLDTL) ---
+# Sales over the last HOT_ITEMS_WINDOW_DAYS are counted per (location, counter, item) by a background reload;
+# paid bills are added as they are inserted. The top items of each location are resolved once and kept as
+# lookup hits, so scans of them are answered from memory while the resident catalog is still loading.
+HOT_ITEMS_WINDOW_DAYS = _to_int(os.environ.get('POS_HOT_ITEMS_DAYS'), 14)
+HOT_ITEMS_REFRESH_SECONDS = 900
+HOT_ITEMS_WARM = 300  # per location
+HOT_ITEMS_DEFAULT_LIMIT = 50
+HOT_ITEMS_MAX_LIMIT = 500
+_hot_items = {'counts': {}, 'bills': {}, 'loaded_at': 0.0, 'ready': False}  # bills: BILLNO -> (recorded_at, lines)
+_hot_hits = {}  # (location key, UPPER code) -> lookup hit
+_hot_items_lock = threading.Lock()
+_hot_items_refresh_lock = threading.Lock()  # held by the one running reload
+
+_HOT_ITEMS_SQL = f"""
+    SELECT d.LOCATIONCODE, h.COUNTERCODE, d.ITEMCODE, COUNT(DISTINCT d.BILLNO), SUM(d.QUANTITY)
+    FROM {BILLDTL_TABLE_NAME} d
+    JOIN {BILLHDR_TABLE_NAME} h ON h.BILLNO = d.BILLNO
+    WHERE h.BILLDATE >= TRUNC(SYSDATE) - :days AND d.ITEMCODE IS NOT NULL
+    GROUP BY d.LOCATIONCODE, h.COUNTERCODE, d.ITEMCODE
+"""
+
+
+def _hot_count(counts, location_key, counter_code, item_code, bills, quantity):
+    """Add to the (location, counter) and whole-location ('' counter) tallies: item -> [bills, quantity]."""
+    for key in ((location_key, (counter_code or '').strip().upper()), (location_key, '')):
+        tally = counts.setdefault(key, {}).setdefault(item_code, [0, 0.0])
+        tally[0] += bills
+        tally[1] += quantity
+
+
+def _hot_ranked(counts, location_key, counter_code, limit):
+    """Item codes by bills then quantity: the counter's own best sellers first, topped up from the location's."""
+    ranked = []
+    seen = set()
+    keys = [(location_key, counter_code.upper())] if counter_code else []
+    for key in keys + [(location_key, '')]:
+        tallies = counts.get(key) or {}
+        for item_code in sorted(tallies, key=lambda ic: (-tallies[ic][0], -tallies[ic][1], ic)):
+            if item_code not in seen:
+                seen.add(item_code)
+                ranked.append((item_code, tallies[item_code]))
+                if len(ranked) >= limit:
+                    return ranked
+    return ranked
+
+
+def _load_hot_items():
+    """Count BILLDTL sales per location / counter / item over the window. None if Oracle unavailable."""
+    conn = _get_connection(read_only=True)
     if not conn:
-        return jsonify({"error": "Database unavailable", "lastBillNo": None, "nextBillNo": None}), 503
+        return None
     cur = None
     try:
         cur = conn.cursor()
-        _ensure_billnotable(cur)
-        cur.execute(f"SELECT NVL(MAX(BILLNO), 0) AS LAST_BILLNO FROM {BILLNO_TABLE_NAME}")
-        row = cur.fetchone()
-        last_billno = _to_int(row[0], 0) if row else 0
-        next_billno = last_billno + 1
-        return jsonify({
-            "ok": True,
-            "lastBillNo": last_billno,
-            "nextBillNo": next_billno,
-        })
+        try:
+            cur.execute(_HOT_ITEMS_SQL, {"days": HOT_ITEMS_WINDOW_DAYS})
+        except oracledb.Error as e:
+            err_str = str(e).upper()
+            if '00942' in err_str:
+                return {}
+            if '00904' not in err_str:
+                raise
+            # BILLHDR without COUNTERCODE: per-location counts only
+            cur.execute(_HOT_ITEMS_SQL.replace('h.COUNTERCODE', 'NULL'), {"days": HOT_ITEMS_WINDOW_DAYS})
+        counts = {}
+        for loc, counter, item_code, bills, quantity in cur.fetchall():
+            _hot_count(counts, _location_key(loc), counter, str(item_code).strip(), _to_int(bills), _to_float(quantity))
+        return counts
     except oracledb.Error as e:
-        print(f"[BillNo] check error: {e}")
-        return jsonify({"ok": False, "error": str(e), "lastBillNo": None, "nextBillNo": None}), 500
+        print(f"[HotItems] load error: {e}")
+        return None
     finally:
         if cur:
             try:
@@ -1584,127 +6334,387 @@ def check_billno():
             pass
 
 
-# --- Counter table: SYSTEMIP, SYSTEMNAME, COUNTERCODE, COUNTERNAME ---
-COUNTER_TABLE_NAME = 'COUNTER'
+def _warm_hot_hits(counts):
+    """Resolve every location's top HOT_ITEMS_WARM items into lookup hits, keyed by item code and manufacturer id."""
+    hits = {}
+    for location_key, counter in list(counts):
+        if counter:
+            continue
+        codes = [ic for ic, _ in _hot_ranked(counts, location_key, '', HOT_ITEMS_WARM)]
+        _, found = _batch_hits(codes, location_key or None)
+        for hit in found.values():
+            for key in (hit[0].get('ITEMCODE'), hit[0].get('MANUFACTUREID')):
+                key = _code_str(key).upper()
+                if key:
+                    hits.setdefault((location_key, key), hit)
+    return hits
 
 
-def _ensure_counter_table(cur):
-    """Create COUNTER table if not exists. Columns: SYSTEMIP, SYSTEMNAME, COUNTERCODE, COUNTERNAME."""
-    create_sql = f"""
-        CREATE TABLE {COUNTER_TABLE_NAME} (
-            SYSTEMIP VARCHAR2(45),
-            SYSTEMNAME VARCHAR2(255),
-            COUNTERCODE VARCHAR2(50),
-            COUNTERNAME VARCHAR2(255)
-        )
-    """
-    try:
-        cur.execute(create_sql)
-    except oracledb.Error as e:
-        err_str = str(e).upper()
-        if 'ORA-00955' in err_str or '00955' in err_str:
-            pass
-        else:
-            print(f"[Counter] {COUNTER_TABLE_NAME} create failed: {e}")
+def _refresh_hot_items():
+    global _hot_hits
+    started = time.time()
+    counts = _load_hot_items()
+    if counts is None:
+        return
+    hits = _warm_hot_hits(counts)
+    with _hot_items_lock:
+        # bills recorded after the query started may be missing from it: replay them onto the new counts
+        bills = {b: sale for b, sale in _hot_items['bills'].items() if sale[0] >= started}
+        for _, lines in bills.values():
+            for entry in lines:
+                _hot_count(counts, *entry[:3], 1, entry[3])
+        _hot_items.update(counts=counts, bills=bills, loaded_at=time.time(), ready=True)
+        _hot_hits = hits
+    _invalidate_single_flight('/api/products/top')
+    print(f"[HotItems] loaded {len(counts)} location/counter lists, {len(hits)} warm codes")
 
 
-@app.route('/api/counters', methods=['GET'])
-def list_counters():
-    """Fetch SYSTEMNAME, COUNTERCODE, COUNTERNAME. If systemIp (and optional systemName) given, only active system's row(s); one row for current terminal."""
-    system_ip = (request.args.get('systemIp') or request.args.get('system_ip') or '').strip()
-    system_name = (request.args.get('systemName') or request.args.get('system_name') or '').strip()
-    conn = _get_connection()
-    if not conn:
-        return jsonify({"ok": False, "counters": [], "error": "Database unavailable"}), 503
-    cur = None
+@_on_bus('resync')
+def _forget_hot_hits(data=None, version=None):
+    """Drop warm lookup results (prices may have changed); the next hot-items reload warms them again."""
+    global _hot_hits
+    _hot_hits = {}
+
+
+def _get_hot_items():
+    """Current hot-item state (may be empty while the first load runs); reloads in the background when stale."""
+    if (time.time() - _hot_items['loaded_at'] >= _stale_after(HOT_ITEMS_REFRESH_SECONDS)
+            and _hot_items_refresh_lock.acquire(blocking=False)):
+        def run():
+            try:
+                _refresh_hot_items()
+            except Exception as e:
+                print(f"[HotItems] refresh error: {e}")
+            finally:
+                _hot_items_refresh_lock.release()
+        threading.Thread(target=run, name='hot-items-refresh', daemon=True).start()
+    return _hot_items
+
+
+def _refresh_hot_items_job():
+    """Scheduled reload (every worker keeps its own counts); skipped while a request-triggered reload runs."""
+    if not _hot_items_refresh_lock.acquire(blocking=False):
+        return
     try:
-        cur = conn.cursor()
-        _ensure_counter_table(cur)
+        _refresh_hot_items()
+    finally:
+        _hot_items_refresh_lock.release()
+
+
+_schedule_job('hot-items', _refresh_hot_items_job, every=HOT_ITEMS_REFRESH_SECONDS, singleton=False, initial_delay=0)
+
+
+def _record_hot_sale(location_code, counter_code, bill_no, items):
+    """Count a paid bill's lines (once per BILLNO until the next reload) without waiting for that reload."""
+    location_key = _location_key(location_code)
+    lines = {}
+    for it in items:
+        if not isinstance(it, dict):
+            continue
+        _ic = it.get('itemCode') or it.get('ITEMCODE') or it.get('itemcode') or it.get('id')
+        item_code = str(_ic).strip() if _ic is not None else ''
+        if item_code:
+            lines[item_code] = lines.get(item_code, 0.0) + _to_float(it.get('quantity') or it.get('QUANTITY'))
+    if not lines:
+        return
+    with _hot_items_lock:
+        if bill_no in _hot_items['bills']:
+            return
+        sale = [(location_key, counter_code, item_code, quantity) for item_code, quantity in lines.items()]
+        _hot_items['bills'][bill_no] = (time.time(), sale)
+        for entry in sale:
+            _hot_count(_hot_items['counts'], *entry[:3], 1, entry[3])
+
+
+def _hot_lookup(keys, location_code=None):
+    """(key, hit) for a scanned code from the warmed hot items (this store first, then unscoped rows)."""
+    _get_hot_items()
+    location_key = _location_key(location_code)
+    return _first_hit(keys, lambda key: _hot_hits.get((location_key, key.upper())) or _hot_hits.get(('', key.upper())))
+
+
+@app.route('/api/products/top', methods=['GET'])
+@_single_flight(fresh=5, stale=30)
+def get_top_products():
+    """
+    Best sellers for a location / counter over the last HOT_ITEMS_WINDOW_DAYS, resolved like lookup_product
+    (name, price, UOM). Args: locationCode (default login location), counterCode, limit.
+    """
+    location_code = _request_location_code()
+    counter_code = (request.args.get('counterCode') or request.args.get('counter_code') or '').strip()
+    limit, _ = _paging_args(HOT_ITEMS_DEFAULT_LIMIT, HOT_ITEMS_MAX_LIMIT)
+    state = _get_hot_items()
+    with _hot_items_lock:
+        ranked = [(ic, list(t)) for ic, t in _hot_ranked(state['counts'], _location_key(location_code), counter_code, limit)]
+    _, found = _batch_hits([ic for ic, _ in ranked], location_code)
+    items = []
+    for item_code, (bills, quantity) in ranked:
+        hit = found.get(item_code)
+        if not hit:
+            continue
+        result = _lookup_result(dict(hit[0]), *hit[1:], code=item_code)
+        result['SOLDBILLS'] = bills
+        result['SOLDQUANTITY'] = quantity
+        items.append(result)
+    return jsonify({
+        "ok": True,
+        "ready": state['ready'],
+        "locationCode": location_code,
+        "counterCode": counter_code or None,
+        "windowDays": HOT_ITEMS_WINDOW_DAYS,
+        "items": items,
+    })
+
+
+# --- Sales rollups (per business date / location / counter / cashier, maintained at checkout) ---
+# billdtl_insert adds each paid bill into POSSALESROLLUP in the same transaction as BILLHDR/BILLDTL, so counter
+# summaries and the close-counter Z totals are a keyed read instead of a BILLHDR/BILLDTL aggregation. Each bill's
+# contribution is kept in POSSALESROLLUPBILL: a re-submitted Pay replaces it rather than counting twice.
+SALES_ROLLUP_TABLE_NAME = 'POSSALESROLLUP'
+SALES_ROLLUP_BILL_TABLE_NAME = 'POSSALESROLLUPBILL'
+SALES_ROLLUP_BILL_RETENTION_DAYS = _to_int(os.environ.get('POS_SALES_ROLLUP_BILL_DAYS'), 7)
+SALES_SUMMARY_MAX_DAYS = 93
+_ROLLUP_NONE = '-'  # key columns are part of the primary key, so a missing location / counter / cashier is stored as '-'
+_sales_rollup_ready = False
+SALES_ROLLUP_ENSURE_RETRY_SECONDS = 300  # after a failed table create, Pay retries the DDL at most this often
+_pay_tables_attempted_at = 0.0
+
+_SALES_ROLLUP_MERGE_SQL = f"""
+    MERGE INTO {SALES_ROLLUP_TABLE_NAME} r
+    USING (SELECT :bday AS BUSINESSDATE, :loc AS LOCATIONCODE, :cnt AS COUNTERCODE, :cashier AS CASHIER FROM dual) s
+    ON (r.BUSINESSDATE = s.BUSINESSDATE AND r.LOCATIONCODE = s.LOCATIONCODE
+        AND r.COUNTERCODE = s.COUNTERCODE AND r.CASHIER = s.CASHIER)
+    WHEN MATCHED THEN UPDATE SET
+        r.BILLS = r.BILLS + :bills, r.LINES = r.LINES + :lines, r.QUANTITY = r.QUANTITY + :qty,
+        r.GROSSAMOUNT = r.GROSSAMOUNT + :amount, r.CASHBILLS = r.CASHBILLS + :cbills,
+        r.CASHAMOUNT = r.CASHAMOUNT + :camount, r.CREDITBILLS = r.CREDITBILLS + :rbills,
+        r.CREDITAMOUNT = r.CREDITAMOUNT + :ramount, r.UPDATEDAT = SYSDATE
+    WHEN NOT MATCHED THEN INSERT
+        (BUSINESSDATE, LOCATIONCODE, COUNTERCODE, CASHIER, BILLS, LINES, QUANTITY, GROSSAMOUNT,
+         CASHBILLS, CASHAMOUNT, CREDITBILLS, CREDITAMOUNT, UPDATEDAT)
+        VALUES (:bday, :loc, :cnt, :cashier, :bills, :lines, :qty, :amount, :cbills, :camount, :rbills, :ramount, SYSDATE)
+"""
+
+_SALES_ROLLUP_COLUMNS = ('BILLS', 'LINES', 'QUANTITY', 'GROSSAMOUNT', 'CASHBILLS', 'CASHAMOUNT', 'CREDITBILLS', 'CREDITAMOUNT')
+
+
+def _ensure_sales_rollup_tables(cur):
+    global _sales_rollup_ready
+    if _sales_rollup_ready:
+        return
+    ddl = (
+        (SALES_ROLLUP_TABLE_NAME, f"""
+            CREATE TABLE {SALES_ROLLUP_TABLE_NAME} (
+                BUSINESSDATE DATE NOT NULL,
+                LOCATIONCODE VARCHAR2(50) NOT NULL,
+                COUNTERCODE VARCHAR2(50) NOT NULL,
+                CASHIER VARCHAR2(100) NOT NULL,
+                BILLS NUMBER DEFAULT 0,
+                LINES NUMBER DEFAULT 0,
+                QUANTITY NUMBER DEFAULT 0,
+                GROSSAMOUNT NUMBER DEFAULT 0,
+                CASHBILLS NUMBER DEFAULT 0,
+                CASHAMOUNT NUMBER DEFAULT 0,
+                CREDITBILLS NUMBER DEFAULT 0,
+                CREDITAMOUNT NUMBER DEFAULT 0,
+                UPDATEDAT DATE,
+                CONSTRAINT {SALES_ROLLUP_TABLE_NAME}_PK PRIMARY KEY (BUSINESSDATE, LOCATIONCODE, COUNTERCODE, CASHIER)
+            )
+        """),
+        (SALES_ROLLUP_BILL_TABLE_NAME, f"""
+            CREATE TABLE {SALES_ROLLUP_BILL_TABLE_NAME} (
+                BILLNO NUMBER PRIMARY KEY,
+                BUSINESSDATE DATE NOT NULL,
+                LOCATIONCODE VARCHAR2(50) NOT NULL,
+                COUNTERCODE VARCHAR2(50) NOT NULL,
+                CASHIER VARCHAR2(100) NOT NULL,
+                BILLTYPE VARCHAR2(1),
+                LINES NUMBER,
+                QUANTITY NUMBER,
+                GROSSAMOUNT NUMBER,
+                UPDATEDAT DATE
+            )
+        """),
+    )
+    for name, sql in ddl:
         try:
-            if system_ip and system_name:
-                cur.execute(
-                    f"SELECT SYSTEMNAME, COUNTERCODE, COUNTERNAME FROM {COUNTER_TABLE_NAME} WHERE SYSTEMIP = :sysip AND SYSTEMNAME = :sysname",
-                    {"sysip": system_ip, "sysname": system_name}
-                )
-            elif system_ip:
-                cur.execute(
-                    f"SELECT SYSTEMNAME, COUNTERCODE, COUNTERNAME FROM {COUNTER_TABLE_NAME} WHERE SYSTEMIP = :sysip",
-                    {"sysip": system_ip}
-                )
-            else:
-                cur.execute(f"SELECT SYSTEMNAME, COUNTERCODE, COUNTERNAME FROM {COUNTER_TABLE_NAME}")
+            cur.execute(sql)
         except oracledb.Error as e:
-            if 'ORA-00904' not in str(e).upper() and '00904' not in str(e).upper():
+            err_str = str(e).upper()
+            if 'ORA-00955' not in err_str and '00955' not in err_str and '01031' not in err_str:
+                print(f"[SalesRollup] {name} create failed: {e}")
                 raise
-            if system_ip:
-                cur.execute(
-                    f"SELECT COUNTERCODE, COUNTERNAME FROM {COUNTER_TABLE_NAME} WHERE SYSTEMIP = :sysip",
-                    {"sysip": system_ip}
-                )
-            else:
-                cur.execute(f"SELECT COUNTERCODE, COUNTERNAME FROM {COUNTER_TABLE_NAME}")
-        rows = cur.fetchall()
-        cols = [c[0].upper() if c else '' for c in cur.description]
-        result = []
-        for row in rows:
-            def get_col(name):
-                try:
-                    i = cols.index(name)
-                    return row[i] if i >= 0 and i < len(row) else None
-                except (ValueError, IndexError):
-                    return None
-            result.append({
-                "systemName": str(get_col('SYSTEMNAME') or "").strip(),
-                "counterCode": str(get_col('COUNTERCODE') or row[0] if row else "").strip(),
-                "counterName": str(get_col('COUNTERNAME') or (row[1] if len(row) > 1 else None) or "").strip(),
-            })
-        return jsonify({"ok": True, "counters": result})
+    _sales_rollup_ready = True
+
+
+def _rollup_part(value):
+    value = str(value).strip() if value is not None else ''
+    return value or _ROLLUP_NONE
+
+
+def _rollup_delta(key, bill_type, sign, lines, quantity, amount):
+    credit = bill_type == 'R'
+    return {
+        "bday": key[0], "loc": key[1], "cnt": key[2], "cashier": key[3],
+        "bills": sign, "lines": lines, "qty": quantity, "amount": amount,
+        "cbills": 0 if credit else sign, "camount": 0 if credit else amount,
+        "rbills": sign if credit else 0, "ramount": amount if credit else 0,
+    }
+
+
+def _merge_rollup(cur, delta):
+    try:
+        cur.execute(_SALES_ROLLUP_MERGE_SQL, delta)
     except oracledb.Error as e:
-        print(f"[Counter] list error: {e}")
-        return jsonify({"ok": False, "counters": [], "error": str(e)}), 500
-    finally:
-        if cur:
-            try:
-                cur.close()
-            except Exception:
-                pass
+        if '00001' not in str(e):
+            raise
+        cur.execute(_SALES_ROLLUP_MERGE_SQL, delta)  # a concurrent checkout inserted the row first: now it matches
+
+
+def _apply_sales_rollup(cur, bill_no, day, location_code, counter_code, cashier, bill_type, lines, quantity, amount):
+    """
+    Add a paid bill to the rollups inside the caller's transaction (replacing an earlier Pay of the same bill).
+    On error the rollup statements are rolled back to a savepoint and the sale goes through; returns success.
+    The caller runs _ensure_sales_rollup_tables before its first DML (DDL here would commit the bill half-written).
+    """
+    key = (day, _rollup_part(location_code), _rollup_part(counter_code), _rollup_part(cashier))
+    if not _sales_rollup_ready:
+        return False
+    try:
+        cur.execute("SAVEPOINT sales_rollup")
+    except oracledb.Error as e:
+        print(f"[SalesRollup] unavailable: {e}")
+        return False
+    try:
+        cur.execute(f"""
+            SELECT BUSINESSDATE, LOCATIONCODE, COUNTERCODE, CASHIER, BILLTYPE, LINES, QUANTITY, GROSSAMOUNT
+            FROM {SALES_ROLLUP_BILL_TABLE_NAME} WHERE BILLNO = :billno FOR UPDATE
+        """, billno=bill_no)
+        prev = cur.fetchone()
+        if prev:
+            prev_day = prev[0].date() if isinstance(prev[0], datetime.datetime) else prev[0]
+            _merge_rollup(cur, _rollup_delta((prev_day,) + tuple(prev[1:4]), prev[4], -1, -_to_int(prev[5]),
+                                             -_to_float(prev[6]), -_to_float(prev[7])))
+            cur.execute(f"""
+                UPDATE {SALES_ROLLUP_BILL_TABLE_NAME}
+                SET BUSINESSDATE = :bday, LOCATIONCODE = :loc, COUNTERCODE = :cnt, CASHIER = :cashier, BILLTYPE = :btype,
+                    LINES = :lines, QUANTITY = :qty, GROSSAMOUNT = :amount, UPDATEDAT = SYSDATE
+                WHERE BILLNO = :billno
+            """, bday=key[0], loc=key[1], cnt=key[2], cashier=key[3], btype=bill_type, lines=lines, qty=quantity,
+                amount=amount, billno=bill_no)
+        else:
+            cur.execute(f"""
+                INSERT INTO {SALES_ROLLUP_BILL_TABLE_NAME}
+                (BILLNO, BUSINESSDATE, LOCATIONCODE, COUNTERCODE, CASHIER, BILLTYPE, LINES, QUANTITY, GROSSAMOUNT, UPDATEDAT)
+                VALUES (:billno, :bday, :loc, :cnt, :cashier, :btype, :lines, :qty, :amount, SYSDATE)
+            """, billno=bill_no, bday=key[0], loc=key[1], cnt=key[2], cashier=key[3], btype=bill_type, lines=lines,
+                qty=quantity, amount=amount)
+        _merge_rollup(cur, _rollup_delta(key, bill_type, 1, lines, quantity, amount))
+        return True
+    except oracledb.Error as e:
+        print(f"[SalesRollup] update error (bill {bill_no}): {e}")
         try:
-            conn.close()
-        except Exception:
+            cur.execute("ROLLBACK TO SAVEPOINT sales_rollup")
+        except oracledb.Error:
             pass
+        return False
 
 
-@app.route('/api/counters/next-code', methods=['GET'])
-def next_counter_code():
-    """Return next counter code: last COUNTERCODE from COUNTER + 1 (numeric)."""
-    conn = _get_connection()
+def _rollup_totals(row):
+    bills, lines, quantity, amount, cash_bills, cash_amount, credit_bills, credit_amount = row
+    return {
+        "bills": _to_int(bills), "lines": _to_int(lines), "quantity": _to_float(quantity),
+        "amount": round(_to_float(amount), 2),
+        "cash": {"bills": _to_int(cash_bills), "amount": round(_to_float(cash_amount), 2)},
+        "credit": {"bills": _to_int(credit_bills), "amount": round(_to_float(credit_amount), 2)},
+    }
+
+
+def _sum_rollup_rows(rows):
+    return _rollup_totals(tuple(sum(_to_float(r[i]) for r in rows) for i in range(len(_SALES_ROLLUP_COLUMNS))))
+
+
+def _fetch_sales_summary(cur, day_from, day_to, location_code=None, counter_code=None, cashier=None):
+    """Rollup rows for [day_from, day_to] (dates inclusive), optionally narrowed to one location / counter / cashier."""
+    if not _on_replica(cur.connection):
+        _ensure_sales_rollup_tables(cur)
+    where = ["BUSINESSDATE >= :d_from", "BUSINESSDATE < :d_to"]
+    params = {"d_from": day_from, "d_to": day_to + datetime.timedelta(days=1)}
+    for column, bind, value in (('LOCATIONCODE', 'loc', location_code), ('COUNTERCODE', 'cnt', counter_code),
+                                ('CASHIER', 'cashier', cashier)):
+        if value:
+            where.append(f"{column} = :{bind}")
+            params[bind] = _rollup_part(value)
+    cur.execute(f"""
+        SELECT BUSINESSDATE, LOCATIONCODE, COUNTERCODE, CASHIER, {', '.join(_SALES_ROLLUP_COLUMNS)}
+        FROM {SALES_ROLLUP_TABLE_NAME}
+        WHERE {' AND '.join(where)}
+        ORDER BY BUSINESSDATE, LOCATIONCODE, COUNTERCODE, CASHIER
+    """, params)
+    return cur.fetchall()
+
+
+def _summary_row(row):
+    day = row[0].date() if isinstance(row[0], datetime.datetime) else row[0]
+    return {
+        "date": day.isoformat() if day else None,
+        "locationCode": None if row[1] == _ROLLUP_NONE else row[1],
+        "counterCode": None if row[2] == _ROLLUP_NONE else row[2],
+        "cashier": None if row[3] == _ROLLUP_NONE else row[3],
+        **_rollup_totals(row[4:]),
+    }
+
+
+def _z_report(cur, day, counter_code, location_code=None):
+    """Z totals for one counter and business date, per cashier and overall, from the rollup (no bill aggregation)."""
+    rows = _fetch_sales_summary(cur, day, day, location_code, counter_code or _ROLLUP_NONE)
+    return {
+        "date": day.isoformat(),
+        "counterCode": counter_code,
+        "locationCode": location_code or None,
+        "totals": _sum_rollup_rows([r[4:] for r in rows]),
+        "byCashier": [_summary_row(r) for r in rows],
+    }
+
+
+@app.route('/api/reports/counter-summary', methods=['GET'])
+def counter_summary():
+    """
+    Sales per business date / location / counter / cashier from the checkout rollups, plus overall totals.
+    Query: date (default today) or from/to (YYYY-MM-DD), optional locationCode, counterCode, cashier. Manager/IT only.
+    """
+    _, err = _require_manager()
+    if err:
+        return err
+    date_str = (request.args.get('date') or '').strip()
+    from_str = (request.args.get('from') or '').strip() or date_str
+    to_str = (request.args.get('to') or '').strip() or from_str
+    day_from = _parse_iso_date(from_str) if from_str else datetime.date.today()
+    day_to = _parse_iso_date(to_str) if to_str else day_from
+    if day_from is None or day_to is None:
+        return jsonify({"ok": False, "error": "date / from / to must be YYYY-MM-DD"}), 400
+    if day_to < day_from or (day_to - day_from).days >= SALES_SUMMARY_MAX_DAYS:
+        return jsonify({"ok": False, "error": f"from..to must be a range of at most {SALES_SUMMARY_MAX_DAYS} days"}), 400
+    location_code = (request.args.get('locationCode') or '').strip() or None
+    counter_code = (request.args.get('counterCode') or '').strip() or None
+    cashier = (request.args.get('cashier') or '').strip() or None
+    conn = _get_connection(read_only=True)
     if not conn:
-        return jsonify({"ok": False, "nextCounterCode": "1", "error": "Database unavailable"}), 503
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
     cur = None
-    try:
-        cur = conn.cursor()
-        _ensure_counter_table(cur)
-        cur.execute(f"SELECT COUNTERCODE FROM {COUNTER_TABLE_NAME} WHERE COUNTERCODE IS NOT NULL")
-        rows = cur.fetchall()
-        max_num = 0
-        for row in rows:
-            val = row[0]
-            if val is None:
-                continue
-            s = str(val).strip()
-            digits = ''.join(c for c in s if c.isdigit())
-            if digits:
-                try:
-                    n = int(digits)
-                    if n > max_num:
-                        max_num = n
-                except ValueError:
-                    pass
-        next_code = str(max_num + 1)
-        return jsonify({"ok": True, "nextCounterCode": next_code})
+    try:
+        cur = conn.cursor()
+        rows = _fetch_sales_summary(cur, day_from, day_to, location_code, counter_code, cashier)
+        return jsonify({
+            "ok": True,
+            "from": day_from.isoformat(),
+            "to": day_to.isoformat(),
+            "rows": [_summary_row(r) for r in rows],
+            "totals": _sum_rollup_rows([r[4:] for r in rows]),
+        })
     except oracledb.Error as e:
-        print(f"[Counter] next-code error: {e}")
-        return jsonify({"ok": False, "nextCounterCode": "1", "error": str(e)}), 500
+        print(f"[SalesRollup] summary error: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
     finally:
         if cur:
             try:
@@ -1717,41 +6727,21 @@ def next_counter_code():
             pass
 
 
-@app.route('/api/counter', methods=['POST'])
-def save_counter():
-    """Insert into COUNTER: systemName, systemIp, counterCode, counterName, locationCode (from Counter Setup Save)."""
-    data = request.get_json(silent=True) or {}
-    system_ip = (data.get('systemIp') or data.get('systemIP') or '').strip()
-    system_name = (data.get('systemName') or '').strip()
-    counter_code = (data.get('counterCode') or '').strip() or '1'
-    counter_name = (data.get('counterName') or '').strip() or 'Counter 1'
-    location_code = (data.get('locationCode') or data.get('location_code') or '').strip() or None
-    if location_code is None:
-        location_code = '1'
+def _prune_sales_rollup_bills():
+    """Drop per-bill contributions past the re-Pay window (the rollup rows themselves are kept)."""
     conn = _get_connection()
     if not conn:
-        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+        raise RuntimeError('Database unavailable')
     cur = None
     try:
         cur = conn.cursor()
-        _ensure_counter_table(cur)
-        cur.execute(
-            f"""
-            INSERT INTO {COUNTER_TABLE_NAME} (SYSTEMIP, SYSTEMNAME, COUNTERCODE, COUNTERNAME, LOCATIONCODE)
-            VALUES (:sysip, :sysname, :cntcode, :cntname, :loccode)
-            """,
-            {"sysip": system_ip or None, "sysname": system_name or None, "cntcode": counter_code, "cntname": counter_name, "loccode": location_code}
-        )
+        _ensure_sales_rollup_tables(cur)
+        cur.execute(f"DELETE FROM {SALES_ROLLUP_BILL_TABLE_NAME} WHERE BUSINESSDATE < TRUNC(SYSDATE) - :days",
+                    days=SALES_ROLLUP_BILL_RETENTION_DAYS)
+        pruned = cur.rowcount
         conn.commit()
-        return jsonify({"ok": True})
-    except oracledb.Error as e:
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        print(f"[Counter] insert error: {e}")
-        return jsonify({"ok": False, "error": str(e)}), 500
+        if pruned:
+            print(f"[SalesRollup] pruned {pruned} bill contributions")
     finally:
         if cur:
             try:
@@ -1764,190 +6754,505 @@ def save_counter():
             pass
 
 
-# --- COUNTEROPERATIONS: DATEOFOPEN, OPENEDDATE, OPENFLAG (O/C), OPENEDBY, CLOSEDBY, CLOSEDDATE ---
-COUNTEROPERATIONS_TABLE_NAME = 'COUNTEROPERATIONS'
+_schedule_job('sales-rollup-prune', _prune_sales_rollup_bills, cron='40 2 * * *')
 
 
-def _ensure_counter_operations_table(cur):
-    """Create COUNTEROPERATIONS table if not exists."""
-    create_sql = f"""
-        CREATE TABLE {COUNTEROPERATIONS_TABLE_NAME} (
-            DATEOFOPEN DATE,
-            OPENEDDATE DATE,
-            OPENFLAG VARCHAR2(1),
-            OPENEDBY VARCHAR2(100),
-            CLOSEDBY VARCHAR2(100),
-            CLOSEDDATE DATE,
-            COUNTERCODE VARCHAR2(50)
-        )
-    """
+# --- Bill export (BILLHDR / BILLDTL streamed to CSV or Parquet) ---
+# Head-office pulls go through here (GET /api/export/bills, or export_bills.py for chunked files) instead of ad-hoc
+# queries. Each export is one ordered read on its own small connection pool: at most EXPORT_MAX_CONCURRENT run at
+# once, and they never take connections from checkout. Rows are fetched EXPORT_ARRAYSIZE at a time and written out
+# as they arrive, so memory stays bounded. Output is ordered by BILLNO: an interrupted export resumes with
+# afterBill = the last complete bill received.
+EXPORT_ARRAYSIZE = _to_int(os.environ.get('POS_EXPORT_ARRAYSIZE'), 5000)
+EXPORT_MAX_CONCURRENT = _to_int(os.environ.get('POS_EXPORT_MAX_CONCURRENT'), 1)
+EXPORT_MAX_DAYS = 366
+EXPORT_ROW_GROUP_ROWS = 100000  # Parquet rows buffered per row group
+EXPORT_COLUMNS = ('LOCATIONCODE', 'BILLNO', 'BILLDATE', 'BILLTYPE', 'COUNTERCODE', 'SLNO', 'ITEMCODE', 'QUANTITY',
+                  'RATE', 'AMOUNT')
+_export_pool = None
+_export_pool_lock = threading.Lock()
+
+_BILL_EXPORT_SQL = f"""
+    SELECT h.LOCATIONCODE, h.BILLNO, h.BILLDATE, h.BILLTYPE, h.COUNTERCODE, d.SLNO, d.ITEMCODE, d.QUANTITY, d.RATE,
+           d.QUANTITY * d.RATE
+    FROM {BILLHDR_TABLE_NAME} h
+    JOIN {BILLDTL_TABLE_NAME} d ON d.BILLNO = h.BILLNO
+    WHERE h.BILLDATE >= :d_from AND h.BILLDATE < :d_to AND h.BILLNO > :after {{location_filter}}
+    ORDER BY h.BILLNO, d.SLNO
+"""
+
+
+def _acquire_export_connection():
+    """(connection, None) from the export pool, or (None, 'busy') when all export slots are in use, (None, 'unavailable')."""
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            try:
+                _export_pool = oracledb.create_pool(
+                    user=ORACLE_CONFIG['user'],
+                    password=ORACLE_CONFIG['password'],
+                    dsn=ORACLE_CONFIG['dsn'],
+                    min=0,
+                    max=EXPORT_MAX_CONCURRENT,
+                    increment=1,
+                    getmode=oracledb.POOL_GETMODE_NOWAIT,
+                )
+            except oracledb.Error as e:
+                print(f"[Export] pool create failed: {e}")
+                return None, 'unavailable'
     try:
-        cur.execute(create_sql)
+        return _export_pool.acquire(), None
     except oracledb.Error as e:
-        err_str = str(e).upper()
-        if 'ORA-00955' in err_str or '00955' in err_str:
-            pass
-        else:
-            print(f"[CounterOperations] create failed: {e}")
+        if 'DPY-4005' in str(e):
+            return None, 'busy'
+        print(f"[Export] connection failed: {e}")
+        return None, 'unavailable'
 
 
-@app.route('/api/counter-operations/status', methods=['GET'])
-def counter_operations_status():
-    """For given date, counterCode: return open=True if OPENFLAG='O', closed=True if OPENFLAG='C' (already closed, cannot open again)."""
-    date_str = (request.args.get('date') or request.args.get('dateOfOpen') or '').strip()
-    counter_code = (request.args.get('counterCode') or request.args.get('counter_code') or '').strip()
-    if not date_str:
-        return jsonify({"ok": False, "open": False, "closed": False, "error": "date required"}), 400
-    conn = _get_connection()
-    if not conn:
-        return jsonify({"ok": False, "open": False, "closed": False, "error": "Database unavailable"}), 503
-    cur = None
+def _export_row(row):
+    location_code, bill_no, bill_date, bill_type, counter_code, slno, item_code, quantity, rate, amount = row
+    return (location_code, _to_int(bill_no), bill_date, bill_type, counter_code, _to_int(slno), item_code,
+            _to_float(quantity), _to_float(rate), round(_to_float(amount), 4))
+
+
+def _iter_bill_export(conn, day_from, day_to, after_bill=0, location_code=None):
+    """Yield batches of rows (EXPORT_COLUMNS order) for bills dated day_from..day_to with BILLNO > after_bill."""
+    params = {"d_from": day_from, "d_to": day_to + datetime.timedelta(days=1), "after": after_bill}
+    location_filter = ''
+    if location_code:
+        location_filter = "AND h.LOCATIONCODE = :loc"
+        params["loc"] = location_code
+    cur = conn.cursor()
     try:
-        cur = conn.cursor()
-        _ensure_counter_operations_table(cur)
-        cnt_val = (counter_code or '').strip()
-        cur.execute(
-            f"""
-            SELECT OPENFLAG FROM {COUNTEROPERATIONS_TABLE_NAME}
-            WHERE TRIM(TO_CHAR(DATEOFOPEN, 'YYYY-MM-DD')) = :d
-            AND NVL(TRIM(COUNTERCODE), ' ') = NVL(:cntcode, ' ')
-            AND ROWNUM = 1
-            """,
-            {"d": date_str, "cntcode": cnt_val}
-        )
-        row = cur.fetchone()
-        open_flag = (row[0] or '').strip().upper() if row and len(row) > 0 else None
-        is_open = open_flag == 'O'
-        is_closed = open_flag == 'C'
-        return jsonify({"ok": True, "open": is_open, "closed": is_closed})
-    except oracledb.Error as e:
-        print(f"[CounterOperations] status error: {e}")
-        return jsonify({"ok": False, "open": False, "closed": False, "error": str(e)}), 500
+        cur.arraysize = EXPORT_ARRAYSIZE
+        cur.prefetchrows = EXPORT_ARRAYSIZE + 1
+        cur.execute(_BILL_EXPORT_SQL.format(location_filter=location_filter), params)
+        while True:
+            rows = cur.fetchmany()
+            if not rows:
+                return
+            yield [_export_row(r) for r in rows]
     finally:
-        if cur:
-            try:
-                cur.close()
-            except Exception:
-                pass
-        try:
+        cur.close()
+
+
+class BillExportWriter:
+    """Writes export row batches to a binary file object as CSV (with header) or Parquet (pyarrow)."""
+
+    CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'parquet': 'application/vnd.apache.parquet'}
+
+    def __init__(self, out, fmt='csv'):
+        if fmt not in self.CONTENT_TYPES:
+            raise ValueError(f"unknown export format: {fmt}")
+        if fmt == 'parquet' and pq is None:
+            raise ValueError("Parquet export needs pyarrow")
+        self.out = out
+        self.fmt = fmt
+        self.rows = 0
+        self._pending = []
+        self._parquet = None
+        if fmt == 'csv':
+            self._text = io.StringIO()
+            self._csv = csv.writer(self._text, lineterminator='\n')
+            self._csv.writerow(EXPORT_COLUMNS)
+            self._flush_csv()
+
+    @staticmethod
+    def schema():
+        return pa.schema([
+            ('LOCATIONCODE', pa.string()), ('BILLNO', pa.int64()), ('BILLDATE', pa.timestamp('s')),
+            ('BILLTYPE', pa.string()), ('COUNTERCODE', pa.string()), ('SLNO', pa.int64()), ('ITEMCODE', pa.string()),
+            ('QUANTITY', pa.float64()), ('RATE', pa.float64()), ('AMOUNT', pa.float64()),
+        ])
+
+    def _flush_csv(self):
+        self.out.write(self._text.getvalue().encode('utf-8'))
+        self._text.seek(0)
+        self._text.truncate()
+
+    def _flush_parquet(self):
+        if not self._pending:
+            return
+        schema = self.schema()
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.out, schema, compression='zstd')
+        columns = list(zip(*self._pending))
+        self._parquet.write_table(pa.table(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+        self._pending = []
+
+    def write(self, rows):
+        self.rows += len(rows)
+        if self.fmt == 'csv':
+            self._csv.writerows(
+                (r[:2] + (r[2].isoformat(sep=' ', timespec='seconds') if r[2] else None,) + r[3:]) for r in rows)
+            self._flush_csv()
+            return
+        self._pending.extend(rows)
+        if len(self._pending) >= EXPORT_ROW_GROUP_ROWS:
+            self._flush_parquet()
+
+    def close(self):
+        if self.fmt == 'parquet':
+            self._flush_parquet()
+            if self._parquet is None:  # no rows: still a valid (empty) file
+                self._parquet = pq.ParquetWriter(self.out, self.schema(), compression='zstd')
+            self._parquet.close()
+
+
+class _ExportSink:
+    """Write-only, non-seekable file object that buffers writer output until the response drains it."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._size = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+@app.route('/api/export/bills', methods=['GET'])
+def export_bills():
+    """
+    Stream bill lines (BILLHDR joined to BILLDTL) ordered by BILLNO, SLNO. Query: from, to (YYYY-MM-DD, default
+    today), format=csv|parquet, afterBill (resume after that bill), locationCode. 429 while another export runs.
+    Manager/IT only.
+    """
+    _, err = _require_manager()
+    if err:
+        return err
+    from_str = (request.args.get('from') or request.args.get('date') or '').strip()
+    to_str = (request.args.get('to') or '').strip() or from_str
+    day_from = _parse_iso_date(from_str) if from_str else datetime.date.today()
+    day_to = _parse_iso_date(to_str) if to_str else day_from
+    if day_from is None or day_to is None:
+        return jsonify({"ok": False, "error": "from / to must be YYYY-MM-DD"}), 400
+    if day_to < day_from or (day_to - day_from).days >= EXPORT_MAX_DAYS:
+        return jsonify({"ok": False, "error": f"from..to must be a range of at most {EXPORT_MAX_DAYS} days"}), 400
+    fmt = (request.args.get('format') or 'csv').strip().lower()
+    if fmt not in BillExportWriter.CONTENT_TYPES:
+        return jsonify({"ok": False, "error": "format must be csv or parquet"}), 400
+    if fmt == 'parquet' and pq is None:
+        return jsonify({"ok": False, "error": "Parquet export needs pyarrow on the server"}), 400
+    after_bill = _to_int(request.args.get('afterBill'), 0)
+    location_code = (request.args.get('locationCode') or '').strip() or None
+    conn, reason = _acquire_export_connection()
+    if conn is None:
+        if reason == 'busy':
+            resp = jsonify({"ok": False, "error": "Another export is running; retry shortly"})
+            resp.headers['Retry-After'] = '30'
+            return resp, 429
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    released = threading.Lock()
+
+    def release():
+        # runs from the generator and from call_on_close; a HEAD or an early disconnect never starts the body
+        if released.acquire(blocking=False):
             conn.close()
-        except Exception:
-            pass
 
+    def generate():
+        sink = _ExportSink()
+        writer = BillExportWriter(sink, fmt)
+        try:
+            for rows in _iter_bill_export(conn, day_from, day_to, after_bill, location_code):
+                writer.write(rows)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            writer.close()
+            yield sink.drain()
+            print(f"[Export] {day_from}..{day_to} {fmt}: {writer.rows} rows")
+        except oracledb.Error as e:
+            # re-raised so the chunked response is cut off rather than ending like a complete file
+            print(f"[Export] stream error after {writer.rows} rows: {e}")
+            raise
+        finally:
+            release()
 
-def _username_from_request():
-    """Get username from Authorization Bearer token (JWT sub)."""
+    filename = f"bills_{day_from.isoformat()}_{day_to.isoformat()}.{fmt}"
+    response = app.response_class(stream_with_context(generate()), content_type=BillExportWriter.CONTENT_TYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no',
+    })
+    response.call_on_close(release)
+    return response
+
+
+# --- Catalog blobs (ETag-referenced) and terminal bootstrap bundle ---
+# Large catalog sections are serialized once into a blob with an ETag; terminals revalidate with
+# If-None-Match and get 304 while the catalog is unchanged. A blob is kept as long as the snapshot it was
+# serialized from (resident catalog, customer directory) is current; without a snapshot it expires after
+# CATALOG_BLOB_TTL_SECONDS. /api/bootstrap returns everything a terminal needs at startup in one response,
+# computing independent sections concurrently.
+CATALOG_BLOB_TTL_SECONDS = 300
+BOOTSTRAP_WORKERS = 6
+_catalog_blobs = {}  # (name, location) -> {"etag", "body", "count", "built_at", "snapshot"}
+_catalog_blobs_lock = threading.Lock()
+_bootstrap_executor = ThreadPoolExecutor(max_workers=BOOTSTRAP_WORKERS, thread_name_prefix='bootstrap')
+
+
+def _load_customer_rows():
+    state = _get_customer_directory()
+    return state['rows'] if state else _get_customers_mock_data()
+
+
+_CATALOG_BLOB_SOURCES = {
+    'products': _load_products,
+    'customers': _load_customer_rows,
+}
+_CATALOG_BLOB_PER_LOCATION = {'products'}
+
+
+def _catalog_blob_snapshot(name):
+    """The in-memory snapshot a section is serialized from (None while there is none yet); never blocks on Oracle."""
+    if name == 'products':
+        return _get_catalog()
+    state = _get_customer_directory() if _customer_directory['ready'] else None
+    return state['rows'] if state else None
+
+
+def _catalog_blob_fresh(blob, snapshot):
+    if snapshot is not None:
+        return blob['snapshot'] is snapshot
+    return blob['snapshot'] is None and time.time() - blob['built_at'] < CATALOG_BLOB_TTL_SECONDS
+
+
+def _catalog_blob_location(name, snapshot, location_code):
+    """
+    Blob key's store: the normalized code when the catalog has rows for it, else None (the all-rows blob, which is
+    what an unknown store is served anyway), so client-supplied codes cannot add blobs.
+    """
+    if name not in _CATALOG_BLOB_PER_LOCATION or not isinstance(snapshot, CompactCatalog):
+        return None
+    if not _location_key(location_code) or snapshot._location_id(location_code) is None:
+        return None
+    return _location_key(location_code)
+
+
+def _get_catalog_blob(name, location_code=None):
+    """Return {"etag", "body", "count", "built_at", "snapshot"} for a catalog section (per store for products), rebuilding it when stale."""
+    snapshot = _catalog_blob_snapshot(name)
+    location = _catalog_blob_location(name, snapshot, location_code)
+    key = (name, location)
+    blob = _catalog_blobs.get(key)
+    if blob and _catalog_blob_fresh(blob, snapshot):
+        return blob
+    with _catalog_blobs_lock:
+        blob = _catalog_blobs.get(key)
+        if blob and _catalog_blob_fresh(blob, snapshot):
+            return blob
+        rows = _CATALOG_BLOB_SOURCES[name](location) if location else _CATALOG_BLOB_SOURCES[name]()
+        body = _json_bytes(rows)
+        blob = {
+            'etag': hashlib.sha1(body).hexdigest(),
+            'body': body,
+            'count': len(rows),
+            'built_at': time.time(),
+            'snapshot': snapshot,
+        }
+        _catalog_blobs[key] = blob
+        return blob
+
+
+@app.route('/api/catalog/<name>', methods=['GET'])
+def get_catalog_blob(name):
+    """Serve a catalog section (products, customers) as a pre-serialized JSON blob with ETag / 304 support."""
+    if name not in _CATALOG_BLOB_SOURCES:
+        return jsonify({"error": "Unknown catalog"}), 404
+    return _catalog_blob_response(name)
+
+
+def _catalog_blob_response(name):
+    """Pre-serialized catalog section for this request's store; 304 when If-None-Match has its ETag."""
+    blob = _get_catalog_blob(name, location_code=_request_location_code())
+    if request.if_none_match.contains(blob['etag']):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(blob['body'], mimetype='application/json')
+    response.set_etag(blob['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    if isinstance(blob['snapshot'], CompactCatalog):
+        response.headers['X-Catalog-Seq'] = str(blob['snapshot'].change_seq)  # since= for /api/products/changes
+    return response
+
+
+def _catalog_ref(name, blob, client_etag, location_code=None):
+    href = f"/api/catalog/{name}"
+    if location_code and name in _CATALOG_BLOB_PER_LOCATION:
+        href += '?' + urlencode({'locationCode': location_code})
+    return {
+        "etag": blob['etag'],
+        "href": href,
+        "count": blob['count'],
+        "unchanged": bool(client_etag) and client_etag.strip('"') == blob['etag'],
+    }
+
+
+@app.route('/api/bootstrap', methods=['GET', 'POST'])
+def bootstrap():
+    """
+    Terminal startup bundle: user, location, counters, counter status, bill no, cart and catalog references.
+    Args: systemIp, systemName, date (YYYY-MM-DD, default today); optional counterCode, billNo,
+    newBill=1 (POST only: allocate a new BILLNO instead of restoring billNo's cart), locationCode (products partition,
+    default login location), productsEtag, customersEtag.
+    """
     auth = request.headers.get('Authorization') or ''
     payload = _decode_token(auth)
     if not payload:
-        return None
-    return (payload.get('sub') or payload.get('username') or '').strip() or None
+        return jsonify({"error": "Invalid or missing token"}), 401
+    data = dict(request.args.items())
+    data.update(request.get_json(silent=True) or {})
+    system_ip = str(data.get('systemIp') or data.get('system_ip') or '').strip()
+    system_name = str(data.get('systemName') or data.get('system_name') or '').strip()
+    date_str = str(data.get('date') or '').strip()
+    day = _parse_iso_date(date_str) if date_str else datetime.date.today()
+    if day is None:
+        return jsonify({"ok": False, "error": "date must be YYYY-MM-DD"}), 400
+    counter_code = str(data.get('counterCode') or data.get('counter_code') or '').strip()
+    bill_no = _to_int(data.get('billNo') or data.get('billno'), 0) or None
+    new_bill = str(data.get('newBill') or '').strip().lower() in ('1', 'true', 'yes')
+    if new_bill and request.method != 'POST':
+        return jsonify({"ok": False, "error": "newBill allocates a bill number; use POST"}), 405
 
+    registry = _get_counter_registry()
+    counters = _counters_for_system(registry, system_ip, system_name) if registry else []
+    if not counter_code and counters:
+        counter_code = counters[0]['counterCode']
+    location_code = _request_location_code(data)
 
-@app.route('/api/counter-operations/open', methods=['POST'])
-def counter_operations_open():
-    """Insert COUNTEROPERATIONS: DATEOFOPEN=selected date, OPENEDDATE=today, OPENFLAG='O', OPENEDBY=username, LOCATIONCODE from login."""
-    data = request.get_json(silent=True) or {}
-    date_str = (data.get('date') or data.get('dateOfOpen') or '').strip()
-    counter_code = (data.get('counterCode') or data.get('counter_code') or '').strip() or '1'
-    location_code = (data.get('locationCode') or data.get('location_code') or '').strip()
-    if not location_code:
-        base_loc = _get_base_location()
-        location_code = (base_loc or {}).get('locationCode') or (base_loc or {}).get('location_code') or '1'
-    location_code = location_code or '1'
-    username = _username_from_request() or (data.get('username') or '').strip()
-    if not date_str:
-        return jsonify({"ok": False, "error": "date required"}), 400
-    conn = _get_connection()
-    if not conn:
-        return jsonify({"ok": False, "error": "Database unavailable"}), 503
-    cur = None
-    try:
-        cur = conn.cursor()
-        _ensure_counter_operations_table(cur)
-        cur.execute(
-            f"""
-            SELECT OPENFLAG FROM {COUNTEROPERATIONS_TABLE_NAME}
-            WHERE TRIM(TO_CHAR(DATEOFOPEN, 'YYYY-MM-DD')) = :d
-            AND NVL(TRIM(COUNTERCODE), ' ') = NVL(TRIM(:cntcode), ' ')
-            AND ROWNUM = 1
-            """,
-            {"d": date_str, "cntcode": counter_code or ''}
-        )
-        existing = cur.fetchone()
-        if existing and len(existing) > 0:
-            open_flag = (existing[0] or '').strip().upper()
-            if open_flag == 'C':
-                return jsonify({"ok": False, "error": "Counter already closed for this date; cannot open again."}), 400
-            if open_flag == 'O':
-                return jsonify({"ok": False, "error": "Counter already open for this date."}), 400
-        from datetime import date as date_type
-        today_str = date_type.today().strftime('%Y-%m-%d')
-        cur.execute(
-            f"""
-            INSERT INTO {COUNTEROPERATIONS_TABLE_NAME}
-            (DATEOFOPEN, OPENEDDATE, OPENFLAG, OPENEDBY, COUNTERCODE, LOCATIONCODE, CASHIERCODE)
-            VALUES (TO_DATE(:d, 'YYYY-MM-DD'), TO_DATE(:oday, 'YYYY-MM-DD'), 'O', :openedby, :cntcode, :loccode, 0)
-            """,
-            {"d": date_str, "oday": today_str, "openedby": username or None, "cntcode": counter_code or None, "loccode": location_code}
-        )
-        conn.commit()
-        return jsonify({"ok": True})
-    except oracledb.Error as e:
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        print(f"[CounterOperations] open error: {e}")
-        return jsonify({"ok": False, "error": str(e)}), 500
-    finally:
-        if cur:
-            try:
-                cur.close()
-            except Exception:
-                pass
+    futures = {
+        'location': _bootstrap_executor.submit(_get_cached_base_location),
+        'products': _bootstrap_executor.submit(_get_catalog_blob, 'products', location_code),
+        'customers': _bootstrap_executor.submit(_get_catalog_blob, 'customers'),
+        'counterStatus': _bootstrap_executor.submit(_get_counter_open_flag, day, counter_code),
+    }
+    if new_bill:
+        futures['billNo'] = _bootstrap_executor.submit(_allocate_billno, counter_code or None)
+    elif bill_no:
+        futures['cart'] = _bootstrap_executor.submit(_load_cart_items, bill_no)
+
+    results = {}
+    errors = {}
+    for key, fut in futures.items():
         try:
-            conn.close()
-        except Exception:
-            pass
+            results[key] = fut.result()
+        except Exception as e:
+            print(f"[Bootstrap] {key} error: {e}")
+            errors[key] = str(e)
 
+    found, open_flag = results.get('counterStatus') or (False, None)
+    body = {
+        "ok": not errors,
+        "user": {
+            "username": payload.get('sub'),
+            "role": payload.get('role'),
+            "userid": payload.get('userid') or payload.get('sub'),
+        },
+        "location": results.get('location'),
+        "date": day.isoformat(),
+        "counters": counters,
+        "counterCode": counter_code,
+        "counterStatus": {"ok": found, "open": open_flag == 'O', "closed": open_flag == 'C'},
+        "billNo": results.get('billNo') if new_bill else bill_no,
+        "cart": results.get('cart', []),
+    }
+    for name in ('products', 'customers'):
+        if name in results:
+            body[name] = _catalog_ref(name, results[name], str(data.get(f'{name}Etag') or ''), location_code)
+    if errors:
+        body["errors"] = errors
+    return jsonify(body)
 
-@app.route('/api/counter-operations/close', methods=['POST'])
-def counter_operations_close():
-    """Update COUNTEROPERATIONS: set OPENFLAG='C', CLOSEDBY=username, CLOSEDDATE=sysdate for matching DATEOFOPEN and OPENFLAG='O'."""
-    data = request.get_json(silent=True) or {}
-    date_str = (data.get('date') or data.get('dateOfOpen') or '').strip()
-    counter_code = (data.get('counterCode') or data.get('counter_code') or '').strip() or '1'
-    username = _username_from_request() or (data.get('username') or '').strip()
-    if not date_str:
-        return jsonify({"ok": False, "error": "date required"}), 400
-    conn = _get_connection()
-    if not conn:
-        return jsonify({"ok": False, "error": "Database unavailable"}), 503
-    cur = None
-    try:
-        cur = conn.cursor()
-        _ensure_counter_operations_table(cur)
-        cur.execute(
-            f"""
-            UPDATE {COUNTEROPERATIONS_TABLE_NAME}
-            SET OPENFLAG = 'C', CLOSEDBY = :closedby, CLOSEDDATE = SYSDATE
-            WHERE TRIM(TO_CHAR(DATEOFOPEN, 'YYYY-MM-DD')) = :d AND OPENFLAG = 'O'
-            AND NVL(TRIM(COUNTERCODE), ' ') = NVL(TRIM(:cntcode), ' ')
-            """,
-            {"closedby": username or None, "d": date_str, "cntcode": counter_code or ''}
-        )
-        conn.commit()
-        return jsonify({"ok": True, "updated": cur.rowcount})
+
+# --- Catalog import (bulk price / UOM changes) and change feed ---
+# A CSV of ITEMCODE, LOCATIONCODE, RETAILPRICE / BASEUOM (ITEMMASTER) or ITEMCODE, LOCATIONCODE, ALTERNATEUOMCODE,
+# RETAILPRICE (ITEMALTERNATEUOMMAP) is applied with executemany, CATALOG_IMPORT_BATCH rows per transaction.
+# Row errors are collected per line and the batch carries on. Each batch records its changed (item, store) keys
+# in POSCATALOGCHANGE under one CHANGESEQ. The catalog stores the highest CHANGESEQ it was built after, and
+# /api/products/changes hands terminals the current rows of items changed since their last poll.
+CATALOG_IMPORT_BATCH = _to_int(os.environ.get('POS_CATALOG_IMPORT_BATCH'), 1000)
+CATALOG_IMPORT_MAX_ERRORS = 500  # line errors listed in the report (all are counted)
+CATALOG_CHANGE_TABLE_NAME = 'POSCATALOGCHANGE'
+CATALOG_CHANGE_SEQ_NAME = 'POSCATALOGCHANGE_SEQ'
+CATALOG_CHANGE_RETENTION_DAYS = 7
+CATALOG_CHANGES_MAX_ITEMS = 5000  # more changed items than this: the terminal reloads /api/products instead
+_CATALOG_IMPORT_COLUMNS = {
+    'ITEMCODE': 'ITEMCODE', 'ITEM_CODE': 'ITEMCODE',
+    'LOCATIONCODE': 'LOCATIONCODE', 'LOCATION': 'LOCATIONCODE',
+    'RETAILPRICE': 'RETAILPRICE', 'PRICE': 'RETAILPRICE',
+    'BASEUOM': 'BASEUOM', 'UOM': 'BASEUOM',
+    'ALTERNATEUOMCODE': 'ALTERNATEUOMCODE', 'ALTUOM': 'ALTERNATEUOMCODE',
+}
+_catalog_change_ready = False
+_catalog_import_lock = threading.Lock()
+
+
+def _ensure_catalog_change_table(cur):
+    global _catalog_change_ready
+    if _catalog_change_ready:
+        return
+    for name, sql in (
+        (CATALOG_CHANGE_TABLE_NAME, f"""
+            CREATE TABLE {CATALOG_CHANGE_TABLE_NAME} (
+                CHANGESEQ NUMBER NOT NULL,
+                ITEMCODE VARCHAR2(50) NOT NULL,
+                LOCATIONCODE VARCHAR2(50),
+                CHANGEDAT DATE DEFAULT SYSDATE NOT NULL
+            )
+        """),
+        (f"{CATALOG_CHANGE_TABLE_NAME}_IX",
+         f"CREATE INDEX {CATALOG_CHANGE_TABLE_NAME}_IX ON {CATALOG_CHANGE_TABLE_NAME} (CHANGESEQ)"),
+        (CATALOG_CHANGE_SEQ_NAME, f"CREATE SEQUENCE {CATALOG_CHANGE_SEQ_NAME} START WITH 1 INCREMENT BY 1 NOCACHE"),
+    ):
+        try:
+            cur.execute(sql)
+        except oracledb.Error as e:
+            err_str = str(e).upper()
+            if not any(c in err_str for c in ('00955', '01408', '01031')):
+                print(f"[CatalogImport] {name} create failed: {e}")
+                raise
+    _catalog_change_ready = True
+
+
+def _latest_catalog_change_seq():
+    """Highest committed CHANGESEQ (0 when there is none, no change table yet, or Oracle is unavailable)."""
+    conn = _get_connection(read_only=True)
+    if not conn:
+        return 0
+    cur = None
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT NVL(MAX(CHANGESEQ), 0) FROM {CATALOG_CHANGE_TABLE_NAME}")
+        row = cur.fetchone()
+        return _to_int(row[0] if row else 0)
     except oracledb.Error as e:
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        print(f"[CounterOperations] close error: {e}")
-        return jsonify({"ok": False, "error": str(e)}), 500
+        if '00942' not in str(e):
+            print(f"[CatalogImport] change seq read error: {e}")
+        return 0
     finally:
         if cur:
             try:
@@ -1960,295 +7265,130 @@ def counter_operations_close():
             pass
 
 
-@app.route('/api/hold', methods=['POST'])
-def hold_bill():
-    """On hold: set FLAG=0 for current bill's cart rows (held). Draft cart uses FLAG=1; held uses FLAG=0."""
-    try:
-        data = request.get_json(silent=True) or {}
-        bill_no = data.get('billNo')
-        location_code = (data.get('locationCode') or '').strip() or 'LOC001'
-        counter_code = (data.get('counterCode') or '').strip() or '20'
-        customer_code = (data.get('customerCode') or '').strip() or None
-        items = data.get('items') or []
-        if bill_no is None:
-            return jsonify({"error": "billNo is required"}), 400
-        if not items:
-            return jsonify({"error": "items (cart) is required"}), 400
-        bill_no = _to_int(bill_no, 1)
-        loc_num = _location_to_num(location_code, 1)
-        conn = _get_connection()
-        if conn:
-            cur = None
-            try:
-                cur = conn.cursor()
-                _ensure_tempbillhdr(cur)
-                _ensure_tempbilldtl(cur)
-                # At HOLD time: set FLAG = 0 (held) for this bill in TEMPBILLHDR
-                cur.execute(f"""
-                    UPDATE {HOLD_TABLE_NAME} SET FLAG = :flag
-                    WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = {FLAG_DRAFT} OR FLAG IS NULL)
-                """, billno=bill_no, loc=loc_num, flag=FLAG_HELD)
-                updated = cur.rowcount
-                if updated == 0:
-                    params = []
-                    for i, it in enumerate(items):
-                        qty = _to_int(it.get('quantity') or it.get('qty'), 1)
-                        for _ in range(max(1, qty)):
-                            params.append({
-                                'billno': bill_no,
-                                'loc': loc_num,
-                                'flag': FLAG_HELD,
-                            })
-                    cur.executemany(f"""
-                        INSERT INTO {HOLD_TABLE_NAME} (BILLNO, LOCATIONCODE, FLAG)
-                        VALUES (:billno, :loc, :flag)
-                    """, params)
-                # At hold: insert product data into TEMPBILLDTL (no FLAG=0; use table default)
-                cur.execute(f"DELETE FROM {HOLD_DTL_TABLE_NAME} WHERE BILLNO = :billno", billno=bill_no)
-                dtl_params = []
-                for slno, it in enumerate(items, start=1):
-                    if not isinstance(it, dict):
-                        continue
-                    itemcode = str(it.get('id') or it.get('itemcode') or it.get('ITEMCODE') or '').strip()
-                    qty = _to_int(it.get('quantity') or it.get('qty') or it.get('QUANTITY'), 1)
-                    rate = _to_float(it.get('price') or it.get('PRICE') or it.get('rate'), 0.0)
-                    manufacturer_id = str(it.get('manufactureId') or it.get('MANUFACTURERID') or it.get('manufacturerId') or '').strip()
-                    dtl_params.append({
-                        'billno': bill_no,
-                        'slno': slno,
-                        'itemcode': itemcode or None,
-                        'quantity': qty,
-                        'rate': rate,
-                        'manufacturerid': manufacturer_id or None,
-                    })
-                if dtl_params:
-                    cur.executemany(f"""
-                        INSERT INTO {HOLD_DTL_TABLE_NAME} (BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID)
-                        VALUES (:billno, :slno, :itemcode, :quantity, :rate, :manufacturerid)
-                    """, dtl_params)
-                # On suspend/hold: insert into TBLCANCELEDHDR (LOCATIONCODE, BILLNO, BILLDATE, BILLTIME, COUNTERCODE, DISCOUNTAMOUNT, NETBILLAMOUNT)
-                net_bill_amount = sum(p['quantity'] * p['rate'] for p in dtl_params)
-                discount_amount = _to_float(data.get('discountAmount') or data.get('discount_amount') or data.get('DISCOUNTAMOUNT'), 0.0)
-                billdate_str = datetime.datetime.now().strftime('%Y-%m-%d')
-                billtime_str = datetime.datetime.now().strftime('%H:%M:%S')
-                try:
-                    cur.execute("""
-                        INSERT INTO TBLCANCELEDHDR (LOCATIONCODE, BILLNO, BILLDATE, BILLTIME, COUNTERCODE, DISCOUNTAMOUNT, NETBILLAMOUNT)
-                        VALUES (:loc, :billno, TO_DATE(:billdate, 'YYYY-MM-DD'), :billtime, :countercode, :discount, :netamount)
-                    """, {
-                        'loc': location_code,
-                        'billno': bill_no,
-                        'billdate': billdate_str,
-                        'billtime': billtime_str,
-                        'countercode': counter_code or None,
-                        'discount': discount_amount,
-                        'netamount': net_bill_amount,
-                    })
-                except oracledb.Error as e:
-                    print(f"[Hold] TBLCANCELEDHDR insert failed: {e}")
-                # On suspend/hold: insert into TBLCANCELEDDTL (LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID)
-                canceled_params = [
-                    {
-                        'loc': location_code,
-                        'billno': p['billno'],
-                        'slno': p['slno'],
-                        'itemcode': p['itemcode'],
-                        'quantity': p['quantity'],
-                        'rate': p['rate'],
-                        'manufacturerid': p['manufacturerid'],
-                    }
-                    for p in dtl_params
-                ]
-                if canceled_params:
-                    try:
-                        cur.executemany("""
-                            INSERT INTO TBLCANCELEDDTL (LOCATIONCODE, BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID)
-                            VALUES (:loc, :billno, :slno, :itemcode, :quantity, :rate, :manufacturerid)
-                        """, canceled_params)
-                    except oracledb.Error as e:
-                        print(f"[Hold] TBLCANCELEDDTL insert failed: {e}")
-                conn.commit()
-                return jsonify({"ok": True, "billNo": bill_no, "locationCode": location_code, "savedToDb": True})
-            except oracledb.Error as e:
-                if conn:
-                    try:
-                        conn.rollback()
-                    except Exception:
-                        pass
-                print(f"[Hold] {HOLD_TABLE_NAME} insert failed (will use in-memory): {e}")
-            finally:
-                if cur:
-                    try:
-                        cur.close()
-                    except Exception:
-                        pass
-                try:
-                    conn.close()
-                except Exception:
-                    pass
-        # In-memory fallback (used when Oracle is down or INSERT failed)
-        hold_items = []
-        for it in items:
-            if not isinstance(it, dict):
-                continue
-            try:
-                hold_items.append({
-                    "id": it.get("id") or it.get("itemcode") or it.get("ITEMCODE"),
-                    "name": it.get("name") or it.get("itemname") or it.get("ITEMNAME") or "",
-                    "price": float(it.get("price", it.get("PRICE", 0)) or 0),
-                    "quantity": int(it.get("quantity", it.get("qty", it.get("QUANTITY", 1))) or 1),
-                })
-            except (TypeError, ValueError):
-                hold_items.append({"id": it.get("id"), "name": "", "price": 0.0, "quantity": 1})
-        key = (location_code, bill_no)
-        _held_bills_fallback[key] = {
-            "counterCode": counter_code,
-            "heldDate": datetime.datetime.now().isoformat(),
-            "customerCode": customer_code,
-            "items": hold_items,
-        }
-        return jsonify({"ok": True, "billNo": bill_no, "locationCode": location_code, "savedToDb": False})
-    except Exception as e:
-        print(f"[Hold] unexpected error: {e}")
-        return jsonify({"ok": False, "error": str(e)}), 500
+def _parse_import_row(row):
+    """CSV row (canonical column names) -> (target, bind dict); raises ValueError with the reason."""
+    item_code = (row.get('ITEMCODE') or '').strip()
+    location_code = (row.get('LOCATIONCODE') or '').strip()
+    if not item_code or not location_code:
+        raise ValueError("ITEMCODE and LOCATIONCODE are required")
+    price = (row.get('RETAILPRICE') or '').strip()
+    if price:
+        try:
+            price = float(price)
+        except ValueError:
+            raise ValueError(f"RETAILPRICE is not a number: {price!r}")
+        if price < 0:
+            raise ValueError("RETAILPRICE must not be negative")
+    else:
+        price = None
+    alt_uom = (row.get('ALTERNATEUOMCODE') or '').strip()
+    if alt_uom:
+        if price is None:
+            raise ValueError("RETAILPRICE is required for an ALTERNATEUOMCODE row")
+        return 'alternate', {"itemcode": item_code, "loc": location_code, "altuom": alt_uom, "price": price}
+    uom = (row.get('BASEUOM') or '').strip() or None
+    if price is None and uom is None:
+        raise ValueError("nothing to change: give RETAILPRICE and/or BASEUOM")
+    return 'master', {"itemcode": item_code, "loc": location_code, "price": price, "uom": uom}
 
 
-def _cart_sync_execute(cur, conn, bill_no, location_code, items):
-    """Execute cart sync: TEMPBILLHDR and TEMPBILLDTL with FLAG=1 (draft) when items added to cart."""
-    loc_num = _location_to_num(location_code, 1)
-    bill_no = _to_int(bill_no, 1)
-    err_str = None
-    try:
-        cur.execute(f"""
-            DELETE FROM {HOLD_TABLE_NAME}
-            WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
-        """, billno=bill_no, loc=loc_num, flag=FLAG_DRAFT)
-    except oracledb.Error as e:
-        err_str = str(e).upper()
-        if 'ORA-00904' not in err_str and '00904' not in err_str:
-            raise
-        conn.rollback()
-        cur.execute(f"DELETE FROM {HOLD_TABLE_NAME} WHERE BILLNO = :billno AND LOCATIONCODE = :loc",
-                    billno=bill_no, loc=loc_num)
-    if items:
-        params_with_flag = []
-        for i, it in enumerate(items):
-            qty = _to_int(it.get('quantity') or it.get('qty'), 1)
-            for _ in range(max(1, qty)):
-                params_with_flag.append({
-                    'billno': bill_no,
-                    'loc': loc_num,
-                    'flag': FLAG_DRAFT,
-                })
-        try:
-            cur.executemany(f"""
-                INSERT INTO {HOLD_TABLE_NAME} (BILLNO, LOCATIONCODE, FLAG)
-                VALUES (:billno, :loc, :flag)
-            """, params_with_flag)
-        except oracledb.Error as e:
-            err_str = str(e).upper()
-            if 'ORA-00904' not in err_str and '00913' not in err_str:
-                raise
-            conn.rollback()
-            cur.execute(f"DELETE FROM {HOLD_TABLE_NAME} WHERE BILLNO = :billno AND LOCATIONCODE = :loc",
-                        billno=bill_no, loc=loc_num)
-            params_no_flag = [{'billno': p['billno'], 'loc': p['loc']} for p in params_with_flag]
-            cur.executemany(f"""
-                INSERT INTO {HOLD_TABLE_NAME} (BILLNO, LOCATIONCODE)
-                VALUES (:billno, :loc)
-            """, params_no_flag)
-    # TEMPBILLDTL: insert product data with FLAG=1 (draft) when cart items added – same as TEMPBILLHDR
-    _ensure_tempbilldtl(cur)
-    cur.execute(f"DELETE FROM {HOLD_DTL_TABLE_NAME} WHERE BILLNO = :billno", billno=bill_no)
-    dtl_params = []
-    for slno, it in enumerate(items or [], start=1):
-        if not isinstance(it, dict):
+def _apply_import_batch(cur, statements, batch, report):
+    """executemany one batch per target table; returns the (ITEMCODE, LOCATIONCODE) keys actually updated."""
+    changed = set()
+    for target, entries in batch.items():
+        if not entries:
             continue
-        itemcode = str(it.get('id') or it.get('itemcode') or it.get('ITEMCODE') or '').strip()
-        qty = _to_int(it.get('quantity') or it.get('qty') or it.get('QUANTITY'), 1)
-        rate = _to_float(it.get('price') or it.get('PRICE') or it.get('rate'), 0.0)
-        manufacturer_id = str(it.get('manufactureId') or it.get('MANUFACTURERID') or it.get('manufacturerId') or '').strip()
-        dtl_params.append({
-            'billno': bill_no,
-            'slno': slno,
-            'itemcode': itemcode or None,
-            'quantity': qty,
-            'rate': rate,
-            'manufacturerid': manufacturer_id or None,
-            'flag': FLAG_DRAFT,
-        })
-    if dtl_params:
-        try:
-            cur.executemany(f"""
-                INSERT INTO {HOLD_DTL_TABLE_NAME} (BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID, FLAG)
-                VALUES (:billno, :slno, :itemcode, :quantity, :rate, :manufacturerid, :flag)
-            """, dtl_params)
-        except oracledb.Error as e:
-            if 'ORA-00904' not in str(e).upper() and '00904' not in str(e).upper():
-                raise
-            dtl_no_flag = [{k: v for k, v in p.items() if k != 'flag'} for p in dtl_params]
-            cur.executemany(f"""
-                INSERT INTO {HOLD_DTL_TABLE_NAME} (BILLNO, SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID)
-                VALUES (:billno, :slno, :itemcode, :quantity, :rate, :manufacturerid)
-            """, dtl_no_flag)
+        cur.executemany(statements[target], [params for _, params in entries], batcherrors=True,
+                        arraydmlrowcounts=True)
+        failed = set()
+        for error in cur.getbatcherrors():
+            failed.add(error.offset)
+            _import_error(report, entries[error.offset][0], error.message)
+        for offset, count in enumerate(cur.getarraydmlrowcounts()):
+            if offset in failed:
+                continue
+            line_no, params = entries[offset]
+            if count:
+                report['updated'] += count
+                changed.add((params['itemcode'].upper(), params['loc'].upper()))
+            else:
+                report['notFound'] += 1
+                _import_error(report, line_no, "no matching row")
+    return changed
 
 
-@app.route('/api/cart/by-bill', methods=['GET'])
-def cart_by_bill():
-    """Fetch cart items from TEMPBILLDTL by BILLNO (for restore on tab reopen)."""
-    bill_no = request.args.get('billNo') or request.args.get('billno')
-    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
-    if not bill_no:
-        return jsonify({"ok": False, "error": "billNo required", "items": []}), 400
-    try:
-        bill_no = int(bill_no)
-    except (TypeError, ValueError):
-        return jsonify({"ok": False, "error": "billNo must be a number", "items": []}), 400
+def _import_error(report, line_no, message):
+    report['errorCount'] += 1
+    if len(report['errors']) < CATALOG_IMPORT_MAX_ERRORS:
+        report['errors'].append({"line": line_no, "error": message})
+
+
+def _import_catalog_changes(lines):
+    """
+    Apply a price / UOM CSV (iterable of text lines, header first). Commits every CATALOG_IMPORT_BATCH rows and
+    returns the report, or None if Oracle is unavailable. Raises ValueError for an unusable header.
+    """
+    reader = csv.DictReader(lines)
+    columns = {name: _CATALOG_IMPORT_COLUMNS.get((name or '').strip().upper()) for name in reader.fieldnames or []}
+    if 'ITEMCODE' not in columns.values() or 'LOCATIONCODE' not in columns.values():
+        raise ValueError("CSV header needs ITEMCODE and LOCATIONCODE (plus RETAILPRICE, BASEUOM, ALTERNATEUOMCODE)")
     conn = _get_connection()
     if not conn:
-        return jsonify({"ok": True, "items": []}), 200
+        return None
+    report = {"rows": 0, "updated": 0, "notFound": 0, "batches": 0, "changedItems": 0, "changeSeq": None,
+              "errorCount": 0, "errors": []}
     cur = None
-    items = []
     try:
         cur = conn.cursor()
-        _ensure_tempbilldtl(cur)
-        cur.execute(f"""
-            SELECT SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID
-            FROM {HOLD_DTL_TABLE_NAME}
-            WHERE BILLNO = :billno
-            ORDER BY SLNO
-        """, billno=bill_no)
-        dtl_rows = cur.fetchall()
-        cols = [c[0].upper() if c else '' for c in cur.description] if cur.description else []
-        for row in dtl_rows:
-            def _col(name, default=None):
-                try:
-                    i = cols.index(name)
-                    return row[i] if i >= 0 and i < len(row) else default
-                except (ValueError, IndexError):
-                    return default
-            itemcode = _col('ITEMCODE')
-            qty = _to_int(_col('QUANTITY'), 1)
-            rate = _to_float(_col('RATE'), 0.0)
-            manufacturer_id = _col('MANUFACTURERID')
-            code_str = str(itemcode).strip() if itemcode else ""
-            items.append({
-                "id": code_str or 0,
-                "name": "",
-                "price": rate,
-                "quantity": qty,
-                "manufactureId": str(manufacturer_id).strip() if manufacturer_id else "",
-                "ITEMCODE": code_str,
-                "MANUFACTURERID": str(manufacturer_id).strip() if manufacturer_id else "",
-            })
-        itemcodes = [str(it.get("ITEMCODE") or it.get("id") or "").strip() for it in items if it.get("ITEMCODE") or it.get("id")]
-        if itemcodes:
-            names_map = _get_item_names_from_master(cur, itemcodes)
-            for it in items:
-                code = str(it.get("ITEMCODE") or it.get("id") or "").strip()
-                it["name"] = names_map.get(code, "") or ""
+        _ensure_catalog_change_table(cur)
+        alt_table = _get_alternate_uom_table_info(cur)[0] or 'ITEMALTERNATEUOMMAP'
+        statements = {
+            'master': """
+                UPDATE ITEMMASTER SET RETAILPRICE = NVL(:price, RETAILPRICE), BASEUOM = NVL(:uom, BASEUOM)
+                WHERE ITEMCODE = :itemcode AND LOCATIONCODE = :loc
+            """,
+            'alternate': f"""
+                UPDATE {alt_table} SET RETAILPRICE = :price
+                WHERE ITEMCODE = :itemcode AND LOCATIONCODE = :loc AND ALTERNATEUOMCODE = :altuom
+            """,
+        }
+        batch = {'master': [], 'alternate': []}
+
+        def flush():
+            changed = _apply_import_batch(cur, statements, batch, report)
+            if changed:
+                cur.execute(f"SELECT {CATALOG_CHANGE_SEQ_NAME}.NEXTVAL FROM dual")
+                seq = _to_int(cur.fetchone()[0])
+                cur.executemany(
+                    f"INSERT INTO {CATALOG_CHANGE_TABLE_NAME} (CHANGESEQ, ITEMCODE, LOCATIONCODE) VALUES (:1, :2, :3)",
+                    [(seq, ic, lc) for ic, lc in changed])
+                report['changeSeq'] = seq
+                report['changedItems'] += len(changed)
+            conn.commit()
+            report['batches'] += 1
+            batch['master'], batch['alternate'] = [], []
+
+        for line_no, raw in enumerate(reader, start=2):
+            report['rows'] += 1
+            try:
+                target, params = _parse_import_row({columns.get(k): v for k, v in raw.items() if columns.get(k)})
+            except ValueError as e:
+                _import_error(report, line_no, str(e))
+                continue
+            batch[target].append((line_no, params))
+            if len(batch['master']) + len(batch['alternate']) >= CATALOG_IMPORT_BATCH:
+                flush()
+        if batch['master'] or batch['alternate']:
+            flush()
+        return report
     except oracledb.Error as e:
-        print(f"[Cart by-bill] {HOLD_DTL_TABLE_NAME} error: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        print(f"[CatalogImport] error after {report['batches']} batches: {e}")
+        report['error'] = str(e)
+        return report
     finally:
         if cur:
             try:
@@ -2259,39 +7399,89 @@ def cart_by_bill():
             conn.close()
         except Exception:
             pass
-    return jsonify({"ok": True, "items": items})
+        if report['changedItems']:
+            _publish_catalog_changes()
 
 
-@app.route('/api/cart/sync', methods=['GET', 'POST'])
-def cart_sync():
-    """Sync current cart to hold table with FLAG=1 (draft). POST only; GET returns hint."""
-    if request.method == 'GET':
-        return jsonify({"ok": True, "message": "Use POST with body: billNo, locationCode, items"}), 200
-    data = request.get_json(silent=True) or {}
-    bill_no = data.get('billNo')
-    location_code = (data.get('locationCode') or '').strip() or 'LOC001'
-    items = data.get('items') or []
-    if bill_no is None:
-        return jsonify({"error": "billNo is required"}), 400
-    bill_no = _to_int(bill_no, 1)
+def _publish_catalog_changes():
+    """Make committed import batches visible: rebuild the shared catalog, drop warm lookups holding old prices."""
+    _invalidate_catalog()
+    _bus_publish('catalog.changed')
+
+
+@_on_bus('catalog.changed')
+def _on_catalog_changed(data, version):
+    """Forget warm lookups now; the rebuilt catalog file is remapped by the next stat check."""
+    _forget_hot_hits()
+
+
+@app.route('/api/admin/catalog/import', methods=['POST'])
+def import_catalog_changes():
+    """
+    Bulk price / UOM update from a CSV request body (streamed; UTF-8, header row). Columns: ITEMCODE, LOCATIONCODE,
+    RETAILPRICE and/or BASEUOM for ITEMMASTER; with ALTERNATEUOMCODE the ITEMALTERNATEUOMMAP row's RETAILPRICE.
+    Returns the per-line error report. Manager/IT only.
+    """
+    _, err = _require_manager()
+    if err:
+        return err
+    if not _catalog_import_lock.acquire(blocking=False):
+        return jsonify({"ok": False, "error": "Another catalog import is running"}), 409
+    try:
+        started = time.time()
+        report = _import_catalog_changes(io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline=''))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    finally:
+        _catalog_import_lock.release()
+    if report is None:
+        return jsonify({"ok": False, "error": "Database unavailable"}), 503
+    report['durationMs'] = round((time.time() - started) * 1000)
+    report['errors'].sort(key=lambda e: e['line'])
+    print(f"[CatalogImport] {report['rows']} rows, {report['updated']} updated, {report['errorCount']} errors")
+    return jsonify({"ok": 'error' not in report, **report}), (500 if 'error' in report else 200)
+
+
+@app.route('/api/products/changes', methods=['GET'])
+def product_changes():
+    """
+    Delta feed for terminals: current /api/products rows of items changed after CHANGESEQ `since` (the
+    X-Catalog-Seq of their last /api/products load, or the seq of the last poll), limited to what the served
+    catalog already contains. full=true: reload /api/products instead. Args: since, locationCode.
+    """
+    since = _to_int(request.args.get('since'), 0)
+    catalog = _get_catalog()
+    if catalog is None:
+        return jsonify({"ok": False, "error": "Catalog loading"}), 503
+    upto = catalog.change_seq
+    if upto <= since:
+        return jsonify({"ok": True, "seq": since, "full": False, "products": []})
+    location_key = _location_key(_request_location_code())
     conn = _get_connection()
     if not conn:
         return jsonify({"ok": False, "error": "Database unavailable"}), 503
     cur = None
     try:
         cur = conn.cursor()
-        _ensure_tempbillhdr(cur)
-        _ensure_tempbilldtl(cur)
-        _cart_sync_execute(cur, conn, bill_no, location_code, items)
-        conn.commit()
-        return jsonify({"ok": True})
+        cur.execute(f"SELECT NVL(MIN(CHANGESEQ), 0) FROM {CATALOG_CHANGE_TABLE_NAME}")
+        oldest = _to_int(cur.fetchone()[0])
+        if not oldest or since < oldest - 1:  # changes after `since` were pruned
+            return jsonify({"ok": True, "seq": upto, "full": True, "products": []})
+        params = {"since": since, "upto": upto, "maxitems": CATALOG_CHANGES_MAX_ITEMS + 1}
+        location_filter = ''
+        if location_key:
+            location_filter = "AND LOCATIONCODE = :loc"
+            params["loc"] = location_key
+        # ROWNUM over the DISTINCT keys: on the raw rows it would cut off items changed more than once
+        cur.execute(f"""
+            SELECT ITEMCODE, LOCATIONCODE FROM (
+                SELECT DISTINCT ITEMCODE, LOCATIONCODE FROM {CATALOG_CHANGE_TABLE_NAME}
+                WHERE CHANGESEQ > :since AND CHANGESEQ <= :upto {location_filter}
+            ) WHERE ROWNUM <= :maxitems
+        """, params)
+        keys = cur.fetchall()
     except oracledb.Error as e:
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        print(f"[Cart sync] {HOLD_TABLE_NAME} error: {e}")
+        print(f"[CatalogImport] change feed error: {e}")
         return jsonify({"ok": False, "error": str(e)}), 500
     finally:
         if cur:
@@ -2303,249 +7493,42 @@ def cart_sync():
             conn.close()
         except Exception:
             pass
+    if len(keys) > CATALOG_CHANGES_MAX_ITEMS:
+        return jsonify({"ok": True, "seq": upto, "full": True, "products": []})
+    products = []
+    for item_code, location_code in keys:
+        i = catalog.find_item(item_code, location_code)
+        if i is not None:
+            products.append(catalog.record(i))
+    return jsonify({"ok": True, "seq": upto, "full": False, "products": products})
 
 
-@app.route('/api/hold', methods=['GET'])
-def list_held_bills():
-    """List held bills from TEMPBILLHDR (FLAG=0). Return BILLNO, HELDDATE, items per bill."""
-    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
-    loc_num = _location_to_num(location_code, 1)
+def _prune_catalog_changes():
     conn = _get_connection()
-    result = []
-    if conn:
-        cur = None
-        try:
-            cur = conn.cursor()
-            _ensure_tempbillhdr(cur)
-            # Held bills: distinct BILLNO for this location with FLAG=0 (held)
-            cur.execute(f"""
-                SELECT DISTINCT BILLNO, LOCATIONCODE
-                FROM {HOLD_TABLE_NAME}
-                WHERE LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
-                ORDER BY BILLNO DESC
-            """, loc=loc_num, flag=FLAG_HELD)
-            rows = cur.fetchall()
-            cols = [c[0] for c in cur.description]
-            result = [dict(zip(cols, row)) for row in rows]
-            for r in result:
-                r["HELDDATE"] = None
-                r["items"] = []
-            # Try to get HELDDATE if column exists (MAX per bill)
-            try:
-                cur.execute(f"""
-                    SELECT BILLNO, MAX(HELDDATE) AS HELDDATE
-                    FROM {HOLD_TABLE_NAME}
-                    WHERE LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
-                    GROUP BY BILLNO
-                """, loc=loc_num, flag=FLAG_HELD)
-                for row in cur.fetchall():
-                    billno, hd = row[0], row[1] if len(row) > 1 else None
-                    for r in result:
-                        if r.get("BILLNO") == billno and hd is not None:
-                            r["HELDDATE"] = hd.isoformat() if hasattr(hd, 'isoformat') else str(hd)
-                            break
-            except oracledb.Error:
-                pass
-            # Fetch product details from TEMPBILLDTL per bill; look up product name from ITEMMASTER
-            for r in result:
-                billno = r.get("BILLNO")
-                r["items"] = []
-                try:
-                    cur.execute(f"""
-                        SELECT SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID
-                        FROM {HOLD_DTL_TABLE_NAME}
-                        WHERE BILLNO = :billno
-                        ORDER BY SLNO
-                    """, billno=billno)
-                    dtl_rows = cur.fetchall()
-                    cols = [c[0].upper() if c else '' for c in cur.description] if cur.description else []
-                    for row in dtl_rows:
-                        def _col(name, default=None):
-                            try:
-                                i = cols.index(name)
-                                return row[i] if i >= 0 and i < len(row) else default
-                            except (ValueError, IndexError):
-                                return default
-                        itemcode = _col('ITEMCODE')
-                        qty = _to_int(_col('QUANTITY'), 1)
-                        rate = _to_float(_col('RATE'), 0.0)
-                        manufacturer_id = _col('MANUFACTURERID')
-                        code_str = str(itemcode).strip() if itemcode else ""
-                        r["items"].append({
-                            "id": code_str or 0,
-                            "name": "",
-                            "price": rate,
-                            "quantity": qty,
-                            "manufactureId": str(manufacturer_id).strip() if manufacturer_id else "",
-                            "ITEMCODE": code_str,
-                        })
-                    # Look up product names from ITEMMASTER by ITEMCODE
-                    itemcodes = [str(it.get("ITEMCODE") or it.get("id") or "").strip() for it in r["items"] if it.get("ITEMCODE") or it.get("id")]
-                    names_map = _get_item_names_from_master(cur, itemcodes)
-                    for it in r["items"]:
-                        code = str(it.get("ITEMCODE") or it.get("id") or "").strip()
-                        it["name"] = names_map.get(code, "") or ""
-                except oracledb.Error:
-                    pass
-                if not r["items"]:
-                    cur.execute(f"""
-                        SELECT BILLNO FROM {HOLD_TABLE_NAME}
-                        WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
-                    """, billno=billno, loc=loc_num, flag=FLAG_HELD)
-                    hold_rows = cur.fetchall()
-                    r["items"] = [{"id": 0, "name": "Item", "price": 0.0, "quantity": 1} for _ in hold_rows]
-            result.sort(key=lambda x: (x.get("HELDDATE") or "", x.get("BILLNO") or 0), reverse=True)
-            return jsonify(result)
-        except oracledb.Error as e:
-            print(f"{HOLD_TABLE_NAME} list error: {e}")
-        finally:
-            if cur:
-                try:
-                    cur.close()
-                except Exception:
-                    pass
+    if not conn:
+        raise RuntimeError('Database unavailable')
+    cur = None
+    try:
+        cur = conn.cursor()
+        _ensure_catalog_change_table(cur)
+        cur.execute(f"DELETE FROM {CATALOG_CHANGE_TABLE_NAME} WHERE CHANGEDAT < SYSDATE - :days",
+                    days=CATALOG_CHANGE_RETENTION_DAYS)
+        conn.commit()
+    finally:
+        if cur:
             try:
-                conn.close()
+                cur.close()
             except Exception:
                 pass
-    for (loc, bill_no), v in _held_bills_fallback.items():
-        if loc == location_code and not v.get("retrieved"):
-            result.append({
-                "BILLNO": bill_no,
-                "LOCATIONCODE": loc,
-                "HELDDATE": v.get("heldDate"),
-                "items": v.get("items", []),
-            })
-    result.sort(key=lambda x: -(x.get("BILLNO") or 0))
-    return jsonify(result)
-
-
-@app.route('/api/hold/<int:bill_no>', methods=['GET'])
-def get_held_bill(bill_no):
-    """Get held bill details: fetch product details from TEMPBILLDTL, return billNo and items for cart retrieve."""
-    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
-    loc_num = _location_to_num(location_code, 1)
-    conn = _get_connection()
-    if conn:
-        cur = None
         try:
-            cur = conn.cursor()
-            cur.execute(f"""
-                SELECT BILLNO
-                FROM {HOLD_TABLE_NAME}
-                WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag OR FLAG IS NULL)
-            """, billno=bill_no, loc=loc_num, flag=FLAG_HELD)
-            hdr_rows = cur.fetchall()
-            if not hdr_rows:
-                return jsonify({"error": "Held bill not found in database"}), 404
-            # Fetch product details from TEMPBILLDTL for this bill (cart items for retrieve)
-            items = []
-            try:
-                cur.execute(f"""
-                    SELECT SLNO, ITEMCODE, QUANTITY, RATE, MANUFACTURERID
-                    FROM {HOLD_DTL_TABLE_NAME}
-                    WHERE BILLNO = :billno
-                    ORDER BY SLNO
-                """, billno=bill_no)
-                dtl_rows = cur.fetchall()
-                cols = [c[0].upper() if c else '' for c in cur.description] if cur.description else []
-                for row in dtl_rows:
-                    def col(name, default=None):
-                        try:
-                            i = cols.index(name)
-                            return row[i] if i >= 0 and i < len(row) else default
-                        except (ValueError, IndexError):
-                            return default
-                    itemcode = col('ITEMCODE')
-                    qty = _to_int(col('QUANTITY'), 1)
-                    rate = _to_float(col('RATE'), 0.0)
-                    manufacturer_id = col('MANUFACTURERID')
-                    code_str = str(itemcode).strip() if itemcode else ""
-                    items.append({
-                        "id": code_str or 0,
-                        "name": "",
-                        "price": rate,
-                        "quantity": qty,
-                        "manufactureId": str(manufacturer_id).strip() if manufacturer_id else "",
-                        "ITEMCODE": code_str,
-                        "MANUFACTURERID": str(manufacturer_id).strip() if manufacturer_id else "",
-                    })
-                # Look up product names from ITEMMASTER by ITEMCODE and set name on each item
-                itemcodes = [str(it.get("ITEMCODE") or it.get("id") or "").strip() for it in items if it.get("ITEMCODE") or it.get("id")]
-                names_map = _get_item_names_from_master(cur, itemcodes)
-                for it in items:
-                    code = str(it.get("ITEMCODE") or it.get("id") or "").strip()
-                    it["name"] = names_map.get(code, "") or ""
-            except oracledb.Error:
-                pass
-            if not items:
-                items = [
-                    {"id": 0, "name": "Item", "price": 0.0, "quantity": 1}
-                    for _ in hdr_rows
-                ]
-            return jsonify({"billNo": bill_no, "locationCode": location_code, "items": items})
-        except oracledb.Error as e:
-            print(f"{HOLD_TABLE_NAME} get error: {e}")
-        finally:
-            if cur:
-                try:
-                    cur.close()
-                except Exception:
-                    pass
-            try:
-                conn.close()
-            except Exception:
-                pass
-    # In-memory fallback only when DB unavailable
-    key = (location_code, bill_no)
-    if key not in _held_bills_fallback:
-        return jsonify({"error": "Held bill not found"}), 404
-    v = _held_bills_fallback[key]
-    return jsonify({
-        "billNo": bill_no,
-        "locationCode": location_code,
-        "items": v.get("items", []),
-    })
+            conn.close()
+        except Exception:
+            pass
 
 
-@app.route('/api/hold/<int:bill_no>', methods=['DELETE'])
-def delete_held_bill(bill_no):
-    """On retrieve: only change FLAG (held=0 -> draft=1), do not delete from DB."""
-    location_code = (request.args.get('locationCode') or '').strip() or 'LOC001'
-    loc_num = _location_to_num(location_code, 1)
-    conn = _get_connection()
-    if conn:
-        cur = None
-        try:
-            cur = conn.cursor()
-            cur.execute(f"""
-                UPDATE {HOLD_TABLE_NAME} SET FLAG = :flag
-                WHERE BILLNO = :billno AND LOCATIONCODE = :loc AND (FLAG = :flag_held OR FLAG IS NULL)
-            """, billno=bill_no, loc=loc_num, flag=FLAG_DRAFT, flag_held=FLAG_HELD)
-            conn.commit()
-            return jsonify({"ok": True})
-        except oracledb.Error as e:
-            if conn:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-            print(f"{HOLD_TABLE_NAME} update flag error: {e}")
-        finally:
-            if cur:
-                try:
-                    cur.close()
-                except Exception:
-                    pass
-            try:
-                conn.close()
-            except Exception:
-                pass
-    # In-memory fallback: mark as retrieved so it no longer appears in held list
-    key = (location_code, bill_no)
-    if key in _held_bills_fallback:
-        _held_bills_fallback[key]["retrieved"] = True
-    return jsonify({"ok": True})
+_schedule_job('catalog-change-prune', _prune_catalog_changes, cron='50 2 * * *')
+
+_start_cache_bus()  # worker start (tools importing app set POS_CACHE_BUS=local)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,81 @@
+"""
+Serialization benchmark for large catalog responses (no Oracle needed).
+
+Builds a synthetic catalog shaped like /api/products rows and reports time and peak memory for Flask's stdlib
+JSON provider, the orjson provider, and a pre-serialized blob hit. Runs twice: with plain values (what the
+resident catalog emits) and with raw Oracle values (Decimal prices, dates), which go through the default hook.
+
+    python bench_json.py [--items 200000] [--repeat 3]
+"""
+import argparse
+import datetime
+import decimal
+import os
+import time
+import tracemalloc
+
+from flask.json.provider import DefaultJSONProvider
+
+os.environ.setdefault('POS_CACHE_BUS', 'local')  # a one-off tool has no caches to keep in step with the workers
+
+from app import FastJSONProvider, app, orjson
+
+
+def _catalog_rows(count, oracle_types):
+    day = datetime.datetime(2024, 1, 1, 9, 30)
+    price = decimal.Decimal if oracle_types else float
+    stamp = (lambda i: day + datetime.timedelta(minutes=i)) if oracle_types else (lambda i: None)
+    return [
+        {
+            'LOCATIONCODE': f"{i % 12:03d}",
+            'ITEMCODE': 100000 + i,
+            'ITEMNAME': f"ITEM {i} منتج",
+            'CATEGORYCODE': f"CAT{i % 40}",
+            'RETAILPRICE': price(f"{i % 997}.{i % 100:02d}"),
+            'MANUFACTURERID': 8900000000000 + i if i % 3 else None,
+            'BASEUOM': 'PCS',
+            'ALTERNATECODES': [f"ALT{i}"] if i % 5 == 0 else [],
+            'UPDATEDDATE': stamp(i),
+        }
+        for i in range(count)
+    ]
+
+
+def _measure(label, fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {best * 1000:10.1f} ms {peak / 2 ** 20:10.1f} MiB {len(body) / 2 ** 20:10.1f} MiB")
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    stdlib = DefaultJSONProvider(app)
+    for oracle_types in (False, True):
+        rows = _catalog_rows(args.items, oracle_types)
+        print(f"\n{args.items} rows, {'Decimal / datetime values' if oracle_types else 'plain values'}")
+        print(f"{'provider':<22} {'time':>13} {'peak':>14} {'body':>14}")
+        expected = _measure('stdlib json', lambda: stdlib.dumps(rows).encode('utf-8'), args.repeat)
+        if orjson is None:
+            print("orjson not installed: pip install orjson")
+        else:
+            fast = FastJSONProvider(app)
+            body = _measure('orjson', lambda: fast.dumpb(rows), args.repeat)
+            print(f"{'':<22} same document as stdlib: {stdlib.loads(body) == stdlib.loads(expected)}")
+        _measure('pre-serialized blob', lambda: expected, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+End-of-day bill export to chunked CSV / Parquet files (same query and format as GET /api/export/bills).
+
+Streams BILLHDR joined to BILLDTL for a date range, ordered by BILLNO, into part files of about --part-rows rows.
+Parts always end on a bill boundary. A state file next to the parts records the last bill of every finished part,
+so --resume continues after it once an interrupted run is restarted.
+
+    python export_bills.py --from 2026-10-01 --to 2026-10-31 [--format csv|parquet] [--out exports]
+                           [--part-rows 500000] [--location L1] [--resume]
+"""
+import argparse
+import json
+import os
+import sys
+
+os.environ.setdefault('POS_CACHE_BUS', 'local')  # a one-off tool has no caches to keep in step with the workers
+
+from app import BillExportWriter, _acquire_export_connection, _iter_bill_export, _parse_iso_date
+
+
+class _Part:
+    def __init__(self, out_dir, stem, number, fmt):
+        self.name = f"{stem}_part{number:04d}.{fmt}"
+        self.path = os.path.join(out_dir, self.name)
+        self.file = open(self.path + '.partial', 'wb')
+        self.writer = BillExportWriter(self.file, fmt)
+
+    def finish(self):
+        self.writer.close()
+        self.file.close()
+        os.replace(self.path + '.partial', self.path)
+
+
+def _save_state(path, state):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--from', dest='day_from', required=True, help='first bill date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='day_to', help='last bill date, YYYY-MM-DD (default: --from)')
+    parser.add_argument('--format', choices=sorted(BillExportWriter.CONTENT_TYPES), default='csv')
+    parser.add_argument('--out', default='exports')
+    parser.add_argument('--part-rows', type=int, default=500000)
+    parser.add_argument('--location')
+    parser.add_argument('--resume', action='store_true', help='continue after the last finished part')
+    args = parser.parse_args()
+
+    day_from = _parse_iso_date(args.day_from)
+    day_to = _parse_iso_date(args.day_to or args.day_from)
+    if day_from is None or day_to is None or day_to < day_from:
+        sys.exit("--from / --to must be YYYY-MM-DD with from <= to")
+    os.makedirs(args.out, exist_ok=True)
+    stem = f"bills_{day_from.isoformat()}_{day_to.isoformat()}" + (f"_{args.location}" if args.location else '')
+    state_path = os.path.join(args.out, f"{stem}.state.json")
+    state = {'from': day_from.isoformat(), 'to': day_to.isoformat(), 'format': args.format,
+             'location': args.location, 'lastBill': 0, 'rows': 0, 'parts': [], 'done': False}
+    if args.resume and os.path.exists(state_path):
+        with open(state_path) as f:
+            saved = json.load(f)
+        if saved.get('format') != args.format:
+            sys.exit(f"{state_path} was written as {saved.get('format')}; rerun with --format {saved.get('format')}")
+        state = saved
+        if state['done']:
+            print(f"{stem}: already complete ({len(state['parts'])} parts, {state['rows']} rows)")
+            return
+        print(f"{stem}: resuming after bill {state['lastBill']}")
+
+    conn, reason = _acquire_export_connection()
+    if conn is None:
+        sys.exit(f"Oracle {reason}")
+
+    def finish(part, last_bill):
+        part.finish()
+        state['parts'].append(part.name)
+        state['lastBill'] = last_bill
+        state['rows'] += part.writer.rows
+        _save_state(state_path, state)
+        print(f"{part.name}: {part.writer.rows} rows, last bill {last_bill}")
+
+    part = _Part(args.out, stem, len(state['parts']) + 1, args.format)
+    bill = None
+    try:
+        for rows in _iter_bill_export(conn, day_from, day_to, state['lastBill'], args.location):
+            start = 0
+            for i, row in enumerate(rows):
+                if row[1] == bill:
+                    continue
+                if part.writer.rows + i - start >= args.part_rows:
+                    part.writer.write(rows[start:i])
+                    start = i
+                    finish(part, bill)
+                    part = _Part(args.out, stem, len(state['parts']) + 1, args.format)
+                bill = row[1]
+            part.writer.write(rows[start:])
+        if part.writer.rows or not state['parts']:
+            finish(part, bill if bill is not None else state['lastBill'])
+        else:
+            part.file.close()
+            os.remove(part.path + '.partial')
+        state['done'] = True
+        _save_state(state_path, state)
+        print(f"{stem}: {state['rows']} rows in {len(state['parts'])} parts")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Importing app must stay passive: no bus sockets, no scheduler, local state under a throwaway dir.
+_DATA_DIR = tempfile.mkdtemp(prefix='pos-tests-')
+os.environ.setdefault('POS_CACHE_BUS', 'local')
+os.environ.setdefault('POS_SCHEDULER', '0')
+os.environ.setdefault('POS_DATA_DIR', _DATA_DIR)
+os.environ.setdefault('POS_CATALOG_PATH', os.path.join(_DATA_DIR, 'catalog.bin'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
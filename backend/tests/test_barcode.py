@@ -0,0 +1,81 @@
+import pytest
+
+import app
+from app import _barcode_lookup_keys, _barcode_variants, _gtin_check_digit, _gtin_valid, _parse_variable_measure
+
+
+def _label(body):
+    return body + _gtin_check_digit(body)
+
+
+def test_check_digit():
+    assert _gtin_check_digit('400638133393') == '1'
+    assert _gtin_valid('4006381333931')
+    assert not _gtin_valid('4006381333932')
+    assert not _gtin_valid('40063813339')  # not a GTIN length
+
+
+def test_ean13_variants():
+    assert _barcode_variants('4006381333931') == ['4006381333931', '04006381333931']
+
+
+def test_upc_a_matches_ean13_and_number_form():
+    variants = _barcode_variants('036000291452')
+    assert variants[0] == '036000291452'
+    assert {'36000291452', '0036000291452', '00036000291452'} <= set(variants)
+
+
+def test_stripped_gtin_finds_padded_forms():
+    assert '036000291452' in _barcode_variants('36000291452')
+
+
+@pytest.mark.parametrize('code', ['12345', 'ABC123', '4006381333932'])
+def test_non_gtin_codes_are_left_alone(code):
+    assert _barcode_variants(code) == [code]
+
+
+def test_weight_label():
+    code = _label('2112345' + '01234')
+    measure = _parse_variable_measure(code)
+    assert measure['kind'] == 'weight'
+    assert measure['value'] == pytest.approx(1.234)
+    assert measure['keys'] == ['12345', '2112345']
+
+
+def test_price_label_strips_item_zeros():
+    code = _label('2000055' + '00250')
+    measure = _parse_variable_measure(code)
+    assert measure['kind'] == 'price'
+    assert measure['value'] == pytest.approx(2.5)
+    assert measure['keys'] == ['00055', '55', '2000055']
+
+
+def test_label_with_bad_check_digit():
+    body = '2112345' + '01234'
+    bad = body + str((int(_gtin_check_digit(body)) + 1) % 10)
+    assert _parse_variable_measure(bad) is None
+
+
+def test_non_measure_prefix():
+    assert _parse_variable_measure('4006381333931') is None
+    assert _parse_variable_measure('21ABC') is None
+
+
+def test_store_rules_replace_default(monkeypatch):
+    rules = dict(app.BARCODE_PREFIX_RULES)
+    rules['L9'] = [{'prefix': '29', 'kind': 'weight', 'length': 13, 'item': (2, 5), 'value': (7, 5), 'decimals': 3,
+                    'key': 'zeroed'}]
+    monkeypatch.setattr(app, 'BARCODE_PREFIX_RULES', rules)
+    code = _label('2912345' + '00750')
+    measure = _parse_variable_measure(code, 'L9')
+    assert measure['value'] == pytest.approx(0.75)
+    assert measure['keys'] == [_label('2912345' + '00000')]
+    assert _parse_variable_measure(code, 'L1') is None  # '29' is not a default prefix
+    assert _parse_variable_measure(_label('2112345' + '01234'), 'L9') is None
+
+
+def test_lookup_keys_try_the_full_label_first():
+    code = _label('2112345' + '01234')
+    measure, keys = _barcode_lookup_keys(code)
+    assert keys[:2] == [code, '0' + code]
+    assert keys[2:] == measure['keys'] == ['12345', '2112345']
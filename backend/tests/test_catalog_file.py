@@ -0,0 +1,76 @@
+import pytest
+
+from app import CompactCatalog, _map_catalog_file, _write_catalog_file
+
+PRODUCTS = [
+    {'LOCATIONCODE': 'L1', 'ITEMCODE': 1001, 'ITEMNAME': 'MILK 1L', 'CATEGORYCODE': 'DAIRY', 'RETAILPRICE': 1.2,
+     'MANUFACTURERID': 4006381333931, 'BASEUOM': 'EA', 'ALTERNATECODES': ['BOX6']},
+    {'LOCATIONCODE': 'L2', 'ITEMCODE': 1001, 'ITEMNAME': 'MILK 1L', 'CATEGORYCODE': 'DAIRY', 'RETAILPRICE': 1.3,
+     'MANUFACTURERID': 4006381333931, 'BASEUOM': 'EA', 'ALTERNATECODES': ['BOX6']},
+    {'LOCATIONCODE': 'L1', 'ITEMCODE': 'B-77', 'ITEMNAME': 'BREAD', 'CATEGORYCODE': None, 'RETAILPRICE': None,
+     'MANUFACTURERID': None, 'BASEUOM': None, 'ALTERNATECODES': []},
+    {'LOCATIONCODE': None, 'ITEMCODE': 2002, 'ITEMNAME': 'APPLES', 'CATEGORYCODE': 'FRUIT', 'RETAILPRICE': 3.5,
+     'MANUFACTURERID': None, 'BASEUOM': 'KG', 'ALTERNATECODES': []},
+]
+ALTERNATES = [
+    # (ITEMCODE, LOCATIONCODE, MANUFACTURERID, RETAILPRICE, ALTERNATEUOMCODE)
+    (1001, 'L1', None, 6.9, 'BOX6'),
+    (1001, 'L2', None, 7.5, 'BOX6'),
+]
+
+
+@pytest.fixture
+def catalogs(tmp_path):
+    built = CompactCatalog(PRODUCTS, ALTERNATES, len(PRODUCTS))
+    built.change_seq = 42
+    path = str(tmp_path / 'catalog.bin')
+    _write_catalog_file(built, path)
+    mapped, file_id = _map_catalog_file(path)
+    assert mapped is not None and file_id is not None
+    return built, mapped
+
+
+def test_rows_round_trip(catalogs):
+    built, mapped = catalogs
+    assert mapped.size == built.size == len(PRODUCTS)
+    assert mapped.rows() == built.rows() == PRODUCTS
+    for loc in ('L1', 'l2 ', 'ZZ'):
+        assert mapped.rows(loc) == built.rows(loc)
+    assert [r['ITEMCODE'] for r in mapped.rows('L1')] == [1001, 'B-77', 2002]
+    assert mapped.rows('ZZ') is None
+
+
+def test_scalar_fields_round_trip(catalogs):
+    built, mapped = catalogs
+    assert mapped.change_seq == 42
+    assert mapped.loaded_at == built.loaded_at
+    assert mapped.master_count == built.master_count
+
+
+@pytest.mark.parametrize('code,location', [
+    ('1001', None), ('1001', 'L2'), ('4006381333931', 'L1'), ('b-77', None), ('BOX6', 'L1'), ('BOX6', 'L2'),
+    ('BOX6', None), ('2002', 'L1'), ('nope', None),
+])
+def test_lookup_round_trip(catalogs, code, location):
+    built, mapped = catalogs
+    assert mapped.lookup(code, location) == built.lookup(code, location)
+
+
+def test_lookup_prefers_the_store(catalogs):
+    _, mapped = catalogs
+    rec, item_from_alt, alt_price, alt_uom = mapped.lookup('BOX6', 'L2')
+    assert (rec['LOCATIONCODE'], rec['RETAILPRICE'], item_from_alt, alt_price, alt_uom) == ('L2', 1.3, '1001', 7.5, 'BOX6')
+
+
+def test_search_round_trip(catalogs):
+    built, mapped = catalogs
+    for q in ('milk', 'BOX', '77', 'zzz'):
+        assert mapped.search(q, 'L1') == built.search(q, 'L1')
+    assert [r['ITEMCODE'] for r in mapped.search('milk', 'L2')] == [1001]
+
+
+def test_not_a_catalog_file(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a catalog')
+    assert _map_catalog_file(str(path)) == (None, None)
+    assert _map_catalog_file(str(tmp_path / 'missing.bin')) == (None, None)
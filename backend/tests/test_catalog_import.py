@@ -0,0 +1,38 @@
+import pytest
+
+from app import _parse_import_row
+
+
+def test_master_price_and_uom():
+    row = {'ITEMCODE': ' 1001 ', 'LOCATIONCODE': 'L1', 'RETAILPRICE': '12.50', 'BASEUOM': 'EA'}
+    assert _parse_import_row(row) == ('master', {'itemcode': '1001', 'loc': 'L1', 'price': 12.5, 'uom': 'EA'})
+
+
+def test_master_price_only():
+    target, params = _parse_import_row({'ITEMCODE': '1001', 'LOCATIONCODE': 'L1', 'RETAILPRICE': '0'})
+    assert target == 'master'
+    assert params['price'] == 0.0 and params['uom'] is None
+
+
+def test_master_uom_only():
+    target, params = _parse_import_row({'ITEMCODE': '1001', 'LOCATIONCODE': 'L1', 'RETAILPRICE': ' ', 'BASEUOM': 'KG'})
+    assert target == 'master'
+    assert params['price'] is None and params['uom'] == 'KG'
+
+
+def test_alternate_row():
+    row = {'ITEMCODE': '1001', 'LOCATIONCODE': 'L1', 'RETAILPRICE': '6.9', 'ALTERNATEUOMCODE': 'BOX6', 'BASEUOM': 'EA'}
+    assert _parse_import_row(row) == ('alternate', {'itemcode': '1001', 'loc': 'L1', 'altuom': 'BOX6', 'price': 6.9})
+
+
+@pytest.mark.parametrize('row,reason', [
+    ({'LOCATIONCODE': 'L1', 'RETAILPRICE': '1'}, 'required'),
+    ({'ITEMCODE': '1001', 'LOCATIONCODE': '  ', 'RETAILPRICE': '1'}, 'required'),
+    ({'ITEMCODE': '1001', 'LOCATIONCODE': 'L1', 'RETAILPRICE': 'abc'}, 'not a number'),
+    ({'ITEMCODE': '1001', 'LOCATIONCODE': 'L1', 'RETAILPRICE': '-1'}, 'negative'),
+    ({'ITEMCODE': '1001', 'LOCATIONCODE': 'L1', 'ALTERNATEUOMCODE': 'BOX6'}, 'RETAILPRICE is required'),
+    ({'ITEMCODE': '1001', 'LOCATIONCODE': 'L1'}, 'nothing to change'),
+])
+def test_rejected_rows(row, reason):
+    with pytest.raises(ValueError, match=reason):
+        _parse_import_row(row)
@@ -0,0 +1,55 @@
+import csv
+import datetime
+import io
+
+import pytest
+
+from app import EXPORT_COLUMNS, BillExportWriter, _ExportSink
+
+ROWS = [
+    ('L1', 1, datetime.datetime(2026, 10, 1, 9, 30, 15), 'C', '3', 1, 'I1', 2.0, 1.5, 3.0),
+    ('L1', 1, datetime.datetime(2026, 10, 1, 9, 30, 15), 'C', '3', 2, 'I2', 1.234, 10.0, 12.34),
+    ('L2', 2, None, 'R', None, 1, 'I1', 1.0, 1.5, 1.5),
+]
+
+
+def test_csv():
+    out = io.BytesIO()
+    writer = BillExportWriter(out, 'csv')
+    writer.write(ROWS[:2])
+    writer.write(ROWS[2:])
+    writer.close()
+    rows = list(csv.reader(io.StringIO(out.getvalue().decode('utf-8'))))
+    assert writer.rows == 3
+    assert rows[0] == list(EXPORT_COLUMNS)
+    assert rows[1] == ['L1', '1', '2026-10-01 09:30:15', 'C', '3', '1', 'I1', '2.0', '1.5', '3.0']
+    assert rows[3][2] == '' and rows[3][4] == ''
+
+
+def test_csv_header_without_rows():
+    out = io.BytesIO()
+    BillExportWriter(out, 'csv').close()
+    assert out.getvalue().decode('utf-8') == ','.join(EXPORT_COLUMNS) + '\n'
+
+
+def test_parquet_through_sink():
+    pq = pytest.importorskip('pyarrow.parquet')
+    sink = _ExportSink()
+    writer = BillExportWriter(sink, 'parquet')
+    writer.write(ROWS)
+    writer.close()
+    table = pq.read_table(io.BytesIO(sink.drain()))
+    assert table.column_names == list(EXPORT_COLUMNS)
+    assert [tuple(r.values()) for r in table.to_pylist()] == ROWS
+
+
+def test_parquet_without_rows():
+    pq = pytest.importorskip('pyarrow.parquet')
+    out = io.BytesIO()
+    BillExportWriter(out, 'parquet').close()
+    assert pq.read_table(io.BytesIO(out.getvalue())).num_rows == 0
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        BillExportWriter(io.BytesIO(), 'xml')
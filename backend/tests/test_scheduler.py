@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+from app import CronSchedule
+
+
+def _next(expr, after):
+    return datetime.datetime.fromtimestamp(CronSchedule(expr).next_after(after.timestamp()))
+
+
+def test_step_minutes():
+    assert _next('*/15 * * * *', datetime.datetime(2026, 10, 19, 10, 7, 30)) == datetime.datetime(2026, 10, 19, 10, 15)
+
+
+def test_next_run_is_strictly_after():
+    assert _next('15 10 * * *', datetime.datetime(2026, 10, 19, 10, 15)) == datetime.datetime(2026, 10, 20, 10, 15)
+
+
+def test_daily_rolls_to_next_day():
+    assert _next('50 2 * * *', datetime.datetime(2026, 10, 19, 3, 0)) == datetime.datetime(2026, 10, 20, 2, 50)
+
+
+def test_weekday_range_skips_weekend():
+    saturday = datetime.datetime(2026, 10, 17, 12, 0)
+    assert _next('0 9 * * 1-5', saturday) == datetime.datetime(2026, 10, 19, 9, 0)
+
+
+def test_sunday_as_seven():
+    assert CronSchedule('0 0 * * 7').weekdays == {0}
+    assert _next('0 0 * * 7', datetime.datetime(2026, 10, 19)) == datetime.datetime(2026, 10, 25)
+
+
+def test_day_of_month_or_day_of_week():
+    # both day fields restricted: the 1st of the month or any Sunday
+    assert _next('0 0 1 * 0', datetime.datetime(2026, 10, 19)) == datetime.datetime(2026, 10, 25)
+    assert _next('0 0 1 * 0', datetime.datetime(2026, 10, 26)) == datetime.datetime(2026, 11, 1)
+
+
+def test_month_field():
+    assert _next('30 6 1 1,7 *', datetime.datetime(2026, 10, 19)) == datetime.datetime(2027, 1, 1, 6, 30)
+
+
+@pytest.mark.parametrize('expr', ['* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *', '5-1 * * * *'])
+def test_invalid_expressions(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+
+def test_never_matching_expression():
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 31 2 *').next_after(datetime.datetime(2026, 10, 19).timestamp())
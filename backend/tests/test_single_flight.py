@@ -0,0 +1,30 @@
+from app import _flight_key, app
+
+
+def _key(url):
+    with app.test_request_context(url):
+        return _flight_key()
+
+
+def test_key_is_path_and_sorted_args():
+    assert _key('/api/hold/list?counterCode=3&date=2026-10-19') == (
+        '/api/hold/list', (('counterCode', '3'), ('date', '2026-10-19')))
+
+
+def test_argument_order_does_not_matter():
+    assert _key('/api/x?b=2&a=1') == _key('/api/x?a=1&b=2')
+
+
+def test_blank_args_and_whitespace_are_ignored():
+    assert _key('/api/x?a=%201%20&b=&c=%20') == _key('/api/x?a=1')
+
+
+def test_repeated_args_are_kept():
+    assert _key('/api/x?a=2&a=1') == ('/api/x', (('a', '1'), ('a', '2')))
+    assert _key('/api/x?a=1&a=2') != _key('/api/x?a=1')
+
+
+def test_paths_and_values_are_distinct():
+    assert _key('/api/x?a=1') != _key('/api/y?a=1')
+    assert _key('/api/x?a=1') != _key('/api/x?a=2')
+    assert _key('/api/x?a=1') != _key('/api/x?A=1')
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react'
+import { useState, useEffect, useCallback, useRef } from 'react'
 import Sidebar from './components/Sidebar'
 import CustomerList from './components/CustomerList'
 import UserManagement from './components/UserManagement'
@@ -11,6 +11,28 @@ import HoldRetrieveModal from './components/HoldRetrieveModal'
 import './App.css'
 
 const API_BASE = `http://${typeof window !== 'undefined' ? window.location.hostname : ''}:5000`
+const PRODUCT_CHANGES_POLL_MS = 10000
+
+// Map backend product fields to frontend expected fields
+const mapProduct = (p) => ({
+  id: p.ITEMCODE,
+  name: p.ITEMNAME,
+  price: parseFloat(p.RETAILPRICE) || 0,
+  category: p.CATEGORYCODE,
+  image: '📦',
+  manufactureId: p.MANUFACTUREID ?? p.manufactureid ?? '',
+  alternateCodes: Array.isArray(p.ALTERNATECODES) ? p.ALTERNATECODES : [],
+  uom: (p.BASEUOM ?? p.baseuom ?? '').toString().trim() || undefined,
+})
+
+// Heavy reads are shed with 429 under load: wait Retry-After (plus jitter, so terminals spread out) and try again
+const fetchWithRetry = (url, options, attempts = 5) =>
+  fetch(url, options).then(res => {
+    if (res.status !== 429 || attempts <= 1) return res
+    const seconds = Number(res.headers.get('Retry-After')) || 2
+    return new Promise(resolve => setTimeout(resolve, seconds * 1000 * (1 + Math.random() / 2)))
+      .then(() => fetchWithRetry(url, options, attempts - 1))
+  })
 
 // Read systemName and ip from URL (set by POS Launcher exe) and store in sessionStorage
 if (typeof window !== 'undefined') {
@@ -51,6 +73,10 @@ function App() {
   const [selectedCustomer, setSelectedCustomer] = useState(null)
   const [showPaymentPage, setShowPaymentPage] = useState(false)
   const [selectedCartItemId, setSelectedCartItemId] = useState(null)
+  // /api/bootstrap result: catalog refs (href + ETag) for products / customers; null until the terminal is ready
+  const [catalogRefs, setCatalogRefs] = useState(null)
+  const newBillOnBootstrap = useRef(false)
+  const cartLoadedFor = useRef(null)
 
   // Restore user from token on load (refresh: keep logged in; only relogin on 401)
   useEffect(() => {
@@ -118,9 +144,8 @@ function App() {
         if (code) localStorage.setItem('pos_location', code)
         if (name) localStorage.setItem('pos_location_name', name)
       }
-      // Create and insert new_billno only on actual login (not on refresh)
-      await fetchAndSetNextBillNo()
-      // New bill on login: clear cart so it matches the new billNo (cart is per bill)
+      // Create and insert new_billno only on actual login (not on refresh): /api/bootstrap allocates it
+      newBillOnBootstrap.current = true
       setCart([])
     } catch (err) {
       setLoginError(err.message || 'Invalid username or password')
@@ -130,11 +155,18 @@ function App() {
   }
 
   const handleLogout = () => {
+    if (token) {
+      fetch(`${API_BASE}/api/logout`, {
+        method: 'POST',
+        headers: { Authorization: `Bearer ${token}` },
+      }).catch(() => {})
+    }
     localStorage.removeItem('pos_token')
     localStorage.removeItem('pos_user')
     setToken(null)
     setUser(null)
     setCart([])
+    setCatalogRefs(null)
   }
 
   const fetchAndSetNextBillNo = async () => {
@@ -241,38 +273,121 @@ function App() {
     };
   }, []);
 
+  // Terminal startup in one round trip: location, counter, bill no (new on login, else restore), its cart and the
+  // catalog refs. Products / customers are then read from their ETag'd catalog URLs.
   useEffect(() => {
-    if (!user) return
-    fetch(`${API_BASE}/api/products`)
-      .then(response => response.json())
+    if (!user || !token) return
+    let cancelled = false
+    const newBill = newBillOnBootstrap.current
+    newBillOnBootstrap.current = false
+    fetchWithRetry(`${API_BASE}/api/bootstrap`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
+      body: JSON.stringify({
+        systemIp: sessionStorage.getItem('pos_system_ip') || '',
+        systemName: sessionStorage.getItem('pos_system_name') || '',
+        counterCode: counterCode || '',
+        locationCode: locationCode || '',
+        billNo: newBill ? null : billNo,
+        newBill,
+      }),
+    })
+      .then(res => (res.ok ? res.json() : Promise.reject(res)))
       .then(data => {
-        // Map backend fields to frontend expected fields
-        const mappedProducts = data.map(p => ({
-          id: p.ITEMCODE,
-          name: p.ITEMNAME,
-          price: parseFloat(p.RETAILPRICE) || 0,
-          category: p.CATEGORYCODE,
-          image: '📦',
-          manufactureId: p.MANUFACTUREID ?? p.manufactureid ?? '',
-          alternateCodes: Array.isArray(p.ALTERNATECODES) ? p.ALTERNATECODES : [],
-          uom: (p.BASEUOM ?? p.baseuom ?? '').toString().trim() || undefined,
-        }))
-        setProducts(mappedProducts)
+        if (cancelled) return
+        const loc = data.location?.locationCode
+        if (loc && !localStorage.getItem('pos_location')) {
+          setLocationCode(loc)
+          localStorage.setItem('pos_location', loc)
+        }
+        if (data.counterCode) {
+          const counter = (data.counters || []).find(c => c.counterCode === data.counterCode)
+          setCounterCode(data.counterCode)
+          localStorage.setItem('pos_counter_code', data.counterCode)
+          if (counter?.counterName) {
+            setCounterName(counter.counterName)
+            localStorage.setItem('pos_counter_name', counter.counterName)
+          }
+        }
+        if (data.billNo != null) {
+          const next = Number(data.billNo)
+          cartLoadedFor.current = next
+          setBillNo(next)
+          localStorage.setItem('pos_bill_no', String(next))
+          setCart(Array.isArray(data.cart) ? data.cart : [])
+        } else if (newBill) {
+          fetchAndSetNextBillNo()
+        }
+        setCatalogRefs({ products: data.products, customers: data.customers })
+      })
+      .catch(() => {
+        if (cancelled) return
+        if (newBill) fetchAndSetNextBillNo()
+        setCatalogRefs({})
+      })
+    return () => {
+      cancelled = true
+    }
+  }, [user?.username, token])
+
+  useEffect(() => {
+    if (!user || !catalogRefs) return
+    let cancelled = false
+    let seq = null
+    // Only this store's partition of the catalog (backend falls back to the login location)
+    const params = new URLSearchParams({ locationCode: locationCode || '' })
+    const loadProducts = () => fetchWithRetry(`${API_BASE}/api/catalog/products?${params}`)
+      .then(response => {
+        seq = Number(response.headers.get('X-Catalog-Seq')) || 0
+        return response.json()
+      })
+      .then(data => {
+        if (!cancelled) setProducts(data.map(mapProduct))
       })
       .catch(error => console.error('Error fetching products:', error))
-  }, [user])
+    // Price / UOM imports: patch changed items in place from the delta feed (full reload when it says so)
+    const pollChanges = () => {
+      if (seq == null) return
+      const changeParams = new URLSearchParams({ since: String(seq), locationCode: locationCode || '' })
+      fetch(`${API_BASE}/api/products/changes?${changeParams}`)
+        .then(res => res.json())
+        .then(data => {
+          if (cancelled || !data.ok) return
+          if (data.full) return loadProducts()
+          seq = data.seq
+          if (!data.products.length) return
+          const changed = new Map(data.products.map(p => [String(p.ITEMCODE), mapProduct(p)]))
+          setProducts(prev => {
+            const next = prev.map(p => changed.get(String(p.id)) ?? p)
+            const known = new Set(prev.map(p => String(p.id)))
+            changed.forEach((p, id) => { if (!known.has(id)) next.push(p) })
+            return next
+          })
+        })
+        .catch(() => { /* next poll retries */ })
+    }
+    loadProducts()
+    const timer = setInterval(pollChanges, PRODUCT_CHANGES_POLL_MS)
+    return () => {
+      cancelled = true
+      clearInterval(timer)
+    }
+  }, [user, locationCode, catalogRefs])
 
   useEffect(() => {
-    if (!user) return
-    fetch(`${API_BASE}/api/customers`)
+    if (!user || !catalogRefs) return
+    const customersUrl = `${API_BASE}${catalogRefs.customers?.href || '/api/customers'}`
+    fetchWithRetry(customersUrl)
       .then(res => res.json())
       .then(data => setCustomers(Array.isArray(data) ? data : []))
       .catch(() => setCustomers([]))
-  }, [user])
+  }, [user, catalogRefs])
 
-  // On load / reopen: restore cart from DB (TEMPBILLDTL) by current billNo; when billNo changes, cart must match that bill
+  // When billNo changes after startup (new bill, retrieve), cart must match that bill: restore it from TEMPBILLDTL
   useEffect(() => {
-    if (!user || billNo == null) return
+    if (!user || !catalogRefs || billNo == null) return
+    if (cartLoadedFor.current === billNo) return
+    cartLoadedFor.current = billNo
     const params = new URLSearchParams({ billNo: String(billNo), locationCode: locationCode || '' })
     fetch(`${API_BASE}/api/cart/by-bill?${params}`)
       .then(res => res.json())
@@ -283,7 +398,7 @@ function App() {
       .catch(() => setCart([]))
   }, [user, billNo])
 
-  const syncCartToDb = (cartItems) => {
+  const syncCartToDb = (cartItems, extra = {}) => {
     fetch(`${API_BASE}/api/cart/sync`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -291,6 +406,7 @@ function App() {
         billNo,
         locationCode,
         items: cartItems,
+        ...extra,
       }),
     }).catch(err => console.error('Cart sync failed:', err))
   }
@@ -298,15 +414,16 @@ function App() {
   const getItemId = (item) => item?.id ?? item?.ITEMCODE ?? item?.itemCode ?? ''
   const sameId = (a, b) => String(a ?? '') === String(b ?? '')
 
-  const addToCart = (product) => {
+  const addToCart = (product, quantity = 1) => {
+    const qty = Number(quantity) > 0 ? Number(quantity) : 1
     setCart(prev => {
       const pid = getItemId(product)
       const existingItem = prev.find(item => sameId(getItemId(item), pid))
       const newCart = existingItem
         ? prev.map(item =>
-            sameId(getItemId(item), pid) ? { ...item, quantity: item.quantity + 1 } : item
+            sameId(getItemId(item), pid) ? { ...item, quantity: item.quantity + qty } : item
           )
-        : [...prev, { ...product, quantity: 1 }]
+        : [...prev, { ...product, quantity: qty }]
       syncCartToDb(newCart)
       return newCart
     })
@@ -342,6 +459,14 @@ function App() {
     syncCartToDb([])
   }
 
+  // Clear button: same as clearCart, but the backend records the cleared lines as a cancel audit event
+  const cancelBill = () => {
+    const canceledItems = cart.filter((item) => !item.void)
+    setCart([])
+    setSelectedCartItemId(null)
+    syncCartToDb([], { cancel: canceledItems.length > 0, canceledItems, counterCode: counterCode || '' })
+  }
+
   const handleSelectCustomer = (customer) => {
     const flag = (customer?.FLAG ?? customer?.flag ?? '').toString().trim().toUpperCase()
     if (flag === 'N') {
@@ -374,9 +499,11 @@ function App() {
       })),
     }
     try {
+      const headers = { 'Content-Type': 'application/json' }
+      if (token) headers.Authorization = `Bearer ${token}`
       const res = await fetch(`${API_BASE}/api/billdtl/insert`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers,
         body: JSON.stringify(billdtlPayload),
       })
       const data = await res.json().catch(() => ({}))
@@ -492,7 +619,7 @@ function App() {
                   onClearCustomer={handleClearCustomer}
                   onUpdateQuantity={updateQuantity}
                   onRemove={removeFromCart}
-                  onClear={clearCart}
+                  onClear={cancelBill}
                   onCheckout={goToPayment}
                   onHold={handleHold}
                   onHoldRetrieve={handleHoldRetrieve}
@@ -15,6 +15,7 @@ function CartSummary({
   products = [],
   onAddToCart,
   apiBase,
+  locationCode,
   selectedItemId,
   onSelectItem,
 }) {
@@ -38,9 +39,11 @@ function CartSummary({
     setScanCode('')
     if (!code) return
     let product = null
+    let quantity = 1
     if (apiBase) {
       try {
-        const res = await fetch(`${apiBase}/api/products/lookup?code=${encodeURIComponent(code)}`)
+        const params = new URLSearchParams({ code, locationCode: locationCode || '' })
+        const res = await fetch(`${apiBase}/api/products/lookup?${params}`)
         const data = await res.json().catch(() => ({}))
         if (res.ok && data.found !== false && (data.ITEMCODE != null || data.itemcode != null)) {
           product = {
@@ -52,6 +55,7 @@ function CartSummary({
             manufactureId: (data.MANUFACTUREID ?? data.manufactureid ?? data.ITEMCODE ?? data.itemcode ?? '').toString().trim(),
             uom: (data.BASEUOM ?? data.baseuom ?? '').toString().trim() || undefined,
           }
+          if (data.QUANTITY != null) quantity = Number(data.QUANTITY) || 1
         }
       } catch (err) {
         console.warn('Lookup error:', err)
@@ -66,8 +70,8 @@ function CartSummary({
       )
     }
     if (product) {
-      onAddToCart?.(product)
-      setScanMsg(`Added: ${product.name}`)
+      onAddToCart?.(product, quantity)
+      setScanMsg(`Added: ${product.name}${quantity !== 1 ? ` x ${quantity}` : ''}`)
     } else {
       setScanMsg(`Not found – ${code}`)
     }
@@ -15,6 +15,7 @@ function CounterOpen({ apiBase, token, locationCode }) {
   const [isOpen, setIsOpen] = useState(false)
   const [isClosed, setIsClosed] = useState(false)
   const [actionError, setActionError] = useState(null)
+  const [zReport, setZReport] = useState(null)
 
   const systemIp = typeof sessionStorage !== 'undefined' ? sessionStorage.getItem('pos_system_ip') || '' : ''
   const counterCode = counters[0] ? (counters[0].counterCode ?? counters[0].COUNTERCODE ?? '').toString().trim() : ''
@@ -97,8 +98,10 @@ function CounterOpen({ apiBase, token, locationCode }) {
     })
       .then((res) => res.json())
       .then((data) => {
-        if (data.ok) fetchStatus()
-        else setActionError(data.error || 'Close failed')
+        if (data.ok) {
+          setZReport(data.z || null)
+          fetchStatus()
+        } else setActionError(data.error || 'Close failed')
       })
       .catch((err) => setActionError(err.message || 'Close failed'))
   }
@@ -157,6 +160,38 @@ function CounterOpen({ apiBase, token, locationCode }) {
           {actionError && <p className="login-error" style={{ marginTop: 8 }}>{actionError}</p>}
         </section>
 
+        {zReport && (
+          <section className="counter-setup-section counter-setup-list">
+            <h3>Z totals – counter {zReport.counterCode}, {zReport.date}</h3>
+            <div className="counter-setup-table-wrap">
+              <table className="counter-setup-table">
+                <thead>
+                  <tr>
+                    <th>Cashier</th>
+                    <th>Bills</th>
+                    <th>Qty</th>
+                    <th>Cash</th>
+                    <th>Credit</th>
+                    <th>Total</th>
+                  </tr>
+                </thead>
+                <tbody>
+                  {[...zReport.byCashier, { cashier: 'Total', ...zReport.totals }].map((row) => (
+                    <tr key={row.cashier ?? '—'}>
+                      <td>{row.cashier ?? '—'}</td>
+                      <td>{row.bills}</td>
+                      <td>{row.quantity}</td>
+                      <td>{row.cash.amount.toFixed(2)}</td>
+                      <td>{row.credit.amount.toFixed(2)}</td>
+                      <td>{row.amount.toFixed(2)}</td>
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            </div>
+          </section>
+        )}
+
         <section className="counter-setup-section counter-setup-list">
           <h3>Active system – counter details (one only)</h3>
           <p className="counter-setup-muted">Saved system name, counter code and name for this terminal only.</p>
@@ -232,6 +232,7 @@ function Dashboard({
             products={products}
             onAddToCart={onAddToCart}
             apiBase={apiBase}
+            locationCode={locationCode}
             selectedItemId={selectedCartItemId}
             onSelectItem={(item) => onSelectCartItem?.(getItemId(item))}
           />
@@ -22,12 +22,15 @@ export default function HoldRetrieveModal({ open, onClose, locationCode, apiBase
     setError(null)
     setLoading(true)
     try {
-      const loc = encodeURIComponent(locationCode || 'LOC001')
-      const res = await fetch(`${apiBase}/api/hold/${billNoNum}?locationCode=${loc}`)
+      // One call: the backend locks the held bill, marks it retrieved and returns its cart
+      const res = await fetch(`${apiBase}/api/hold/${billNoNum}/retrieve`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ locationCode: locationCode || 'LOC001' }),
+      })
       const data = await res.json()
       if (!res.ok) throw new Error(data.error || 'Held bill not found')
       onRetrieve(data.billNo, data.items || [])
-      await fetch(`${apiBase}/api/hold/${billNoNum}?locationCode=${loc}`, { method: 'DELETE' })
       setBillNoInput('')
       onClose()
     } catch (err) {
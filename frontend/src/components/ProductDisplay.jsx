@@ -38,12 +38,15 @@ function ProductDisplay({ products, onAddToCart, cartItems, onPosAction, onHold,
     setScanCode('')
     if (!code) return
     let product = null
+    let quantity = 1
     if (apiBase) {
       try {
         const res = await fetch(`${apiBase}/api/products/lookup?code=${encodeURIComponent(code)}`)
         const data = await res.json().catch(() => ({}))
         if (res.ok && data.found !== false && (data.ITEMCODE != null || data.itemcode != null)) {
           product = mapLookupToProduct(data)
+          // Scale / price labels: backend returns the embedded weight (or amount / unit price) as QUANTITY
+          if (data.QUANTITY != null) quantity = Number(data.QUANTITY) || 1
         }
       } catch (err) {
         console.error('Lookup error:', err)
@@ -58,8 +61,8 @@ function ProductDisplay({ products, onAddToCart, cartItems, onPosAction, onHold,
       )
     }
     if (product) {
-      onAddToCart(product)
-      setScanMsg(`Added: ${product.name} (Barcode: ${code})`)
+      onAddToCart(product, quantity)
+      setScanMsg(`Added: ${product.name}${quantity !== 1 ? ` x ${quantity}` : ''} (Barcode: ${code})`)
     } else {
       setScanMsg(`Not found – Barcode: ${code}`)
     }